@@ -0,0 +1,187 @@
+"""
+Индекс сегментов пользователей для выбора получателей рассылок
+
+Вместо загрузки и перебора всех пользователей на каждую рассылку:
+- пользователи разложены по тарифу, признаку блокировки и дню окончания подписки
+- индекс строится один раз, дальше применяются только изменения из журнала
+  user_changes хранилища (включая сделанные админ-ботом в другом процессе)
+- "активные" и "истекающие" считаются на момент запроса по корзинам дней,
+  без перебора пользователей вне нужного диапазона
+"""
+
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+LIFETIME_PLAN = 'subscription_lifetime'
+BLOCKED_STATUS = 'blocked'
+
+# Сегменты по подстроке в названии тарифа (как в прежней фильтрации рассылок)
+PLAN_SEGMENTS = {
+    'trial': 'trial',
+    'premium': 'premium',
+    'free': 'free',
+}
+
+# Окно сегмента "истекающие": осталось от 0 до 7 полных дней
+EXPIRING_DAYS = 7
+
+
+class RecipientSegmentIndex:
+    """Инкрементальный индекс сегментов пользователей: all, active, trial, premium, free, expiring"""
+
+    def __init__(self, store):
+        """
+        Args:
+            store: UserStore с журналом изменений
+        """
+        self.store = store
+        self._lock = threading.Lock()
+        self._seq: Optional[int] = None
+
+        # telegram_id -> (тариф, заблокирован, окончание подписки)
+        self._entries: Dict[int, Tuple[str, bool, Optional[datetime]]] = {}
+        self._by_plan: Dict[str, Set[int]] = {}
+        self._by_end_day: Dict[int, Set[int]] = {}
+        self._blocked: Set[int] = set()
+        self._stats = {'rebuilds': 0, 'applied_changes': 0, 'queries': 0}
+
+    @staticmethod
+    def _entry(user_data: dict) -> Tuple[str, bool, Optional[datetime]]:
+        plan = (user_data.get('subscription_plan') or 'trial').lower()
+        subscription_end = user_data.get('subscription_end')
+        if isinstance(subscription_end, str):
+            subscription_end = datetime.fromisoformat(subscription_end.replace('Z', '+00:00'))
+        return plan, user_data.get('status') == BLOCKED_STATUS, subscription_end
+
+    def _add(self, telegram_id: int, user_data: dict):
+        try:
+            entry = self._entry(user_data)
+        except Exception as e:
+            logger.error(f"Ошибка индексации пользователя {telegram_id}: {e}")
+            return
+        plan, blocked, subscription_end = entry
+        self._entries[telegram_id] = entry
+        self._by_plan.setdefault(plan, set()).add(telegram_id)
+        if subscription_end:
+            self._by_end_day.setdefault(subscription_end.toordinal(), set()).add(telegram_id)
+        if blocked:
+            self._blocked.add(telegram_id)
+
+    def _remove(self, telegram_id: int):
+        entry = self._entries.pop(telegram_id, None)
+        if entry is None:
+            return
+        plan, _, subscription_end = entry
+        self._discard(self._by_plan, plan, telegram_id)
+        if subscription_end:
+            self._discard(self._by_end_day, subscription_end.toordinal(), telegram_id)
+        self._blocked.discard(telegram_id)
+
+    @staticmethod
+    def _discard(buckets: dict, key, telegram_id: int):
+        bucket = buckets.get(key)
+        if bucket is not None:
+            bucket.discard(telegram_id)
+            if not bucket:
+                del buckets[key]
+
+    def _rebuild(self):
+        seq = self.store.change_seq()
+        self._entries.clear()
+        self._by_plan.clear()
+        self._by_end_day.clear()
+        self._blocked.clear()
+        for user_data in self.store.all():
+            self._add(int(user_data['telegram_id']), user_data)
+        self._seq = seq
+        self._stats['rebuilds'] += 1
+        logger.info(f"📇 Индекс получателей построен: {len(self._entries)} пользователей")
+
+    def _refresh(self):
+        """Применяет изменения пользователей, записанные после прошлого обращения"""
+        if self._seq is None:
+            self._rebuild()
+            return
+        seq, changed = self.store.changes_since(self._seq)
+        if changed is None:
+            self._rebuild()
+            return
+        if changed:
+            users = self.store.get_many(changed)
+            for telegram_id in changed:
+                self._remove(telegram_id)
+                if telegram_id in users:
+                    self._add(telegram_id, users[telegram_id])
+            self._stats['applied_changes'] += len(changed)
+        self._seq = seq
+
+    def _ending_between(self, start: datetime, end: datetime) -> List[int]:
+        """Пользователи с окончанием подписки в [start, end)"""
+        result = []
+        for day in range(start.toordinal(), end.toordinal() + 1):
+            for telegram_id in self._by_end_day.get(day, ()):
+                if start <= self._entries[telegram_id][2] < end:
+                    result.append(telegram_id)
+        return result
+
+    def get_recipients(self, segment: str, now: Optional[datetime] = None) -> List[int]:
+        """
+        telegram_id пользователей сегмента
+
+        Args:
+            segment: all, active, trial, premium, free или expiring
+            now: Момент, на который считаются active и expiring
+        """
+        now = now or datetime.now()
+        with self._lock:
+            self._refresh()
+            self._stats['queries'] += 1
+
+            if segment == 'all':
+                return list(self._entries)
+
+            if segment in PLAN_SEGMENTS:
+                marker = PLAN_SEGMENTS[segment]
+                return [telegram_id for plan, ids in self._by_plan.items() if marker in plan for telegram_id in ids]
+
+            if segment == 'expiring':
+                return self._ending_between(now, now + timedelta(days=EXPIRING_DAYS + 1))
+
+            if segment == 'active':
+                active = {telegram_id for telegram_id in self._by_plan.get(LIFETIME_PLAN, ())
+                          if telegram_id not in self._blocked}
+                for day, ids in self._by_end_day.items():
+                    if day < now.toordinal():
+                        continue
+                    active.update(telegram_id for telegram_id in ids
+                                  if telegram_id not in self._blocked and self._entries[telegram_id][2] > now)
+                return list(active)
+
+            raise ValueError(f"Неизвестный сегмент {segment}")
+
+    def get_stats(self) -> Dict[str, int]:
+        """Статистика индекса"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        return stats
+
+
+# Глобальный индекс
+_recipient_index: Optional[RecipientSegmentIndex] = None
+_recipient_index_lock = threading.Lock()
+
+
+def get_recipient_index() -> RecipientSegmentIndex:
+    """Получает общий индекс получателей (по хранилищу UserService по умолчанию)"""
+    global _recipient_index
+    if _recipient_index is None:
+        with _recipient_index_lock:
+            if _recipient_index is None:
+                from .user_service import UserService
+                _recipient_index = RecipientSegmentIndex(UserService().store)
+    return _recipient_index
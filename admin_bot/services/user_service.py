@@ -1,91 +1,80 @@
-import json
 import os
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict
 from ..models.user import User, SubscriptionPlan, UserStatus, PLAN_INFO
+from .user_store import get_user_store
 
 class UserService:
     """Сервис для управления пользователями"""
     
-    def __init__(self, data_file: str = "admin_bot/data/users.json"):
+    def __init__(self, data_file: str = "admin_bot/data/users.json", db_file: str = None):
         self.data_file = data_file
-        self.users = {}
+        self.db_file = db_file or os.path.splitext(data_file)[0] + '.db'
         self._ensure_data_dir()
-        self.load_users()
+        # Прежний users.json импортируется в БД один раз
+        self.store = get_user_store(self.db_file, legacy_json=data_file)
     
     def _ensure_data_dir(self):
         """Создает директорию для данных если её нет"""
-        os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
+        os.makedirs(os.path.dirname(self.data_file) or '.', exist_ok=True)
     
     def load_users(self):
-        """Загружает пользователей из файла"""
-        try:
-            if os.path.exists(self.data_file):
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.users = {
-                        int(telegram_id): User.from_dict(user_data)
-                        for telegram_id, user_data in data.items()
-                    }
-            else:
-                self.users = {}
-        except Exception as e:
-            print(f"Ошибка загрузки пользователей: {e}")
-            self.users = {}
+        """Оставлено для совместимости: пользователи читаются из БД при каждом обращении"""
+        self.store.flush()
     
     def save_users(self):
-        """Сохраняет пользователей в файл"""
-        try:
-            data = {
-                str(telegram_id): user.to_dict()
-                for telegram_id, user in self.users.items()
-            }
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"Ошибка сохранения пользователей: {e}")
+        """Записывает накопленные отметки активности (остальные изменения сохраняются сразу)"""
+        self.store.flush()
     
     def get_user(self, telegram_id: int) -> Optional[User]:
         """Получает пользователя по Telegram ID"""
-        return self.users.get(telegram_id)
+        try:
+            user_data = self.store.get(telegram_id)
+            return User.from_dict(user_data) if user_data else None
+        except Exception as e:
+            print(f"Ошибка загрузки пользователя {telegram_id}: {e}")
+            return None
     
     def create_user(self, telegram_id: int, username: str = None) -> User:
         """Создает нового пользователя"""
         user = User(telegram_id=telegram_id, username=username)
-        self.users[telegram_id] = user
-        self.save_users()
+        self.update_user(user)
         return user
     
     def update_user(self, user: User):
         """Обновляет пользователя"""
-        self.users[user.telegram_id] = user
-        self.save_users()
+        try:
+            self.store.put(user.to_dict())
+        except Exception as e:
+            print(f"Ошибка сохранения пользователя {user.telegram_id}: {e}")
     
     def delete_user(self, telegram_id: int) -> bool:
         """Удаляет пользователя"""
-        if telegram_id in self.users:
-            del self.users[telegram_id]
-            self.save_users()
-            return True
-        return False
+        return self.store.delete(telegram_id)
     
     def get_all_users(self) -> List[User]:
         """Получает всех пользователей"""
-        return list(self.users.values())
+        users = []
+        for user_data in self.store.all():
+            try:
+                users.append(User.from_dict(user_data))
+            except Exception as e:
+                print(f"Ошибка загрузки пользователя {user_data.get('telegram_id')}: {e}")
+        return users
     
     def get_users_by_status(self, status: UserStatus) -> List[User]:
         """Получает пользователей по статусу"""
-        return [user for user in self.users.values() if user.status == status]
+        return [user for user in self.get_all_users() if user.status == status]
     
     def get_users_by_plan(self, plan: SubscriptionPlan) -> List[User]:
         """Получает пользователей по тарифному плану"""
-        return [user for user in self.users.values() if user.subscription_plan == plan]
+        return [user for user in self.get_all_users() if user.subscription_plan == plan]
     
     def get_expiring_users(self, days: int = 3) -> List[User]:
         """Получает пользователей с истекающей подпиской"""
         expiring_date = datetime.now() + timedelta(days=days)
         return [
-            user for user in self.users.values()
+            user for user in self.get_all_users()
             if user.subscription_end and user.subscription_end <= expiring_date
             and user.is_active
         ]
@@ -127,11 +116,8 @@ class UserService:
         return False
     
     def update_user_activity(self, telegram_id: int):
-        """Обновляет активность пользователя"""
-        user = self.get_user(telegram_id)
-        if user:
-            user.update_activity()
-            self.update_user(user)
+        """Обновляет активность пользователя (запись откладывается и объединяется с другими)"""
+        self.store.touch(telegram_id, datetime.now())
     
     def get_statistics(self) -> Dict:
         """Получает статистику по пользователям"""
@@ -149,7 +135,7 @@ class UserService:
         
         # Распределение по планам
         for plan in SubscriptionPlan:
-            count = len(self.get_users_by_plan(plan))
+            count = len([u for u in users if u.subscription_plan == plan])
             if count > 0:
                 stats['plans_distribution'][plan.value] = count
         
@@ -165,16 +151,16 @@ class UserService:
     def cleanup_expired_users(self):
         """Обновляет статусы истекших пользователей"""
         now = datetime.now()
-        updated_count = 0
+        expired = []
         
-        for user in self.users.values():
+        for user in self.get_all_users():
             if (user.subscription_end and 
                 user.subscription_end < now and 
                 user.status == UserStatus.ACTIVE):
                 user.status = UserStatus.EXPIRED
-                updated_count += 1
+                expired.append(user.to_dict())
         
-        if updated_count > 0:
-            self.save_users()
+        if expired:
+            self.store.put_many(expired)
         
-        return updated_count 
\ No newline at end of file
+        return len(expired) 
\ No newline at end of file
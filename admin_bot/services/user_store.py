@@ -0,0 +1,362 @@
+"""
+Хранилище пользователей админ-бота в SQLite (режим WAL)
+
+Вместо перезаписи всего users.json при каждом изменении:
+- каждый пользователь - отдельная строка, чтение и запись одного пользователя
+  не трогают остальных (поиск по первичному ключу)
+- отметки активности (на каждое нажатие кнопки) копятся в памяти, схлопываются
+  по telegram_id и сбрасываются фоновым потоком одним executemany
+- WAL позволяет нескольким процессам (основной и админ-бот) читать без блокировок
+- при первом запуске данные импортируются из прежнего users.json
+- каждое сохранение/удаление пишется в журнал user_changes, по которому
+  индексы (например, сегменты получателей рассылок) обновляются инкрементально,
+  в том числе после изменений из другого процесса
+"""
+
+import os
+import json
+import atexit
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Максимальная задержка записи отметок активности (сек)
+ACTIVITY_FLUSH_INTERVAL = 5.0
+# Сбрасывать сразу при таком количестве ожидающих отметок
+ACTIVITY_MAX_PENDING = 1000
+# Сколько последних записей журнала изменений хранить
+CHANGES_KEEP = 10000
+
+
+class UserStore:
+    """Построчное хранилище пользователей с отложенной записью активности"""
+
+    def __init__(self, db_path: str, legacy_json: Optional[str] = None,
+                 flush_interval: float = ACTIVITY_FLUSH_INTERVAL,
+                 max_pending: int = ACTIVITY_MAX_PENDING):
+        """
+        Args:
+            db_path: Путь к файлу SQLite
+            legacy_json: Прежний users.json для однократного импорта
+            flush_interval: Максимальная задержка записи активности (сек)
+            max_pending: Сбрасывать сразу при таком количестве ожидающих отметок
+        """
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._lock = threading.RLock()
+        self._cond = threading.Condition()
+        self._pending: Dict[int, str] = {}
+        self._closed = False
+        self._thread = None
+        self._listeners: List[Callable[[List[int]], None]] = []
+        self._stats = {'touches': 0, 'coalesced': 0, 'flushes': 0, 'rows_written': 0, 'errors': 0}
+
+        self._init_schema()
+        if legacy_json:
+            self._import_legacy_json(legacy_json)
+
+    def _init_schema(self):
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=10000")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS users ("
+                "telegram_id INTEGER PRIMARY KEY, "
+                "data TEXT NOT NULL, "
+                "last_activity TEXT)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS user_changes ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "telegram_id INTEGER NOT NULL)"
+            )
+
+    def _import_legacy_json(self, json_path: str):
+        """Однократно переносит пользователей из users.json"""
+        with self._lock:
+            imported = self._conn.execute("SELECT value FROM meta WHERE key = 'legacy_json_imported'").fetchone()
+            if imported:
+                return
+
+            rows = []
+            if os.path.exists(json_path):
+                try:
+                    with open(json_path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    rows = [self._row(user_data) for user_data in data.values()]
+                except Exception as e:
+                    logger.error(f"Ошибка импорта пользователей из {json_path}: {e}")
+                    return
+
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # INSERT OR IGNORE: другой процесс мог успеть импортировать раньше
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO users (telegram_id, data, last_activity) VALUES (?, ?, ?)", rows
+                )
+                self._log_changes([row[0] for row in rows])
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_json_imported', ?)",
+                    (datetime.now().isoformat(),)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            if rows:
+                logger.info(f"📦 Импортировано {len(rows)} пользователей из {json_path} в {self.db_path}")
+
+    def add_listener(self, callback: Callable[[List[int]], None]):
+        """Подписка на изменения пользователей в этом процессе (callback получает список telegram_id)"""
+        self._listeners.append(callback)
+
+    def _notify(self, telegram_ids: List[int]):
+        for callback in list(self._listeners):
+            try:
+                callback(telegram_ids)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика изменений пользователей: {e}")
+
+    def _log_changes(self, telegram_ids: List[int]):
+        """Пишет изменения в журнал (внутри транзакции вызывающего) и отрезает старые записи"""
+        if not telegram_ids:
+            return
+        self._conn.executemany("INSERT INTO user_changes (telegram_id) VALUES (?)",
+                               [(telegram_id,) for telegram_id in telegram_ids])
+        last_seq = self._conn.execute("SELECT MAX(seq) FROM user_changes").fetchone()[0]
+        if self._conn.execute("DELETE FROM user_changes WHERE seq <= ?", (last_seq - CHANGES_KEEP,)).rowcount:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('changes_pruned_through', ?)",
+                (str(last_seq - CHANGES_KEEP),)
+            )
+
+    def change_seq(self) -> int:
+        """Номер последней записи журнала изменений"""
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM user_changes").fetchone()[0]
+
+    def changes_since(self, seq: int) -> Tuple[int, Optional[List[int]]]:
+        """
+        Пользователи, измененные после записи seq журнала (любым процессом)
+
+        Returns:
+            (номер последней записи, список telegram_id) - список None, если
+            нужные записи уже отрезаны и индекс надо строить заново
+        """
+        with self._lock:
+            # Одна читающая транзакция - согласованный снимок журнала
+            self._conn.execute("BEGIN")
+            try:
+                last_seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM user_changes").fetchone()[0]
+                pruned = self._conn.execute("SELECT value FROM meta WHERE key = 'changes_pruned_through'").fetchone()
+                if pruned and seq < int(pruned[0]):
+                    return last_seq, None
+                telegram_ids = [row[0] for row in self._conn.execute(
+                    "SELECT DISTINCT telegram_id FROM user_changes WHERE seq > ? AND seq <= ?", (seq, last_seq)
+                )]
+                return last_seq, telegram_ids
+            finally:
+                self._conn.execute("COMMIT")
+
+    @staticmethod
+    def _row(user_data: dict) -> tuple:
+        return int(user_data['telegram_id']), json.dumps(user_data, ensure_ascii=False), user_data.get('last_activity')
+
+    def _decode(self, telegram_id: int, data: str, last_activity: Optional[str]) -> dict:
+        """Словарь пользователя с самой свежей отметкой активности (в т.ч. еще не записанной)"""
+        user_data = json.loads(data)
+        pending = self._pending.get(telegram_id)
+        latest = max(filter(None, (last_activity, pending)), default=None)
+        if latest:
+            user_data['last_activity'] = latest
+        return user_data
+
+    def get(self, telegram_id: int) -> Optional[dict]:
+        """Данные одного пользователя (None, если не найден)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT telegram_id, data, last_activity FROM users WHERE telegram_id = ?", (telegram_id,)
+            ).fetchone()
+        return self._decode(*row) if row else None
+
+    def all(self) -> List[dict]:
+        """Данные всех пользователей"""
+        with self._lock:
+            rows = self._conn.execute("SELECT telegram_id, data, last_activity FROM users").fetchall()
+        return [self._decode(*row) for row in rows]
+
+    def get_many(self, telegram_ids: Iterable[int]) -> Dict[int, dict]:
+        """Данные нескольких пользователей: telegram_id -> словарь (ненайденных нет в результате)"""
+        telegram_ids = list(telegram_ids)
+        rows = []
+        with self._lock:
+            for start in range(0, len(telegram_ids), 500):
+                chunk = telegram_ids[start:start + 500]
+                rows.extend(self._conn.execute(
+                    f"SELECT telegram_id, data, last_activity FROM users WHERE telegram_id IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall())
+        return {row[0]: self._decode(*row) for row in rows}
+
+    def exists(self, telegram_id: int) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM users WHERE telegram_id = ?", (telegram_id,)).fetchone() is not None
+
+    def put(self, user_data: dict):
+        """Сохраняет одного пользователя"""
+        self.put_many([user_data])
+
+    def put_many(self, users: Iterable[dict]):
+        """Сохраняет несколько пользователей одной транзакцией"""
+        rows = [self._row(user_data) for user_data in users]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO users (telegram_id, data, last_activity) VALUES (?, ?, ?) "
+                    "ON CONFLICT(telegram_id) DO UPDATE SET data = excluded.data, "
+                    "last_activity = MAX(COALESCE(users.last_activity, ''), COALESCE(excluded.last_activity, ''))",
+                    rows
+                )
+                self._log_changes([row[0] for row in rows])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._notify([row[0] for row in rows])
+
+    def delete(self, telegram_id: int) -> bool:
+        """Удаляет пользователя"""
+        with self._cond:
+            self._pending.pop(telegram_id, None)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                deleted = self._conn.execute("DELETE FROM users WHERE telegram_id = ?", (telegram_id,)).rowcount > 0
+                if deleted:
+                    self._log_changes([telegram_id])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if deleted:
+            self._notify([telegram_id])
+        return deleted
+
+    def touch(self, telegram_id: int, when: Optional[datetime] = None):
+        """Отмечает активность пользователя (запись откладывается)"""
+        timestamp = (when or datetime.now()).isoformat()
+        with self._cond:
+            if telegram_id in self._pending:
+                self._stats['coalesced'] += 1
+            self._pending[telegram_id] = timestamp
+            self._stats['touches'] += 1
+            if len(self._pending) >= self.max_pending:
+                self._cond.notify_all()
+            direct = self._closed or self._thread is None
+        if direct:
+            self.flush()
+
+    def flush(self) -> bool:
+        """Синхронно записывает накопленные отметки активности"""
+        with self._cond:
+            if not self._pending:
+                return True
+            pending, self._pending = self._pending, {}
+
+        rows = [(timestamp, telegram_id, timestamp) for telegram_id, timestamp in pending.items()]
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    # Отметка не затирает более позднюю, записанную другим процессом
+                    self._conn.executemany(
+                        "UPDATE users SET last_activity = ? "
+                        "WHERE telegram_id = ? AND (last_activity IS NULL OR last_activity < ?)",
+                        rows
+                    )
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            with self._cond:
+                self._stats['flushes'] += 1
+                self._stats['rows_written'] += len(rows)
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка записи активности пользователей: {e}")
+            with self._cond:
+                self._stats['errors'] += 1
+                for telegram_id, timestamp in pending.items():
+                    self._pending.setdefault(telegram_id, timestamp)
+            return False
+
+    def start(self):
+        """Запускает фоновый поток сброса активности"""
+        with self._cond:
+            self._closed = False
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._flush_loop, daemon=True, name="UserActivityFlush")
+            self._thread.start()
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or len(self._pending) >= self.max_pending,
+                                    timeout=self.flush_interval)
+                if self._closed:
+                    return
+            self.flush()
+
+    def close(self):
+        """Останавливает поток и записывает оставшиеся отметки"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+        self.flush()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Статистика отложенной записи"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        return stats
+
+
+# Хранилища по пути к БД: все UserService процесса пишут через одно
+_stores: Dict[str, UserStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_user_store(db_path: str, legacy_json: Optional[str] = None) -> UserStore:
+    """Получает общее хранилище для файла БД (поток сброса запускается при первом обращении)"""
+    key = os.path.abspath(db_path)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                store = UserStore(db_path, legacy_json)
+                store.start()
+                atexit.register(store.close)
+                _stores[key] = store
+    return store
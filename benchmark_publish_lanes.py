@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк полос аккаунтов в очереди публикаций (utils/task_queue.py)
+
+Прогоняет синтетические задачи через настоящий диспетчер и process_task
+с заглушкой PostManager (без Instagram и БД) в двух режимах:
+- lanes:  задачи привязаны к аккаунтам, не больше одной задачи аккаунта в работе
+- shared: задачи без аккаунта (как старая общая очередь), потоки пула
+          конкурируют за блокировку аккаунта внутри публикации
+
+Запуск:
+    python benchmark_publish_lanes.py --tasks 1000 --accounts 100 --workers 20
+"""
+
+import argparse
+import logging
+import threading
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import utils.task_queue as tq
+from database.models import TaskType
+
+
+class StubStats:
+    """Статистика заглушки PostManager"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.account_locks = defaultdict(threading.Lock)
+        self.in_flight = defaultdict(int)
+        self.max_in_flight = 0
+        self.lock_wait = 0.0
+        self.published = 0
+
+
+def make_stub_post_manager(stats, work_seconds):
+    """Создает класс-заглушку PostManager с блокировкой аккаунта, как в instagram.client"""
+
+    class StubPostManager:
+        def __init__(self, account_id):
+            self.account_id = account_id
+
+        def publish_photo(self, media_path, caption=""):
+            with stats.lock:
+                stats.in_flight[self.account_id] += 1
+                stats.max_in_flight = max(stats.max_in_flight, stats.in_flight[self.account_id])
+
+            wait_started = time.time()
+            with stats.account_locks[self.account_id]:
+                waited = time.time() - wait_started
+                time.sleep(work_seconds)
+
+            with stats.lock:
+                stats.in_flight[self.account_id] -= 1
+                stats.lock_wait += waited
+                stats.published += 1
+            return True, f"media_{self.account_id}"
+
+    return StubPostManager
+
+
+def run_mode(mode, total_tasks, accounts, workers, work_seconds):
+    """Прогоняет все задачи в одном режиме и возвращает результаты"""
+    stats = StubStats()
+    tasks_per_account = max(1, total_tasks // accounts)
+
+    def account_for(task_id):
+        return task_id // tasks_per_account % accounts
+
+    def fake_get_publish_task(task_id):
+        return {
+            'id': task_id,
+            'account_id': account_for(task_id),
+            'account_username': f"bench_{account_for(task_id)}",
+            'account_email': None,
+            'account_email_password': None,
+            'task_type': TaskType.PHOTO,
+            'status': None,
+            'media_path': "bench.jpg",
+            'caption': "",
+            'hashtags': "",
+            'options': {},
+            'user_id': None
+        }
+
+    limits = SimpleNamespace(description="benchmark", max_workers=workers, delay_between_batches=0.0)
+    patches = [
+        patch.object(tq, 'PostManager', make_stub_post_manager(stats, work_seconds)),
+        patch.object(tq, 'get_publish_task', fake_get_publish_task),
+        patch.object(tq, 'update_publish_task_status', lambda *args, **kwargs: (True, None)),
+        patch.object(tq, 'claim_interrupted_publish_tasks', lambda lease_timeout: []),
+        patch.object(tq, 'renew_publish_task_leases', lambda: 0),
+        patch.object(tq, 'check_system_overload', lambda: False),
+        patch.object(tq, 'get_task_adaptive_limits', lambda: (workers, 0.0, limits)),
+        patch.object(tq, 'random', SimpleNamespace(uniform=lambda a, b: 0.0)),
+        patch('utils.smart_validator_service.validate_before_use', lambda *args, **kwargs: True),
+    ]
+    for p in patches:
+        p.start()
+
+    try:
+        tq.start_task_queue()
+        started = time.time()
+        for task_id in range(total_tasks):
+            account_id = account_for(task_id) if mode == 'lanes' else None
+            tq.task_scheduler.put(task_id, account_id)
+
+        while stats.published < total_tasks:
+            time.sleep(0.01)
+        elapsed = time.time() - started
+        latency = tq.get_queue_stats()['latency']
+    finally:
+        tq.stop_task_queue()
+        for p in patches:
+            p.stop()
+
+    return {
+        'mode': mode,
+        'elapsed': elapsed,
+        'throughput': total_tasks / elapsed,
+        'lock_wait': stats.lock_wait,
+        'max_in_flight_per_account': stats.max_in_flight,
+        'queue_wait_p95': latency['enqueue_to_start']['p95']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк полос аккаунтов очереди публикаций")
+    parser.add_argument('--tasks', type=int, default=1000)
+    parser.add_argument('--accounts', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=20)
+    parser.add_argument('--work-ms', type=float, default=20.0, help="Время одной публикации в заглушке (мс)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    print(f"📊 {args.tasks} задач, {args.accounts} аккаунтов, {args.workers} потоков, "
+          f"публикация {args.work_ms:.0f} мс")
+    for mode in ('shared', 'lanes'):
+        result = run_mode(mode, args.tasks, args.accounts, args.workers, args.work_ms / 1000)
+        print(f"  {result['mode']:>6}: {result['elapsed']:.2f}с, {result['throughput']:.0f} задач/с, "
+              f"ожидание блокировок потоками пула {result['lock_wait']:.2f}с, "
+              f"макс. задач аккаунта одновременно {result['max_in_flight_per_account']}, "
+              f"p95 ожидания в очереди {result['queue_wait_p95']}с")
+
+
+if __name__ == '__main__':
+    main()
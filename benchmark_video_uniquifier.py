@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк уникализации видео (utils/video_uniquifier.py)
+
+Создает синтетическое видео и прогоняет его через:
+- legacy: прежний покадровый цикл (BGR→HSV→float32→BGR в одном потоке)
+- opencv: LUT-цветокоррекция и конвейер декодирование → пул потоков → кодирование
+- ffmpeg: фильтр-граф внутри ffmpeg без передачи кадров в Python (H.264)
+
+legacy и opencv пишут mp4v; в uniquify_video после них видео еще раз перекодируется
+в H.264 через moviepy ради метаданных, ffmpeg делает всё за один проход.
+
+Запуск:
+    python benchmark_video_uniquifier.py --frames 300 --width 1080 --height 1920
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from utils.video_uniquifier import (
+    VideoUniquifyParams, TranscodeStats, get_ffmpeg_exe, transcode_ffmpeg, transcode_opencv
+)
+
+
+def make_source_video(path, frames, width, height, fps=30):
+    """Синтетическое видео с движущимся градиентом"""
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    for i in range(frames):
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[..., 0] = (x + i * 3) % 256
+        frame[..., 1] = (y + i * 2) % 256
+        frame[..., 2] = ((x + y) / 2 + i) % 256
+        out.write(frame)
+    out.release()
+
+
+def transcode_legacy(input_path, output_path, params):
+    """Прежняя реализация uniquify_video (без перезаписи метаданных)"""
+    started = time.perf_counter()
+    cap = cv2.VideoCapture(input_path)
+    fps = int(cap.get(cv2.CAP_PROP_FPS))
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    new_width, new_height = int(width * params.scale), int(height * params.scale)
+    out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'),
+                          int(fps * params.speed_factor), (new_width, new_height))
+    frames = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frame = cv2.resize(frame, (new_width, new_height))
+        frame = cv2.convertScaleAbs(frame, alpha=params.contrast, beta=params.brightness)
+        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV).astype(np.float32)
+        hsv[:, :, 1] = hsv[:, :, 1] * params.saturation
+        hsv[:, :, 1][hsv[:, :, 1] > 255] = 255
+        frame = cv2.cvtColor(hsv.astype(np.uint8), cv2.COLOR_HSV2BGR)
+        out.write(frame)
+        frames += 1
+    cap.release()
+    out.release()
+    return TranscodeStats('legacy', frames, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк уникализации видео")
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--width', type=int, default=1080)
+    parser.add_argument('--height', type=int, default=1920)
+    parser.add_argument('--workers', type=int, default=0, help="Потоков OpenCV-конвейера (0 - авто)")
+    parser.add_argument('--preset', default='veryfast', help="Пресет libx264 для ffmpeg")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    params = VideoUniquifyParams(scale=1.01, speed_factor=1.03, brightness=5, contrast=1.05, saturation=1.08)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.mp4')
+        make_source_video(source, args.frames, args.width, args.height)
+        print(f"📊 {args.frames} кадров {args.width}x{args.height}, ядер: {os.cpu_count()}")
+
+        runs = [
+            ('legacy', lambda out: transcode_legacy(source, out, params)),
+            ('opencv', lambda out: transcode_opencv(source, out, params, workers=args.workers or None)),
+        ]
+        if get_ffmpeg_exe():
+            runs.append(('ffmpeg', lambda out: transcode_ffmpeg(source, out, params, preset=args.preset)))
+        else:
+            print("  ffmpeg: пропущен (imageio-ffmpeg не установлен)")
+
+        for name, run in runs:
+            stats = run(os.path.join(tmp, f'{name}.mp4'))
+            print(f"  {name:>6}: {stats.frames} кадров за {stats.seconds:.2f}с, {stats.fps:.1f} кадров/с")
+
+
+if __name__ == '__main__':
+    main()
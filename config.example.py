@@ -78,4 +78,77 @@ LAZY_INACTIVE_THRESHOLD = 3600
 LAZY_ENABLE_STATS_LOGGING = True
 
 # Интервал логирования статистики (секунды)
-LAZY_STATS_LOG_INTERVAL = 300  # 5 минут 
\ No newline at end of file
+LAZY_STATS_LOG_INTERVAL = 300  # 5 минут 
+
+# ============================================================================
+# SESSION LIVENESS (ПРОВЕРКА ЖИВОСТИ СЕССИЙ)
+# ============================================================================
+
+# Сколько секунд доверяем сессии после последнего успешного запроса
+# В пределах окна кэшированный клиент возвращается без запроса к Instagram
+SESSION_LIVENESS_WINDOW = 900
+
+# Потоков для пакетной проверки устаревших сессий
+SESSION_LIVENESS_PROBE_WORKERS = 5
+
+# Интервал фоновой проверки устаревших сессий (секунды)
+SESSION_LIVENESS_PROBE_INTERVAL = 300
+
+# Настройки проверки прокси
+# Адрес, запрашиваемый через прокси при проверке
+PROXY_CHECK_URL = 'http://httpbin.org/ip'
+
+# Таймаут проверки одного прокси (секунды)
+PROXY_CHECK_TIMEOUT = 10
+
+# Одновременных проверок (асинхронно, без потока на прокси)
+PROXY_CHECK_CONCURRENCY = 500
+
+# Настройки уникализации видео
+# 'auto' - ffmpeg из imageio-ffmpeg, если доступен, иначе OpenCV; 'ffmpeg'; 'opencv'
+VIDEO_UNIQUIFY_BACKEND = 'auto'
+
+# Потоков обработки кадров в OpenCV-конвейере (0 - по числу ядер, до 4)
+VIDEO_UNIQUIFY_WORKERS = 0
+
+# Вариантов видео за одно декодирование при публикации в несколько аккаунтов
+# (каждый вариант - свой кодировщик; больше вариантов делаются несколькими проходами)
+VIDEO_VARIANTS_PER_PASS = 4
+
+# Настройки кэша проверки подписок
+# Сколько секунд решение о доступе пользователя берется из кэша
+# (изменения из админ-бота сбрасывают кэш сразу)
+SUBSCRIPTION_CACHE_TTL = 30
+
+# Настройки кэша профилей Instagram (фильтры автоподписки)
+# Сколько секунд профиль цели берется из кэша (6 часов)
+PROFILE_CACHE_TTL = 21600
+
+# Максимум профилей в кэше (вытесняются давно не использованные)
+PROFILE_CACHE_SIZE = 50000
+
+# Настройки очереди автоподписок
+# Интервал страховочной проверки PENDING-задач в БД (секунды);
+# новые задачи передаются в очередь сразу при создании
+FOLLOW_QUEUE_RECONCILE_INTERVAL = 60
+
+# Настройки общего состояния лимитов действий
+# Файл SQLite со счетчиками, общий для всех процессов бота (None - только в памяти)
+RATE_LIMITER_STATE_PATH = "data/rate_limiter.sqlite"
+
+# Как часто писать свои действия и читать действия других процессов (секунды, не больше 1 -
+# половины интервала между действиями, иначе процессы могут сильнее превысить лимит)
+RATE_LIMITER_SYNC_INTERVAL = 1
+
+# Настройки массовых рассылок
+# Сообщений в секунду суммарно (лимит Telegram - около 30)
+BROADCAST_RATE = 25
+
+# Потоков отправки
+BROADCAST_WORKERS = 8
+
+# Как часто сохранять статусы доставки и прогресс рассылки (секунды)
+BROADCAST_CHECKPOINT_INTERVAL = 2
+
+# Рассылка без контрольной точки дольше этого (секунды) считается брошенной и продолжается другим процессом
+BROADCAST_STALE_TIMEOUT = 120
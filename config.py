@@ -75,4 +75,31 @@ LAZY_CLEANUP_INTERVAL = 1800  # 30 минут в секундах
 LAZY_FALLBACK_TO_NORMAL = True
 LAZY_INACTIVE_THRESHOLD = 600  # 10 минут в секундах
 LAZY_ENABLE_STATS_LOGGING = True
-LAZY_STATS_LOG_INTERVAL = 300  # 5 минут в секундах
\ No newline at end of file
+LAZY_STATS_LOG_INTERVAL = 300  # 5 минут в секундах
+# Настройки проверки живости сессий Instagram
+SESSION_LIVENESS_WINDOW = 900  # Сколько секунд доверяем сессии после успешного запроса
+SESSION_LIVENESS_PROBE_WORKERS = 5  # Потоков для пакетной проверки устаревших сессий
+SESSION_LIVENESS_PROBE_INTERVAL = 300  # Интервал фоновой проверки (секунды)
+# Настройки проверки прокси
+PROXY_CHECK_URL = 'http://httpbin.org/ip'  # Адрес, запрашиваемый через прокси при проверке
+PROXY_CHECK_TIMEOUT = 10  # Таймаут проверки одного прокси (секунды)
+PROXY_CHECK_CONCURRENCY = 500  # Одновременных проверок
+# Настройки уникализации видео
+VIDEO_UNIQUIFY_BACKEND = 'auto'  # 'auto' - ffmpeg из imageio-ffmpeg, если доступен; 'ffmpeg'; 'opencv'
+VIDEO_UNIQUIFY_WORKERS = 0  # Потоков обработки кадров в OpenCV-конвейере (0 - по числу ядер, до 4)
+VIDEO_VARIANTS_PER_PASS = 4  # Вариантов видео за одно декодирование (каждый - свой кодировщик)
+# Настройки кэша проверки подписок
+SUBSCRIPTION_CACHE_TTL = 30  # Сколько секунд решение о доступе пользователя берется из кэша
+# Настройки кэша профилей Instagram (фильтры автоподписки)
+PROFILE_CACHE_TTL = 21600  # Сколько секунд профиль цели берется из кэша (6 часов)
+PROFILE_CACHE_SIZE = 50000  # Максимум профилей в кэше (вытесняются давно не использованные)
+# Настройки очереди автоподписок
+FOLLOW_QUEUE_RECONCILE_INTERVAL = 60  # Интервал страховочной проверки PENDING-задач в БД (секунды)
+# Настройки общего состояния лимитов действий
+RATE_LIMITER_STATE_PATH = str(DATA_DIR / 'rate_limiter.sqlite')  # Файл SQLite со счетчиками, общий для всех процессов (None - только в памяти)
+RATE_LIMITER_SYNC_INTERVAL = 1  # Как часто писать свои действия и читать чужие (секунды, не больше 1)
+# Настройки массовых рассылок
+BROADCAST_RATE = 25  # Сообщений в секунду суммарно (лимит Telegram - около 30)
+BROADCAST_WORKERS = 8  # Потоков отправки
+BROADCAST_CHECKPOINT_INTERVAL = 2  # Как часто сохранять статусы доставки и прогресс (секунды)
+BROADCAST_STALE_TIMEOUT = 120  # Рассылка без контрольной точки дольше этого (секунды) продолжается другим процессом
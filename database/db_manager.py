@@ -1,7 +1,10 @@
 import os
+import uuid
+import socket
 import logging
-from datetime import datetime
-from sqlalchemy import create_engine
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, func, or_, update
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import joinedload
@@ -30,6 +33,15 @@ Session = sessionmaker(bind=engine)
 # Флаг для отслеживания инициализации пула
 _pool_initialized = False
 
+# Статусы задач, ожидающих запуска по scheduled_time
+SCHEDULED_STATUSES = (TaskStatus.SCHEDULED, TaskStatus.PENDING)
+
+# Устанавливается при создании отложенной задачи - будит планировщик раньше следующего срока
+scheduled_tasks_changed = threading.Event()
+
+# Владелец задач, поставленных в очередь этим процессом (queue_owner в publish_tasks)
+QUEUE_OWNER = f"{os.getpid()}:{uuid.uuid4().hex[:12]}@{socket.gethostname()}"[:64]
+
 def init_db():
     """Инициализирует базу данных"""
     global _pool_initialized
@@ -633,6 +645,8 @@ def create_publish_task(account_id, task_type, media_path, caption="", scheduled
 
         logger.info(f"✅ Создана задача #{task_id} со статусом {status.value}" + 
                    (f" на {scheduled_time}" if scheduled_time else ""))
+        if scheduled_time:
+            scheduled_tasks_changed.set()
 
         return True, task_id
     except Exception as e:
@@ -683,6 +697,126 @@ def update_task_status(task_id, status, error_message=None, media_id=None):
     """
     return update_publish_task_status(task_id, status, error_message, media_id)
 
+def mark_publish_task_queued(task_id, scheduled_time=None, priority=None):
+    """
+    Помечает задачу как поставленную в очередь (PROCESSING) одним коммитом.
+    Время запуска и приоритет сохраняются, чтобы очередь можно было восстановить после перезапуска.
+    """
+    try:
+        session = get_session()
+        task = session.query(PublishTask).filter_by(id=task_id).first()
+
+        if not task:
+            session.close()
+            return False, "Задача не найдена"
+
+        task.status = TaskStatus.PROCESSING
+        task.queue_owner = QUEUE_OWNER
+        task.queue_heartbeat = datetime.now()
+        if scheduled_time:
+            task.scheduled_time = scheduled_time
+
+        if priority is not None:
+            try:
+                import json
+                options = json.loads(task.options) if task.options and isinstance(task.options, str) else dict(task.options or {})
+                options['queue_priority'] = int(priority)
+                task.options = options
+            except Exception as e:
+                logger.warning(f"Не удалось сохранить приоритет задачи #{task_id}: {e}")
+
+        session.commit()
+        session.close()
+
+        return True, None
+    except Exception as e:
+        logger.error(f"Ошибка при постановке задачи в очередь: {e}")
+        return False, str(e)
+
+def _claim_rows(session, statement, ids):
+    """Выполняет условный UPDATE и возвращает ID строк, которые он действительно изменил"""
+    if session.get_bind().dialect.update_returning:
+        return [row[0] for row in session.execute(statement.returning(PublishTask.id))]
+    return [task_id for task_id in ids if session.execute(statement.where(PublishTask.id == task_id)).rowcount]
+
+def renew_publish_task_leases():
+    """
+    Продлевает аренду задач в статусе PROCESSING, которые держит этот процесс.
+
+    Returns:
+        int: Количество продленных задач (-1 при ошибке)
+    """
+    try:
+        session = get_session()
+        try:
+            result = session.execute(update(PublishTask).where(
+                PublishTask.queue_owner == QUEUE_OWNER,
+                PublishTask.status == TaskStatus.PROCESSING
+            ).values(queue_heartbeat=datetime.now()).execution_options(synchronize_session=False))
+            session.commit()
+            return result.rowcount
+        finally:
+            session.close()
+    except Exception as e:
+        logger.error(f"Ошибка при продлении аренды задач: {e}")
+        return -1
+
+def claim_interrupted_publish_tasks(lease_timeout, limit=500):
+    """
+    Забирает задачи в статусе PROCESSING, аренда которых истекла: их процесс
+    остановлен или завис. Задачи живых процессов (в том числе другого бота
+    или веб-API с общей базой) не трогаются. Задачу получает только тот,
+    чей условный UPDATE изменил строку.
+
+    Args:
+        lease_timeout: Через сколько секунд без heartbeat аренда считается истекшей
+    """
+    try:
+        session = get_session()
+        try:
+            cutoff = datetime.now() - timedelta(seconds=lease_timeout)
+            # Строки без heartbeat (до появления аренды) считаются по updated_at
+            expired = (
+                PublishTask.status == TaskStatus.PROCESSING,
+                or_(PublishTask.queue_heartbeat < cutoff,
+                    (PublishTask.queue_heartbeat.is_(None) & (PublishTask.updated_at < cutoff)))
+            )
+            expired_ids = [row[0] for row in session.query(PublishTask.id).filter(*expired).limit(limit)]
+            if not expired_ids:
+                return []
+
+            claimed = _claim_rows(session, update(PublishTask).where(
+                PublishTask.id.in_(expired_ids), *expired
+            ).values(queue_owner=QUEUE_OWNER, queue_heartbeat=datetime.now()).execution_options(
+                synchronize_session=False
+            ), expired_ids)
+            session.commit()
+            if not claimed:
+                return []
+
+            result = []
+            for task in session.query(PublishTask).filter(PublishTask.id.in_(claimed)).all():
+                options = task.options
+                if isinstance(options, str):
+                    try:
+                        import json
+                        options = json.loads(options)
+                    except Exception:
+                        options = {}
+                result.append({
+                    'id': task.id,
+                    'account_id': task.account_id,
+                    'user_id': task.user_id,
+                    'scheduled_time': task.scheduled_time,
+                    'priority': (options or {}).get('queue_priority')
+                })
+            return result
+        finally:
+            session.close()
+    except Exception as e:
+        logger.error(f"Ошибка при захвате прерванных задач: {e}")
+        return []
+
 def get_publish_task(task_id):
     """Получает задачу на публикацию по ID"""
     try:
@@ -708,6 +842,9 @@ def get_publish_task(task_id):
                 'hashtags': task.hashtags,
                 'options': task.options,
                 'user_id': task.user_id,  # Добавляем user_id
+                'error_message': task.error_message,
+                'scheduled_time': task.scheduled_time,
+                'updated_at': task.updated_at,
                 'account': task.account  # Сохраняем ссылку на объект аккаунта
             }
             session.close()
@@ -749,17 +886,17 @@ def get_pending_tasks():
         logger.error(f"Ошибка при получении списка ожидающих задач: {e}")
         return []
 
-def get_scheduled_tasks():
-    """Получает список запланированных задач, готовых к выполнению"""
+def get_scheduled_tasks(now=None):
+    """Получает список запланированных задач, готовых к выполнению (scheduled_time <= now)"""
     try:
         session = get_session()
-        # Получаем задачи со статусом SCHEDULED или PENDING, у которых есть scheduled_time
+        # Только наступившие задачи - по индексу (status, scheduled_time)
         tasks = session.query(PublishTask).filter(
-            PublishTask.scheduled_time.isnot(None),
-            PublishTask.status.in_([TaskStatus.SCHEDULED, TaskStatus.PENDING])
+            PublishTask.status.in_(SCHEDULED_STATUSES),
+            PublishTask.scheduled_time <= (now or datetime.now())
         ).options(
             joinedload(PublishTask.account)
-        ).all()
+        ).order_by(PublishTask.scheduled_time).all()
         
         logger.debug(f"📋 Найдено {len(tasks)} запланированных задач")
         
@@ -775,6 +912,62 @@ def get_scheduled_tasks():
         logger.error(f"❌ Ошибка при получении списка запланированных задач: {e}")
         return []
 
+def claim_due_scheduled_tasks(now=None, limit=100):
+    """
+    Забирает наступившие запланированные задачи: переводит их в PROCESSING одним UPDATE
+    с арендой этого процесса. Задачу получает только тот, чей UPDATE изменил строку
+    (безопасно для нескольких процессов).
+    
+    Returns:
+        list: Захваченные задачи (с загруженным аккаунтом)
+    """
+    now = now or datetime.now()
+    try:
+        session = get_session()
+        try:
+            due_ids = [row[0] for row in session.query(PublishTask.id).filter(
+                PublishTask.status.in_(SCHEDULED_STATUSES),
+                PublishTask.scheduled_time <= now
+            ).order_by(PublishTask.scheduled_time).limit(limit)]
+            if not due_ids:
+                return []
+            
+            statement = update(PublishTask).where(
+                PublishTask.id.in_(due_ids),
+                PublishTask.status.in_(SCHEDULED_STATUSES)
+            ).values(
+                status=TaskStatus.PROCESSING, updated_at=datetime.now(),
+                queue_owner=QUEUE_OWNER, queue_heartbeat=datetime.now()
+            ).execution_options(synchronize_session=False)
+            claimed = _claim_rows(session, statement, due_ids)
+            session.commit()
+            
+            if not claimed:
+                return []
+            return session.query(PublishTask).filter(PublishTask.id.in_(claimed)).options(
+                joinedload(PublishTask.account)
+            ).order_by(PublishTask.scheduled_time).all()
+        finally:
+            session.close()
+    except Exception as e:
+        logger.error(f"❌ Ошибка при захвате запланированных задач: {e}")
+        return []
+
+def get_next_scheduled_time():
+    """Самый ранний scheduled_time среди ожидающих запуска задач (None, если таких нет)"""
+    try:
+        session = get_session()
+        try:
+            return session.query(func.min(PublishTask.scheduled_time)).filter(
+                PublishTask.status.in_(SCHEDULED_STATUSES),
+                PublishTask.scheduled_time.isnot(None)
+            ).scalar()
+        finally:
+            session.close()
+    except Exception as e:
+        logger.error(f"❌ Ошибка при получении времени ближайшей задачи: {e}")
+        return None
+
 def delete_publish_task(task_id):
     """Удаляет задачу на публикацию"""
     try:
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Float, JSON, Enum, Table
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Float, JSON, Enum, Table, Index, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -72,6 +72,12 @@ class Proxy(Base):
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
+    # Результаты проверок
+    last_checked = Column(DateTime, nullable=True)  # Время последней проверки
+    latency_ms = Column(Float, nullable=True)  # Задержка последней успешной проверки
+    check_count = Column(Integer, default=0)  # Всего проверок
+    fail_count = Column(Integer, default=0)  # Неудачных проверок
+
     # Отношения
     accounts = relationship("InstagramAccount", secondary=account_proxy, back_populates="proxies")
 
@@ -142,8 +148,17 @@ class PublishTask(Base):
     # ID опубликованного поста в Instagram
     media_id = Column(String(255), nullable=True)  # ID медиа в Instagram после публикации
 
+    # Аренда задачи в статусе PROCESSING: процесс, который держит ее в очереди, и его последний heartbeat
+    queue_owner = Column(String(64), nullable=True)
+    queue_heartbeat = Column(DateTime, nullable=True)
+
     # Отношения
     account = relationship("InstagramAccount", back_populates="tasks")
+    
+    # Выборка наступивших задач и ближайшего срока планировщиком
+    __table_args__ = (
+        Index('ix_publish_tasks_status_scheduled', 'status', 'scheduled_time'),
+    )
 
 class TelegramUser(Base):
     __tablename__ = 'telegram_users'
@@ -274,4 +289,32 @@ class FollowHistory(Base):
     
     # Отношения
     account = relationship("InstagramAccount")
-    task = relationship("FollowTask")
\ No newline at end of file
+    task = relationship("FollowTask")
+    
+    # Проверка "уже подписывались" и догрузка новых записей для фильтра Блума
+    __table_args__ = (
+        Index('ix_follow_history_account_target', 'account_id', 'target_user_id'),
+    )
+
+# Сохраненный фильтр Блума целей подписок аккаунта (utils/follow_dedup.py)
+class FollowBloomFilter(Base):
+    __tablename__ = 'follow_bloom_filters'
+    
+    account_id = Column(Integer, ForeignKey('instagram_accounts.id'), primary_key=True)
+    capacity = Column(Integer, nullable=False)  # Расчетное количество записей
+    hash_count = Column(Integer, nullable=False)
+    item_count = Column(Integer, default=0)
+    bits = Column(LargeBinary, nullable=False)
+    last_history_id = Column(Integer, default=0)  # Последняя учтенная запись follow_history
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+# Последнее состояние проверки аккаунта умным валидатором (utils/smart_validator_service.py)
+class AccountValidationState(Base):
+    __tablename__ = 'account_validation_states'
+    
+    account_id = Column(Integer, ForeignKey('instagram_accounts.id'), primary_key=True)
+    status = Column(String(20), nullable=False)  # AccountStatus.value
+    retry_count = Column(Integer, default=0)  # Неудачных попыток восстановления подряд
+    last_check = Column(DateTime, nullable=True)
+    next_check = Column(DateTime, nullable=True)  # Конец cooldown после неудачного восстановления
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
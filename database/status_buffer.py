@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+"""
+Буфер отложенной записи статусов задач публикации
+
+Вместо отдельной сессии и коммита на каждый переход статуса:
+- переходы копятся в памяти и схлопываются по task_id (пишется только последний)
+- фоновый поток сбрасывает их одним executemany UPDATE каждые N мс или при N строках
+- для финальных статусов (COMPLETED/FAILED), от которых зависят уведомления и отчеты,
+  вызывающий поток ждет записи (групповой коммит вместе с соседними задачами)
+- при остановке буфер сбрасывается синхронно
+"""
+
+import atexit
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import update, bindparam
+
+from database.models import PublishTask, TaskStatus
+
+logger = logging.getLogger(__name__)
+
+# Статусы, после которых отправляются уведомления и итоговые отчеты
+TERMINAL_STATUSES = (TaskStatus.COMPLETED, TaskStatus.FAILED)
+
+
+@dataclass
+class StatusUpdate:
+    """Последний известный переход статуса задачи"""
+    task_id: int
+    status: TaskStatus
+    error_message: Optional[str] = None
+    media_id: Optional[str] = None
+    generation: int = 0
+
+
+@dataclass
+class StatusBufferStats:
+    """Статистика буфера"""
+    updates: int = 0
+    coalesced: int = 0
+    flushes: int = 0
+    rows_written: int = 0
+    errors: int = 0
+
+
+class PublishStatusBuffer:
+    """Буфер статусов с фоновым сбросом и групповым коммитом финальных статусов"""
+
+    def __init__(self, session_factory: Optional[Callable] = None,
+                 flush_interval: float = 0.2,
+                 max_rows: int = 100,
+                 terminal_delay: float = 0.02):
+        """
+        Args:
+            session_factory: Фабрика сессий (по умолчанию get_session из db_manager)
+            flush_interval: Максимальная задержка записи нефинальных статусов (сек)
+            max_rows: Сбрасывать сразу при таком количестве ожидающих строк
+            terminal_delay: Окно сбора соседних финальных статусов в один коммит (сек)
+        """
+        if session_factory is None:
+            from database.db_manager import get_session
+            session_factory = get_session
+        self._session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.terminal_delay = terminal_delay
+
+        self._pending: Dict[int, StatusUpdate] = {}
+        self._generation = 1  # Поколение, в которое попадут новые записи
+        self._flushed_generation = 0
+        self._failed_generations = set()
+        self._urgent = False
+        self._closed = False
+        self._stats = StatusBufferStats()
+
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Запускает фоновый поток сброса"""
+        with self._cond:
+            self._closed = False
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._flush_loop, daemon=True, name="PublishStatusBuffer")
+            self._thread.start()
+
+    def update(self, task_id: int, status: TaskStatus, error_message: Optional[str] = None,
+               media_id: Optional[str] = None, wait: Optional[bool] = None) -> bool:
+        """
+        Записывает переход статуса.
+
+        Args:
+            task_id: ID задачи
+            status: Новый статус
+            error_message: Сообщение об ошибке
+            media_id: ID медиа после публикации
+            wait: Ждать записи в БД (по умолчанию - только для финальных статусов)
+
+        Returns:
+            bool: True, если запись принята (при wait - если сохранена в БД)
+        """
+        if wait is None:
+            wait = status in TERMINAL_STATUSES
+
+        with self._cond:
+            if self._closed or self._thread is None:
+                # Буфер не запущен - пишем напрямую
+                direct = True
+            else:
+                direct = False
+                if task_id in self._pending:
+                    self._stats.coalesced += 1
+                self._pending[task_id] = StatusUpdate(task_id, status, error_message, media_id, self._generation)
+                self._stats.updates += 1
+                generation = self._generation
+                if wait:
+                    self._urgent = True
+                if wait or len(self._pending) >= self.max_rows:
+                    self._cond.notify_all()
+
+        if direct:
+            return self._write([StatusUpdate(task_id, status, error_message, media_id)])
+
+        if not wait:
+            return True
+
+        with self._cond:
+            self._cond.wait_for(lambda: self._flushed_generation >= generation or self._closed,
+                                timeout=max(5.0, self.flush_interval * 10))
+            return self._flushed_generation >= generation and generation not in self._failed_generations
+
+    def flush(self) -> bool:
+        """Синхронно сбрасывает все ожидающие статусы"""
+        with self._cond:
+            if not self._pending:
+                return True
+            batch = self._take_batch()
+        return self._commit_batch(batch)
+
+    def close(self):
+        """Останавливает поток и сбрасывает буфер"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+        self.flush()
+
+    def _take_batch(self):
+        """Забирает накопленные записи (вызывается под блокировкой)"""
+        batch = (self._generation, list(self._pending.values()))
+        self._pending = {}
+        self._generation += 1
+        self._urgent = False
+        return batch
+
+    def _commit_batch(self, batch) -> bool:
+        """Пишет пакет и будит ожидающих"""
+        generation, updates = batch
+        success = self._write(updates)
+        with self._cond:
+            if not success:
+                # Возвращаем неудачный пакет, не затирая более новые переходы
+                for status_update in updates:
+                    self._pending.setdefault(status_update.task_id, status_update)
+                self._failed_generations.add(generation)
+                if len(self._failed_generations) > 100:
+                    self._failed_generations.discard(min(self._failed_generations))
+            self._flushed_generation = max(self._flushed_generation, generation)
+            self._cond.notify_all()
+        return success
+
+    def _flush_loop(self):
+        """Фоновый сброс по времени, объему или запросу финального статуса"""
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._closed or self._urgent or len(self._pending) >= self.max_rows,
+                    timeout=self.flush_interval
+                )
+                if self._closed:
+                    return
+                urgent = self._urgent
+
+            if urgent and self.terminal_delay:
+                # Даем соседним задачам попасть в тот же коммит
+                time.sleep(self.terminal_delay)
+
+            with self._cond:
+                if not self._pending:
+                    self._urgent = False
+                    continue
+                batch = self._take_batch()
+            self._commit_batch(batch)
+
+    def _write(self, updates: List[StatusUpdate]) -> bool:
+        """Записывает пакет статусов одной транзакцией"""
+        if not updates:
+            return True
+
+        with self._write_lock:
+            session = None
+            try:
+                session = self._session_factory()
+                now = datetime.now()
+                table = PublishTask.__table__
+
+                base_rows, completed_rows, media_updates = [], [], {}
+                for status_update in updates:
+                    row = {
+                        'b_id': status_update.task_id,
+                        'b_status': status_update.status,
+                        'b_error_message': status_update.error_message,
+                        'b_media_id': status_update.media_id,
+                        'b_updated_at': now
+                    }
+                    if status_update.status == TaskStatus.COMPLETED:
+                        row['b_completed_time'] = now
+                        completed_rows.append(row)
+                        if status_update.media_id:
+                            media_updates[status_update.task_id] = status_update.media_id
+                    else:
+                        base_rows.append(row)
+
+                values = dict(
+                    status=bindparam('b_status', type_=table.c.status.type),
+                    error_message=bindparam('b_error_message'),
+                    media_id=bindparam('b_media_id'),
+                    updated_at=bindparam('b_updated_at')
+                )
+                where = table.c.id == bindparam('b_id')
+
+                if base_rows:
+                    session.execute(update(table).where(where).values(**values), base_rows)
+                if completed_rows:
+                    session.execute(
+                        update(table).where(where).values(completed_time=bindparam('b_completed_time'), **values),
+                        completed_rows
+                    )
+
+                # media_id дублируется в options для обратной совместимости
+                if media_updates:
+                    tasks = session.query(PublishTask).filter(PublishTask.id.in_(list(media_updates))).all()
+                    for task in tasks:
+                        try:
+                            options = json.loads(task.options) if task.options and isinstance(task.options, str) else dict(task.options or {})
+                            options['media_id'] = media_updates[task.id]
+                            task.options = json.dumps(options)
+                        except Exception as e:
+                            logger.warning(f"Не удалось обновить options с media_id для задачи #{task.id}: {e}")
+
+                session.commit()
+                self._stats.flushes += 1
+                self._stats.rows_written += len(updates)
+                logger.debug(f"💾 Записано {len(updates)} статусов задач одним коммитом")
+                return True
+            except Exception as e:
+                self._stats.errors += 1
+                logger.error(f"Ошибка при пакетной записи статусов задач: {e}")
+                if session is not None:
+                    try:
+                        session.rollback()
+                    except Exception:
+                        pass
+                return False
+            finally:
+                if session is not None:
+                    session.close()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Статистика буфера"""
+        with self._cond:
+            stats = dict(self._stats.__dict__)
+            stats['pending'] = len(self._pending)
+        return stats
+
+
+# Глобальный экземпляр
+_status_buffer: Optional[PublishStatusBuffer] = None
+_buffer_lock = threading.Lock()
+
+
+def get_status_buffer() -> PublishStatusBuffer:
+    """Получает глобальный буфер статусов (запускается при первом обращении)"""
+    global _status_buffer
+    if _status_buffer is None:
+        with _buffer_lock:
+            if _status_buffer is None:
+                _status_buffer = PublishStatusBuffer()
+                _status_buffer.start()
+                atexit.register(_status_buffer.close)
+    return _status_buffer
+
+
+def buffer_publish_task_status(task_id, status, error_message=None, media_id=None, wait=None):
+    """Записывает статус задачи публикации через буфер (аналог update_publish_task_status)"""
+    return get_status_buffer().update(task_id, status, error_message, media_id, wait)
@@ -19,17 +19,16 @@ def diagnose_user_storage():
     
     user_id = 6626270112
     
-    # 1. Проверяем UserService (admin_bot/data/users.json)
-    print("\n1️⃣ USERSERVICE (admin_bot/data/users.json):")
+    # 1. Проверяем UserService (admin_bot/data/users.db)
+    print("\n1️⃣ USERSERVICE (admin_bot/data/users.db):")
     try:
-        userservice_file = "admin_bot/data/users.json"
+        userservice_file = "admin_bot/data/users.db"
         if os.path.exists(userservice_file):
-            with open(userservice_file, 'r', encoding='utf-8') as f:
-                userservice_data = json.load(f)
+            from services.user_store import UserStore
+            store = UserStore(userservice_file)
             
-            user_key = str(user_id)
-            if user_key in userservice_data:
-                user_data = userservice_data[user_key]
+            user_data = store.get(user_id)
+            if user_data:
                 print(f"✅ НАЙДЕН в UserService:")
                 print(f"   Username: {user_data.get('username', 'N/A')}")
                 print(f"   Status: {user_data.get('status', 'N/A')}")
@@ -37,7 +36,7 @@ def diagnose_user_storage():
                 print(f"   End Date: {user_data.get('subscription_end', 'N/A')}")
             else:
                 print(f"❌ НЕТ в UserService")
-                print(f"📄 В файле найдены пользователи: {list(userservice_data.keys())}")
+                print(f"📄 В базе найдены пользователи: {[u['telegram_id'] for u in store.all()]}")
         else:
             print(f"❌ Файл {userservice_file} не существует")
     except Exception as e:
@@ -182,17 +181,16 @@ def diagnose_user_storage():
     
     user_id = 6626270112
     
-    # 1. Проверяем UserService (admin_bot/data/users.json)
-    print("\n1️⃣ USERSERVICE (admin_bot/data/users.json):")
+    # 1. Проверяем UserService (admin_bot/data/users.db)
+    print("\n1️⃣ USERSERVICE (admin_bot/data/users.db):")
     try:
-        userservice_file = "admin_bot/data/users.json"
+        userservice_file = "admin_bot/data/users.db"
         if os.path.exists(userservice_file):
-            with open(userservice_file, 'r', encoding='utf-8') as f:
-                userservice_data = json.load(f)
+            from services.user_store import UserStore
+            store = UserStore(userservice_file)
             
-            user_key = str(user_id)
-            if user_key in userservice_data:
-                user_data = userservice_data[user_key]
+            user_data = store.get(user_id)
+            if user_data:
                 print(f"✅ НАЙДЕН в UserService:")
                 print(f"   Username: {user_data.get('username', 'N/A')}")
                 print(f"   Status: {user_data.get('status', 'N/A')}")
@@ -200,7 +198,7 @@ def diagnose_user_storage():
                 print(f"   End Date: {user_data.get('subscription_end', 'N/A')}")
             else:
                 print(f"❌ НЕТ в UserService")
-                print(f"📄 В файле найдены пользователи: {list(userservice_data.keys())}")
+                print(f"📄 В базе найдены пользователи: {[u['telegram_id'] for u in store.all()]}")
         else:
             print(f"❌ Файл {userservice_file} не существует")
     except Exception as e:
@@ -1,395 +1,532 @@
 #!/usr/bin/env python3
 """
 🔥 FakeRedis - Эмулятор Redis для разработки с межпроцессной поддержкой
+
+- ключи хранятся в памяти; каждая запись добавляется строкой в общий
+  append-only журнал (data/fake_redis/appendonly.log) под fcntl-блокировкой,
+  другие процессы догоняют журнал перед чтением (один stat, если изменений нет)
+- журнал периодически сжимается в снимок (запись snapshot + новые операции)
+- Pub/Sub: каждый подписчик слушает свой Unix datagram сокет, publish отправляет
+  сообщение в сокеты напрямую - доставка за миллисекунды, без опроса каталога
 """
 
 import json
 import os
 import time
+import errno
+import socket
+import hashlib
+import fnmatch
+import tempfile
 import threading
 import logging
+import itertools
 from typing import Dict, Any, Optional, List
-from datetime import datetime, timedelta
+from datetime import datetime
 import fcntl  # Для блокировки файлов
 
 logger = logging.getLogger(__name__)
 
+# Размер журнала, после которого он сжимается в снимок (байт)
+AOF_COMPACT_SIZE = 4 * 1024 * 1024
+# Не чаще одного fsync журнала в секунду (как appendfsync everysec)
+AOF_FSYNC_INTERVAL = 1.0
+# Таймаут ожидания сообщения в listen() - как часто проверяется close()
+PUBSUB_POLL_TIMEOUT = 0.5
+# Максимальная длина пути Unix сокета (sun_path) с запасом
+MAX_SOCKET_PATH = 100
+
+
 class FakeRedisFileBased:
-    """FakeRedis с полной файловой синхронизацией для межпроцессной связи"""
-    
-    def __init__(self):
+    """FakeRedis: данные в памяти + общий append-only журнал для межпроцессной связи"""
+
+    def __init__(self, data_dir: Optional[str] = None):
         # Используем абсолютный путь для межпроцессной синхронизации
         project_root = os.path.dirname(os.path.abspath(__file__))
-        self.data_dir = os.path.join(project_root, "data", "fake_redis")
-        self.sync_file = os.path.join(self.data_dir, "data.json")
-        self.messages_dir = os.path.join(self.data_dir, "messages")
-        
-        # Создаем директории
+        self.data_dir = data_dir or os.path.join(project_root, "data", "fake_redis")
+        self.aof_file = os.path.join(self.data_dir, "appendonly.log")
+        self.sync_file = os.path.join(self.data_dir, "data.json")  # Прежний формат, импортируется один раз
+        self.sockets_dir = self._get_sockets_dir()
+
         os.makedirs(self.data_dir, exist_ok=True)
-        os.makedirs(self.messages_dir, exist_ok=True)
-        
-        self._data = {}
-        self._lock = threading.Lock()
-        self._subscribers = {}  # Каналы подписок
-        
-        self._load_from_file()
-        logger.info("🔥 FakeRedis с файловой синхронизацией запущен")
-    
-    def _safe_file_operation(self, filename: str, operation: str, data: Any = None):
-        """Безопасная операция с файлом с блокировкой"""
+        os.makedirs(self.sockets_dir, exist_ok=True)
+
+        self._data: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+        self._aof_inode = None
+        self._aof_offset = 0
+        self._last_fsync = 0.0
+
+        self._import_legacy_json()
+        with self._lock:
+            self._catch_up()
+        logger.info("🔥 FakeRedis с журналом и Unix сокетами запущен")
+
+    def _get_sockets_dir(self) -> str:
+        """Каталог сокетов подписчиков (во временном каталоге, если путь слишком длинный)"""
+        sockets_dir = os.path.join(self.data_dir, "sockets")
+        if len(sockets_dir) + 32 > MAX_SOCKET_PATH:
+            digest = hashlib.md5(self.data_dir.encode('utf-8')).hexdigest()[:12]
+            sockets_dir = os.path.join(tempfile.gettempdir(), f"fake_redis_{digest}")
+        return sockets_dir
+
+    # ----- Журнал -----
+
+    def _import_legacy_json(self):
+        """Переносит данные из прежнего data.json, если журнала еще нет"""
+        if os.path.exists(self.aof_file) or not os.path.exists(self.sync_file):
+            return
         try:
-            with open(filename, 'a+' if operation == 'read' else 'w') as f:
-                # Блокируем файл
-                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
-                
-                if operation == 'read':
-                    f.seek(0)
-                    content = f.read()
-                    return json.loads(content) if content.strip() else {}
-                elif operation == 'write':
-                    json.dump(data, f, indent=2)
-                    f.flush()
-                    os.fsync(f.fileno())
-                    return True
-                    
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {} if operation == 'read' else False
+            with open(self.sync_file, 'r') as f:
+                content = f.read()
+            legacy = json.loads(content).get('data', {}) if content.strip() else {}
         except Exception as e:
-            logger.error(f"⚠️ Ошибка файловой операции {operation}: {e}")
-            return {} if operation == 'read' else False
-    
-    def _load_from_file(self):
-        """Загружает данные из файла"""
-        data = self._safe_file_operation(self.sync_file, 'read')
-        with self._lock:
-            self._data = data.get('data', {})
-    
-    def _save_to_file(self):
-        """Сохраняет данные в файл"""
-        data_to_save = {
-            'data': self._data,
-            'timestamp': datetime.now().isoformat()
-        }
-        self._safe_file_operation(self.sync_file, 'write', data_to_save)
-    
-    def set(self, key: str, value: str, ex: Optional[int] = None) -> bool:
-        """Устанавливает значение ключа"""
+            logger.error(f"⚠️ Не удалось импортировать {self.sync_file}: {e}")
+            return
+
+        data = {}
+        for key, value in legacy.items():
+            # Хеши и списки раньше хранились JSON-строками
+            try:
+                decoded = json.loads(value) if isinstance(value, str) else value
+            except (ValueError, TypeError):
+                decoded = value
+            data[key] = decoded if isinstance(decoded, (dict, list)) else value
+
+        with self._locked_aof() as fd:
+            if os.fstat(fd).st_size == 0:
+                self._append_record(fd, {'op': 'snapshot', 'data': data})
+        logger.info(f"📦 FakeRedis: импортировано {len(data)} ключей из {self.sync_file}")
+
+    def _locked_aof(self):
+        """Открывает журнал на дозапись под эксклюзивной блокировкой"""
+        return _LockedFile(self.aof_file)
+
+    def _append_record(self, fd: int, record: dict):
+        os.write(fd, (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+        now = time.monotonic()
+        if now - self._last_fsync >= AOF_FSYNC_INTERVAL:
+            os.fsync(fd)
+            self._last_fsync = now
+
+    def _catch_up(self):
+        """Применяет записи журнала, сделанные другими процессами (под self._lock)"""
+        try:
+            stat = os.stat(self.aof_file)
+        except FileNotFoundError:
+            return
+
+        if stat.st_ino != self._aof_inode:
+            # Журнал сжат или создан заново - перечитываем с начала
+            self._data = {}
+            self._aof_inode = stat.st_ino
+            self._aof_offset = 0
+        elif stat.st_size == self._aof_offset:
+            return
+
+        with open(self.aof_file, 'rb') as f:
+            if os.fstat(f.fileno()).st_ino != self._aof_inode:
+                # Подменили между stat и open - догоним при следующем обращении
+                self._aof_inode = None
+                return
+            f.seek(self._aof_offset)
+            chunk = f.read()
+
+        # Незавершенная последняя строка дочитается в следующий раз
+        end = chunk.rfind(b'\n') + 1
+        for line in chunk[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                self._apply(json.loads(line))
+            except Exception as e:
+                logger.warning(f"Поврежденная запись журнала FakeRedis: {e}")
+        self._aof_offset += end
+
+    def _write(self, record: dict) -> Any:
+        """Догоняет журнал, применяет операцию и дописывает ее (атомарно между процессами)"""
         with self._lock:
-            self._data[key] = value
-            self._save_to_file()
-            logger.debug(f"Redis SET: {key} = {value}")
+            with self._locked_aof() as fd:
+                self._catch_up()
+                result = self._apply(record)
+                if result is not _NOT_CHANGED:
+                    self._append_record(fd, record)
+                    self._aof_offset = os.fstat(fd).st_size
+                    if self._aof_offset > AOF_COMPACT_SIZE:
+                        self._compact()
+            return None if result is _NOT_CHANGED else result
+
+    def _compact(self):
+        """Заменяет журнал снимком текущих данных (под блокировкой журнала)"""
+        tmp_path = self.aof_file + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'op': 'snapshot', 'data': self._data}, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.aof_file)
+        stat = os.stat(self.aof_file)
+        self._aof_inode, self._aof_offset = stat.st_ino, stat.st_size
+        logger.info(f"🗜️ Журнал FakeRedis сжат: {len(self._data)} ключей")
+
+    def _apply(self, record: dict) -> Any:
+        """Применяет одну операцию к данным в памяти"""
+        op, key = record['op'], record.get('key')
+        data = self._data
+
+        if op == 'snapshot':
+            self._data = dict(record['data'])
+            return True
+        if op == 'set':
+            data[key] = record['value']
+            return True
+        if op == 'delete':
+            return True if data.pop(key, _NOT_CHANGED) is not _NOT_CHANGED else _NOT_CHANGED
+        if op == 'hset':
+            hash_data = data.get(key)
+            if not isinstance(hash_data, dict):
+                hash_data = data[key] = {}
+            if 'mapping' in record:
+                hash_data.update(record['mapping'])
+            else:
+                hash_data[record['field']] = record['value']
             return True
-    
+        if op == 'hdel':
+            hash_data = data.get(key)
+            if isinstance(hash_data, dict) and record['field'] in hash_data:
+                del hash_data[record['field']]
+                return True
+            return _NOT_CHANGED
+        if op == 'lpush':
+            data_list = data.get(key)
+            if not isinstance(data_list, list):
+                data_list = data[key] = []
+            data_list.insert(0, record['value'])
+            return len(data_list)
+        if op == 'rpop':
+            data_list = data.get(key)
+            if not isinstance(data_list, list) or not data_list:
+                return _NOT_CHANGED
+            return data_list.pop()
+        if op == 'lrem':
+            data_list = data.get(key)
+            if not isinstance(data_list, list):
+                return _NOT_CHANGED
+            removed = _list_remove(data_list, record['count'], record['value'])
+            return removed if removed else _NOT_CHANGED
+        raise ValueError(f"Неизвестная операция {op}")
+
+    def _read(self, key: str) -> Any:
+        with self._lock:
+            self._catch_up()
+            return self._data.get(key)
+
+    # ----- Строки -----
+
+    def set(self, key: str, value: str, ex: Optional[int] = None) -> bool:
+        """Устанавливает значение ключа (ex не поддерживается, как и раньше)"""
+        self._write({'op': 'set', 'key': key, 'value': value})
+        logger.debug(f"Redis SET: {key} = {value}")
+        return True
+
     def get(self, key: str) -> Optional[str]:
         """Получает значение ключа"""
-        self._load_from_file()  # Обновляем данные
-        return self._data.get(key)
-    
+        value = self._read(key)
+        # Хеши и списки раньше хранились JSON-строками - отдаем так же
+        return json.dumps(value) if isinstance(value, (dict, list)) else value
+
     def delete(self, key: str) -> bool:
         """Удаляет ключ"""
+        if self._write({'op': 'delete', 'key': key}):
+            logger.debug(f"Redis DELETE: {key}")
+            return True
+        return False
+
+    def exists(self, key: str) -> bool:
+        """Проверяет существование ключа"""
         with self._lock:
-            if key in self._data:
-                del self._data[key]
-                self._save_to_file()
-                logger.debug(f"Redis DELETE: {key}")
-                return True
-            return False
-    
-    def hset(self, key: str, field: str, value: str) -> bool:
-        """Устанавливает поле в хеше"""
+            self._catch_up()
+            return key in self._data
+
+    def keys(self, pattern: str = "*") -> List[str]:
+        """Получает все ключи по паттерну"""
         with self._lock:
-            if key not in self._data:
-                self._data[key] = "{}"
-            
-            try:
-                hash_data = json.loads(self._data[key])
-            except:
-                hash_data = {}
-            
-            hash_data[field] = value
-            self._data[key] = json.dumps(hash_data)
-            self._save_to_file()
-            logger.debug(f"Redis HSET: {key}.{field} = {value}")
+            self._catch_up()
+            if pattern == "*":
+                return list(self._data.keys())
+            return [k for k in self._data.keys() if fnmatch.fnmatchcase(k, pattern)]
+
+    # ----- Хеши -----
+
+    def hset(self, key: str, field: Optional[str] = None, value: Optional[str] = None,
+             mapping: Optional[Dict[str, str]] = None) -> bool:
+        """Устанавливает поле в хеше (mapping - несколько полей одной записью журнала)"""
+        if mapping:
+            self._write({'op': 'hset', 'key': key, 'mapping': dict(mapping)})
+            logger.debug(f"Redis HSET: {key} ({len(mapping)} полей)")
             return True
-    
+        self._write({'op': 'hset', 'key': key, 'field': field, 'value': value})
+        logger.debug(f"Redis HSET: {key}.{field} = {value}")
+        return True
+
     def hget(self, key: str, field: str) -> Optional[str]:
         """Получает поле из хеша"""
-        self._load_from_file()  # Обновляем данные
-        
-        if key not in self._data:
-            return None
-        
-        try:
-            hash_data = json.loads(self._data[key])
-            return hash_data.get(field)
-        except:
-            return None
-    
+        hash_data = self._read(key)
+        return hash_data.get(field) if isinstance(hash_data, dict) else None
+
     def hdel(self, key: str, field: str) -> bool:
         """Удаляет поле из хеша"""
-        with self._lock:
-            if key not in self._data:
-                return False
-            
-            try:
-                hash_data = json.loads(self._data[key])
-                if field in hash_data:
-                    del hash_data[field]
-                    self._data[key] = json.dumps(hash_data)
-                    self._save_to_file()
-                    logger.debug(f"Redis HDEL: {key}.{field}")
-                    return True
-            except:
-                pass
-            return False
+        if self._write({'op': 'hdel', 'key': key, 'field': field}):
+            logger.debug(f"Redis HDEL: {key}.{field}")
+            return True
+        return False
 
     def hgetall(self, key: str) -> Dict[str, str]:
         """Получает все поля из хеша"""
-        self._load_from_file()  # Обновляем данные
-        
-        if key not in self._data:
-            return {}
-        
-        try:
-            hash_data = json.loads(self._data[key])
-            return hash_data
-        except:
-            return {}
+        hash_data = self._read(key)
+        return dict(hash_data) if isinstance(hash_data, dict) else {}
 
-    def exists(self, key: str) -> bool:
-        """Проверяет существование ключа"""
-        self._load_from_file()  # Обновляем данные
-        return key in self._data
+    def hlen(self, key: str) -> int:
+        """Количество полей в хеше"""
+        hash_data = self._read(key)
+        return len(hash_data) if isinstance(hash_data, dict) else 0
 
-    def keys(self, pattern: str = "*") -> List[str]:
-        """Получает все ключи по паттерну"""
-        self._load_from_file()  # Обновляем данные
-        
-        if pattern == "*":
-            return list(self._data.keys())
-        else:
-            # Простая поддержка паттернов
-            pattern_clean = pattern.replace("*", "")
-            return [k for k in self._data.keys() if pattern_clean in k]
+    # ----- Списки -----
 
     def lpush(self, key: str, value: str) -> int:
         """Добавляет элемент в начало списка"""
-        with self._lock:
-            if key not in self._data:
-                self._data[key] = "[]"  # Храним как JSON строку
-            
-            try:
-                data_list = json.loads(self._data[key])
-            except:
-                data_list = []
-            
-            data_list.insert(0, value)
-            self._data[key] = json.dumps(data_list)
-            self._save_to_file()
-            logger.debug(f"Redis LPUSH: {key} <- {value}")
-            return len(data_list)
+        length = self._write({'op': 'lpush', 'key': key, 'value': value})
+        logger.debug(f"Redis LPUSH: {key} <- {value}")
+        return length
 
     def rpop(self, key: str) -> Optional[str]:
         """Удаляет и возвращает последний элемент списка"""
-        self._load_from_file()  # Обновляем данные
-        
-        with self._lock:
-            if key not in self._data:
-                return None
-            
-            try:
-                data_list = json.loads(self._data[key])
-            except:
-                return None
-            
-            if len(data_list) == 0:
-                return None
-            
-            value = data_list.pop()
-            self._data[key] = json.dumps(data_list)
-            self._save_to_file()
+        value = self._write({'op': 'rpop', 'key': key})
+        if value is not None:
             logger.debug(f"Redis RPOP: {key} -> {value}")
-            return value
+        return value
 
     def llen(self, key: str) -> int:
         """Возвращает длину списка"""
-        self._load_from_file()  # Обновляем данные
-        
-        if key not in self._data:
-            return 0
-        
-        try:
-            data_list = json.loads(self._data[key])
-            return len(data_list)
-        except:
-            return 0
+        data_list = self._read(key)
+        return len(data_list) if isinstance(data_list, list) else 0
 
     def lrem(self, key: str, count: int, value: str) -> int:
         """Удаляет элементы из списка"""
-        with self._lock:
-            if key not in self._data:
-                return 0
-            
-            try:
-                data_list = json.loads(self._data[key])
-            except:
-                return 0
-            
-            removed = 0
-            if count == 0:  # Удалить все
-                removed = data_list.count(value)
-                data_list = [item for item in data_list if item != value]
-            elif count > 0:  # Удалить count элементов с начала
-                for i in range(len(data_list) - 1, -1, -1):
-                    if data_list[i] == value and removed < count:
-                        del data_list[i]
-                        removed += 1
-            else:  # Удалить count элементов с конца
-                for i in range(len(data_list)):
-                    if data_list[i] == value and removed < abs(count):
-                        del data_list[i]
-                        removed += 1
-                        break
-            
-            self._data[key] = json.dumps(data_list)
-            self._save_to_file()
-            logger.debug(f"Redis LREM: {key} count={count} value={value} removed={removed}")
-            return removed
-    
+        removed = self._write({'op': 'lrem', 'key': key, 'count': count, 'value': value}) or 0
+        logger.debug(f"Redis LREM: {key} count={count} value={value} removed={removed}")
+        return removed
+
+    # ----- Pub/Sub -----
+
     def publish(self, channel: str, message: str) -> int:
-        """Публикует сообщение в канал"""
-        # Создаем файл сообщения с временной меткой
-        timestamp = int(time.time() * 1000000)  # микросекунды
-        message_file = os.path.join(self.messages_dir, f"{channel}_{timestamp}.json")
-        
-        message_data = {
+        """Публикует сообщение в канал: отправляет его в сокеты всех подписчиков"""
+        payload = json.dumps({
             'channel': channel,
             'data': message,
-            'timestamp': timestamp,
             'created_at': datetime.now().isoformat()
-        }
-        
+        }).encode('utf-8')
+
+        delivered = 0
+        sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sender.setblocking(False)
         try:
-            with open(message_file, 'w') as f:
-                json.dump(message_data, f)
-            
-            logger.info(f"Redis PUBLISH: {channel} -> {message}")
-            return 1  # Количество подписчиков (симулируем)
+            for name in os.listdir(self.sockets_dir):
+                if not name.endswith('.sock'):
+                    continue
+                path = os.path.join(self.sockets_dir, name)
+                try:
+                    sender.sendto(payload, path)
+                    delivered += 1
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # Подписчик завершился, не закрыв сокет
+                    _unlink_quietly(path)
+                except BlockingIOError:
+                    logger.warning(f"Очередь подписчика {name} переполнена, сообщение {channel} пропущено")
+                except OSError as e:
+                    if e.errno == errno.ECONNREFUSED:
+                        _unlink_quietly(path)
+                    else:
+                        logger.error(f"Ошибка отправки {channel} подписчику {name}: {e}")
         except Exception as e:
             logger.error(f"Ошибка публикации: {e}")
-            return 0
-    
+        finally:
+            sender.close()
+
+        logger.info(f"Redis PUBLISH: {channel} -> {message} ({delivered} получателей)")
+        return delivered
+
     def pubsub(self):
         """Возвращает объект PubSub"""
-        return FakePubSub(self.messages_dir)
+        return FakePubSub(self.sockets_dir)
+
 
 class FakePubSub:
-    """Эмулятор Redis PubSub с файловой системой"""
-    
-    def __init__(self, messages_dir: str):
-        self.messages_dir = messages_dir
+    """Эмулятор Redis PubSub: сообщения приходят в собственный Unix datagram сокет"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, sockets_dir: str):
+        self.sockets_dir = sockets_dir
         self.subscribed_channels = set()
-        self._last_check = 0
-        
+        self.socket_path = os.path.join(sockets_dir, f"{os.getpid()}_{next(self._ids)}.sock")
+        self._sock = None
+        self._closed = False
+
+    def _ensure_socket(self):
+        if self._sock is None:
+            os.makedirs(self.sockets_dir, exist_ok=True)
+            _unlink_quietly(self.socket_path)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(self.socket_path)
+            sock.settimeout(PUBSUB_POLL_TIMEOUT)
+            self._sock = sock
+
     def subscribe(self, *channels):
-        """Подписывается на каналы"""
+        """Подписывается на каналы (сообщения, опубликованные после подписки)"""
+        self._ensure_socket()
         for channel in channels:
             self.subscribed_channels.add(channel)
             logger.info(f"FakePubSub: подписка на {channel}")
-    
+
+    def unsubscribe(self, *channels):
+        """Отписывается от каналов (без аргументов - от всех)"""
+        if channels:
+            self.subscribed_channels.difference_update(channels)
+        else:
+            self.subscribed_channels.clear()
+
+    def get_message(self, timeout: float = 0.0) -> Optional[dict]:
+        """Возвращает следующее сообщение подписанных каналов или None по таймауту"""
+        self._ensure_socket()
+        deadline = time.monotonic() + timeout
+        while not self._closed:
+            remaining = deadline - time.monotonic()
+            sock = self._sock
+            if sock is None:
+                return None
+            try:
+                sock.settimeout(max(0.0, min(remaining, PUBSUB_POLL_TIMEOUT)))
+                payload = sock.recv(65536)
+            except (socket.timeout, BlockingIOError):
+                if remaining <= 0:
+                    return None
+                continue
+            except OSError:
+                return None  # Сокет закрыт из другого потока
+
+            message = self._decode(payload)
+            if message is not None:
+                return message
+            if time.monotonic() >= deadline:
+                return None
+        return None
+
     def listen(self):
-        """Слушает сообщения из подписанных каналов"""
+        """Слушает сообщения из подписанных каналов (блокируется до close())"""
         logger.info(f"FakePubSub: начинаем слушать каналы: {self.subscribed_channels}")
-        processed_files = set()  # Защита от дублирования
-        
-        while True:
+        self._ensure_socket()
+        while not self._closed:
+            sock = self._sock
+            if sock is None:
+                return
             try:
-                # Проверяем новые файлы сообщений
-                current_time = int(time.time() * 1000000)
-                
-                if not os.path.exists(self.messages_dir):
-                    time.sleep(0.1)
-                    continue
-                
-                for filename in os.listdir(self.messages_dir):
-                    if not filename.endswith('.json'):
-                        continue
-                    
-                    # Защита от дублирования
-                    if filename in processed_files:
-                        continue
-                    
-                    filepath = os.path.join(self.messages_dir, filename)
-                    
-                    # Проверяем, что файл еще существует
-                    if not os.path.exists(filepath):
-                        continue
-                    
-                    try:
-                        # Проверяем время создания файла
-                        file_timestamp = int(filename.split('_')[-1].replace('.json', ''))
-                        
-                        # Пропускаем старые сообщения
-                        if file_timestamp <= self._last_check:
-                            processed_files.add(filename)
-                            continue
-                        
-                        # Читаем сообщение
-                        with open(filepath, 'r') as f:
-                            message_data = json.load(f)
-                        
-                        channel = message_data['channel']
-                        
-                        # Проверяем подписку на канал
-                        if channel in self.subscribed_channels:
-                            yield {
-                                'type': 'message',
-                                'channel': channel,
-                                'data': message_data['data']
-                            }
-                            
-                            logger.info(f"📨 FakePubSub получил: {channel} -> {message_data['data']}")
-                        
-                        # Помечаем как обработанное
-                        processed_files.add(filename)
-                        
-                        # Безопасно удаляем обработанное сообщение
-                        try:
-                            os.remove(filepath)
-                        except FileNotFoundError:
-                            pass  # Файл уже удален другим процессом
-                            
-                    except (json.JSONDecodeError, ValueError, KeyError) as e:
-                        logger.warning(f"Поврежденное сообщение {filename}: {e}")
-                        try:
-                            os.remove(filepath)
-                        except FileNotFoundError:
-                            pass
-                        processed_files.add(filename)
-                        
-                    except Exception as e:
-                        logger.error(f"Ошибка обработки сообщения {filename}: {e}")
-                        processed_files.add(filename)
-                
-                # Обновляем время последней проверки
-                self._last_check = current_time
-                
-                # Очищаем список обработанных файлов периодически
-                if len(processed_files) > 1000:
-                    processed_files.clear()
-                
-                time.sleep(0.1)  # Небольшая пауза для снижения нагрузки
-                
-            except Exception as e:
-                logger.error(f"Критическая ошибка в FakePubSub.listen: {e}")
+                payload = sock.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                if self._closed:
+                    return
+                logger.error("Ошибка чтения сокета FakePubSub")
                 time.sleep(1)
+                continue
+
+            message = self._decode(payload)
+            if message is not None:
+                logger.info(f"📨 FakePubSub получил: {message['channel']} -> {message['data']}")
+                yield message
+
+    def _decode(self, payload: bytes) -> Optional[dict]:
+        try:
+            message_data = json.loads(payload)
+            channel = message_data['channel']
+        except (ValueError, KeyError) as e:
+            logger.warning(f"Поврежденное сообщение FakePubSub: {e}")
+            return None
+        if channel not in self.subscribed_channels:
+            return None
+        return {'type': 'message', 'channel': channel, 'data': message_data['data']}
+
+    def close(self):
+        """Закрывает сокет подписчика"""
+        self._closed = True
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+                _unlink_quietly(self.socket_path)
+
+
+class _LockedFile:
+    """Контекстный менеджер: файл на дозапись под fcntl.LOCK_EX"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.fd = None
+
+    def __enter__(self) -> int:
+        while True:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            # Пока ждали блокировку, журнал могли сжать и подменить
+            try:
+                if os.fstat(fd).st_ino == os.stat(self.path).st_ino:
+                    self.fd = fd
+                    return fd
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
+        return False
+
+
+# Маркер "операция ничего не изменила" (в журнал не пишется)
+_NOT_CHANGED = object()
+
+
+def _list_remove(data_list: list, count: int, value: str) -> int:
+    """LREM: count > 0 - с начала, count < 0 - с конца, 0 - все вхождения"""
+    if count == 0:
+        removed = data_list.count(value)
+        data_list[:] = [item for item in data_list if item != value]
+        return removed
+
+    indexes = range(len(data_list)) if count > 0 else range(len(data_list) - 1, -1, -1)
+    matched = [i for i in indexes if data_list[i] == value][:abs(count)]
+    for i in sorted(matched, reverse=True):
+        del data_list[i]
+    return len(matched)
+
+
+def _unlink_quietly(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
 
 # Singleton экземпляр
 _fake_redis_instance = None
+_instance_lock = threading.Lock()
 
 def get_fake_redis():
     """Возвращает singleton экземпляр FakeRedis"""
     global _fake_redis_instance
     if _fake_redis_instance is None:
-        _fake_redis_instance = FakeRedisFileBased()
-    return _fake_redis_instance 
\ No newline at end of file
+        with _instance_lock:
+            if _fake_redis_instance is None:
+                _fake_redis_instance = FakeRedisFileBased()
+    return _fake_redis_instance
@@ -11,6 +11,7 @@ from config import ACCOUNTS_DIR
 from database.db_manager import get_instagram_account, update_account_session_data, get_proxy_for_account, get_instagram_account_by_username
 from device_manager import generate_device_settings, get_or_create_device_settings
 from .client_patch import *
+from .session_liveness import get_liveness_tracker, get_liveness_stats
 from utils.rotating_proxy_manager import get_rotating_proxy_url
 #from instagram.clip_upload_patch import *
 import builtins
@@ -676,6 +677,7 @@ def test_instagram_login_with_proxy(account_id, username, password, email=None,
 
                 # Сохраняем клиент в глобальный кэш
                 _instagram_clients[account_id] = client
+                get_liveness_tracker().bind_client(client, account_id)
                 return True
             except Exception as e:
                 logger.warning(f"Не удалось использовать сохраненную сессию для {username}: {e}")
@@ -957,6 +959,7 @@ def test_instagram_login_with_proxy(account_id, username, password, email=None,
 
             # Сохраняем клиент в глобальный кэш
             _instagram_clients[account_id] = client
+            get_liveness_tracker().bind_client(client, account_id)
             return True
         else:
             logger.warning(f"Неизвестная ошибка входа для {username}")
@@ -1314,28 +1317,32 @@ def get_instagram_client(account_id, skip_recovery=False, force_login=False):
     """
     global _instagram_clients
 
+    liveness = get_liveness_tracker()
+
     # Если force_login, удаляем из кэша
     if force_login and account_id in _instagram_clients:
         del _instagram_clients[account_id]
+        liveness.mark_dead(account_id)
         logger.info(f"Принудительное обновление сессии для аккаунта {account_id}")
 
     # Проверяем, есть ли клиент в кэше
     if account_id in _instagram_clients and not force_login:
         client = _instagram_clients[account_id]
-        # Проверяем, активна ли сессия
-        try:
-            client.get_timeline_feed()
+        # Свежей сессии доверяем без запроса, устаревшую проверяем дешевым запросом
+        if liveness.ensure_alive(account_id, client):
             logger.info(f"Используем кэшированный клиент для аккаунта {account_id}")
             return client
-        except Exception as e:
-            # Если сессия не активна, удаляем из кэша
-            logger.info(f"Кэшированный клиент не активен для аккаунта {account_id}: {e}")
-            del _instagram_clients[account_id]
-            
-            # Если skip_recovery, возвращаем None
-            if skip_recovery:
-                logger.warning(f"Пропускаем восстановление для аккаунта {account_id}")
-                return None
+
+        # Если сессия не активна, удаляем из кэша
+        logger.info(f"Кэшированный клиент не активен для аккаунта {account_id}")
+        _instagram_clients.pop(account_id, None)
+
+        # Если skip_recovery, возвращаем None
+        if skip_recovery:
+            logger.warning(f"Пропускаем восстановление для аккаунта {account_id}")
+            return None
+    else:
+        liveness.record_miss()
 
     # Получаем данные аккаунта из базы
     account = get_instagram_account(account_id)
@@ -1362,6 +1369,7 @@ def get_instagram_client(account_id, skip_recovery=False, force_login=False):
                         client.login(account.username, account.password)
                         client.get_timeline_feed()  # Проверяем что работает
                         _instagram_clients[account_id] = client
+                        liveness.bind_client(client, account_id)
                         return client
                     except:
                         return None
@@ -1453,6 +1461,7 @@ def remove_instagram_account(account_id):
                 logger.warning(f"Ошибка при выходе из аккаунта {account_id}: {e}")
 
             del _instagram_clients[account_id]
+            get_liveness_tracker().mark_dead(account_id)
 
         # Удаляем файлы сессии
         session_dir = os.path.join(ACCOUNTS_DIR, str(account_id))
@@ -1565,9 +1574,19 @@ def get_instagram_client_stats():
     """Получает статистику работы Instagram клиентов"""
     try:
         from instagram.client_adapter import get_client_stats
-        return get_client_stats()
+        stats = get_client_stats()
     except ImportError:
-        return {'mode': 'normal', 'adapter_not_available': True}
+        stats = {'mode': 'normal', 'adapter_not_available': True}
+    stats['session_liveness'] = get_liveness_stats()
+    return stats
+
+
+def start_session_liveness_probing():
+    """Запускает фоновую пакетную проверку устаревших кэшированных сессий"""
+    get_liveness_tracker().start_background_probing(
+        lambda: dict(_instagram_clients),
+        on_dead=lambda account_id: _instagram_clients.pop(account_id, None)
+    )
 
 
 # Функция для очистки клиентов
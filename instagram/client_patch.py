@@ -1,10 +1,12 @@
 from instagrapi import Client
 from instagrapi.mixins.private import PrivateRequestMixin
+from instagrapi.exceptions import LoginRequired
 import logging
 import builtins
 import re
 from instagram.email_utils import get_verification_code_from_email
 from database.db_manager import get_instagram_account
+from instagram.session_liveness import get_liveness_tracker, ACCOUNT_ID_ATTR
 
 logger = logging.getLogger(__name__)
 
@@ -39,7 +41,18 @@ def patched_send_private_request(self, *args, **kwargs):
             logger.info(f"📱 УСТРОЙСТВО: {self.settings['device_name']}")
 
     # Вызываем оригинальный метод
-    return original_send_private_request(self, *args, **kwargs)
+    try:
+        result = original_send_private_request(self, *args, **kwargs)
+    except LoginRequired:
+        # Сессия мертва - больше не доверяем ей
+        account_id = getattr(self, ACCOUNT_ID_ATTR, None)
+        if account_id is not None:
+            get_liveness_tracker().mark_dead(account_id)
+        raise
+
+    # Отмечаем успешный запрос, чтобы не проверять сессию повторно
+    get_liveness_tracker().record_request(self)
+    return result
 
 # Применяем патч
 PrivateRequestMixin._send_private_request = patched_send_private_request
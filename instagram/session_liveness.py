@@ -0,0 +1,247 @@
+"""
+Кэш "живости" сессий Instagram
+Запоминает время последнего успешного приватного запроса по каждому аккаунту,
+чтобы не делать лишний запрос к Instagram при каждом получении клиента из кэша
+"""
+
+import time
+import logging
+import threading
+from typing import Dict, Any, Optional, Callable
+from dataclasses import dataclass, asdict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Атрибут, которым помечается клиент, привязанный к аккаунту
+ACCOUNT_ID_ATTR = '_liveness_account_id'
+
+
+@dataclass
+class LivenessConfig:
+    """Конфигурация проверки живости сессий"""
+    freshness_window: int = 900  # Сколько секунд доверяем сессии после успешного запроса
+    probe_workers: int = 5  # Потоков для фоновой пакетной проверки
+    background_interval: int = 300  # Интервал фоновой проверки (секунды)
+
+
+@dataclass
+class LivenessStats:
+    """Статистика для мониторинга сэкономленных запросов"""
+    hits: int = 0  # Сессия свежая - запрос не нужен
+    probes: int = 0  # Сессия устарела - выполнена проверка
+    probe_failures: int = 0  # Проверка показала, что сессия мертва
+    misses: int = 0  # Клиента нет в кэше
+    recorded_requests: int = 0  # Успешные приватные запросы, отмеченные патчем
+    background_probes: int = 0
+
+
+class SessionLivenessTracker:
+    """
+    Отслеживает время последнего успешного запроса по аккаунтам.
+    Свежие сессии считаются живыми без обращения к Instagram,
+    устаревшие проверяются дешевым запросом.
+    """
+
+    def __init__(self, config: Optional[LivenessConfig] = None):
+        self.config = config or LivenessConfig()
+        self._last_ok: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._stats = LivenessStats()
+        self._background_thread = None
+        self._stop_event = threading.Event()
+
+    def bind_client(self, client, account_id: int):
+        """Привязывает клиент к аккаунту и отмечает сессию как живую (сразу после входа)"""
+        try:
+            setattr(client, ACCOUNT_ID_ATTR, account_id)
+        except Exception:
+            pass
+        self.mark_alive(account_id)
+
+    def mark_alive(self, account_id: int, timestamp: Optional[float] = None):
+        """Отмечает успешный запрос для аккаунта"""
+        with self._lock:
+            self._last_ok[account_id] = timestamp if timestamp is not None else time.time()
+
+    def mark_dead(self, account_id: int):
+        """Сбрасывает отметку живости для аккаунта"""
+        with self._lock:
+            self._last_ok.pop(account_id, None)
+
+    def record_request(self, client):
+        """Вызывается патчем приватных запросов после успешного ответа"""
+        account_id = getattr(client, ACCOUNT_ID_ATTR, None)
+        if account_id is None:
+            return
+        with self._lock:
+            self._last_ok[account_id] = time.time()
+            self._stats.recorded_requests += 1
+
+    def record_miss(self):
+        """Клиента не оказалось в кэше"""
+        with self._lock:
+            self._stats.misses += 1
+
+    def is_fresh(self, account_id: int) -> bool:
+        """Проверяет, был ли успешный запрос в пределах окна свежести"""
+        last_ok = self._last_ok.get(account_id)
+        if last_ok is None:
+            return False
+        return time.time() - last_ok < self.config.freshness_window
+
+    def ensure_alive(self, account_id: int, client) -> bool:
+        """
+        Проверяет, жива ли сессия кэшированного клиента.
+
+        Args:
+            account_id: ID аккаунта
+            client: Кэшированный клиент Instagram
+
+        Returns:
+            bool: True, если сессией можно пользоваться
+        """
+        if self.is_fresh(account_id):
+            with self._lock:
+                self._stats.hits += 1
+            return True
+
+        with self._lock:
+            self._stats.probes += 1
+        return self._probe(account_id, client)
+
+    def _probe(self, account_id: int, client) -> bool:
+        """Выполняет дешевую проверку сессии"""
+        try:
+            probe_session(client)
+            self.mark_alive(account_id)
+            return True
+        except Exception as e:
+            logger.info(f"Проверка сессии не пройдена для аккаунта {account_id}: {e}")
+            self.mark_dead(account_id)
+            with self._lock:
+                self._stats.probe_failures += 1
+            return False
+
+    def probe_stale(self, clients: Dict[int, Any], on_dead: Optional[Callable[[int], None]] = None) -> Dict[int, bool]:
+        """
+        Пакетно проверяет устаревшие сессии в пуле потоков.
+
+        Args:
+            clients: Словарь {account_id: client}
+            on_dead: Вызывается для каждого аккаунта с мертвой сессией
+
+        Returns:
+            Dict[int, bool]: Результаты проверки для устаревших аккаунтов
+        """
+        stale = {account_id: client for account_id, client in list(clients.items())
+                 if not self.is_fresh(account_id)}
+        if not stale:
+            return {}
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.config.probe_workers) as executor:
+            futures = {account_id: executor.submit(self._probe, account_id, client)
+                       for account_id, client in stale.items()}
+            for account_id, future in futures.items():
+                results[account_id] = future.result()
+
+        with self._lock:
+            self._stats.background_probes += len(stale)
+
+        if on_dead:
+            for account_id, alive in results.items():
+                if not alive:
+                    try:
+                        on_dead(account_id)
+                    except Exception as e:
+                        logger.warning(f"Ошибка обработки мертвой сессии {account_id}: {e}")
+
+        logger.info(f"Пакетная проверка сессий: {len(stale)} проверено, "
+                    f"{sum(1 for alive in results.values() if not alive)} мертвых")
+        return results
+
+    def start_background_probing(self, get_clients: Callable[[], Dict[int, Any]],
+                                 on_dead: Optional[Callable[[int], None]] = None):
+        """Запускает фоновую пакетную проверку устаревших сессий"""
+        if self._background_thread and self._background_thread.is_alive():
+            return
+
+        self._stop_event.clear()
+
+        def worker():
+            while not self._stop_event.wait(self.config.background_interval):
+                try:
+                    self.probe_stale(get_clients(), on_dead)
+                except Exception as e:
+                    logger.error(f"Ошибка фоновой проверки сессий: {e}")
+
+        self._background_thread = threading.Thread(target=worker, daemon=True, name="SessionLivenessProber")
+        self._background_thread.start()
+        logger.info("Фоновая проверка сессий запущена")
+
+    def stop_background_probing(self):
+        """Останавливает фоновую проверку"""
+        self._stop_event.set()
+        if self._background_thread:
+            self._background_thread.join(timeout=5)
+            self._background_thread = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Возвращает счетчики попаданий/проверок/промахов"""
+        with self._lock:
+            stats = asdict(self._stats)
+            stats['tracked_accounts'] = len(self._last_ok)
+        checks = stats['hits'] + stats['probes']
+        stats['hit_rate'] = stats['hits'] / checks if checks else 0.0
+        stats['round_trips_saved'] = stats['hits']
+        stats['freshness_window'] = self.config.freshness_window
+        return stats
+
+    def reset_stats(self):
+        """Сбрасывает статистику"""
+        with self._lock:
+            self._stats = LivenessStats()
+
+
+def probe_session(client):
+    """
+    Дешевая проверка сессии: данные текущего аккаунта вместо загрузки ленты.
+    Если метод недоступен, используется старая проверка через ленту.
+    """
+    if hasattr(client, 'account_info'):
+        return client.account_info()
+    return client.get_timeline_feed()
+
+
+# Глобальный экземпляр
+_liveness_tracker: Optional[SessionLivenessTracker] = None
+_tracker_lock = threading.Lock()
+
+
+def _load_config() -> LivenessConfig:
+    """Читает настройки из config.py"""
+    config = LivenessConfig()
+    try:
+        import config as app_config
+        config.freshness_window = getattr(app_config, 'SESSION_LIVENESS_WINDOW', config.freshness_window)
+        config.probe_workers = getattr(app_config, 'SESSION_LIVENESS_PROBE_WORKERS', config.probe_workers)
+        config.background_interval = getattr(app_config, 'SESSION_LIVENESS_PROBE_INTERVAL', config.background_interval)
+    except ImportError:
+        pass
+    return config
+
+
+def get_liveness_tracker() -> SessionLivenessTracker:
+    """Получает глобальный трекер живости сессий"""
+    global _liveness_tracker
+    if _liveness_tracker is None:
+        with _tracker_lock:
+            if _liveness_tracker is None:
+                _liveness_tracker = SessionLivenessTracker(_load_config())
+    return _liveness_tracker
+
+
+def get_liveness_stats() -> Dict[str, Any]:
+    """Возвращает статистику трекера живости сессий"""
+    return get_liveness_tracker().get_stats()
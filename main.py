@@ -75,6 +75,11 @@ def main():
     logger.info("Запуск обработчика очереди задач...")
     start_task_queue()  # Добавляем запуск очереди задач
 
+    # Запускаем фоновую проверку устаревших сессий Instagram
+    logger.info("Запуск проверки живости сессий Instagram...")
+    from instagram.client import start_session_liveness_probing
+    start_session_liveness_probing()
+
     # Запускаем мониторинг системы
     logger.info("Запуск мониторинга системных ресурсов...")
     start_system_monitoring()
@@ -191,6 +196,13 @@ def main():
         except:
             pass
         
+        try:
+            from instagram.session_liveness import get_liveness_tracker
+            get_liveness_tracker().stop_background_probing()
+            logger.info("🔎 Проверка живости сессий остановлена")
+        except:
+            pass
+        
         try:
             if 'broadcast_system' in locals():
                 broadcast_system.stop_processor()
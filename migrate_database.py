@@ -7,6 +7,36 @@ import sqlite3
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Колонки с результатами проверок прокси
+PROXY_CHECK_COLUMNS_SQLITE = [
+    ('last_checked', 'DATETIME'),
+    ('latency_ms', 'FLOAT'),
+    ('check_count', 'INTEGER DEFAULT 0'),
+    ('fail_count', 'INTEGER DEFAULT 0'),
+]
+PROXY_CHECK_COLUMNS_POSTGRES = [
+    ('last_checked', 'TIMESTAMP'),
+    ('latency_ms', 'DOUBLE PRECISION'),
+    ('check_count', 'INTEGER DEFAULT 0'),
+    ('fail_count', 'INTEGER DEFAULT 0'),
+]
+
+# Аренда задач публикации в очереди
+PUBLISH_LEASE_COLUMNS_SQLITE = [
+    ('queue_owner', 'VARCHAR(64)'),
+    ('queue_heartbeat', 'DATETIME'),
+]
+PUBLISH_LEASE_COLUMNS_POSTGRES = [
+    ('queue_owner', 'VARCHAR(64)'),
+    ('queue_heartbeat', 'TIMESTAMP'),
+]
+
+# Индексы, которых нет в таблицах, созданных до их появления в моделях
+INDEXES = [
+    ('ix_follow_history_account_target', 'follow_history', 'account_id, target_user_id'),
+    ('ix_publish_tasks_status_scheduled', 'publish_tasks', 'status, scheduled_time'),
+]
+
 def add_columns_sqlite():
     """Добавляет новые колонки в таблицу instagram_accounts для SQLite"""
     conn = sqlite3.connect(DATABASE_URL.replace('sqlite:///', ''))
@@ -25,6 +55,27 @@ def add_columns_sqlite():
             logger.info("Добавление колонки biography...")
             cursor.execute('ALTER TABLE instagram_accounts ADD COLUMN biography TEXT')
 
+        # Результаты проверок прокси
+        cursor.execute("PRAGMA table_info(proxies)")
+        proxy_columns = [column[1] for column in cursor.fetchall()]
+
+        for column, column_type in PROXY_CHECK_COLUMNS_SQLITE:
+            if column not in proxy_columns:
+                logger.info(f"Добавление колонки proxies.{column}...")
+                cursor.execute(f'ALTER TABLE proxies ADD COLUMN {column} {column_type}')
+
+        cursor.execute("PRAGMA table_info(publish_tasks)")
+        task_columns = [column[1] for column in cursor.fetchall()]
+
+        for column, column_type in PUBLISH_LEASE_COLUMNS_SQLITE:
+            if column not in task_columns:
+                logger.info(f"Добавление колонки publish_tasks.{column}...")
+                cursor.execute(f'ALTER TABLE publish_tasks ADD COLUMN {column} {column_type}')
+
+        for index_name, table, columns in INDEXES:
+            logger.info(f"Создание индекса {index_name}...")
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({columns})')
+
         conn.commit()
         logger.info("Миграция завершена успешно!")
     except Exception as e:
@@ -45,6 +96,19 @@ def add_columns_postgres():
         logger.info("Добавление колонки biography...")
         engine.execute('ALTER TABLE instagram_accounts ADD COLUMN IF NOT EXISTS biography TEXT')
 
+        # Результаты проверок прокси
+        for column, column_type in PROXY_CHECK_COLUMNS_POSTGRES:
+            logger.info(f"Добавление колонки proxies.{column}...")
+            engine.execute(f'ALTER TABLE proxies ADD COLUMN IF NOT EXISTS {column} {column_type}')
+
+        for column, column_type in PUBLISH_LEASE_COLUMNS_POSTGRES:
+            logger.info(f"Добавление колонки publish_tasks.{column}...")
+            engine.execute(f'ALTER TABLE publish_tasks ADD COLUMN IF NOT EXISTS {column} {column_type}')
+
+        for index_name, table, columns in INDEXES:
+            logger.info(f"Создание индекса {index_name}...")
+            engine.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({columns})')
+
         logger.info("Миграция завершена успешно!")
     except Exception as e:
         logger.error(f"Ошибка при выполнении миграции: {e}")
@@ -229,7 +229,7 @@ class RedisAccessSync:
                 for user_key, raw_data in all_users.items():
                     try:
                         user_data = json.loads(raw_data)
-                        self._local_cache[user_key.decode('utf-8')] = user_data
+                        self._local_cache[user_key.decode('utf-8') if isinstance(user_key, bytes) else user_key] = user_data
                     except:
                         continue
                         
@@ -507,7 +507,7 @@ class RedisAccessSync:
                 for user_key, raw_data in all_users.items():
                     try:
                         user_data = json.loads(raw_data)
-                        self._local_cache[user_key.decode('utf-8')] = user_data
+                        self._local_cache[user_key.decode('utf-8') if isinstance(user_key, bytes) else user_key] = user_data
                     except:
                         continue
                         
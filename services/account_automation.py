@@ -148,8 +148,8 @@ class AccountAutomationService:
             if status["ban_risk_score"] > 60:
                 return False, "Слишком высокий риск бана"
             
-            # Проверяем лимиты
-            can_perform, reason = rate_limiter.can_perform_action(account_id, action_type)
+            # Проверяем лимиты и сразу занимаем место под действие
+            can_perform, reason = rate_limiter.try_perform_action(account_id, action_type)
             if not can_perform:
                 return False, reason
             
@@ -161,9 +161,6 @@ class AccountAutomationService:
             # Выполняем действие
             result = action_func(*args, **kwargs)
             
-            # Записываем действие
-            rate_limiter.record_action(account_id, action_type)
-            
             return True, result
             
         except Exception as e:
@@ -94,9 +94,9 @@ class AsyncTaskProcessor:
                 logger.error(f"Задача #{task_id} не найдена")
                 return False
             
-            # Проверяем лимиты
+            # Проверяем лимиты и сразу занимаем место под действие
             action_type = self._get_action_type(task.task_type)
-            can_perform, reason = rate_limiter.can_perform_action(
+            can_perform, reason = rate_limiter.try_perform_action(
                 task.account_id, 
                 action_type
             )
@@ -112,9 +112,6 @@ class AsyncTaskProcessor:
             # Имитируем обработку (здесь должна быть реальная публикация)
             time.sleep(2)  # Заменить на реальную публикацию
             
-            # Записываем действие
-            rate_limiter.record_action(task.account_id, action_type)
-            
             # Обновляем статус
             update_publish_task_status(task_id, TaskStatus.COMPLETED)
             
@@ -5,14 +5,28 @@
 
 import time
 import logging
+import threading
 from datetime import datetime, timedelta
 from collections import defaultdict
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 from enum import Enum
 from database.db_manager import get_instagram_account
+from services.rate_limiter_state import DEFAULT_SYNC_INTERVAL, SharedLimiterState, get_state_settings
 
 logger = logging.getLogger(__name__)
 
+# Ширина корзины счетчика (сек) и окна лимитов в корзинах
+BUCKET_SECONDS = 60
+HOUR_BUCKETS = 3600 // BUCKET_SECONDS
+DAY_BUCKETS = 86400 // BUCKET_SECONDS
+
+# Сколько хранить дату создания аккаунта в кэше (сек)
+ACCOUNT_AGE_CACHE_TTL = 3600
+
+# Минимальный интервал между действиями одного типа на аккаунте (сек);
+# не меньше двух MAX_SYNC_INTERVAL, иначе перерасход между процессами растет
+MIN_ACTION_INTERVAL = 2
+
 class ActionType(Enum):
     """Типы действий для отслеживания"""
     LIKE = "like"
@@ -26,8 +40,67 @@ class ActionType(Enum):
     VIEW_FEED = "view_feed"
     DIRECT_MESSAGE = "direct_message"
 
+ACTIONS_BY_VALUE = {action_type.value: action_type for action_type in ActionType}
+
+class ActionCounter:
+    """
+    Счетчик действий за скользящие час и сутки: кольцо поминутных корзин
+    и текущие суммы по окнам. Запись и проверка - O(1) (амортизированно),
+    вместо списка отметок времени, который перебирался при каждой проверке.
+    
+    Окна считаются с точностью до корзины в сторону строгости: в часовое окно
+    попадают действия текущей минуты и 60 предыдущих.
+    """
+    
+    def __init__(self):
+        self._buckets = [0] * (DAY_BUCKETS + 1)
+        self._current = None  # Номер последней учтенной минуты
+        self._hour_total = 0
+        self._day_total = 0
+        self.last = None  # Время последнего действия
+    
+    def _advance(self, minute: int):
+        """Сдвигает окна к минуте minute, вычитая вышедшие из них корзины"""
+        if self._current is None or minute - self._current > DAY_BUCKETS:
+            self._buckets = [0] * len(self._buckets)
+            self._hour_total = self._day_total = 0
+            self._current = minute
+            return
+        size = len(self._buckets)
+        while self._current < minute:
+            self._current += 1
+            self._hour_total -= self._buckets[(self._current - HOUR_BUCKETS - 1) % size]
+            slot = self._current % size
+            self._day_total -= self._buckets[slot]
+            self._buckets[slot] = 0
+    
+    def append(self, timestamp: float, count: int = 1):
+        """Учитывает count действий в момент timestamp"""
+        minute = int(timestamp // BUCKET_SECONDS)
+        if self._current is None or minute > self._current:
+            self._advance(minute)
+        age = self._current - minute
+        if age > DAY_BUCKETS:
+            return
+        self._buckets[minute % len(self._buckets)] += count
+        self._day_total += count
+        if age <= HOUR_BUCKETS:
+            self._hour_total += count
+        if self.last is None or timestamp > self.last:
+            self.last = timestamp
+    
+    def counts(self, now: float) -> Tuple[int, int]:
+        """Количество действий за час и за сутки на момент now"""
+        minute = int(now // BUCKET_SECONDS)
+        if self._current is not None and minute > self._current:
+            self._advance(minute)
+        return self._hour_total, self._day_total
+    
+    def __len__(self):
+        return self._day_total
+
 class RateLimiter:
-    """Централизованный контроль rate limiting"""
+    """Централизованный контроль rate limiting (один экземпляр на все потоки)"""
     
     # Лимиты по умолчанию (консервативные для безопасности)
     DEFAULT_LIMITS = {
@@ -77,123 +150,204 @@ class RateLimiter:
         }
     }
     
-    def __init__(self):
-        # Хранилище действий: account_id -> action_type -> list of timestamps
-        self._actions: Dict[int, Dict[ActionType, list]] = defaultdict(lambda: defaultdict(list))
+    def __init__(self, state_path: Optional[str] = None, sync_interval: float = DEFAULT_SYNC_INTERVAL):
+        """
+        Args:
+            state_path: Файл SQLite, общий для всех процессов (None - счетчики только в памяти)
+            sync_interval: Интервал синхронизации с общим файлом (сек)
+        """
+        # Счетчики действий: account_id -> action_type -> ActionCounter
+        self._actions: Dict[int, Dict[ActionType, ActionCounter]] = defaultdict(lambda: defaultdict(ActionCounter))
         
         # Временные блокировки: account_id -> action_type -> unlock_time
         self._blocks: Dict[int, Dict[ActionType, datetime]] = defaultdict(dict)
+        
+        # Кэш даты создания аккаунтов: account_id -> (created_at, время загрузки)
+        self._account_created: Dict[int, Tuple[Optional[datetime], float]] = {}
+        
+        # Лимиты по уровням прогрева считаются один раз
+        self._tier_limits = {
+            "new": {
+                "hourly": self.DEFAULT_LIMITS["new_hourly"],
+                "daily": self.DEFAULT_LIMITS["new_daily"]
+            },
+            "warming": {
+                "hourly": {k: int(v * 1.5) for k, v in self.DEFAULT_LIMITS["new_hourly"].items()},
+                "daily": {k: int(v * 1.5) for k, v in self.DEFAULT_LIMITS["new_daily"].items()}
+            },
+            "warmed": {
+                "hourly": self.DEFAULT_LIMITS["warmed_hourly"],
+                "daily": self.DEFAULT_LIMITS["warmed_daily"]
+            }
+        }
+        
+        self._lock = threading.RLock()
+        
+        # Общее состояние открывается при первом обращении к лимитеру
+        self._state_path = state_path
+        self._sync_interval = sync_interval
+        self._state: Optional[SharedLimiterState] = None
     
-    def _get_account_age_days(self, account_id: int) -> int:
-        """Получить возраст аккаунта в днях"""
+    def _get_state(self) -> Optional[SharedLimiterState]:
+        """Общее для процессов состояние (None, если не настроено или недоступно)"""
+        if self._state is None and self._state_path:
+            with self._lock:
+                if self._state is None and self._state_path:
+                    try:
+                        state = SharedLimiterState(self, self._state_path, self._sync_interval)
+                        state.start()
+                        self._state = state
+                    except Exception as e:
+                        logger.error(f"❌ Не удалось открыть общее состояние лимитов {self._state_path}: {e}")
+                        self._state_path = None
+        return self._state
+    
+    def _apply_shared(self, rows, blocks):
+        """Добавить в счетчики действия и блокировки других процессов"""
+        with self._lock:
+            for account_id, action, count, last_at in rows:
+                action_type = ACTIONS_BY_VALUE.get(action)
+                if action_type:
+                    self._actions[account_id][action_type].append(last_at, count)
+            for account_id, action, unlock_at in blocks:
+                action_type = ACTIONS_BY_VALUE.get(action)
+                if action_type:
+                    unlock_time = datetime.fromtimestamp(unlock_at)
+                    current = self._blocks[account_id].get(action_type)
+                    if current is None or unlock_time > current:
+                        self._blocks[account_id][action_type] = unlock_time
+    
+    def _get_account_created_at(self, account_id: int) -> Optional[datetime]:
+        """Дата создания аккаунта (из кэша, в БД - не чаще раза в ACCOUNT_AGE_CACHE_TTL)"""
+        cached = self._account_created.get(account_id)
+        if cached is not None and time.monotonic() - cached[1] < ACCOUNT_AGE_CACHE_TTL:
+            return cached[0]
+        
+        created_at = None
         try:
             account = get_instagram_account(account_id)
             if account and account.created_at:
-                age = (datetime.now() - account.created_at).days
-                return age
+                created_at = account.created_at
         except:
             pass
+        self._account_created[account_id] = (created_at, time.monotonic())
+        return created_at
+    
+    def _get_account_age_days(self, account_id: int) -> int:
+        """Получить возраст аккаунта в днях"""
+        created_at = self._get_account_created_at(account_id)
+        if created_at:
+            return (datetime.now() - created_at).days
         return 0  # По умолчанию считаем новым
     
+    def forget_account(self, account_id: int):
+        """Сбросить закэшированный возраст аккаунта (например, после его замены в БД)"""
+        self._account_created.pop(account_id, None)
+    
     def _get_limits(self, account_id: int) -> Dict[str, Dict[ActionType, int]]:
         """Получить лимиты для аккаунта в зависимости от его возраста"""
         age_days = self._get_account_age_days(account_id)
         
         if age_days < 7:
             # Новый аккаунт - самые строгие лимиты
-            return {
-                "hourly": self.DEFAULT_LIMITS["new_hourly"],
-                "daily": self.DEFAULT_LIMITS["new_daily"]
-            }
+            return self._tier_limits["new"]
         elif age_days < 30:
             # Промежуточные лимиты
-            return {
-                "hourly": {k: int(v * 1.5) for k, v in self.DEFAULT_LIMITS["new_hourly"].items()},
-                "daily": {k: int(v * 1.5) for k, v in self.DEFAULT_LIMITS["new_daily"].items()}
-            }
+            return self._tier_limits["warming"]
         else:
             # Прогретый аккаунт
-            return {
-                "hourly": self.DEFAULT_LIMITS["warmed_hourly"],
-                "daily": self.DEFAULT_LIMITS["warmed_daily"]
-            }
-    
-    def _cleanup_old_actions(self, account_id: int, action_type: ActionType):
-        """Очистить старые записи действий (старше 24 часов)"""
-        cutoff_time = time.time() - 86400  # 24 часа назад
-        self._actions[account_id][action_type] = [
-            ts for ts in self._actions[account_id][action_type] 
-            if ts > cutoff_time
-        ]
+            return self._tier_limits["warmed"]
     
     def can_perform_action(self, account_id: int, action_type: ActionType) -> tuple[bool, Optional[str]]:
         """
         Проверить, можно ли выполнить действие
         Возвращает (можно_ли, причина_отказа)
         """
-        # Проверяем временную блокировку
-        if account_id in self._blocks and action_type in self._blocks[account_id]:
-            unlock_time = self._blocks[account_id][action_type]
-            if datetime.now() < unlock_time:
-                wait_seconds = (unlock_time - datetime.now()).seconds
-                return False, f"Действие {action_type.value} заблокировано на {wait_seconds} секунд"
-        
-        # Очищаем старые действия
-        self._cleanup_old_actions(account_id, action_type)
-        
-        # Получаем лимиты для аккаунта
-        limits = self._get_limits(account_id)
-        
-        # Текущее время
-        now = time.time()
-        
-        # Получаем список действий
-        actions = self._actions[account_id][action_type]
-        
-        # Проверяем часовой лимит
-        hour_ago = now - 3600
-        hourly_count = sum(1 for ts in actions if ts > hour_ago)
-        hourly_limit = limits["hourly"].get(action_type, 0)
-        
-        if hourly_count >= hourly_limit:
-            return False, f"Достигнут часовой лимит ({hourly_count}/{hourly_limit}) для {action_type.value}"
-        
-        # Проверяем дневной лимит
-        day_ago = now - 86400
-        daily_count = sum(1 for ts in actions if ts > day_ago)
-        daily_limit = limits["daily"].get(action_type, 0)
-        
-        if daily_count >= daily_limit:
-            return False, f"Достигнут дневной лимит ({daily_count}/{daily_limit}) для {action_type.value}"
-        
-        # Проверяем скорость действий (не чаще 1 действия в 2 секунды)
-        if actions and (now - actions[-1]) < 2:
-            return False, "Слишком быстрые действия, подождите 2 секунды"
+        self._get_state()
+        with self._lock:
+            # Проверяем временную блокировку
+            if account_id in self._blocks and action_type in self._blocks[account_id]:
+                unlock_time = self._blocks[account_id][action_type]
+                if datetime.now() < unlock_time:
+                    wait_seconds = (unlock_time - datetime.now()).seconds
+                    return False, f"Действие {action_type.value} заблокировано на {wait_seconds} секунд"
+                del self._blocks[account_id][action_type]
+            
+            # Получаем лимиты для аккаунта
+            limits = self._get_limits(account_id)
+            
+            # Текущее время
+            now = time.time()
+            
+            # Счетчики действий за час и за сутки
+            actions = self._actions[account_id][action_type]
+            hourly_count, daily_count = actions.counts(now)
+            
+            # Проверяем часовой лимит
+            hourly_limit = limits["hourly"].get(action_type, 0)
+            
+            if hourly_count >= hourly_limit:
+                return False, f"Достигнут часовой лимит ({hourly_count}/{hourly_limit}) для {action_type.value}"
+            
+            # Проверяем дневной лимит
+            daily_limit = limits["daily"].get(action_type, 0)
+            
+            if daily_count >= daily_limit:
+                return False, f"Достигнут дневной лимит ({daily_count}/{daily_limit}) для {action_type.value}"
+            
+            # Проверяем скорость действий (не чаще 1 действия в MIN_ACTION_INTERVAL секунд)
+            if actions.last is not None and (now - actions.last) < MIN_ACTION_INTERVAL:
+                return False, "Слишком быстрые действия, подождите 2 секунды"
+            
+            return True, None
+    
+    def try_perform_action(self, account_id: int, action_type: ActionType) -> tuple[bool, Optional[str]]:
+        """
+        Проверить и сразу записать действие - атомарно, чтобы два потока
+        одного аккаунта не прошли проверку на последнем свободном месте.
         
-        return True, None
+        Место занимается до выполнения действия и не возвращается, если оно
+        не удалось. Между процессами атомарности нет: действия других процессов
+        видны через интервал синхронизации, поэтому лимит может быть превышен
+        не больше чем на одно действие от каждого другого процесса.
+        """
+        with self._lock:
+            can_perform, reason = self.can_perform_action(account_id, action_type)
+            if can_perform:
+                self.record_action(account_id, action_type)
+            return can_perform, reason
     
     def record_action(self, account_id: int, action_type: ActionType):
         """Записать выполненное действие"""
-        self._actions[account_id][action_type].append(time.time())
+        state = self._get_state()
+        now = time.time()
+        with self._lock:
+            self._actions[account_id][action_type].append(now)
+        if state:
+            state.record(account_id, action_type.value, now)
         logger.info(f"✅ Действие {action_type.value} записано для аккаунта {account_id}")
     
     def block_action(self, account_id: int, action_type: ActionType, duration_seconds: int):
         """Временно заблокировать действие"""
         unlock_time = datetime.now() + timedelta(seconds=duration_seconds)
-        self._blocks[account_id][action_type] = unlock_time
+        state = self._get_state()
+        with self._lock:
+            self._blocks[account_id][action_type] = unlock_time
+        if state:
+            state.block(account_id, action_type.value, unlock_time.timestamp())
         logger.warning(f"🔒 Действие {action_type.value} заблокировано для аккаунта {account_id} на {duration_seconds} секунд")
     
     def get_action_stats(self, account_id: int) -> Dict[str, Dict[str, int]]:
         """Получить статистику действий аккаунта"""
         stats = {"hourly": {}, "daily": {}}
         now = time.time()
-        hour_ago = now - 3600
-        day_ago = now - 86400
         
-        for action_type in ActionType:
-            actions = self._actions[account_id][action_type]
-            stats["hourly"][action_type.value] = sum(1 for ts in actions if ts > hour_ago)
-            stats["daily"][action_type.value] = sum(1 for ts in actions if ts > day_ago)
+        self._get_state()
+        with self._lock:
+            for action_type in ActionType:
+                hourly_count, daily_count = self._actions[account_id][action_type].counts(now)
+                stats["hourly"][action_type.value] = hourly_count
+                stats["daily"][action_type.value] = daily_count
         
         return stats
     
@@ -216,5 +370,5 @@ class RateLimiter:
         
         return max(2, int(delay))  # Минимум 2 секунды
 
-# Глобальный экземпляр
-rate_limiter = RateLimiter() 
\ No newline at end of file
+# Глобальный экземпляр (общие счетчики для всех процессов бота)
+rate_limiter = RateLimiter(*get_state_settings()) 
\ No newline at end of file
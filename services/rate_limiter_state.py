@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+Общее для всех процессов состояние RateLimiter
+
+Проверки лимитов остаются в памяти процесса (счетчики ActionCounter), а
+файл SQLite в режиме WAL служит общим журналом:
+- записанные действия копятся в буфере и раз в RATE_LIMITER_SYNC_INTERVAL
+  пишутся одной транзакцией - строка на (аккаунт, действие, минута)
+- тем же проходом читаются строки других процессов (id > последнего
+  прочитанного) и добавляются в локальные счетчики
+- блокировки действий хранятся отдельной таблицей
+- при запуске журнал за последние сутки загружается заново, поэтому
+  перезапуск не обнуляет часовые и дневные счетчики
+
+Чужие действия видны с задержкой до одного интервала, поэтому процессы вместе
+могут превысить лимит - не больше чем на одно действие от каждого другого
+процесса: чужое действие попадает в счетчики не позже чем через два интервала,
+а это не больше минимального интервала между действиями.
+"""
+
+import os
+import time
+import uuid
+import atexit
+import logging
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Значение по умолчанию, если в config.py его нет
+DEFAULT_SYNC_INTERVAL = 1.0
+
+# Интервал из config.py не больше половины минимального интервала между действиями
+# (MIN_ACTION_INTERVAL RateLimiter): чужое действие пишется и читается за два
+# интервала, за это время другой процесс успевает сделать не больше одного действия того же типа
+MAX_SYNC_INTERVAL = 1.0
+
+# Строки журнала старше суток (плюс запас) удаляются
+RETENTION_SECONDS = 86400 + 3600
+
+# Как часто чистить журнал (в циклах синхронизации)
+PRUNE_EVERY = 300
+
+
+class SharedLimiterState:
+    """Журнал действий и блокировок в общем файле SQLite"""
+
+    def __init__(self, limiter, path: str, sync_interval: float = DEFAULT_SYNC_INTERVAL):
+        """
+        Args:
+            limiter: RateLimiter, в счетчики которого применяются записи
+            path: Путь к файлу SQLite
+            sync_interval: Интервал записи буфера и чтения чужих записей (сек)
+        """
+        self.limiter = limiter
+        self.path = path
+        self.sync_interval = sync_interval
+        self.origin = uuid.uuid4().hex[:16]
+
+        # Буфер: (account_id, action, minute) -> [count, last_at]
+        self._pending: Dict[Tuple[int, str, int], List[float]] = {}
+        self._pending_blocks: Dict[Tuple[int, str], float] = {}
+        self._pending_lock = threading.Lock()
+
+        self._db_lock = threading.Lock()
+        self._last_id = 0
+        self._syncs = 0
+        self._stats = {'written_rows': 0, 'applied_rows': 0, 'syncs': 0, 'errors': 0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS action_counts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                origin TEXT NOT NULL,
+                account_id INTEGER NOT NULL,
+                action TEXT NOT NULL,
+                minute INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                last_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_action_counts_minute ON action_counts (minute)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS action_blocks (
+                account_id INTEGER NOT NULL,
+                action TEXT NOT NULL,
+                unlock_at REAL NOT NULL,
+                PRIMARY KEY (account_id, action)
+            )
+        """)
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Загрузить журнал за сутки и запустить фоновую синхронизацию"""
+        since = int((time.time() - 86400) // 60) - 1
+        with self._db_lock:
+            self._last_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM action_counts").fetchone()[0]
+            rows = self._conn.execute(
+                "SELECT account_id, action, count, last_at FROM action_counts WHERE minute >= ? AND id <= ?",
+                (since, self._last_id)
+            ).fetchall()
+            blocks = self._read_blocks()
+        self.limiter._apply_shared(rows, blocks)
+        logger.info(f"📥 Загружено {len(rows)} записей лимитов из {self.path}")
+
+        self._thread = threading.Thread(target=self._sync_loop, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, account_id: int, action: str, timestamp: float):
+        """Поставить действие в буфер записи"""
+        key = (account_id, action, int(timestamp // 60))
+        with self._pending_lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                self._pending[key] = [1, timestamp]
+            else:
+                entry[0] += 1
+                entry[1] = max(entry[1], timestamp)
+
+    def block(self, account_id: int, action: str, unlock_at: float):
+        """Поставить блокировку в буфер записи"""
+        with self._pending_lock:
+            self._pending_blocks[(account_id, action)] = unlock_at
+
+    def _read_blocks(self) -> List[Tuple[int, str, float]]:
+        return self._conn.execute(
+            "SELECT account_id, action, unlock_at FROM action_blocks WHERE unlock_at > ?", (time.time(),)
+        ).fetchall()
+
+    def sync(self) -> bool:
+        """Записать буфер одной транзакцией и применить записи других процессов"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+            pending_blocks, self._pending_blocks = self._pending_blocks, {}
+
+        committed = False
+        try:
+            with self._db_lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    if pending:
+                        self._conn.executemany(
+                            "INSERT INTO action_counts (origin, account_id, action, minute, count, last_at) "
+                            "VALUES (?, ?, ?, ?, ?, ?)",
+                            [(self.origin, account_id, action, minute, int(count), last_at)
+                             for (account_id, action, minute), (count, last_at) in pending.items()]
+                        )
+                    if pending_blocks:
+                        self._conn.executemany(
+                            "INSERT INTO action_blocks (account_id, action, unlock_at) VALUES (?, ?, ?) "
+                            "ON CONFLICT (account_id, action) DO UPDATE SET unlock_at = MAX(unlock_at, excluded.unlock_at)",
+                            [(account_id, action, unlock_at)
+                             for (account_id, action), unlock_at in pending_blocks.items()]
+                        )
+                    self._syncs += 1
+                    if self._syncs % PRUNE_EVERY == 0:
+                        self._conn.execute("DELETE FROM action_counts WHERE minute < ?",
+                                           (int((time.time() - RETENTION_SECONDS) // 60),))
+                        self._conn.execute("DELETE FROM action_blocks WHERE unlock_at <= ?", (time.time(),))
+                    self._conn.execute("COMMIT")
+                    committed = True
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+
+                # Свои строки тоже читаем (и пропускаем), чтобы сдвигать _last_id
+                # только по прочитанному и не пропустить чужую параллельную запись
+                rows = []
+                for row_id, origin, account_id, action, count, last_at in self._conn.execute(
+                    "SELECT id, origin, account_id, action, count, last_at FROM action_counts WHERE id > ? ORDER BY id",
+                    (self._last_id,)
+                ):
+                    self._last_id = row_id
+                    if origin != self.origin:
+                        rows.append((account_id, action, count, last_at))
+                blocks = self._read_blocks()
+        except Exception as e:
+            # Не теряем действия: возвращаем незаписанный буфер до следующего раза
+            if not committed:
+                self._restore(pending, pending_blocks)
+            self._stats['errors'] += 1
+            logger.error(f"❌ Ошибка синхронизации лимитов с {self.path}: {e}")
+            return False
+
+        self.limiter._apply_shared(rows, blocks)
+        self._stats['syncs'] += 1
+        self._stats['written_rows'] += len(pending)
+        self._stats['applied_rows'] += len(rows)
+        return True
+
+    def _restore(self, pending, pending_blocks):
+        """Вернуть в буфер то, что не удалось записать"""
+        with self._pending_lock:
+            for key, (count, last_at) in pending.items():
+                entry = self._pending.setdefault(key, [0, last_at])
+                entry[0] += count
+                entry[1] = max(entry[1], last_at)
+            for key, unlock_at in pending_blocks.items():
+                self._pending_blocks[key] = max(unlock_at, self._pending_blocks.get(key, 0))
+
+    def _sync_loop(self):
+        while not self._stop_event.wait(self.sync_interval):
+            self.sync()
+
+    def close(self):
+        """Остановить синхронизацию и дописать буфер"""
+        if self._stop_event.is_set():
+            return
+        self._stop_event.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self.sync()
+        with self._db_lock:
+            self._conn.close()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._pending_lock:
+            pending = len(self._pending)
+        return dict(self._stats, pending_rows=pending)
+
+
+def get_state_settings() -> Tuple[Optional[str], float]:
+    """Путь к общему файлу лимитов (None - только в памяти) и интервал синхронизации"""
+    try:
+        from config import RATE_LIMITER_STATE_PATH
+    except ImportError:
+        return None, DEFAULT_SYNC_INTERVAL
+    try:
+        from config import RATE_LIMITER_SYNC_INTERVAL
+        sync_interval = min(float(RATE_LIMITER_SYNC_INTERVAL), MAX_SYNC_INTERVAL)
+    except ImportError:
+        sync_interval = DEFAULT_SYNC_INTERVAL
+    return (str(RATE_LIMITER_STATE_PATH) if RATE_LIMITER_STATE_PATH else None), sync_interval
@@ -556,7 +556,7 @@ def confirm_publish_now(update, context):
         )
 
         # Создаем задачи для каждого аккаунта
-        task_ids = []
+        created_tasks = []
         for account_id in account_ids:
             # Подготавливаем дополнительные данные
             additional_data = {
@@ -574,17 +574,17 @@ def confirm_publish_now(update, context):
             )
 
             if success:
-                # Добавляем задачу в очередь
-                from utils.task_queue import add_task_to_queue
-                if add_task_to_queue(task_id, update.effective_chat.id, context.bot):
-                    account = get_instagram_account(account_id)
-                    task_ids.append((task_id, account.username))
+                created_tasks.append((task_id, account_id))
+
+        # Ставим пакет в очередь (варианты медиа готовятся до старта задач)
+        # и регистрируем его для итогового отчета
+        from utils.task_queue import enqueue_task_batch
+        queued = set(enqueue_task_batch([task_id for task_id, _ in created_tasks],
+                                        update.effective_chat.id, context.bot))
+        task_ids = [(task_id, get_instagram_account(account_id).username)
+                    for task_id, account_id in created_tasks if task_id in queued]
 
         if task_ids:
-            # Регистрируем пакет задач для итогового отчета
-            from utils.task_queue import register_task_batch
-            just_task_ids = [task_id for task_id, _ in task_ids]
-            register_task_batch(just_task_ids, update.effective_chat.id, context.bot)
             
             # Формируем сообщение о созданных задачах
             message = f"✅ Созданы задачи на публикацию {publish_type}:\n\n"
@@ -2679,20 +2679,20 @@ def execute_publish_task(update, context):
             if not account:
                 continue
             
-            # Проверяем лимиты через rate limiter
-            action_type = ActionType.POST if task_type in [TaskType.PHOTO, TaskType.VIDEO, TaskType.CAROUSEL] else ActionType.STORY
-            can_publish, reason = rate_limiter.can_perform_action(account_id, action_type)
-            
-            if not can_publish:
-                logger.warning(f"❌ Пропускаем {account.username}: {reason}")
-                continue
-            
             # Проверяем статус аккаунта через automation service
             account_status = automation_service.get_account_status(account_id)
             if account_status.get('ban_risk_score', 0) > 70:
                 logger.warning(f"❌ Пропускаем {account.username}: высокий риск бана ({account_status['ban_risk_score']})")
                 continue
             
+            # Проверяем лимиты через rate limiter и сразу занимаем место под публикацию
+            action_type = ActionType.POST if task_type in [TaskType.PHOTO, TaskType.VIDEO, TaskType.CAROUSEL] else ActionType.STORY
+            can_publish, reason = rate_limiter.try_perform_action(account_id, action_type)
+            
+            if not can_publish:
+                logger.warning(f"❌ Пропускаем {account.username}: {reason}")
+                continue
+            
             # Создаем задачу публикации
             success, task_id = create_publish_task(
                 account_id=account_id,
@@ -2711,19 +2711,12 @@ def execute_publish_task(update, context):
             
             if success and task_id:
                 task_ids.append(task_id)
-                # Записываем действие в rate limiter
-                rate_limiter.record_action(account_id, action_type)
                 logger.info(f"Создана задача #{task_id} для аккаунта @{account.username}")
-                
-                # Добавляем задачу в очередь для выполнения
-                from utils.task_queue import add_task_to_queue
-                add_task_to_queue(task_id, query.message.chat_id, context.bot)
-                logger.info(f"Задача #{task_id} добавлена в очередь обработки")
         
-        # Регистрируем пакет задач для итогового отчета
+        # Ставим пакет в очередь и регистрируем его для итогового отчета
         if task_ids:
-            from utils.task_queue import register_task_batch
-            register_task_batch(task_ids, query.message.chat_id, context.bot)
+            from utils.task_queue import enqueue_task_batch
+            enqueue_task_batch(task_ids, query.message.chat_id, context.bot)
             logger.info(f"📦 Зарегистрирован пакет из {len(task_ids)} задач для итогового отчета")
         
         # Обновляем сообщение с результатом
@@ -3251,18 +3244,15 @@ def story_confirm_publish_handler(update, context):
             )
             
             if success:
-                # Добавляем задачу в очередь
-                from utils.task_queue import add_task_to_queue
-                add_task_to_queue(task_id, query.message.chat_id, context.bot)
                 task_ids.append(task_id)
                 successful_tasks += 1
             else:
                 failed_tasks += 1
 
-        # Регистрируем пакет задач для итогового отчета
+        # Ставим пакет в очередь и регистрируем его для итогового отчета
         if task_ids:
-            from utils.task_queue import register_task_batch
-            register_task_batch(task_ids, query.message.chat_id, context.bot)
+            from utils.task_queue import enqueue_task_batch
+            enqueue_task_batch(task_ids, query.message.chat_id, context.bot)
 
         # Отправляем сообщение о результате
         if successful_tasks > 0:
@@ -3919,7 +3909,7 @@ def reels_confirm_publish_handler(update, context):
     # Создаем задачи для каждого аккаунта
     from database.db_manager import create_publish_task
     from database.models import TaskType
-    from utils.task_queue import add_task_to_queue, register_task_batch
+    from utils.task_queue import enqueue_task_batch
     
     task_ids = []
     
@@ -3972,14 +3962,12 @@ def reels_confirm_publish_handler(update, context):
         
         if success:
             task_ids.append(task_id)
-            # Добавляем в очередь с уведомлениями
-            add_task_to_queue(task_id, query.message.chat_id, context.bot)
         else:
             raise Exception(f"Не удалось создать задачу для аккаунта {account_id}: {task_id}")
     
-    # Регистрируем пакет задач для итогового отчета
+    # Ставим пакет в очередь с уведомлениями и регистрируем для итогового отчета
     if task_ids:
-        register_task_batch(task_ids, query.message.chat_id, context.bot)
+        enqueue_task_batch(task_ids, query.message.chat_id, context.bot)
     
     # Сообщаем об успешном создании задач
     if len(selected_accounts) == 1:
@@ -4029,7 +4017,7 @@ def execute_reels_publish(update, context):
         # Создаем задачи для каждого аккаунта
         from database.db_manager import create_publish_task
         from database.models import TaskType
-        from utils.task_queue import add_task_to_queue, register_task_batch
+        from utils.task_queue import enqueue_task_batch
         
         task_ids = []
         
@@ -4082,14 +4070,12 @@ def execute_reels_publish(update, context):
             
             if success:
                 task_ids.append(task_id)
-                # Добавляем в очередь с уведомлениями
-                add_task_to_queue(task_id, query.message.chat_id, context.bot)
             else:
                 raise Exception(f"Не удалось создать задачу для аккаунта {account_id}: {task_id}")
         
-        # Регистрируем пакет задач для итогового отчета
+        # Ставим пакет в очередь с уведомлениями и регистрируем для итогового отчета
         if task_ids:
-            register_task_batch(task_ids, query.message.chat_id, context.bot)
+            enqueue_task_batch(task_ids, query.message.chat_id, context.bot)
         
         # Сообщаем об успешном создании задач
         if len(account_ids) == 1:
@@ -5,7 +5,6 @@
 
 import sys
 import os
-import json
 
 sys.path.insert(0, './utils')
 sys.path.insert(0, './admin_bot')
@@ -35,24 +34,24 @@ def test_userservice():
         user_ids = [u.telegram_id for u in all_users]
         print(f"📄 ID пользователей: {user_ids}")
         
-        # Проверяем файл напрямую
-        print(f"\n2️⃣ ФАЙЛ admin_bot/data/users.json:")
-        userservice_file = "admin_bot/data/users.json"
+        # Проверяем базу напрямую
+        print(f"\n2️⃣ БАЗА admin_bot/data/users.db:")
+        userservice_file = "admin_bot/data/users.db"
         if os.path.exists(userservice_file):
-            with open(userservice_file, 'r', encoding='utf-8') as f:
-                file_data = json.load(f)
-                
-            user_key = str(user_id)
-            if user_key in file_data:
-                user_data = file_data[user_key]
-                print(f"✅ Пользователь найден в файле:")
+            from services.user_store import UserStore
+            store = UserStore(userservice_file)
+            
+            user_data = store.get(user_id)
+            if user_data:
+                print(f"✅ Пользователь найден в базе:")
                 print(f"   Username: {user_data.get('username', 'N/A')}")
                 print(f"   Status: {user_data.get('status', 'N/A')}")
             else:
-                print(f"❌ Пользователь НЕ найден в файле")
+                print(f"❌ Пользователь НЕ найден в базе")
                 
-            print(f"📊 Всего пользователей в файле: {len(file_data)}")
-            print(f"📄 ID пользователей в файле: {list(file_data.keys())}")
+            all_data = store.all()
+            print(f"📊 Всего пользователей в базе: {len(all_data)}")
+            print(f"📄 ID пользователей в базе: {[u['telegram_id'] for u in all_data]}")
         else:
             print(f"❌ Файл {userservice_file} не существует")
             
@@ -80,12 +79,9 @@ def test_userservice():
         user = user_service.get_user(user_id)
         print(f"📊 В памяти после удаления: пользователь {'найден' if user else 'НЕ найден'}")
         
-        # Проверяем в файле
-        with open(userservice_file, 'r', encoding='utf-8') as f:
-            file_data = json.load(f)
-        user_key = str(user_id)
-        in_file = user_key in file_data
-        print(f"📊 В файле после удаления: пользователь {'найден' if in_file else 'НЕ найден'}")
+        # Проверяем в базе
+        in_db = user_service.store.exists(user_id)
+        print(f"📊 В базе после удаления: пользователь {'найден' if in_db else 'НЕ найден'}")
         
         # Пересоздаем UserService
         print(f"\n4️⃣ ПЕРЕСОЗДАЕМ USERSERVICE:")
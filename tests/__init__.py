@@ -1,4 +1,46 @@
 # -*- coding: utf-8 -*-
 """
 Модуль тестов для Instagram Bot MVP
-""" 
\ No newline at end of file
+"""
+
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database.models import Base
+
+
+class InMemoryDatabaseTestCase(unittest.TestCase):
+    """
+    Тесты с базой SQLite в памяти: self.engine, self.Session.
+
+    Все соединения идут в одну базу (StaticPool), поэтому ее видят и фоновые потоки.
+    """
+
+    # Модули, в которых get_session подменяется сессиями тестовой базы
+    session_modules = ()
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://", connect_args={'check_same_thread': False}, poolclass=StaticPool)
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        for module in self.session_modules:
+            patcher = patch.object(module, 'get_session', self.Session)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def record_statements(self):
+        """Список SQL-запросов, выполненных после вызова (пополняется на месте)"""
+        statements = []
+        event.listen(self.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        return statements
+
+    def record_commits(self):
+        """Список, в который добавляется элемент на каждый COMMIT после вызова"""
+        commits = []
+        event.listen(self.engine, 'commit', lambda conn: commits.append(1))
+        return commits
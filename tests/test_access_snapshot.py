@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для общего снимка доступов
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+
+from utils.access_snapshot import (
+    AccessEntry, AccessSnapshotReader, FLAG_ACTIVE, FLAG_TRIAL,
+    build_access_entries, write_access_snapshot
+)
+
+
+class TestAccessSnapshot(unittest.TestCase):
+    """Тесты для записи и чтения снимка"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'access_snapshot.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_lookup_and_expiry(self):
+        """Бинарный поиск учитывает флаг активности и срок подписки"""
+        now = datetime.now()
+        entries = build_access_entries([
+            ('5', {'is_active': True, 'role': 'trial', 'subscription_end': (now + timedelta(days=1)).isoformat()}),
+            ('3', {'is_active': True}),
+            ('9', {'is_active': False}),
+            ('7', {'is_active': True, 'subscription_end': (now - timedelta(minutes=1)).isoformat()}),
+            ('oops', {'is_active': True}),
+        ])
+        write_access_snapshot(entries, self.path)
+
+        reader = AccessSnapshotReader(self.path)
+        self.assertTrue(reader.has_access(3))
+        self.assertTrue(reader.has_access(5))
+        self.assertFalse(reader.has_access(7))
+        self.assertFalse(reader.has_access(9))
+        self.assertFalse(reader.has_access(4))
+        self.assertEqual(reader.lookup(5).flags, FLAG_ACTIVE | FLAG_TRIAL)
+        self.assertEqual(reader.get_stats()['users'], 4)
+
+    def test_missing_snapshot(self):
+        """Без снимка читатель возвращает None (проверка по источнику)"""
+        self.assertIsNone(AccessSnapshotReader(self.path).has_access(1))
+
+    def test_reload_only_on_version_change(self):
+        """Снимок перечитывается только после публикации новой версии"""
+        write_access_snapshot({1: AccessEntry(FLAG_ACTIVE)}, self.path)
+        reader = AccessSnapshotReader(self.path)
+        for _ in range(100):
+            self.assertTrue(reader.has_access(1))
+        self.assertEqual(reader.reloads, 1)
+
+        # Другой процесс публикует новую версию
+        self.assertEqual(write_access_snapshot({2: AccessEntry(FLAG_ACTIVE)}, self.path), 2)
+        self.assertFalse(reader.has_access(1))
+        self.assertTrue(reader.has_access(2))
+        self.assertEqual(reader.reloads, 2)
+        self.assertEqual(reader.version, 2)
+
+    def test_lookup_speed(self):
+        """Проверка по снимку из 100 000 пользователей - микросекунды"""
+        write_access_snapshot({i * 7: AccessEntry(FLAG_ACTIVE) for i in range(100000)}, self.path)
+        reader = AccessSnapshotReader(self.path)
+        reader.has_access(0)
+
+        started = time.perf_counter()
+        for i in range(20000):
+            reader.has_access(i * 3)
+        per_call = (time.perf_counter() - started) / 20000
+        self.assertLess(per_call, 50e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для приема задач в очередь автоподписок
+"""
+
+import threading
+import unittest
+from unittest.mock import patch
+
+from database.models import FollowTask, FollowTaskStatus, FollowSourceType
+from tests import InMemoryDatabaseTestCase
+from utils import async_follow_queue
+
+
+class TestFollowQueueIntake(InMemoryDatabaseTestCase):
+    """Тесты для захвата и передачи задач"""
+
+    session_modules = (async_follow_queue,)
+
+    def setUp(self):
+        super().setUp()
+        self._add_tasks({1: FollowTaskStatus.PENDING, 2: FollowTaskStatus.PENDING,
+                         3: FollowTaskStatus.PAUSED, 4: FollowTaskStatus.PENDING})
+
+        self.processed = []
+        self.done = threading.Event()
+
+        def process(task_id):
+            self.processed.append(task_id)
+            if len(self.processed) >= self.expected:
+                self.done.set()
+
+        self.expected = 0
+        patcher = patch.object(async_follow_queue, 'process_follow_task', process)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _add_tasks(self, statuses):
+        session = self.Session()
+        for task_id, status in statuses.items():
+            session.add(FollowTask(id=task_id, account_id=1, name=f'task{task_id}',
+                                   source_type=FollowSourceType.HASHTAG, source_value='tag', status=status))
+        session.commit()
+        session.close()
+
+    def _status(self, task_id):
+        session = self.Session()
+        try:
+            return session.get(FollowTask, task_id).status
+        finally:
+            session.close()
+
+    def test_claim_is_single_update_and_exclusive(self):
+        """Задачи захватываются одним UPDATE, повторный захват ничего не получает"""
+        statements = self.record_statements()
+
+        self.assertEqual(async_follow_queue.claim_follow_tasks([2, 1, 3, 99]), [1, 2])
+        self.assertEqual(len([s for s in statements if s.startswith('UPDATE')]), 1)
+        self.assertEqual(self._status(1), FollowTaskStatus.RUNNING)
+        self.assertEqual(self._status(3), FollowTaskStatus.PAUSED)
+
+        # Другой процесс (или повторная передача) уже не получит эти задачи
+        self.assertEqual(async_follow_queue.claim_follow_tasks([1, 2]), [])
+
+    def test_pushed_tasks_run_without_polling(self):
+        """Переданные задачи выполняются сразу, сверка с БД подхватывает остальные"""
+        with patch.object(async_follow_queue, '_get_reconcile_interval', return_value=3600), \
+                patch.object(async_follow_queue, 'check_pending_tasks') as sweep:
+            async_follow_queue.start_async_follow_queue(max_workers=1)
+            try:
+                self.expected = 2
+                self.assertTrue(async_follow_queue.enqueue_follow_tasks([1, 2]))
+                self.assertTrue(self.done.wait(5))
+                # Начальная сверка при запуске, дальше - только по интервалу
+                self.assertEqual(sweep.call_count, 1)
+            finally:
+                async_follow_queue.stop_async_follow_queue()
+
+        self.assertEqual(sorted(self.processed), [1, 2])
+        self.assertEqual(self._status(4), FollowTaskStatus.PENDING)
+
+        # Сверка находит задачу, которую никто не передал в очередь
+        async_follow_queue.follow_executor = async_follow_queue.ThreadPoolExecutor(max_workers=1)
+        try:
+            async_follow_queue.check_pending_tasks()
+        finally:
+            async_follow_queue.follow_executor.shutdown(wait=True)
+        self.assertEqual(sorted(self.processed), [1, 2, 4])
+        self.assertEqual(self._status(4), FollowTaskStatus.RUNNING)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для очереди прогрева аккаунтов
+"""
+
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+from utils.async_warmup_queue import AsyncWarmupQueue
+
+
+class TestAsyncWarmupQueue(unittest.TestCase):
+    """Тесты для планирования задач одного аккаунта"""
+
+    def setUp(self):
+        self.queue = AsyncWarmupQueue(max_workers=2)
+        self.release = {}
+        self.started = []
+        self.finished = threading.Semaphore(0)
+
+        def process(task):
+            self.started.append(task.id)
+            self.release[task.id].wait(5)
+            self.finished.release()
+
+        self.queue._process_task = process
+        self.queue.start()
+
+    def tearDown(self):
+        for event in self.release.values():
+            event.set()
+        self.queue.stop()
+
+    def _add(self, task_id, account_id):
+        self.release[task_id] = threading.Event()
+        self.queue.add_task(SimpleNamespace(id=task_id, account_id=account_id))
+
+    def _wait_started(self, count):
+        deadline = time.monotonic() + 5
+        while len(self.started) < count and time.monotonic() < deadline:
+            time.sleep(0.005)
+        return list(self.started)
+
+    def test_account_tasks_run_in_order_without_spinning(self):
+        """Задача занятого аккаунта ждет и запускается сразу после завершения предыдущей"""
+        self._add(1, account_id=10)
+        self._add(2, account_id=10)
+        self._add(3, account_id=20)
+        self.assertEqual(sorted(self._wait_started(2)), [1, 3])
+
+        stats = self.queue.get_stats()
+        self.assertEqual((stats['running'], stats['waiting']), (2, 1))
+
+        time.sleep(0.05)
+        self.release[1].set()
+        self.assertTrue(self.finished.acquire(timeout=5))
+        self.assertEqual(self._wait_started(3)[-1], 2)
+
+        accounts = self.queue.get_stats()['accounts']
+        self.assertEqual(accounts[10]['tasks'], 2)
+        self.assertGreaterEqual(accounts[10]['max_wait'], 0.05)
+        self.assertEqual(accounts[20]['tasks'], 1)
+
+    def test_duplicate_task_is_ignored(self):
+        """Повторное добавление задачи в очереди не дублирует ее"""
+        self._add(1, account_id=10)
+        self.queue.add_task(SimpleNamespace(id=1, account_id=10))
+        self._wait_started(1)
+        self.release[1].set()
+        self.assertTrue(self.finished.acquire(timeout=5))
+        time.sleep(0.05)
+        self.assertEqual(self.started, [1])
+        self.assertEqual(self.queue.get_stats()['running'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
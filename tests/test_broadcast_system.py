@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для параллельной отправки массовых рассылок
+"""
+
+import json
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from fake_redis import FakeRedisFileBased
+from utils import broadcast_system
+from utils.broadcast_system import BroadcastRateLimiter, BroadcastStatus, BroadcastType, RedisBroadcastSystem
+
+
+class TestBroadcastRateLimiter(unittest.TestCase):
+    """Тесты для BroadcastRateLimiter"""
+
+    def test_global_rate(self):
+        """После исчерпания корзины сообщения идут с заданной скоростью"""
+        limiter = BroadcastRateLimiter(rate=100, burst=5)
+        started = time.monotonic()
+        for chat_id in range(25):
+            limiter.acquire(chat_id)
+        self.assertGreaterEqual(time.monotonic() - started, 0.18)
+
+    def test_per_chat_interval(self):
+        """Второе сообщение в тот же чат ждет интервал чата"""
+        limiter = BroadcastRateLimiter(rate=1000, per_chat_interval=0.2)
+        self.assertEqual(limiter._reserve(1), 0)
+        self.assertAlmostEqual(limiter._reserve(1), 0.2, delta=0.05)
+        self.assertEqual(limiter._reserve(2), 0)
+
+
+class TestBroadcastFanOut(unittest.TestCase):
+    """Тесты для _execute_broadcast"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.redis = FakeRedisFileBased(self.tmp)
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.addCleanup(shutil.rmtree, self.redis.sockets_dir, True)
+
+        self.sent = []
+        self.sent_lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+
+        def send(user_id, **kwargs):
+            with self.sent_lock:
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+            time.sleep(0.02)
+            with self.sent_lock:
+                self.active -= 1
+                self.sent.append(user_id)
+            return user_id % 10 != 0
+
+        manager = SimpleNamespace(redis_client=self.redis, send_personal_notification=send)
+        for target, value in (('get_notification_manager', lambda: manager),
+                              ('_get_fanout_settings', lambda: (1000, 4, 0.05))):
+            patcher = patch.object(broadcast_system, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.system = RedisBroadcastSystem()
+
+    def _create(self, user_ids):
+        broadcast_id = self.system.broadcast_to_users('Новости', 'Текст', user_ids, admin_id=1)
+        return self.system._load_broadcast(self.redis.hget(self.system.KEYS['broadcasts'], broadcast_id))
+
+    def test_parallel_delivery_with_batched_statuses(self):
+        """Отправка идет в несколько потоков, статусы пишутся пачками"""
+        broadcast = self._create(list(range(1, 101)))
+        self.assertEqual(broadcast.broadcast_type, BroadcastType.SPECIFIC_USERS)
+
+        with patch.object(self.redis, 'hset', wraps=self.redis.hset) as hset:
+            self.system._execute_broadcast(broadcast)
+
+        self.assertEqual(sorted(self.sent), list(range(1, 101)))
+        self.assertGreater(self.max_active, 1)
+        delivery_writes = [c for c in hset.call_args_list if c.args[0].startswith(self.system.KEYS['delivery'])]
+        self.assertLess(len(delivery_writes), 20)
+
+        saved = self.system.get_broadcast_status(broadcast.id)
+        self.assertEqual(saved['status'], 'completed')
+        self.assertEqual((saved['sent_count'], saved['failed_count']), (90, 10))
+        self.assertEqual(saved['delivery_stats']['processed'], 100)
+        self.assertGreater(saved['delivery_stats']['messages_per_second'], 0)
+        self.assertEqual(len(self.redis.hgetall(f"{self.system.KEYS['delivery']}:{broadcast.id}")), 100)
+
+    def test_resume_from_checkpoint(self):
+        """Прерванная рассылка возвращается в очередь и не отправляется повторно"""
+        broadcast = self._create([1, 2, 3, 4, 5])
+        self.redis.rpop(self.system.KEYS['queue'])
+        broadcast.status = BroadcastStatus.IN_PROGRESS
+        broadcast.total_recipients = 5
+        self.system._save_broadcast(broadcast)
+        self.redis.hset(f"{self.system.KEYS['delivery']}:{broadcast.id}", mapping={
+            '1': json.dumps({'sent_at': 'x', 'success': True}),
+            '2': json.dumps({'sent_at': 'x', 'success': False})
+        })
+
+        self.system._resume_interrupted_broadcasts()
+        self.system._process_pending_broadcasts()
+
+        self.assertEqual(sorted(self.sent), [3, 4, 5])
+        saved = self.system.get_broadcast_status(broadcast.id)
+        self.assertEqual((saved['status'], saved['sent_count'], saved['failed_count']), ('completed', 4, 1))
+
+    def test_fresh_checkpoint_not_resumed(self):
+        """Рассылку со свежей контрольной точкой отправляет другой процесс - она не дублируется"""
+        broadcast = self._create([1, 2, 3])
+        broadcast.status = BroadcastStatus.IN_PROGRESS
+        broadcast.delivery_stats['updated_at'] = datetime.now().isoformat()
+        self.system._save_broadcast(broadcast)
+
+        self.system._resume_interrupted_broadcasts()
+        self.assertEqual(self.redis.llen(self.system.KEYS['queue']), 1)
+        self.system._process_pending_broadcasts()
+        self.system._process_pending_broadcasts()
+
+        self.assertEqual(self.sent, [])
+        self.assertEqual(self.system.get_broadcast_status(broadcast.id)['status'], 'in_progress')
+
+    def test_stale_checkpoint_resumed_once(self):
+        """Брошенная рассылка возвращается в очередь один раз, даже если ее вернули несколько процессов"""
+        broadcast = self._create([1, 2, 3])
+        self.redis.rpop(self.system.KEYS['queue'])
+        broadcast.status = BroadcastStatus.IN_PROGRESS
+        broadcast.delivery_stats['updated_at'] = (datetime.now() - timedelta(seconds=self.system.stale_timeout + 1)).isoformat()
+        self.system._save_broadcast(broadcast)
+
+        self.system._resume_interrupted_broadcasts()
+        self.system._resume_interrupted_broadcasts()
+        self.assertEqual(self.redis.llen(self.system.KEYS['queue']), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для пакетной уникализации контента
+"""
+
+import os
+import tempfile
+import unittest
+from concurrent.futures import Future
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from PIL import Image
+
+import utils.task_queue as tq
+from database.models import TaskType
+from utils.content_uniquifier import ContentUniquifier
+
+
+class TestUniquifyBatch(unittest.TestCase):
+    """Тесты для ContentUniquifier.uniquify_batch"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmp.name, 'photo.jpg')
+        Image.new('RGB', (120, 80), (200, 100, 50)).save(self.source)
+        self.uniquifier = ContentUniquifier()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_image_decoded_once(self):
+        """Исходник открывается один раз, вариантов - сколько запрошено"""
+        with patch('utils.content_uniquifier.Image.open', wraps=Image.open) as image_open:
+            variants = self.uniquifier.uniquify_batch(self.source, 'photo', 4, caption="Привет #a #b #c")
+
+        self.assertEqual(image_open.call_count, 1)
+        self.assertEqual(len(variants), 4)
+        paths = [path for path, _ in variants]
+        self.assertEqual(len(set(paths)), 4)
+        self.assertTrue(all(os.path.exists(path) and path != self.source for path in paths))
+
+    def test_stage_timings_in_queue_stats(self):
+        """Время этапов уникализации изображений попадает в статистику очереди"""
+        before = tq.get_image_stage_stats().get('encode', {}).get('count', 0)
+        self.uniquifier.uniquify_batch(self.source, 'photo', 2)
+
+        with patch.object(tq, 'get_task_adaptive_limits', return_value=(1, 0.0, SimpleNamespace(description='test'))), \
+                patch.object(tq, 'check_system_overload', return_value=False):
+            stages = tq.get_queue_stats()['image_stages']
+        self.assertEqual(stages['encode']['count'], before + 2)
+        self.assertIn('geometry', stages)
+
+    def test_carousel_variants(self):
+        """Для карусели каждый вариант - список файлов в исходном порядке"""
+        second = os.path.join(self.tmp.name, 'second.png')
+        Image.new('RGB', (60, 60), (0, 0, 255)).save(second)
+
+        variants = self.uniquifier.uniquify_batch([self.source, second], 'carousel', 2)
+
+        self.assertEqual(len(variants), 2)
+        for paths, _ in variants:
+            self.assertEqual(len(paths), 2)
+            self.assertTrue(paths[1].endswith('.png'))
+
+
+class TestPrepareBatchMedia(unittest.TestCase):
+    """Тесты для подготовки вариантов пакета задач"""
+
+    def tearDown(self):
+        tq.prepared_media.clear()
+
+    def test_tasks_with_same_source_share_one_batch(self):
+        """Задачи с общим исходником получают свои варианты из одного вызова"""
+        tasks = {
+            1: {'media_path': 'a.jpg', 'task_type': TaskType.PHOTO, 'options': '{"uniquify_content": true}'},
+            2: {'media_path': 'a.jpg', 'task_type': TaskType.PHOTO, 'options': {'uniquify_content': True}},
+            3: {'media_path': 'b.jpg', 'task_type': TaskType.PHOTO, 'options': {'uniquify_content': True}},
+            4: {'media_path': 'a.jpg', 'task_type': TaskType.PHOTO, 'options': {}},
+        }
+        calls = []
+
+        def fake_batch(source, content_type, count, caption=""):
+            calls.append((source, content_type, count))
+            return [(f"{source}_{i}", "") for i in range(count)]
+
+        with patch.object(tq, 'get_publish_task', tasks.get), \
+                patch.object(tq.uniquifier, 'uniquify_batch', fake_batch):
+            self.assertEqual(tq.prepare_batch_media([1, 2, 3, 4]), 2)
+            tq.prepared_media[1][0].result(timeout=10)
+            self.assertEqual(tq.take_prepared_media(1), 'a.jpg_0')
+            self.assertEqual(tq.take_prepared_media(2), 'a.jpg_1')
+
+        self.assertEqual(calls, [('a.jpg', 'photo', 2)])
+        self.assertIsNone(tq.take_prepared_media(3))
+        self.assertIsNone(tq.take_prepared_media(1))
+
+    def test_pending_variants_defer_dispatch(self):
+        """Пока варианты готовятся, задача не занимает поток и возвращается по их готовности"""
+        future = Future()
+        tq.prepared_media[5] = (future, 0, 'a.jpg')
+        task = SimpleNamespace(task_id=5)
+        with patch.object(tq.task_scheduler, 'defer') as defer:
+            self.assertTrue(tq._wait_for_prepared_media(task))
+            defer.assert_not_called()
+            future.set_result([('a.jpg_0', '')])
+            defer.assert_called_once_with(task, 0)
+            self.assertFalse(tq._wait_for_prepared_media(task))
+        self.assertEqual(tq.take_prepared_media(5), 'a.jpg_0')
+
+    def test_take_does_not_block_on_pending_variants(self):
+        """Неготовые варианты не ждутся: задача уникализирует медиа сама, файлы уберутся позже"""
+        future = Future()
+        tq.prepared_media[6] = (future, 0, 'a.jpg')
+        self.assertIsNone(tq.take_prepared_media(6))
+        self.assertNotIn(6, tq.prepared_media)
+
+    def test_media_prepared_before_enqueue(self):
+        """Подготовка запускается до постановки задач в очередь"""
+        events = []
+        with patch.object(tq, 'prepare_batch_media', lambda ids: events.append(('prepare', list(ids)))), \
+                patch.object(tq, 'add_task_to_queue', lambda task_id, *args: events.append(('queue', task_id)) or task_id != 2), \
+                patch.object(tq, 'register_task_batch', lambda ids, *args: events.append(('register', ids))):
+            self.assertEqual(tq.enqueue_task_batch([1, 2, 3], 10, object()), [1, 3])
+
+        self.assertEqual(events, [('prepare', [1, 2, 3]), ('queue', 1), ('queue', 2), ('queue', 3), ('register', [1, 3])])
+
+    def test_untaken_variant_files_removed(self):
+        """Невостребованные варианты удаляются вместе с файлами, исходник остается"""
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, 'source.jpg')
+            variants = [os.path.join(tmp, f'variant_{i}.jpg') for i in range(2)]
+            for path in [source] + variants:
+                open(path, 'w').close()
+
+            future = tq.concurrent.futures.Future()
+            tq.prepared_media[1] = (future, 0, source)
+            tq.prepared_media[2] = (future, 1, source)
+            # Уникализация не удалась и вместо варианта вернулся исходник
+            tq.prepared_media[3] = (future, 1, variants[1])
+
+            # Файлы удаляются, только когда подготовка завершится
+            self.assertTrue(tq.discard_prepared_media(1))
+            self.assertTrue(os.path.exists(variants[0]))
+            future.set_result([(variants[0], ''), (variants[1], '')])
+            self.assertFalse(os.path.exists(variants[0]))
+
+            self.assertEqual(tq.take_prepared_media(2), variants[1])
+            self.assertFalse(tq.discard_prepared_media(2))
+            self.assertTrue(os.path.exists(variants[1]))
+
+            self.assertTrue(tq.discard_prepared_media(3))
+            self.assertTrue(os.path.exists(variants[1]))
+            self.assertTrue(os.path.exists(source))
+            self.assertEqual(tq.prepared_media, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для FakeRedis (журнал и Pub/Sub через Unix сокеты)
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import fake_redis
+from fake_redis import FakeRedisFileBased
+
+
+class TestFakeRedis(unittest.TestCase):
+    """Тесты для FakeRedisFileBased и FakePubSub"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.admin = FakeRedisFileBased(self.tmp)
+        self.bot = FakeRedisFileBased(self.tmp)  # Второй "процесс" с тем же журналом
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        shutil.rmtree(self.admin.sockets_dir, ignore_errors=True)
+
+    def test_writes_visible_to_other_instance(self):
+        """Запись одного экземпляра видна другому без перезаписи файла"""
+        self.admin.hset('access:users', '1', '{"is_active": true}')
+        self.admin.set('plain', 'value')
+        self.assertEqual(self.bot.hget('access:users', '1'), '{"is_active": true}')
+        self.assertEqual(self.bot.hlen('access:users'), 1)
+        self.assertEqual(self.bot.get('plain'), 'value')
+
+        self.bot.hdel('access:users', '1')
+        self.assertIsNone(self.admin.hget('access:users', '1'))
+        self.assertEqual(self.admin.keys('access:*'), ['access:users'])
+
+    def test_lists_and_restart(self):
+        """Списки восстанавливаются из журнала новым экземпляром"""
+        for value in ('a', 'b', 'c', 'b'):
+            self.admin.lpush('queue', value)
+        self.assertEqual(self.bot.rpop('queue'), 'a')
+        self.assertEqual(self.admin.lrem('queue', 0, 'b'), 2)
+
+        restarted = FakeRedisFileBased(self.tmp)
+        self.assertEqual(restarted.llen('queue'), 1)
+        self.assertEqual(restarted.rpop('queue'), 'c')
+        self.assertIsNone(restarted.rpop('queue'))
+
+    def test_compaction(self):
+        """Журнал сжимается в снимок, другие экземпляры перечитывают его"""
+        with patch.object(fake_redis, 'AOF_COMPACT_SIZE', 2000):
+            for i in range(100):
+                self.admin.set(f'key{i % 5}', str(i))
+        self.assertLess(os.path.getsize(self.admin.aof_file), 2000)
+        self.assertEqual(self.bot.get('key4'), '99')
+        self.assertEqual(len(self.bot.keys()), 5)
+
+    def test_legacy_json_import(self):
+        """Прежний data.json переносится в журнал"""
+        legacy_dir = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(legacy_dir, 'data.json'), 'w') as f:
+                json.dump({'data': {'access:users': json.dumps({'7': 'x'}), 'plain': 'v'}}, f)
+            client = FakeRedisFileBased(legacy_dir)
+            self.assertEqual(client.hget('access:users', '7'), 'x')
+            self.assertEqual(client.get('plain'), 'v')
+        finally:
+            shutil.rmtree(legacy_dir, ignore_errors=True)
+
+    def test_pubsub_delivery(self):
+        """Сообщение доставляется подписчику без опроса каталога"""
+        pubsub = self.bot.pubsub()
+        pubsub.subscribe('access:user_removed')
+        received = []
+
+        def listen():
+            for message in pubsub.listen():
+                received.append((message, time.monotonic()))
+                return
+
+        listener = threading.Thread(target=listen)
+        listener.start()
+        self.admin.publish('access:other', 'skip')
+        sent = time.monotonic()
+        self.assertEqual(self.admin.publish('access:user_removed', '{"user_id": 1}'), 1)
+        listener.join(timeout=5)
+        pubsub.close()
+
+        message, delivered = received[0]
+        self.assertEqual(message, {'type': 'message', 'channel': 'access:user_removed', 'data': '{"user_id": 1}'})
+        self.assertLess(delivered - sent, 0.2)
+        self.assertEqual(os.listdir(self.admin.sockets_dir), [])
+        # После закрытия подписчика сообщения никому не отправляются
+        self.assertEqual(self.admin.publish('access:user_removed', '{}'), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для фильтра Блума истории подписок
+"""
+
+import unittest
+
+from database.models import FollowHistory, FollowBloomFilter
+from tests import InMemoryDatabaseTestCase
+from utils.follow_dedup import BloomFilter, FollowDedupIndex
+
+
+class TestFollowDedupIndex(InMemoryDatabaseTestCase):
+    """Тесты для FollowDedupIndex"""
+
+    def setUp(self):
+        super().setUp()
+        self._add_history(1, range(100))
+        self._add_history(2, range(1000, 1010))
+
+    def _add_history(self, account_id, target_ids):
+        session = self.Session()
+        for target_id in target_ids:
+            session.add(FollowHistory(account_id=account_id, target_user_id=str(target_id)))
+        session.commit()
+        session.close()
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        """Добавленные ключи всегда находятся, доля ложных срабатываний около расчетной"""
+        bloom = BloomFilter(1000, 0.01)
+        for key in range(1000):
+            bloom.add(str(key))
+        self.assertTrue(all(str(key) in bloom for key in range(1000)))
+        false_positives = sum(str(key) in bloom for key in range(10000, 20000))
+        self.assertLess(false_positives, 300)
+
+        restored = BloomFilter(bloom.capacity, hash_count=bloom.hash_count, bits=bytes(bloom.bits))
+        self.assertIn('500', restored)
+
+    def test_find_followed_is_exact(self):
+        """Результат совпадает с историей аккаунта, чужая история не учитывается"""
+        index = FollowDedupIndex(session_factory=self.Session, min_capacity=100)
+        targets = [str(target_id) for target_id in range(50, 150)] + ['1000']
+        self.assertEqual(index.find_followed(1, targets), {str(target_id) for target_id in range(50, 100)})
+        self.assertTrue(index.is_followed(2, '1005'))
+        self.assertFalse(index.is_followed(2, '50'))
+
+    def test_new_history_is_caught_up_and_persisted(self):
+        """Новые записи (в т.ч. из другого процесса) догружаются, фильтр сохраняется в БД"""
+        index = FollowDedupIndex(session_factory=self.Session, min_capacity=100)
+        self.assertFalse(index.is_followed(1, '500'))
+
+        self._add_history(1, [500])
+        self.assertTrue(index.is_followed(1, '500'))
+
+        session = self.Session()
+        row = session.get(FollowBloomFilter, 1)
+        self.assertEqual(row.item_count, 101)
+        session.close()
+
+        # Новый процесс загружает сохраненный фильтр без полного чтения истории
+        statements = self.record_statements()
+        other = FollowDedupIndex(session_factory=self.Session, min_capacity=100)
+        self.assertTrue(other.is_followed(1, '500'))
+        self.assertEqual(other.get_stats()['rebuilds'], 0)
+        self.assertFalse(any('count(' in statement for statement in statements))
+
+    def test_overflow_rebuilds_with_larger_capacity(self):
+        """При переполнении фильтр пересобирается с большей емкостью"""
+        index = FollowDedupIndex(session_factory=self.Session, min_capacity=100)
+        index.find_followed(2, ['1'])
+        self._add_history(2, range(2000, 2200))
+        self.assertEqual(index.find_followed(2, ['2100', '1']), {'2100'})
+
+        session = self.Session()
+        row = session.get(FollowBloomFilter, 2)
+        self.assertEqual(row.item_count, 210)
+        self.assertEqual(row.capacity, 420)
+        session.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для однопроходной уникализации изображений
+"""
+
+import unittest
+
+import numpy as np
+from PIL import Image, ImageEnhance, ImageFilter, ImageOps
+
+from utils.image_uniquifier import ImageUniquifyParams, build_geometry, uniquify_array
+
+
+def make_source(width=240, height=160):
+    """Гладкое цветное изображение"""
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[..., 0] = x
+    image[..., 1] = y
+    image[..., 2] = (x + y) / 2
+    return image
+
+
+def legacy_chain(source, params):
+    """Прежняя цепочка операций PIL с теми же параметрами"""
+    img = Image.fromarray(source)
+    if params.scale is not None:
+        img = img.resize((int(img.width * params.scale), int(img.height * params.scale)), Image.Resampling.LANCZOS)
+    if params.angle is not None:
+        img = img.rotate(params.angle, expand=True, fillcolor='white')
+    if params.brightness is not None:
+        img = ImageEnhance.Brightness(img).enhance(params.brightness)
+    if params.contrast is not None:
+        img = ImageEnhance.Contrast(img).enhance(params.contrast)
+    if params.saturation is not None:
+        img = ImageEnhance.Color(img).enhance(params.saturation)
+    if params.blur_radius is not None:
+        img = img.filter(ImageFilter.GaussianBlur(radius=params.blur_radius))
+    if params.sharpness is not None:
+        img = ImageEnhance.Sharpness(img).enhance(params.sharpness)
+    if params.crop:
+        img = img.crop((params.crop, params.crop, img.width - params.crop, img.height - params.crop))
+    if params.mirror:
+        img = ImageOps.mirror(img)
+    return np.asarray(img)
+
+
+class TestFusedImageTransform(unittest.TestCase):
+    """Тесты для uniquify_array"""
+
+    def assert_equivalent(self, params, tolerance=4.0):
+        source = make_source()
+        expected = legacy_chain(source, params)
+        actual, timings = uniquify_array(source, params)
+
+        self.assertEqual(actual.shape, expected.shape)
+        # Края после поворота интерполируются по-разному, сравниваем внутреннюю часть
+        inner = (slice(8, -8), slice(8, -8))
+        difference = np.abs(actual[inner].astype(np.int16) - expected[inner]).mean()
+        self.assertLess(difference, tolerance)
+        self.assertEqual(set(timings), {'geometry', 'color', 'filter'})
+
+    def test_all_operations_match_pil_chain(self):
+        """Все операции вместе дают то же изображение, что и цепочка PIL"""
+        self.assert_equivalent(ImageUniquifyParams(
+            scale=1.02, angle=1.5, brightness=1.08, contrast=0.92, saturation=1.1,
+            sharpness=1.2, crop=2, mirror=True
+        ))
+
+    def test_color_only(self):
+        """Только цветокоррекция: геометрия не меняется"""
+        self.assert_equivalent(ImageUniquifyParams(brightness=0.9, contrast=1.1, saturation=0.9, blur_radius=0.4),
+                               tolerance=1.5)
+
+    def test_random_params_keep_size_close(self):
+        """Случайные параметры дают размер в пределах прежних границ"""
+        for _ in range(20):
+            params = ImageUniquifyParams.random('story')
+            _, size = build_geometry(1080, 1350, params)
+            self.assertTrue(1000 <= size[0] <= 1160 and 1260 <= size[1] <= 1440, size)
+
+    def test_source_not_modified(self):
+        """Исходный массив не изменяется (разделяется между вариантами)"""
+        source = make_source()
+        copy = source.copy()
+        uniquify_array(source, ImageUniquifyParams(brightness=1.1, saturation=1.1))
+        self.assertTrue(np.array_equal(source, copy))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для кэша профилей и фильтрации целей автоподписки
+"""
+
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from utils import follow_manager
+from utils.follow_manager import FollowManager
+from utils.profile_cache import ProfileCache
+
+
+def profile(pk, username=None, **fields):
+    return SimpleNamespace(pk=pk, username=username or f'user{pk}', **fields)
+
+
+class TestProfileCache(unittest.TestCase):
+    """Тесты для ProfileCache"""
+
+    def test_lru_eviction_and_username_alias(self):
+        """Профиль доступен по pk и username, давно не использованные вытесняются"""
+        cache = ProfileCache(max_size=2, ttl=60)
+        cache.put(profile(1, 'Alice'))
+        cache.put(profile(2))
+        self.assertEqual(cache.get_by_username('alice').pk, 1)
+        cache.put(profile(3))
+
+        self.assertIsNone(cache.get(2))
+        self.assertIsNone(cache.get_by_username('user2'))
+        self.assertEqual(cache.get('1').username, 'Alice')
+        self.assertEqual(cache.get_stats()['evictions'], 1)
+
+    def test_fetch_uses_cache_until_expired(self):
+        """Повторный запрос берется из кэша, после TTL профиль запрашивается снова"""
+        cache = ProfileCache(ttl=60)
+        client = MagicMock()
+        client.user_info.side_effect = lambda pk: profile(pk)
+
+        with patch('utils.profile_cache.time.monotonic', return_value=1000.0):
+            cache.fetch(client, pk=5)
+            cache.fetch(client, pk=5)
+        self.assertEqual(client.user_info.call_count, 1)
+
+        with patch('utils.profile_cache.time.monotonic', return_value=1061.0):
+            cache.fetch(client, pk=5)
+        self.assertEqual(client.user_info.call_count, 2)
+
+        stats = cache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['expired']), (1, 2, 1))
+        self.assertEqual(stats['hit_rate'], 0.333)
+
+
+class TestFollowFiltering(unittest.TestCase):
+    """Тесты для ленивой фильтрации FollowManager"""
+
+    def setUp(self):
+        self.cache = ProfileCache()
+        patcher = patch.object(follow_manager, 'get_profile_cache', lambda: self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.manager = FollowManager.__new__(FollowManager)
+        self.manager.instagram_client = MagicMock()
+        self.manager.instagram_client.user_info.side_effect = lambda pk: profile(
+            pk, follower_count=pk * 100, is_private=False, profile_pic_url='pic'
+        )
+
+    def _task(self, filters, follow_limit=100, followed_count=0):
+        self.manager.task = SimpleNamespace(filters=filters, follow_limit=follow_limit,
+                                            followed_count=followed_count, skipped_count=0)
+
+    def test_no_profile_requests_when_source_data_is_enough(self):
+        """Фильтрам по приватности и аватару хватает данных из источника"""
+        self._task({'skip_private': True, 'skip_no_avatar': True})
+        users = [profile(1, is_private=True, profile_pic_url='pic'),
+                 profile(2, is_private=False, profile_pic_url=''),
+                 profile(3, is_private=False, profile_pic_url='pic')]
+
+        self.assertEqual([u.pk for u in self.manager.apply_filters(users)], [3])
+        self.assertEqual(self.manager.task.skipped_count, 2)
+        self.manager.instagram_client.user_info.assert_not_called()
+
+    def test_stops_at_quota(self):
+        """Профили запрашиваются только пока не набран лимит задачи"""
+        self._task({'min_followers': 200}, follow_limit=10, followed_count=8)
+        users = [profile(pk, is_private=False, profile_pic_url='pic') for pk in range(1, 20)]
+
+        self.assertEqual([u.pk for u in self.manager.apply_filters(users)], [2, 3])
+        self.assertEqual(self.manager.instagram_client.user_info.call_count, 3)
+
+        # Повторная фильтрация (другая задача на ту же аудиторию) идет из кэша
+        self.manager.apply_filters(users)
+        self.assertEqual(self.manager.instagram_client.user_info.call_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для балансировки аккаунтов по прокси
+"""
+
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from database.models import Proxy, InstagramAccount
+from tests import InMemoryDatabaseTestCase
+from utils import proxy_manager
+from utils.proxy_balancer import ProxyLoad, ProxyLoadBalancer
+
+
+class TestProxyLoadBalancer(unittest.TestCase):
+    """Тесты для ProxyLoadBalancer"""
+
+    def test_fast_proxy_gets_more_accounts(self):
+        """Быстрый и стабильный прокси получает больше аккаунтов"""
+        balancer = ProxyLoadBalancer([
+            ProxyLoad(1, latency_ms=50, check_count=10),
+            ProxyLoad(2, latency_ms=1500, check_count=10),
+            ProxyLoad(3, latency_ms=50, check_count=10, fail_count=5),
+        ])
+        for _ in range(60):
+            balancer.acquire()
+
+        counts = balancer.snapshot()
+        self.assertEqual(sum(counts.values()), 60)
+        self.assertGreater(counts[1], counts[2])
+        self.assertGreater(counts[1], counts[3])
+
+    def test_existing_load_respected(self):
+        """Новые аккаунты идут на менее загруженные прокси"""
+        balancer = ProxyLoadBalancer([ProxyLoad(1, accounts=10), ProxyLoad(2, accounts=0)])
+        self.assertEqual([balancer.acquire() for _ in range(5)], [2] * 5)
+
+    def test_remove_and_exclude(self):
+        """Удаленный прокси больше не выдается, исключенный пропускается"""
+        balancer = ProxyLoadBalancer([ProxyLoad(1), ProxyLoad(2, accounts=5)])
+        self.assertEqual(balancer.acquire(exclude=1), 2)
+        balancer.remove(1)
+        self.assertNotIn(1, balancer)
+        self.assertEqual(balancer.acquire(), 2)
+        balancer.remove(2)
+        self.assertIsNone(balancer.acquire())
+
+    def test_overload(self):
+        """Перегрузка определяется относительно справедливой доли"""
+        balancer = ProxyLoadBalancer([ProxyLoad(1, accounts=10), ProxyLoad(2, accounts=0)])
+        self.assertTrue(balancer.is_overloaded(1))
+        self.assertFalse(balancer.is_overloaded(2))
+
+
+class TestProxyAssignment(InMemoryDatabaseTestCase):
+    """Тесты для распределения прокси в БД"""
+
+    session_modules = (proxy_manager,)
+
+    def setUp(self):
+        super().setUp()
+        session = self.Session()
+        session.add_all([Proxy(id=i, host=f'10.0.0.{i}', port=8080, is_active=True) for i in (1, 2, 3)])
+        session.add_all([
+            InstagramAccount(id=i, username=f'acc{i}', password='x', user_id=100 + i % 2,
+                             proxy_id=1 if i <= 4 else 2)
+            for i in range(1, 9)
+        ])
+        session.commit()
+        session.close()
+
+    def proxy_of_accounts(self):
+        session = self.Session()
+        try:
+            return {account.id: account.proxy_id for account in session.query(InstagramAccount).all()}
+        finally:
+            session.close()
+
+    def test_reassign_only_accounts_of_dead_proxy(self):
+        """Переносятся только аккаунты отключенного прокси"""
+        session = self.Session()
+        session.query(Proxy).filter_by(id=1).update({'is_active': False})
+        session.commit()
+        session.close()
+
+        moved = proxy_manager.reassign_accounts_from_proxies([1])
+
+        self.assertEqual(moved, 4)
+        proxies = self.proxy_of_accounts()
+        self.assertNotIn(1, proxies.values())
+        # Аккаунты прокси 2 остались на месте, новые ушли в основном на пустой прокси 3
+        self.assertTrue(all(proxies[i] == 2 for i in range(5, 9)))
+        self.assertEqual(sum(1 for i in range(1, 5) if proxies[i] == 3), 4)
+
+    def test_distribute_keeps_balanced_accounts(self):
+        """Распределение не трогает аккаунты на рабочих неперегруженных прокси"""
+        session = self.Session()
+        detached = {
+            user_id: [SimpleNamespace(id=a.id, proxy_id=a.proxy_id, username=a.username)
+                      for a in session.query(InstagramAccount).filter_by(user_id=user_id).all()]
+            for user_id in (100, 101)
+        }
+        session.query(Proxy).filter_by(id=2).update({'is_active': False})
+        session.commit()
+        session.close()
+
+        user_cache = SimpleNamespace(get_active_users_safe=lambda: [100, 101])
+        with patch.object(proxy_manager, 'get_user_cache', lambda: user_cache), \
+                patch.object(proxy_manager, 'get_instagram_accounts', lambda user_id: detached[user_id]), \
+                patch.object(proxy_manager, 'ProcessingState'):
+            success, _ = proxy_manager.distribute_proxies()
+
+        self.assertTrue(success)
+        proxies = self.proxy_of_accounts()
+        self.assertTrue(all(proxies[i] == 1 for i in range(1, 5)))
+        self.assertTrue(all(proxies[i] == 3 for i in range(5, 9)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для асинхронной проверки прокси
+"""
+
+import socket
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from database.models import Proxy
+from tests import InMemoryDatabaseTestCase
+from utils.proxy_checker import AsyncProxyChecker, ProxyTarget, save_check_results
+
+
+class StandInProxyHandler(BaseHTTPRequestHandler):
+    """Локальная заглушка HTTP-прокси: отвечает 200 на любой запрос"""
+
+    delay = 0.0
+
+    def do_GET(self):
+        if self.delay:
+            time.sleep(self.delay)
+        body = b'{"origin": "127.0.0.1"}'
+        try:
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Проверка закрывает соединение, не дочитывая ответ
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInProxyServer(ThreadingHTTPServer):
+    """Заглушка с большой очередью соединений, чтобы не терять одновременные подключения"""
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def free_port():
+    """Порт, на котором гарантированно никто не слушает"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class TestAsyncProxyChecker(unittest.TestCase):
+    """Тесты для AsyncProxyChecker"""
+
+    def setUp(self):
+        StandInProxyHandler.delay = 0.0
+        self.server = StandInProxyServer(('127.0.0.1', 0), StandInProxyHandler)
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.checker = AsyncProxyChecker(check_url='http://probe.test/ip', timeout=2, concurrency=50)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_working_and_dead_proxies(self):
+        """Рабочие прокси получают задержку, мертвые - ошибку"""
+        dead_port = free_port()
+        proxies = [ProxyTarget(i, '127.0.0.1', self.port) for i in range(1, 101)]
+        proxies += [ProxyTarget(i, '127.0.0.1', dead_port) for i in range(101, 111)]
+
+        results = self.checker.check(proxies)
+
+        self.assertEqual(len(results), 110)
+        self.assertTrue(all(results[i].working for i in range(1, 101)))
+        self.assertTrue(all(results[i].latency_ms is not None for i in range(1, 101)))
+        self.assertFalse(any(results[i].working for i in range(101, 111)))
+        self.assertTrue(all(results[i].error for i in range(101, 111)))
+
+    def test_deadline_stops_check(self):
+        """По дедлайну незавершенные проверки отменяются и не попадают в результаты"""
+        StandInProxyHandler.delay = 0.5
+        checker = AsyncProxyChecker(check_url='http://probe.test/ip', timeout=5, concurrency=5)
+        proxies = [ProxyTarget(i, '127.0.0.1', self.port) for i in range(1, 51)]
+
+        started = time.time()
+        results = checker.check(proxies, deadline=0.8)
+
+        self.assertLess(time.time() - started, 2.0)
+        self.assertLess(len(results), 50)
+
+    def test_cancel_before_run_is_kept(self):
+        """Отмена до запуска не сбрасывается: проверка завершается сразу, следующая идет полностью"""
+        proxies = [ProxyTarget(i, '127.0.0.1', self.port) for i in range(1, 11)]
+
+        self.checker.cancel()
+        self.assertEqual(self.checker.check(proxies), {})
+        self.assertFalse(self.checker.cancelled)
+        self.assertEqual(len(self.checker.check(proxies)), 10)
+
+    def test_cancel_event_from_caller(self):
+        """Проверку прерывает событие отмены вызывающего кода"""
+        StandInProxyHandler.delay = 0.5
+        cancel_event = threading.Event()
+        checker = AsyncProxyChecker(check_url='http://probe.test/ip', timeout=5, concurrency=2,
+                                    cancel_event=cancel_event)
+        proxies = [ProxyTarget(i, '127.0.0.1', self.port) for i in range(1, 21)]
+        threading.Timer(0.3, cancel_event.set).start()
+
+        started = time.time()
+        results = checker.check(proxies)
+
+        self.assertLess(time.time() - started, 2.0)
+        self.assertLess(len(results), 20)
+        self.assertFalse(cancel_event.is_set())
+
+    def test_check_all_proxies_uses_caller_checker(self):
+        """check_all_proxies проверяет переданным объектом, и его отмена действует"""
+        import utils.proxy_manager as proxy_manager
+
+        proxies = [Proxy(id=1, host='127.0.0.1', port=self.port, is_active=True)]
+        self.checker.cancel()
+        with patch.object(proxy_manager, 'get_proxies', return_value=proxies), \
+                patch.object(proxy_manager, 'get_proxy_checker') as get_checker, \
+                patch.object(proxy_manager, 'save_check_results') as save:
+            self.assertEqual(proxy_manager.check_all_proxies(checker=self.checker), {})
+            self.assertEqual(proxy_manager.check_all_proxies(checker=self.checker)[1]['working'], True)
+
+        get_checker.assert_not_called()
+        self.assertEqual(save.call_count, 2)
+
+    def test_fallback_for_socks(self):
+        """socks-прокси проверяются синхронной функцией"""
+        checker = AsyncProxyChecker(check_url='http://probe.test/ip',
+                                    fallback_check=lambda proxy: (proxy.id, False, "socks недоступен"))
+        results = checker.check([ProxyTarget(1, '127.0.0.1', 1080, protocol='socks5')])
+        self.assertFalse(results[1].working)
+        self.assertEqual(results[1].error, "socks недоступен")
+
+
+class TestSaveCheckResults(InMemoryDatabaseTestCase):
+    """Тесты для пакетной записи результатов"""
+
+    def setUp(self):
+        super().setUp()
+        session = self.Session()
+        session.add_all([
+            Proxy(id=1, host='10.0.0.1', port=8080, is_active=False),
+            Proxy(id=2, host='10.0.0.2', port=8080, is_active=True, latency_ms=120.0),
+            Proxy(id=3, host='10.0.0.3', port=8080, is_active=True),
+        ])
+        session.commit()
+        session.close()
+
+    def test_bulk_update(self):
+        """Статус, время проверки и счетчики обновляются одной транзакцией"""
+        from utils.proxy_checker import ProxyCheckResult
+
+        results = {
+            1: ProxyCheckResult(1, True, latency_ms=45.0),
+            2: ProxyCheckResult(2, False, "Таймаут подключения"),
+        }
+        self.assertTrue(save_check_results(results, session_factory=self.Session))
+
+        session = self.Session()
+        proxies = {proxy.id: proxy for proxy in session.query(Proxy).all()}
+        self.assertTrue(proxies[1].is_active)
+        self.assertEqual(proxies[1].latency_ms, 45.0)
+        self.assertEqual((proxies[1].check_count, proxies[1].fail_count), (1, 0))
+        self.assertFalse(proxies[2].is_active)
+        self.assertEqual(proxies[2].latency_ms, 120.0)
+        self.assertEqual((proxies[2].check_count, proxies[2].fail_count), (1, 1))
+        self.assertIsNotNone(proxies[2].last_checked)
+        # Непроверенный прокси не трогается
+        self.assertTrue(proxies[3].is_active)
+        self.assertIsNone(proxies[3].last_checked)
+        session.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для аренды задач публикации между процессами
+"""
+
+import unittest
+from datetime import datetime, timedelta
+
+from database import db_manager
+from database.models import InstagramAccount, PublishTask, TaskStatus, TaskType
+from tests import InMemoryDatabaseTestCase
+
+
+class TestPublishTaskLease(InMemoryDatabaseTestCase):
+    """Тесты для renew_publish_task_leases и claim_interrupted_publish_tasks"""
+
+    session_modules = (db_manager,)
+
+    def setUp(self):
+        super().setUp()
+        now = datetime.now()
+        stale = now - timedelta(minutes=10)
+        session = self.Session()
+        session.add(InstagramAccount(id=1, username='account', password='secret', user_id=1))
+        rows = (
+            # Задача живого процесса (например, веб-API) - не трогается
+            (1, TaskStatus.PROCESSING, 'other', now, now),
+            # Процесс остановился и перестал продлевать аренду
+            (2, TaskStatus.PROCESSING, 'other', stale, stale),
+            # Строка без аренды, оставшаяся с прошлой версии
+            (3, TaskStatus.PROCESSING, None, None, stale),
+            # Без аренды, но только что переведена в PROCESSING
+            (4, TaskStatus.PROCESSING, None, None, now),
+            # Завершенная задача остановившегося процесса
+            (5, TaskStatus.COMPLETED, 'other', stale, stale),
+        )
+        for task_id, status, owner, heartbeat, updated_at in rows:
+            session.add(PublishTask(id=task_id, account_id=1, task_type=TaskType.PHOTO, status=status,
+                                    queue_owner=owner, queue_heartbeat=heartbeat, updated_at=updated_at))
+        session.commit()
+        session.close()
+
+    def _owner(self, task_id):
+        session = self.Session()
+        try:
+            return session.get(PublishTask, task_id).queue_owner
+        finally:
+            session.close()
+
+    def test_only_expired_leases_are_claimed(self):
+        """Забираются только задачи с истекшей арендой, повторный захват ничего не получает"""
+        claimed = db_manager.claim_interrupted_publish_tasks(lease_timeout=300)
+
+        self.assertEqual(sorted(task['id'] for task in claimed), [2, 3])
+        self.assertEqual(self._owner(2), db_manager.QUEUE_OWNER)
+        self.assertEqual(self._owner(1), 'other')
+        self.assertEqual(db_manager.claim_interrupted_publish_tasks(lease_timeout=300), [])
+
+    def test_renewed_lease_is_not_claimed(self):
+        """Продленная аренда защищает задачу от захвата другим процессом"""
+        db_manager.claim_interrupted_publish_tasks(lease_timeout=300)
+        session = self.Session()
+        session.get(PublishTask, 2).queue_heartbeat = datetime.now() - timedelta(minutes=10)
+        session.commit()
+        session.close()
+
+        self.assertEqual(db_manager.renew_publish_task_leases(), 2)
+
+        # Другой процесс с тем же сроком аренды ничего не получает
+        self.assertEqual(db_manager.claim_interrupted_publish_tasks(lease_timeout=300), [])
+
+    def test_queued_and_scheduled_tasks_get_lease(self):
+        """Постановка в очередь и захват отложенной задачи записывают аренду процесса"""
+        session = self.Session()
+        session.add(PublishTask(id=6, account_id=1, task_type=TaskType.PHOTO, status=TaskStatus.SCHEDULED,
+                                scheduled_time=datetime.now() - timedelta(minutes=1)))
+        session.add(PublishTask(id=7, account_id=1, task_type=TaskType.PHOTO, status=TaskStatus.PENDING))
+        session.commit()
+        session.close()
+
+        self.assertEqual([task.id for task in db_manager.claim_due_scheduled_tasks()], [6])
+        self.assertEqual(db_manager.mark_publish_task_queued(7), (True, None))
+        self.assertEqual((self._owner(6), self._owner(7)), (db_manager.QUEUE_OWNER, db_manager.QUEUE_OWNER))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для планировщика задач публикации
+"""
+
+import time
+import unittest
+
+from utils.publish_scheduler import PublishScheduler, TaskPriority, LatencyHistogram
+
+
+class TestPublishScheduler(unittest.TestCase):
+    """Тесты для PublishScheduler"""
+
+    def setUp(self):
+        self.scheduler = PublishScheduler()
+        self.scheduler.start()
+
+    def tearDown(self):
+        self.scheduler.close()
+
+    def test_priority_order(self):
+        """Более приоритетные задачи выдаются первыми, равные - в порядке добавления"""
+        self.scheduler.put(1, account_id=1, priority=TaskPriority.LOW)
+        self.scheduler.put(2, account_id=2, priority=TaskPriority.NORMAL)
+        self.scheduler.put(3, account_id=3, priority=TaskPriority.CRITICAL)
+        self.scheduler.put(4, account_id=4, priority=TaskPriority.NORMAL)
+
+        order = [self.scheduler.get(timeout=0.1).task_id for _ in range(4)]
+        self.assertEqual(order, [3, 2, 4, 1])
+
+    def test_delayed_task_released_by_timer(self):
+        """Отложенная задача появляется только после задержки"""
+        self.scheduler.put(1, account_id=1, delay_seconds=0.2)
+
+        self.assertIsNone(self.scheduler.get(timeout=0.05))
+        task = self.scheduler.get(timeout=1.0)
+        self.assertIsNotNone(task)
+        self.assertEqual(task.task_id, 1)
+
+    def test_account_serialization(self):
+        """Вторая задача аккаунта ждет завершения первой, другие аккаунты не блокируются"""
+        self.scheduler.put(1, account_id=10)
+        self.scheduler.put(2, account_id=10)
+        self.scheduler.put(3, account_id=20)
+
+        first = self.scheduler.get(timeout=0.1)
+        other = self.scheduler.get(timeout=0.1)
+        self.assertEqual((first.task_id, other.task_id), (1, 3))
+        self.assertIsNone(self.scheduler.get(timeout=0.05))
+
+        self.scheduler.task_done(first)
+        self.assertEqual(self.scheduler.get(timeout=0.1).task_id, 2)
+
+    def test_priority_within_account_lane(self):
+        """Внутри полосы аккаунта задачи тоже идут по приоритету"""
+        self.scheduler.put(1, account_id=10)
+        running = self.scheduler.get(timeout=0.1)
+        self.scheduler.put(2, account_id=10, priority=TaskPriority.LOW)
+        self.scheduler.put(3, account_id=10, priority=TaskPriority.HIGH)
+
+        self.scheduler.task_done(running)
+        self.assertEqual(self.scheduler.get(timeout=0.1).task_id, 3)
+
+    def test_defer_releases_account(self):
+        """Отложенная задача возвращается позже, не блокируя аккаунт"""
+        self.scheduler.put(1, account_id=10)
+        task = self.scheduler.get(timeout=0.1)
+        self.scheduler.defer(task, 0.1)
+        self.scheduler.put(2, account_id=10)
+
+        self.assertEqual(self.scheduler.get(timeout=0.05).task_id, 2)
+        self.assertEqual(self.scheduler.qsize(), 1)
+
+    def test_duplicate_and_remove(self):
+        """Повторное добавление игнорируется, задачу можно снять с очереди"""
+        self.assertTrue(self.scheduler.put(1, account_id=1, delay_seconds=10))
+        self.assertFalse(self.scheduler.put(1, account_id=1))
+        self.assertTrue(self.scheduler.remove(1))
+        self.assertEqual(self.scheduler.qsize(), 0)
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    """Тесты для LatencyHistogram"""
+
+    def test_snapshot(self):
+        """Наблюдения раскладываются по корзинам, перцентили оцениваются по границам"""
+        histogram = LatencyHistogram(buckets=(0.1, 1, 10))
+        for value in (0.05, 0.05, 0.5, 5, 50):
+            histogram.observe(value)
+
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot['count'], 5)
+        self.assertEqual(snapshot['max'], 50)
+        self.assertEqual(snapshot['p50'], 1)
+        self.assertEqual(snapshot['p99'], 50)
+        self.assertEqual(list(snapshot['buckets'].values()), [2, 1, 1, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
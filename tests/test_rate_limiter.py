@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для счетчиков скользящих окон RateLimiter
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from services import rate_limiter as rate_limiter_module
+from services.rate_limiter import ActionCounter, ActionType, RateLimiter
+from services.rate_limiter_state import get_state_settings
+
+
+class TestActionCounter(unittest.TestCase):
+    """Тесты для ActionCounter"""
+
+    def test_windows_expire(self):
+        """Действия выходят из часового окна через час, из суточного - через сутки"""
+        counter = ActionCounter()
+        start = 1_000_000 * 60
+        for i in range(5):
+            counter.append(start + i)
+        counter.append(start + 1800)
+
+        self.assertEqual(counter.counts(start + 1800), (6, 6))
+        self.assertEqual(counter.counts(start + 3600 + 120), (1, 6))
+        self.assertEqual(counter.counts(start + 86400 + 120), (0, 1))
+        self.assertEqual(counter.counts(start + 3 * 86400), (0, 0))
+        self.assertEqual(counter.last, start + 1800)
+
+    def test_out_of_order_timestamps(self):
+        """Запись задним числом учитывается только в окнах, куда она попадает"""
+        counter = ActionCounter()
+        now = 1_000_000 * 60
+        counter.append(now)
+        counter.append(now - 2 * 3600)
+        counter.append(now - 2 * 86400)
+        self.assertEqual(counter.counts(now), (1, 2))
+        self.assertEqual(counter.last, now)
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Тесты для RateLimiter"""
+
+    def setUp(self):
+        self.calls = []
+        created = {1: datetime.now() - timedelta(days=60), 2: datetime.now() - timedelta(days=10)}
+
+        def get_account(account_id):
+            self.calls.append(account_id)
+            return SimpleNamespace(created_at=created[account_id]) if account_id in created else None
+
+        patcher = patch.object(rate_limiter_module, 'get_instagram_account', get_account)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.limiter = RateLimiter()
+
+    def test_account_age_is_cached(self):
+        """Возраст аккаунта запрашивается из БД один раз, уровень лимитов по возрасту"""
+        for _ in range(5):
+            self.limiter.can_perform_action(1, ActionType.LIKE)
+        self.assertEqual(self.calls, [1])
+        self.assertEqual(self.limiter._get_limits(1)["hourly"][ActionType.LIKE], 60)
+        self.assertEqual(self.limiter._get_limits(2)["hourly"][ActionType.LIKE], 15)
+        self.assertEqual(self.limiter._get_limits(3)["hourly"][ActionType.LIKE], 10)
+
+        self.limiter.forget_account(1)
+        self.limiter._get_limits(1)
+        self.assertEqual(self.calls, [1, 2, 3, 1])
+
+    def test_hourly_limit(self):
+        """Часовой лимит считается по записанным действиям"""
+        base_time = 1_000_000 * 60
+        for i in range(5):
+            self.limiter._actions[3][ActionType.FOLLOW].append(base_time + i * 3)
+        with patch.object(rate_limiter_module.time, 'time', return_value=base_time + 60):
+            can_do, reason = self.limiter.can_perform_action(3, ActionType.FOLLOW)
+        self.assertFalse(can_do)
+        self.assertIn("часовой лимит (5/5)", reason)
+
+        with patch.object(rate_limiter_module.time, 'time', return_value=base_time + 3700 + 60):
+            self.assertEqual(self.limiter.can_perform_action(3, ActionType.FOLLOW), (True, None))
+
+    def test_concurrent_try_perform_respects_limit(self):
+        """Параллельные потоки не превышают лимит"""
+        allowed = []
+        clock = iter(range(1_000_000 * 60, 1_000_000 * 60 + 100000, 3))
+        clock_lock = threading.Lock()
+
+        def fake_time():
+            with clock_lock:
+                return next(clock)
+
+        def worker():
+            for _ in range(20):
+                if self.limiter.try_perform_action(1, ActionType.LIKE)[0]:
+                    allowed.append(1)
+
+        with patch.object(rate_limiter_module.time, 'time', fake_time):
+            threads = [threading.Thread(target=worker) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(allowed), 60)
+
+
+class TestSharedLimiterState(unittest.TestCase):
+    """Тесты для общего между процессами состояния лимитов"""
+
+    def setUp(self):
+        patcher = patch.object(rate_limiter_module, 'get_instagram_account', lambda account_id: None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'rate_limiter.sqlite')
+
+    def _limiter(self):
+        # Синхронизация только вручную, чтобы тест не зависел от фонового потока
+        limiter = RateLimiter(state_path=self.path, sync_interval=3600)
+        state = limiter._get_state()
+        self.addCleanup(state.close)
+        return limiter, state
+
+    def test_processes_share_budget(self):
+        """Действия и блокировки одного процесса учитываются в другом после синхронизации"""
+        first, first_state = self._limiter()
+        second, second_state = self._limiter()
+
+        base_time = 1_000_000 * 60
+        with patch.object(rate_limiter_module.time, 'time', side_effect=[base_time + i * 3 for i in range(10)]):
+            for _ in range(10):
+                first.record_action(7, ActionType.LIKE)
+        first.block_action(7, ActionType.POST, 600)
+        self.assertTrue(first_state.sync())
+        self.assertEqual(first_state.get_stats()['written_rows'], 1)
+
+        second_state.sync()
+        with patch.object(rate_limiter_module.time, 'time', return_value=base_time + 60):
+            can_do, reason = second.can_perform_action(7, ActionType.LIKE)
+        self.assertFalse(can_do)
+        self.assertIn("часовой лимит (10/10)", reason)
+        self.assertIn("заблокировано", second.can_perform_action(7, ActionType.POST)[1])
+
+        # Свои строки не учитываются повторно
+        first_state.sync()
+        self.assertEqual(first._actions[7][ActionType.LIKE].counts(base_time + 60), (10, 10))
+
+    def test_counts_survive_restart(self):
+        """Перезапущенный процесс загружает счетчики за последние сутки"""
+        limiter, state = self._limiter()
+        limiter.record_action(7, ActionType.FOLLOW)
+        limiter.record_action(7, ActionType.FOLLOW)
+        state.close()
+
+        restarted, _ = self._limiter()
+        self.assertEqual(restarted.get_action_stats(7)["daily"]["follow"], 2)
+
+    def test_sync_interval_bounded_by_action_interval(self):
+        """Интервал синхронизации из config.py не больше интервала между действиями"""
+        config = SimpleNamespace(RATE_LIMITER_STATE_PATH=self.path, RATE_LIMITER_SYNC_INTERVAL=30)
+        with patch.dict(sys.modules, {'config': config}):
+            self.assertEqual(get_state_settings(), (self.path, rate_limiter_module.MIN_ACTION_INTERVAL / 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
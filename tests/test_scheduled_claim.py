@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для захвата наступивших отложенных публикаций
+"""
+
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from database import db_manager
+from database.models import InstagramAccount, PublishTask, TaskStatus, TaskType
+from tests import InMemoryDatabaseTestCase
+
+
+class TestScheduledTaskClaim(InMemoryDatabaseTestCase):
+    """Тесты для claim_due_scheduled_tasks и get_next_scheduled_time"""
+
+    session_modules = (db_manager,)
+
+    def setUp(self):
+        super().setUp()
+
+        self.now = datetime(2025, 1, 1, 12, 0)
+        session = self.Session()
+        session.add(InstagramAccount(id=1, username='account', password='secret', user_id=1))
+        for task_id, minutes, status in ((1, -5, TaskStatus.SCHEDULED), (2, -1, TaskStatus.PENDING),
+                                         (3, 30, TaskStatus.SCHEDULED), (4, -10, TaskStatus.COMPLETED),
+                                         (5, 10, TaskStatus.SCHEDULED)):
+            session.add(PublishTask(id=task_id, account_id=1, task_type=TaskType.PHOTO, status=status,
+                                    scheduled_time=self.now + timedelta(minutes=minutes)))
+        session.commit()
+        session.close()
+
+    def _status(self, task_id):
+        session = self.Session()
+        try:
+            return session.get(PublishTask, task_id).status
+        finally:
+            session.close()
+
+    def test_claims_only_due_tasks_once(self):
+        """Захватываются только наступившие задачи, повторный захват ничего не получает"""
+        statements = self.record_statements()
+
+        tasks = db_manager.claim_due_scheduled_tasks(self.now)
+        self.assertEqual([task.id for task in tasks], [1, 2])
+        self.assertEqual(tasks[0].account.username, 'account')
+        self.assertEqual(self._status(1), TaskStatus.PROCESSING)
+        self.assertEqual(self._status(3), TaskStatus.SCHEDULED)
+        self.assertEqual(len([s for s in statements if s.startswith('UPDATE')]), 1)
+
+        self.assertEqual(db_manager.claim_due_scheduled_tasks(self.now), [])
+
+    def test_next_scheduled_time(self):
+        """Ближайший срок считается только по ожидающим задачам"""
+        db_manager.claim_due_scheduled_tasks(self.now)
+        self.assertEqual(db_manager.get_next_scheduled_time(), self.now + timedelta(minutes=10))
+
+        db_manager.claim_due_scheduled_tasks(self.now + timedelta(hours=1))
+        self.assertIsNone(db_manager.get_next_scheduled_time())
+
+    def test_failed_claim_backs_off(self):
+        """Если наступившие задачи забрать не удалось, планировщик не крутится без паузы"""
+        from utils import scheduler
+
+        with patch.object(scheduler, 'claim_due_scheduled_tasks', return_value=[]):
+            self.assertEqual(scheduler.check_scheduled_tasks(), scheduler.MIN_SCHEDULER_SLEEP)
+
+    def test_claimed_tasks_are_queued(self):
+        """Забранные задачи уходят в очередь, сон - до ближайшего срока"""
+        from utils import scheduler
+
+        bot = object()
+        with patch.object(scheduler, 'add_task_to_queue') as add_task, \
+                patch.object(scheduler.datetime, 'datetime', wraps=datetime) as fake_datetime:
+            fake_datetime.now.return_value = self.now
+            self.assertEqual(scheduler.check_scheduled_tasks(bot), scheduler.MAX_SCHEDULER_SLEEP)
+
+        self.assertEqual(sorted(call.args[0] for call in add_task.call_args_list), [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
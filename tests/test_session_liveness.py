@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для кэша живости сессий Instagram
+"""
+
+import time
+import unittest
+from unittest.mock import Mock
+
+from instagram.session_liveness import SessionLivenessTracker, LivenessConfig
+
+
+class TestSessionLivenessTracker(unittest.TestCase):
+    """Тесты для SessionLivenessTracker"""
+
+    def setUp(self):
+        self.tracker = SessionLivenessTracker(LivenessConfig(freshness_window=60, probe_workers=2))
+
+    def test_fresh_session_skips_probe(self):
+        """Свежая сессия возвращается без запроса к Instagram"""
+        client = Mock()
+        self.tracker.bind_client(client, 1)
+
+        self.assertTrue(self.tracker.ensure_alive(1, client))
+        client.account_info.assert_not_called()
+        self.assertEqual(self.tracker.get_stats()['hits'], 1)
+
+    def test_stale_session_is_probed(self):
+        """Устаревшая сессия проверяется дешевым запросом"""
+        client = Mock()
+        self.tracker.mark_alive(1, time.time() - 120)
+
+        self.assertTrue(self.tracker.ensure_alive(1, client))
+        client.account_info.assert_called_once()
+        self.assertTrue(self.tracker.is_fresh(1))
+        self.assertEqual(self.tracker.get_stats()['probes'], 1)
+
+    def test_failed_probe_marks_dead(self):
+        """Неудачная проверка сбрасывает отметку живости"""
+        client = Mock()
+        client.account_info.side_effect = Exception("login_required")
+
+        self.assertFalse(self.tracker.ensure_alive(1, client))
+        self.assertFalse(self.tracker.is_fresh(1))
+        self.assertEqual(self.tracker.get_stats()['probe_failures'], 1)
+
+    def test_record_request_refreshes_bound_client(self):
+        """Успешный приватный запрос продлевает окно свежести"""
+        client = Mock()
+        self.tracker.bind_client(client, 7)
+        self.tracker.mark_alive(7, time.time() - 120)
+
+        self.tracker.record_request(client)
+        self.assertTrue(self.tracker.is_fresh(7))
+
+    def test_probe_stale_only_checks_stale(self):
+        """Пакетная проверка затрагивает только устаревшие сессии"""
+        fresh, stale, dead = Mock(), Mock(), Mock()
+        dead.account_info.side_effect = Exception("dead")
+        self.tracker.mark_alive(1)
+        dead_ids = []
+
+        results = self.tracker.probe_stale({1: fresh, 2: stale, 3: dead}, on_dead=dead_ids.append)
+
+        self.assertEqual(results, {2: True, 3: False})
+        fresh.account_info.assert_not_called()
+        self.assertEqual(dead_ids, [3])
+
+
+if __name__ == '__main__':
+    unittest.main()
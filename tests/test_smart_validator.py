@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для ожидания проверки аккаунтов в SmartValidatorService
+"""
+
+import asyncio
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+from database.models import AccountValidationState
+from tests import InMemoryDatabaseTestCase
+from utils import smart_validator_service
+from utils.smart_validator_service import (
+    AccountStatus, SmartValidatorService, ValidationPriority,
+    validate_before_use, validate_before_use_async
+)
+
+
+class TestValidationFutures(unittest.TestCase):
+    """Тесты для Future проверки аккаунта"""
+
+    def setUp(self):
+        self.service = SmartValidatorService()
+        session = MagicMock()
+        session.query.return_value.filter_by.return_value.first.side_effect = \
+            lambda: SimpleNamespace(id=1, username='account')
+        for target, value in (('get_smart_validator', lambda: self.service),
+                              ('get_session', lambda: session),
+                              ('update_instagram_account', MagicMock())):
+            patcher = patch.object(smart_validator_service, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch.object(smart_validator_service.random, 'uniform', return_value=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _run_check(self, account_id, is_valid=True, delay=0.0):
+        """Выполнить проверку из очереди так же, как _check_worker"""
+        def run():
+            time.sleep(delay)
+            priority, queued_id = self.service.check_queue.get(timeout=5)
+            self.assertEqual(queued_id, account_id)
+            with self.service._status_lock:
+                self.service._queued_checks.discard(account_id)
+                self.service.active_checks.add(account_id)
+            with patch.object(self.service, '_quick_check', return_value=is_valid):
+                self.service._check_account(account_id)
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread
+
+    def test_concurrent_requests_share_one_check(self):
+        """Повторные запросы получают тот же Future, повышение приоритета не дублирует проверку"""
+        first = self.service.request_validation(1, ValidationPriority.LOW)
+        second = self.service.request_validation(1, ValidationPriority.LOW)
+        self.assertIs(first, second)
+        self.assertEqual(self.service.check_queue.qsize(), 1)
+
+        self.assertIs(self.service.request_validation(1, ValidationPriority.CRITICAL), first)
+        self.assertEqual(self.service.check_queue.get_nowait(), (ValidationPriority.CRITICAL.value, 1))
+        self.assertEqual(self.service.get_stats()['pending_checks'], 1)
+
+        self._run_check(1, is_valid=True).join()
+        self.assertEqual(first.result(timeout=1), AccountStatus.VALID)
+        self.assertIsNone(self.service.get_pending_check(1))
+
+    def test_critical_waiter_wakes_on_result(self):
+        """Ожидающий просыпается сразу по завершении проверки, без опроса раз в секунду"""
+        thread = self._run_check(1, is_valid=True, delay=0.05)
+        started = time.monotonic()
+        self.assertTrue(validate_before_use(1, ValidationPriority.CRITICAL))
+        self.assertLess(time.monotonic() - started, 0.9)
+        thread.join()
+
+    def test_invalid_account_waits_for_recovery(self):
+        """Невалидный аккаунт: Future завершается результатом восстановления"""
+        future = self.service.request_validation(1, ValidationPriority.HIGH)
+        self._run_check(1, is_valid=False).join()
+        self.assertFalse(future.done())
+        self.assertEqual(self.service.recovery_queue.qsize(), 1)
+
+        with patch.object(self.service, '_attempt_recovery', return_value=False):
+            self.service._recover_account(1)
+        self.assertEqual(future.result(timeout=1), AccountStatus.COOLDOWN)
+
+    def test_async_variant(self):
+        """Асинхронный вариант ждет Future, не блокируя цикл событий"""
+        async def scenario():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0.01)
+
+            ticker_task = asyncio.create_task(ticker())
+            thread = self._run_check(1, is_valid=True, delay=0.1)
+            result = await validate_before_use_async(1, ValidationPriority.CRITICAL)
+            ticker_task.cancel()
+            thread.join()
+            return result, ticks
+
+        result, ticks = asyncio.run(scenario())
+        self.assertTrue(result)
+        self.assertGreater(ticks, 3)
+
+
+class TestValidationStatePersistence(InMemoryDatabaseTestCase):
+    """Тесты для сохранения состояния проверок между перезапусками"""
+
+    session_modules = (smart_validator_service,)
+
+    def _settle(self, service, account_id, status, **fields):
+        service.account_statuses[account_id] = smart_validator_service.ValidationTask(
+            account_id=account_id, priority=ValidationPriority.LOW, status=status, **fields
+        )
+        service._settle(account_id, status)
+
+    def test_state_survives_restart(self):
+        """Итоговые статусы пишутся одной транзакцией и загружаются новым экземпляром"""
+        service = SmartValidatorService()
+        checked = datetime.now() - timedelta(minutes=5)
+        cooldown_end = datetime.now() + timedelta(hours=6)
+        self._settle(service, 1, AccountStatus.VALID, last_check=checked)
+        self._settle(service, 2, AccountStatus.COOLDOWN, retry_count=1, last_check=checked, next_check=cooldown_end)
+        self._settle(service, 3, AccountStatus.CHECKING)
+
+        commits = self.record_commits()
+        self.assertTrue(service.flush_state())
+        self.assertEqual(len(commits), 1)
+
+        # Повторный результат обновляет строку
+        service.account_statuses[1].status = AccountStatus.INVALID
+        service._settle(1, AccountStatus.INVALID)
+        service.flush_state()
+
+        restarted = SmartValidatorService()
+        self.assertEqual(restarted.load_state(), 2)
+        self.assertEqual(restarted.get_account_status(1), AccountStatus.INVALID)
+        self.assertEqual(restarted.account_statuses[1].last_check, checked)
+        self.assertIsNone(restarted.get_account_status(3))
+
+        # Аккаунт в cooldown не проверяется заново сразу после перезапуска
+        future = restarted.request_validation(2, ValidationPriority.CRITICAL)
+        self.assertEqual(future.result(timeout=0), AccountStatus.COOLDOWN)
+        self.assertEqual(restarted.check_queue.qsize(), 0)
+
+        session = self.Session()
+        self.assertEqual(session.query(AccountValidationState).count(), 2)
+        session.close()
+
+    def test_periodic_requests_are_staggered(self):
+        """Плановые проверки растягиваются до следующего цикла"""
+        service = SmartValidatorService()
+        service.is_running = True
+        requested = []
+        with patch.object(service, 'request_validation', side_effect=lambda account_id, priority: requested.append(
+                (round(time.monotonic() - started, 2), account_id))):
+            started = time.monotonic()
+            service._stagger_requests([1, 2, 3, 4], started + 0.2)
+
+        self.assertEqual([account_id for _, account_id in requested], [1, 2, 3, 4])
+        self.assertGreaterEqual(requested[-1][0], 0.14)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для буфера статусов задач публикации
+"""
+
+import unittest
+
+from database.models import PublishTask, TaskStatus, TaskType
+from database.status_buffer import PublishStatusBuffer
+from tests import InMemoryDatabaseTestCase
+
+
+class TestPublishStatusBuffer(InMemoryDatabaseTestCase):
+    """Тесты для PublishStatusBuffer"""
+
+    def setUp(self):
+        super().setUp()
+
+        session = self.Session()
+        for task_id in (1, 2, 3):
+            session.add(PublishTask(id=task_id, account_id=1, task_type=TaskType.PHOTO, status=TaskStatus.PENDING))
+        session.commit()
+        session.close()
+
+        self.commits = self.record_commits()
+
+        self.buffer = PublishStatusBuffer(session_factory=self.Session, flush_interval=10, max_rows=100)
+        self.buffer.start()
+
+    def tearDown(self):
+        self.buffer.close()
+
+    def _status(self, task_id):
+        session = self.Session()
+        task = session.get(PublishTask, task_id)
+        session.close()
+        return task
+
+    def test_non_terminal_updates_are_buffered(self):
+        """Нефинальные статусы копятся в памяти и пишутся одним коммитом"""
+        for task_id in (1, 2, 3):
+            self.buffer.update(task_id, TaskStatus.PROCESSING)
+        self.assertEqual(self._status(1).status, TaskStatus.PENDING)
+
+        self.buffer.flush()
+        self.assertEqual(len(self.commits), 1)
+        self.assertEqual(self._status(3).status, TaskStatus.PROCESSING)
+
+    def test_terminal_update_waits_for_write(self):
+        """Финальный статус записывается до возврата вместе с накопленными"""
+        self.buffer.update(1, TaskStatus.PROCESSING)
+        self.buffer.update(2, TaskStatus.PROCESSING)
+        self.assertTrue(self.buffer.update(2, TaskStatus.COMPLETED, media_id="abc"))
+
+        task = self._status(2)
+        self.assertEqual(task.status, TaskStatus.COMPLETED)
+        self.assertEqual(task.media_id, "abc")
+        self.assertIsNotNone(task.completed_time)
+        self.assertIn("abc", task.options)
+        self.assertEqual(self._status(1).status, TaskStatus.PROCESSING)
+        self.assertEqual(self.buffer.get_stats()['coalesced'], 1)
+
+    def test_close_flushes_pending(self):
+        """При остановке буфер сбрасывается"""
+        self.buffer.update(3, TaskStatus.FAILED, error_message="boom", wait=False)
+        self.buffer.close()
+
+        task = self._status(3)
+        self.assertEqual(task.status, TaskStatus.FAILED)
+        self.assertEqual(task.error_message, "boom")
+
+
+if __name__ == '__main__':
+    unittest.main()
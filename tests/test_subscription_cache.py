@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для кэша решений о доступе по подписке
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from admin_bot.models.user import SubscriptionPlan
+from admin_bot.services.user_service import UserService
+from admin_bot.services.user_store import UserStore
+from utils.subscription_service import SubscriptionService
+
+
+class TestAccessDecisionCache(unittest.TestCase):
+    """Тесты для кэширования check_user_access"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.json_path = os.path.join(self.tmp, 'users.json')
+        self.user_service = UserService(data_file=self.json_path)
+        self.user_service.create_user(1, 'client')
+        self.user_service.set_user_subscription(1, SubscriptionPlan.SUBSCRIPTION_30_DAYS)
+        self.service = SubscriptionService(cache_ttl=60, user_service=self.user_service)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_repeated_checks_hit_cache(self):
+        """Повторная проверка не читает пользователя из хранилища"""
+        self.assertTrue(self.service.check_user_access(1)['has_access'])
+        with patch.object(self.user_service, 'get_user', side_effect=AssertionError("чтение из хранилища")):
+            for _ in range(5):
+                self.assertTrue(self.service.check_user_access(1)['has_access'])
+
+        stats = self.service.get_cache_stats()
+        self.assertEqual(stats['hits'], 5)
+        self.assertEqual(stats['misses'], 1)
+        self.assertAlmostEqual(stats['hit_rate'], 5 / 6, places=3)
+
+    def test_admin_changes_invalidate(self):
+        """Блокировка и смена плана сразу меняют решение"""
+        self.assertTrue(self.service.check_user_access(1)['has_access'])
+
+        self.user_service.block_user(1)
+        self.assertEqual(self.service.check_user_access(1)['status'], 'blocked')
+
+        self.user_service.unblock_user(1)
+        self.user_service.set_user_subscription(1, SubscriptionPlan.FREE_TRIAL_3_DAYS)
+        access_info = self.service.check_user_access(1)
+        self.assertTrue(access_info['has_access'])
+        self.assertTrue(access_info['is_trial'])
+
+    def test_change_from_other_process_applied_once_per_ttl(self):
+        """Изменение пользователя другим процессом сбрасывает его решение при синхронизации раз в TTL"""
+        self.assertTrue(self.service.check_user_access(1)['has_access'])
+
+        other = UserStore(self.user_service.db_file)
+        self.addCleanup(other.close)
+        user_data = other.get(1)
+        user_data['status'] = 'blocked'
+        other.put(user_data)
+
+        with patch.object(self.user_service.store, 'changes_since', wraps=self.user_service.store.changes_since) as changes:
+            self.assertTrue(self.service.check_user_access(1)['has_access'])
+            changes.assert_not_called()
+
+            self.service.access_cache._next_sync = 0
+            self.assertEqual(self.service.check_user_access(1)['status'], 'blocked')
+            self.assertEqual(changes.call_count, 1)
+        self.assertEqual(self.service.get_cache_stats()['invalidations'], 1)
+
+    def test_activity_from_other_process_keeps_cache(self):
+        """Отметки активности другого процесса не сбрасывают кэш"""
+        self.assertTrue(self.service.check_user_access(1)['has_access'])
+
+        other = UserStore(self.user_service.db_file)
+        self.addCleanup(other.close)
+        other.touch(1)
+
+        self.service.access_cache._next_sync = 0
+        with patch.object(self.user_service, 'get_user', side_effect=AssertionError("чтение из хранилища")):
+            self.assertTrue(self.service.check_user_access(1)['has_access'])
+
+    def test_unknown_user_cached_until_created(self):
+        """Незарегистрированный пользователь кэшируется до создания"""
+        self.assertEqual(self.service.check_user_access(2)['status'], 'not_registered')
+        self.service.create_trial_user(2, 'newbie')
+        self.assertTrue(self.service.check_user_access(2)['has_access'])
+
+
+if __name__ == '__main__':
+    unittest.main()
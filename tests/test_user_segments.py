@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для индекса сегментов получателей рассылок
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from admin_bot.models.user import User, SubscriptionPlan
+from admin_bot.services import user_store
+from admin_bot.services.user_segments import RecipientSegmentIndex
+from admin_bot.services.user_store import UserStore
+
+
+class TestRecipientSegmentIndex(unittest.TestCase):
+    """Тесты для RecipientSegmentIndex"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.db_path = os.path.join(self.tmp, 'users.db')
+        self.store = UserStore(self.db_path)
+        self.now = datetime.now()
+
+        users = []
+        for telegram_id, plan, days_left, blocked in (
+                (1, SubscriptionPlan.FREE_TRIAL_3_DAYS, 2, False),
+                (2, SubscriptionPlan.SUBSCRIPTION_30_DAYS, 20, False),
+                (3, SubscriptionPlan.SUBSCRIPTION_30_DAYS, 6, True),
+                (4, SubscriptionPlan.SUBSCRIPTION_90_DAYS, -3, False),
+                (5, SubscriptionPlan.SUBSCRIPTION_LIFETIME, None, False),
+                (6, SubscriptionPlan.SUBSCRIPTION_LIFETIME, None, True),
+                (7, None, None, False)):
+            user = User(telegram_id)
+            if plan:
+                user.set_subscription(plan)
+            if days_left is not None:
+                user.subscription_end = self.now + timedelta(days=days_left, hours=1)
+            if blocked:
+                user.block_user()
+            users.append(user.to_dict())
+        self.store.put_many(users)
+        self.index = RecipientSegmentIndex(self.store)
+
+    def _segment(self, segment):
+        return sorted(self.index.get_recipients(segment, now=self.now))
+
+    def test_segments(self):
+        """Сегменты совпадают с прежней фильтрацией рассылок"""
+        self.assertEqual(self._segment('all'), [1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual(self._segment('active'), [1, 2, 5])
+        self.assertEqual(self._segment('trial'), [1, 7])
+        self.assertEqual(self._segment('free'), [1])
+        self.assertEqual(self._segment('premium'), [])
+        self.assertEqual(self._segment('expiring'), [1, 3])
+
+    def test_changes_from_other_process_applied_incrementally(self):
+        """Изменения другого процесса применяются без повторного чтения всех пользователей"""
+        self._segment('all')
+
+        admin_store = UserStore(self.db_path)
+        user = User(8)
+        user.set_subscription(SubscriptionPlan.FREE_TRIAL_7_DAYS)
+        admin_store.put(user.to_dict())
+        admin_store.delete(5)
+        blocked = User.from_dict(admin_store.get(2))
+        blocked.block_user()
+        admin_store.put(blocked.to_dict())
+
+        with patch.object(self.store, 'all', side_effect=AssertionError("полный перебор")):
+            self.assertEqual(self._segment('active'), [1, 8])
+            self.assertEqual(self._segment('expiring'), [1, 3, 8])
+        self.assertEqual(self.index.get_stats()['rebuilds'], 1)
+        self.assertEqual(self.index.get_stats()['applied_changes'], 3)
+
+    def test_rebuild_after_journal_pruned(self):
+        """Если журнал отрезан дальше прочитанного места, индекс строится заново"""
+        self._segment('all')
+        with patch.object(user_store, 'CHANGES_KEEP', 1):
+            for telegram_id in (20, 21, 22):
+                self.store.put(User(telegram_id).to_dict())
+        self.assertEqual(self._segment('all'), [1, 2, 3, 4, 5, 6, 7, 20, 21, 22])
+        self.assertEqual(self.index.get_stats()['rebuilds'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для хранилища пользователей админ-бота
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from admin_bot.models.user import User, SubscriptionPlan, UserStatus
+from admin_bot.services.user_service import UserService
+from admin_bot.services.user_store import UserStore
+
+
+class TestUserStore(unittest.TestCase):
+    """Тесты для UserStore и UserService"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.json_path = os.path.join(self.tmp, 'users.json')
+        self.db_path = os.path.join(self.tmp, 'users.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _db_activity(self, telegram_id):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return conn.execute("SELECT last_activity FROM users WHERE telegram_id = ?", (telegram_id,)).fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_legacy_json_imported_once(self):
+        """Пользователи из users.json переносятся один раз"""
+        user = User(1, 'legacy')
+        user.set_subscription(SubscriptionPlan.SUBSCRIPTION_30_DAYS)
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'1': user.to_dict()}, f)
+
+        store = UserStore(self.db_path, legacy_json=self.json_path)
+        self.assertEqual(store.get(1)['username'], 'legacy')
+        store.delete(1)
+        store.close()
+
+        # Удаленный пользователь не возвращается из старого файла
+        store = UserStore(self.db_path, legacy_json=self.json_path)
+        self.assertIsNone(store.get(1))
+        store.close()
+
+    def test_activity_is_buffered_and_coalesced(self):
+        """Отметки активности копятся в памяти и пишутся одним сбросом"""
+        store = UserStore(self.db_path, flush_interval=60)
+        store.start()
+        store.put(User(7, 'active').to_dict())
+        before = self._db_activity(7)
+
+        later = datetime.now() + timedelta(minutes=5)
+        for seconds in range(10):
+            store.touch(7, later + timedelta(seconds=seconds))
+        self.assertEqual(self._db_activity(7), before)
+        # Чтение видит еще не записанную отметку
+        self.assertEqual(store.get(7)['last_activity'], (later + timedelta(seconds=9)).isoformat())
+
+        store.flush()
+        stats = store.get_stats()
+        self.assertEqual(stats['flushes'], 1)
+        self.assertEqual(stats['rows_written'], 1)
+        self.assertEqual(stats['coalesced'], 9)
+        self.assertEqual(self._db_activity(7), (later + timedelta(seconds=9)).isoformat())
+        store.close()
+
+    def test_older_update_keeps_newer_activity(self):
+        """Сохранение пользователя не откатывает более позднюю активность"""
+        store = UserStore(self.db_path)
+        user = User(3, 'admin_edit')
+        later = datetime.now() + timedelta(hours=1)
+        store.put(user.to_dict())
+        store.touch(3, later)
+        store.flush()
+
+        user.status = UserStatus.BLOCKED
+        store.put(user.to_dict())
+        self.assertEqual(store.get(3)['status'], 'blocked')
+        self.assertEqual(store.get(3)['last_activity'], later.isoformat())
+        store.close()
+
+    def test_user_service_roundtrip(self):
+        """UserService читает и пишет пользователей по одному"""
+        service = UserService(data_file=self.json_path)
+        service.create_user(42, 'client')
+        self.assertTrue(service.set_user_subscription(42, SubscriptionPlan.SUBSCRIPTION_30_DAYS))
+        service.update_user_activity(42)
+        service.save_users()
+
+        other = UserService(data_file=self.json_path)
+        user = other.get_user(42)
+        self.assertEqual(user.subscription_plan, SubscriptionPlan.SUBSCRIPTION_30_DAYS)
+        self.assertEqual(user.status, UserStatus.ACTIVE)
+        self.assertEqual([u.telegram_id for u in other.get_all_users()], [42])
+        self.assertTrue(other.delete_user(42))
+        self.assertIsNone(service.get_user(42))
+        self.assertFalse(os.path.exists(self.json_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для потоковой уникализации видео
+"""
+
+import os
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+from utils.video_uniquifier import (
+    VideoUniquifyParams, FrameTransformer, build_color_lut, get_ffmpeg_exe,
+    transcode_ffmpeg, transcode_ffmpeg_many, transcode_opencv, transcode_opencv_many
+)
+
+
+def write_numbered_video(path, frames, width=64, height=48, fps=30):
+    """Видео, где яркость кадра равна его номеру * 10"""
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    for i in range(frames):
+        out.write(np.full((height, width, 3), i * 10, dtype=np.uint8))
+    out.release()
+
+
+def read_frames(path):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+class TestFrameTransformer(unittest.TestCase):
+    """Тесты для LUT-цветокоррекции"""
+
+    def test_lut_matches_convert_scale_abs(self):
+        """Таблица дает тот же результат, что и cv2.convertScaleAbs"""
+        frame = np.random.RandomState(0).randint(0, 256, (32, 32, 3), dtype=np.uint8)
+        for contrast, brightness in ((0.9, -10), (1.1, 10), (1.05, -3.7)):
+            expected = cv2.convertScaleAbs(frame, alpha=contrast, beta=brightness)
+            actual = cv2.LUT(frame, build_color_lut(contrast, brightness))
+            self.assertLessEqual(int(np.abs(expected.astype(int) - actual).max()), 1)
+
+    def test_saturation_keeps_gray(self):
+        """Насыщенность не меняет серые пиксели и усиливает цветные"""
+        params = VideoUniquifyParams(saturation=1.1)
+        transformer = FrameTransformer(params, (2, 1))
+        frame = np.array([[[100, 100, 100], [50, 100, 200]]], dtype=np.uint8)
+
+        result = transformer(frame.copy())
+
+        self.assertTrue(np.array_equal(result[0, 0], frame[0, 0]))
+        self.assertGreater(int(result[0, 1].max()) - int(result[0, 1].min()), 150)
+
+
+class TestTranscode(unittest.TestCase):
+    """Тесты для бэкендов перекодирования"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmp.name, 'source.mp4')
+        write_numbered_video(self.source, 20)
+        self.params = VideoUniquifyParams(scale=1.02, speed_factor=1.04)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_opencv_pipeline_keeps_frame_order(self):
+        """Конвейер сохраняет все кадры в исходном порядке"""
+        output = os.path.join(self.tmp.name, 'opencv.mp4')
+        stats = transcode_opencv(self.source, output, self.params, workers=3, max_in_flight=4)
+
+        self.assertEqual(stats.frames, 20)
+        frames = read_frames(output)
+        self.assertEqual(len(frames), 20)
+        self.assertEqual(frames[0].shape[:2], (48, 64))
+        brightness = [float(frame.mean()) for frame in frames]
+        self.assertEqual(brightness, sorted(brightness))
+
+    @unittest.skipUnless(get_ffmpeg_exe(), "imageio-ffmpeg не установлен")
+    def test_ffmpeg_backend(self):
+        """ffmpeg не теряет кадры при изменении скорости"""
+        output = os.path.join(self.tmp.name, 'ffmpeg.mp4')
+        stats = transcode_ffmpeg(self.source, output, self.params, metadata={'comment': 'test'})
+
+        self.assertEqual(stats.frames, 20)
+        self.assertEqual(len(read_frames(output)), 20)
+
+    def test_opencv_many_variants(self):
+        """Несколько вариантов за одно декодирование получают свои размеры"""
+        outputs = [os.path.join(self.tmp.name, f'variant_{i}.mp4') for i in range(3)]
+        params_list = [VideoUniquifyParams(scale=scale) for scale in (0.98, 1.0, 1.02)]
+
+        stats = transcode_opencv_many(self.source, outputs, params_list, workers=2)
+
+        self.assertEqual(stats.frames, 20)
+        widths = [read_frames(path)[0].shape[1] for path in outputs]
+        self.assertEqual(widths, [62, 64, 64])
+
+    def test_opencv_many_variants_in_passes(self):
+        """Вариантов больше лимита прохода - исходник декодируется несколько раз"""
+        outputs = [os.path.join(self.tmp.name, f'variant_{i}.mp4') for i in range(5)]
+        params_list = [VideoUniquifyParams(scale=1.0)] * 5
+
+        stats = transcode_opencv_many(self.source, outputs, params_list, workers=2, outputs_per_pass=2)
+
+        self.assertEqual(stats.frames, 60)
+        self.assertTrue(all(len(read_frames(path)) == 20 for path in outputs))
+
+    @unittest.skipUnless(get_ffmpeg_exe(), "imageio-ffmpeg не установлен")
+    def test_ffmpeg_many_variants(self):
+        """ffmpeg пишет все варианты одним процессом"""
+        outputs = [os.path.join(self.tmp.name, f'variant_{i}.mp4') for i in range(3)]
+        # Коэффициенты, при которых последний кадр раньше терялся
+        params_list = [VideoUniquifyParams(scale=1.0184, speed_factor=speed, brightness=2.0, contrast=1.0864)
+                       for speed in (0.9819, 1.04, 0.9570)]
+
+        transcode_ffmpeg_many(self.source, outputs, params_list, [{'comment': str(i)} for i in range(3)])
+
+        self.assertTrue(all(len(read_frames(path)) == 20 for path in outputs))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,7 @@ import json
 import os
 import time
 import logging
+import threading
 from typing import List, Set, Dict, Optional
 from datetime import datetime
 from admin_bot.models.user import User, UserStatus
@@ -359,28 +360,8 @@ def delete_user_completely(telegram_id: int) -> bool:
         user = access_manager.user_service.get_user(telegram_id)
         if user:
             access_manager.user_service.delete_user(telegram_id)
-            access_manager.user_service.save_users()  # Важно сохранить изменения
             logger.info(f"Пользователь {telegram_id} полностью удален из базы данных")
         
-        # ДОПОЛНИТЕЛЬНО: Удаляем из файла admin_bot/data/users.json напрямую
-        try:
-            users_file = "admin_bot/data/users.json"
-            if os.path.exists(users_file):
-                import json
-                with open(users_file, 'r', encoding='utf-8') as f:
-                    users_data = json.load(f)
-                
-                user_key = str(telegram_id)
-                if user_key in users_data:
-                    del users_data[user_key]
-                    
-                    with open(users_file, 'w', encoding='utf-8') as f:
-                        json.dump(users_data, f, ensure_ascii=False, indent=2)
-                    
-                    logger.info(f"Пользователь {telegram_id} удален из файла users.json")
-        except Exception as e:
-            logger.error(f"Ошибка удаления из файла users.json: {e}")
-        
         # Дополнительно удаляем из shared cache напрямую ДО синхронизации
         try:
             cache_file = "data/shared_access_cache.json"
@@ -443,8 +424,61 @@ except ImportError:
         USE_FILE_SYNC = False
         print("🔴 Fallback на старую систему синхронизации")
 
+# ОБЩИЙ СНИМОК ДОСТУПОВ (utils/access_snapshot.py)
+# Изменения доступов публикуются в mmap-снимок, проверки во всех процессах идут по нему
+from utils.access_snapshot import has_access_snapshot, publish_access_snapshot
+
+_snapshot_bootstrap_lock = threading.Lock()
+_snapshot_bootstrapped = False
+
+def _current_access_records():
+    """Пары (telegram_id, данные доступа) из активной системы синхронизации"""
+    if USE_REDIS_SYNC:
+        redis_sync = get_redis_sync()
+        records = redis_sync.redis_client.hgetall(redis_sync.ACCESS_KEY)
+        for user_key, raw_data in records.items():
+            if isinstance(user_key, bytes):
+                user_key = user_key.decode('utf-8')
+            try:
+                yield user_key, json.loads(raw_data)
+            except (TypeError, ValueError):
+                continue
+    elif USE_FILE_SYNC:
+        from file_access_sync import get_file_sync
+        yield from get_file_sync()._load_from_file().items()
+    else:
+        yield from get_access_manager().get_all_users().items()
+
+def publish_access_changes() -> bool:
+    """Публикует снимок доступов после изменения (вызывается из add/remove)"""
+    global _snapshot_bootstrapped
+    try:
+        publish_access_snapshot(_current_access_records())
+        _snapshot_bootstrapped = True
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка публикации снимка доступов: {e}")
+        return False
+
+def _bootstrap_snapshot():
+    """Публикует первый снимок, если его еще никто не опубликовал"""
+    global _snapshot_bootstrapped
+    with _snapshot_bootstrap_lock:
+        if not _snapshot_bootstrapped:
+            _snapshot_bootstrapped = True
+            publish_access_changes()
+
 def has_access(telegram_id: int) -> bool:
-    """Проверяет доступ пользователя (ТОЛЬКО Redis система)"""
+    """Проверяет доступ пользователя (по общему снимку, Redis - пока снимка нет)"""
+    result = has_access_snapshot(telegram_id)
+    if result is not None:
+        return result
+    
+    _bootstrap_snapshot()
+    result = has_access_snapshot(telegram_id)
+    if result is not None:
+        return result
+    
     if USE_REDIS_SYNC:
         result = has_access_redis(telegram_id)
         print(f"🔍 Redis проверка доступа {telegram_id}: {result}")
@@ -454,7 +488,13 @@ def has_access(telegram_id: int) -> bool:
         return False
 
 def add_user_access(telegram_id: int, user_data: dict = None) -> bool:
-    """Добавляет доступ пользователю (Redis система)"""
+    """Добавляет доступ пользователю (Redis система) и публикует снимок"""
+    success = _add_user_access(telegram_id, user_data)
+    if success:
+        publish_access_changes()
+    return success
+
+def _add_user_access(telegram_id: int, user_data: dict = None) -> bool:
     if USE_REDIS_SYNC:
         if user_data is None:
             from datetime import datetime, timedelta
@@ -480,7 +520,12 @@ def add_user_access(telegram_id: int, user_data: dict = None) -> bool:
         return get_access_manager().add_user(telegram_id)
 
 def remove_user_access(telegram_id: int) -> bool:
-    """Удаляет доступ пользователя (Redis система)"""
+    """Удаляет доступ пользователя (Redis система) и публикует снимок"""
+    success = _remove_user_access(telegram_id)
+    publish_access_changes()
+    return success
+
+def _remove_user_access(telegram_id: int) -> bool:
     if USE_REDIS_SYNC:
         return remove_user_redis(telegram_id)
     elif USE_FILE_SYNC:
@@ -490,7 +535,12 @@ def remove_user_access(telegram_id: int) -> bool:
         return get_access_manager().remove_user(telegram_id)
 
 def delete_user_completely(telegram_id: int) -> bool:
-    """Полностью удаляет пользователя (Redis система)"""
+    """Полностью удаляет пользователя (Redis система) и публикует снимок"""
+    success = _delete_user_completely(telegram_id)
+    publish_access_changes()
+    return success
+
+def _delete_user_completely(telegram_id: int) -> bool:
     if USE_REDIS_SYNC:
         return remove_user_redis(telegram_id)
     elif USE_FILE_SYNC:
@@ -515,7 +565,8 @@ def delete_user_completely(telegram_id: int) -> bool:
             return False
 
 def force_sync_access():
-    """Принудительная синхронизация (Redis система)"""
+    """Принудительная синхронизация (Redis система), заново публикует снимок"""
+    publish_access_changes()
     if USE_REDIS_SYNC:
         # В Redis показываем статистику
         redis_sync = get_redis_sync()
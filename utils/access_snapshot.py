@@ -0,0 +1,296 @@
+"""
+Общий снимок доступов для всех процессов бота (mmap)
+
+Вместо JSON-кэшей, перечитывания файлов и IPC на каждую проверку:
+- процесс, изменивший доступы (обычно админ-бот), пишет компактный бинарный снимок:
+  отсортированный массив telegram_id, время окончания подписки и флаги
+- снимок пишется во временный файл и атомарно подменяется, затем увеличивается
+  версия в маленьком управляющем файле
+- читатели держат управляющий файл и снимок в mmap: проверка версии - чтение из памяти,
+  поиск - бинарный поиск по массиву, без блокировок и системных вызовов;
+  снимок перечитывается только при смене версии
+"""
+
+import os
+import time
+import mmap
+import bisect
+import fcntl
+import struct
+import logging
+import threading
+from array import array
+from datetime import datetime
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SNAPSHOT_PATH = os.path.join(PROJECT_ROOT, "data", "access_snapshot.bin")
+
+# Заголовок снимка: магия, версия формата, версия снимка, количество записей
+SNAPSHOT_MAGIC = b'ACSS'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sIQQ')
+# Управляющий файл: два uint64 - магия и текущая версия снимка
+CONTROL_MAGIC = 0x4143_4353_4354_524C
+CONTROL_SIZE = 16
+
+# Флаги записи
+FLAG_ACTIVE = 1
+FLAG_TRIAL = 2
+FLAG_SUPER_ADMIN = 4
+
+# Как часто искать снимок, если его еще нет (сек)
+MISSING_RECHECK_INTERVAL = 5.0
+
+
+@dataclass(frozen=True)
+class AccessEntry:
+    """Запись снимка: флаги и окончание подписки (unix-время, 0 - бессрочно)"""
+    flags: int
+    expires_at: int = 0
+
+    @classmethod
+    def from_user_data(cls, user_data: dict) -> 'AccessEntry':
+        """Запись из словаря доступа (формат Redis/файловой синхронизации и кэша AccessManager)"""
+        flags = FLAG_ACTIVE if user_data.get('is_active', False) else 0
+        role = user_data.get('role')
+        if role == 'trial':
+            flags |= FLAG_TRIAL
+        elif role == 'super_admin':
+            flags |= FLAG_SUPER_ADMIN
+
+        expires_at = 0
+        subscription_end = user_data.get('subscription_end')
+        if subscription_end:
+            try:
+                expires_at = int(datetime.fromisoformat(subscription_end).timestamp())
+            except (TypeError, ValueError):
+                pass  # Как и раньше: нечитаемая дата не ограничивает доступ
+        return cls(flags, expires_at)
+
+    def is_active(self, now: float) -> bool:
+        return bool(self.flags & FLAG_ACTIVE) and (self.expires_at == 0 or now <= self.expires_at)
+
+
+def _control_path(snapshot_path: str) -> str:
+    return os.path.splitext(snapshot_path)[0] + '.ver'
+
+
+def _open_control(snapshot_path: str) -> int:
+    """Открывает (и при необходимости создает) управляющий файл нужного размера"""
+    fd = os.open(_control_path(snapshot_path), os.O_RDWR | os.O_CREAT, 0o644)
+    if os.fstat(fd).st_size < CONTROL_SIZE:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_size < CONTROL_SIZE:
+                os.pwrite(fd, struct.pack('<QQ', CONTROL_MAGIC, 0), 0)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    return fd
+
+
+def write_access_snapshot(entries: Dict[int, AccessEntry], path: str = DEFAULT_SNAPSHOT_PATH) -> int:
+    """
+    Записывает снимок и публикует новую версию.
+
+    Returns:
+        int: Номер опубликованной версии
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    user_ids = sorted(entries)
+    ids = array('q', user_ids)
+    expires = array('q', (entries[user_id].expires_at for user_id in user_ids))
+    flags = bytes(entries[user_id].flags for user_id in user_ids)
+
+    control_fd = _open_control(path)
+    try:
+        # Блокировка управляющего файла упорядочивает писателей из разных процессов
+        fcntl.flock(control_fd, fcntl.LOCK_EX)
+        _, current = struct.unpack('<QQ', os.pread(control_fd, CONTROL_SIZE, 0))
+        version = current + 1
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(SNAPSHOT_MAGIC, FORMAT_VERSION, version, len(ids)))
+            f.write(ids.tobytes())
+            f.write(expires.tobytes())
+            f.write(flags)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        # Версия меняется после подмены: читатель, увидевший ее, откроет уже новый снимок
+        os.pwrite(control_fd, struct.pack('<Q', version), 8)
+        return version
+    finally:
+        fcntl.flock(control_fd, fcntl.LOCK_UN)
+        os.close(control_fd)
+
+
+class _LoadedSnapshot:
+    """Неизменяемый снимок в памяти (файл после подмены не меняется)"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self._mm = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) if size else None
+        if self._mm is None or size < HEADER.size:
+            raise ValueError(f"Поврежденный снимок доступов: {path}")
+
+        magic, format_version, self.version, count = HEADER.unpack_from(self._mm, 0)
+        if magic != SNAPSHOT_MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError(f"Неизвестный формат снимка доступов: {path}")
+        if size < HEADER.size + count * 17:
+            raise ValueError(f"Неполный снимок доступов: {path}")
+
+        view = memoryview(self._mm)
+        ids_end = HEADER.size + count * 8
+        self.ids = view[HEADER.size:ids_end].cast('q')
+        self.expires = view[ids_end:ids_end + count * 8].cast('q')
+        self.flags = view[ids_end + count * 8:ids_end + count * 9]
+        self.count = count
+
+    def lookup(self, user_id: int) -> Optional[AccessEntry]:
+        index = bisect.bisect_left(self.ids, user_id)
+        if index < self.count and self.ids[index] == user_id:
+            return AccessEntry(self.flags[index], self.expires[index])
+        return None
+
+    def is_active(self, user_id: int, now: float) -> bool:
+        index = bisect.bisect_left(self.ids, user_id)
+        if index >= self.count or self.ids[index] != user_id or not self.flags[index] & FLAG_ACTIVE:
+            return False
+        expires_at = self.expires[index]
+        return expires_at == 0 or now <= expires_at
+
+
+class AccessSnapshotReader:
+    """Читатель снимка: проверка версии и поиск без блокировок"""
+
+    def __init__(self, path: str = DEFAULT_SNAPSHOT_PATH):
+        self.path = path
+        self._control = None
+        self._control_view = None
+        self._snapshot: Optional[_LoadedSnapshot] = None
+        self._reload_lock = threading.Lock()
+        self._next_missing_check = 0.0
+        self.reloads = 0
+
+    def _attach_control(self) -> bool:
+        """Отображает управляющий файл в память (один раз)"""
+        if self._control_view is not None:
+            return True
+        if time.monotonic() < self._next_missing_check:
+            return False
+        if not os.path.exists(self.path):
+            self._next_missing_check = time.monotonic() + MISSING_RECHECK_INTERVAL
+            return False
+        fd = _open_control(self.path)
+        try:
+            self._control = mmap.mmap(fd, CONTROL_SIZE, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        self._control_view = memoryview(self._control).cast('Q')
+        return True
+
+    def _current(self) -> Optional[_LoadedSnapshot]:
+        snapshot = self._snapshot
+        view = self._control_view
+        # Горячий путь: одно чтение версии из разделяемой памяти
+        if snapshot is not None and view is not None and view[1] == snapshot.version:
+            return snapshot
+
+        with self._reload_lock:
+            if not self._attach_control():
+                return None
+            snapshot = self._snapshot
+            if snapshot is not None and self._control_view[1] == snapshot.version:
+                return snapshot
+            try:
+                snapshot = _LoadedSnapshot(self.path)
+            except FileNotFoundError:
+                return self._snapshot
+            except Exception as e:
+                logger.error(f"Ошибка загрузки снимка доступов: {e}")
+                return self._snapshot
+            self._snapshot = snapshot
+            self.reloads += 1
+            logger.debug(f"🔄 Загружен снимок доступов v{snapshot.version}: {snapshot.count} пользователей")
+            return snapshot
+
+    def notify_published(self):
+        """Снимок только что опубликован в этом процессе - не ждать повторного поиска файла"""
+        self._next_missing_check = 0.0
+
+    def lookup(self, user_id: int) -> Optional[AccessEntry]:
+        snapshot = self._current()
+        return snapshot.lookup(user_id) if snapshot is not None else None
+
+    def has_access(self, user_id: int) -> Optional[bool]:
+        """
+        Проверяет доступ по снимку.
+
+        Returns:
+            True/False или None, если снимка еще нет (нужно проверить по источнику)
+        """
+        snapshot = self._current()
+        if snapshot is None:
+            return None
+        return snapshot.is_active(user_id, time.time())
+
+    @property
+    def version(self) -> int:
+        snapshot = self._current()
+        return snapshot.version if snapshot is not None else 0
+
+    def get_stats(self) -> Dict[str, int]:
+        snapshot = self._current()
+        return {
+            'version': snapshot.version if snapshot is not None else 0,
+            'users': snapshot.count if snapshot is not None else 0,
+            'reloads': self.reloads
+        }
+
+
+def build_access_entries(records: Iterable[Tuple[int, dict]]) -> Dict[int, AccessEntry]:
+    """Записи снимка из пар (telegram_id, словарь доступа)"""
+    entries = {}
+    for telegram_id, user_data in records:
+        try:
+            entries[int(telegram_id)] = AccessEntry.from_user_data(user_data)
+        except (TypeError, ValueError):
+            logger.warning(f"Пропущена запись доступа с некорректным ID: {telegram_id}")
+    return entries
+
+
+# Глобальный читатель
+_reader: Optional[AccessSnapshotReader] = None
+_reader_lock = threading.Lock()
+
+
+def get_access_snapshot() -> AccessSnapshotReader:
+    """Получает глобальный читатель снимка доступов"""
+    global _reader
+    if _reader is None:
+        with _reader_lock:
+            if _reader is None:
+                _reader = AccessSnapshotReader()
+    return _reader
+
+
+def has_access_snapshot(user_id: int) -> Optional[bool]:
+    """Проверка доступа по общему снимку (None - снимок еще не опубликован)"""
+    return get_access_snapshot().has_access(user_id)
+
+
+def publish_access_snapshot(records: Iterable[Tuple[int, dict]], path: str = DEFAULT_SNAPSHOT_PATH) -> int:
+    """Публикует снимок из пар (telegram_id, словарь доступа)"""
+    entries = build_access_entries(records)
+    version = write_access_snapshot(entries, path)
+    if _reader is not None and _reader.path == path:
+        _reader.notify_published()
+    logger.info(f"📸 Опубликован снимок доступов v{version}: {len(entries)} пользователей")
+    return version
@@ -3,21 +3,38 @@ import threading
 import queue
 import time
 import asyncio
-from typing import Optional
+from typing import Iterable, List, Optional, Tuple
 from concurrent.futures import ThreadPoolExecutor
 
+from sqlalchemy import update
+
 from database.db_manager import get_session
 from database.models import FollowTask, FollowTaskStatus
 from utils.follow_manager import FollowManager
 
 logger = logging.getLogger(__name__)
 
+# Интервал страховочной проверки PENDING-задач в БД (сек), если в config.py его нет
+DEFAULT_RECONCILE_INTERVAL = 60.0
+
 # Глобальные переменные для управления очередью
 follow_queue: Optional[queue.Queue] = None
 follow_executor: Optional[ThreadPoolExecutor] = None
 follow_thread: Optional[threading.Thread] = None
 is_running = False
 
+# Статистика приема задач
+intake_stats = {'pushed': 0, 'claimed': 0, 'claim_conflicts': 0, 'sweeps': 0, 'swept': 0}
+_stats_lock = threading.Lock()
+
+
+def _get_reconcile_interval() -> float:
+    try:
+        from config import FOLLOW_QUEUE_RECONCILE_INTERVAL
+        return float(FOLLOW_QUEUE_RECONCILE_INTERVAL)
+    except ImportError:
+        return DEFAULT_RECONCILE_INTERVAL
+
 
 def process_follow_task(task_id: int):
     """Обработать одну задачу автоподписки"""
@@ -50,24 +67,90 @@ def process_follow_task(task_id: int):
             session.close()
 
 
+def claim_follow_tasks(task_ids: Iterable[int]) -> List[int]:
+    """
+    Атомарно переводит задачи из PENDING в RUNNING одним UPDATE.
+    Задачу получает только тот процесс, чей UPDATE изменил строку.
+
+    Returns:
+        List[int]: ID задач, захваченных этим процессом
+    """
+    task_ids = sorted(set(task_ids))
+    if not task_ids:
+        return []
+    
+    session = get_session()
+    try:
+        statement = update(FollowTask).where(
+            FollowTask.id.in_(task_ids),
+            FollowTask.status == FollowTaskStatus.PENDING
+        ).values(status=FollowTaskStatus.RUNNING).execution_options(synchronize_session=False)
+        
+        if session.get_bind().dialect.update_returning:
+            claimed = [row[0] for row in session.execute(statement.returning(FollowTask.id))]
+        else:
+            # Без RETURNING захват определяем по rowcount каждой строки
+            claimed = [
+                task_id for task_id in task_ids
+                if session.execute(statement.where(FollowTask.id == task_id)).rowcount
+            ]
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        logger.error(f"❌ Ошибка при захвате задач {task_ids}: {e}")
+        return []
+    finally:
+        session.close()
+    
+    with _stats_lock:
+        intake_stats['claimed'] += len(claimed)
+        intake_stats['claim_conflicts'] += len(task_ids) - len(claimed)
+    return sorted(claimed)
+
+
+def _dispatch(task_ids: List[int]):
+    """Отправить захваченные задачи на выполнение в пул потоков"""
+    for task_id in task_ids:
+        follow_executor.submit(process_follow_task, task_id)
+        logger.info(f"📋 Задача #{task_id} отправлена на выполнение")
+
+
+def _next_batch(timeout: float) -> Tuple[List[int], bool]:
+    """Дождаться ID задач и забрать все уже поставленные (ID, получен ли сигнал остановки)"""
+    try:
+        items = [follow_queue.get(timeout=timeout)]
+    except queue.Empty:
+        return [], False
+    while True:
+        try:
+            items.append(follow_queue.get_nowait())
+        except queue.Empty:
+            break
+    return [item for item in items if item is not None], None in items
+
+
 def follow_queue_worker():
     """Рабочий поток для обработки очереди задач"""
     logger.info("🚀 Запущен рабочий поток очереди автоподписок")
     
+    reconcile_interval = _get_reconcile_interval()
+    next_sweep = time.monotonic() + reconcile_interval
+    
     while is_running:
         try:
-            # Получаем задачу из очереди с таймаутом
-            task_id = follow_queue.get(timeout=1)
+            # Ждем ID от создателей задач не дольше, чем до следующей сверки с БД
+            task_ids, stop = _next_batch(max(0.0, next_sweep - time.monotonic()))
+            
+            if task_ids:
+                _dispatch(claim_follow_tasks(task_ids))
             
-            if task_id is None:  # Сигнал остановки
+            if stop:  # Сигнал остановки
                 break
             
-            # Отправляем задачу на выполнение в пул потоков
-            follow_executor.submit(process_follow_task, task_id)
+            if time.monotonic() >= next_sweep:
+                check_pending_tasks()
+                next_sweep = time.monotonic() + reconcile_interval
             
-        except queue.Empty:
-            # Проверяем новые задачи в БД
-            check_pending_tasks()
         except Exception as e:
             logger.error(f"❌ Ошибка в рабочем потоке очереди: {e}")
             time.sleep(1)
@@ -76,27 +159,28 @@ def follow_queue_worker():
 
 
 def check_pending_tasks():
-    """Проверить наличие новых задач в БД и добавить их в очередь"""
+    """
+    Страховочная сверка с БД: захватить PENDING-задачи, которые не попали в очередь
+    (созданы другим процессом или до запуска очереди)
+    """
     session = get_session()
     try:
-        # Находим все задачи со статусом PENDING
-        pending_tasks = session.query(FollowTask).filter_by(
-            status=FollowTaskStatus.PENDING
-        ).all()
-        
-        for task in pending_tasks:
-            # Обновляем статус на RUNNING
-            task.status = FollowTaskStatus.RUNNING
-            session.commit()
-            
-            # Добавляем в очередь
-            follow_queue.put(task.id)
-            logger.info(f"📋 Добавлена задача #{task.id} в очередь")
-        
+        pending_ids = [row[0] for row in session.query(FollowTask.id).filter(
+            FollowTask.status == FollowTaskStatus.PENDING
+        )]
     except Exception as e:
         logger.error(f"❌ Ошибка при проверке новых задач: {e}")
+        return
     finally:
         session.close()
+    
+    claimed = claim_follow_tasks(pending_ids)
+    with _stats_lock:
+        intake_stats['sweeps'] += 1
+        intake_stats['swept'] += len(claimed)
+    if claimed:
+        logger.info(f"🔎 Сверка с БД: найдено {len(claimed)} задач вне очереди")
+        _dispatch(claimed)
 
 
 def start_async_follow_queue(max_workers: int = 5):
@@ -174,10 +258,28 @@ def stop_async_follow_queue():
 
 def add_task_to_queue(task_id: int):
     """Добавить задачу в очередь"""
+    return enqueue_follow_tasks([task_id])
+
+
+def enqueue_follow_tasks(task_ids: Iterable[int]) -> bool:
+    """
+    Передать ID только что созданных PENDING-задач в очередь.
+    Если очередь не запущена, задачи подхватит сверка с БД при запуске.
+    """
     if not is_running:
         logger.error("❌ Очередь автоподписок не запущена")
         return False
     
-    follow_queue.put(task_id)
-    logger.info(f"📋 Задача #{task_id} добавлена в очередь")
-    return True 
\ No newline at end of file
+    task_ids = list(task_ids)
+    for task_id in task_ids:
+        follow_queue.put(task_id)
+    with _stats_lock:
+        intake_stats['pushed'] += len(task_ids)
+    logger.info(f"📋 В очередь добавлено задач: {len(task_ids)}")
+    return True
+
+
+def get_intake_stats() -> dict:
+    """Статистика приема задач: переданные напрямую, захваченные, найденные сверкой"""
+    with _stats_lock:
+        return dict(intake_stats)
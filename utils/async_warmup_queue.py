@@ -3,16 +3,23 @@
 
 """
 Асинхронный обработчик очереди задач прогрева аккаунтов
+
+Задачи одного аккаунта выполняются строго по очереди без опроса:
+- задача, чей аккаунт уже занят, откладывается в список ожидания этого аккаунта
+- по завершении задачи (callback future) следующая задача аккаунта сразу
+  становится готовой, и свободные потоки занимаются готовыми задачами
+- учитывается время ожидания в очереди по каждому аккаунту
 """
 
 import logging
 import threading
-import queue
 import time
 import json
+from collections import deque
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Dict, List, Optional
+from functools import partial
+from typing import Deque, Dict, List, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -33,19 +40,26 @@ class AsyncWarmupQueue:
     def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS):
         self.max_workers = max_workers
         self.executor = ThreadPoolExecutor(max_workers=max_workers)
-        self.task_queue = queue.Queue()
         self.running = False
         self.active_accounts = set()
-        self.queued_tasks = set()  # Добавляем отслеживание задач в очереди
+        self.queued_tasks = set()  # Задачи в очереди и в работе
         self.lock = threading.Lock()
         
+        # Готовые к запуску задачи (не больше одной на аккаунт) и отложенные по аккаунтам
+        self.ready: Deque = deque()
+        self.waiting: Dict[int, Deque] = {}
+        self._scheduled_accounts = set()  # Аккаунты с задачей в ready или в работе
+        self._enqueued_at: Dict[int, float] = {}
+        self._running_count = 0
+        
+        # Время ожидания в очереди по аккаунтам
+        self.wait_stats: Dict[int, Dict[str, float]] = {}
+        
     def start(self):
         """Запустить асинхронную очередь"""
         self.running = True
         logger.info(f"🚀 Запуск асинхронной очереди прогрева с {self.max_workers} потоками")
-        
-        # Запускаем обработчик очереди
-        threading.Thread(target=self._process_queue, daemon=True).start()
+        self._dispatch()
         
     def stop(self):
         """Остановить очередь"""
@@ -56,66 +70,89 @@ class AsyncWarmupQueue:
     def add_task(self, task):
         """Добавить задачу в очередь"""
         with self.lock:
-            if task.id not in self.queued_tasks:
-                self.task_queue.put(task)
-                self.queued_tasks.add(task.id)
+            if task.id in self.queued_tasks:
+                return
+            self.queued_tasks.add(task.id)
+            self._enqueued_at[task.id] = time.monotonic()
+            
+            if task.account_id in self._scheduled_accounts:
+                # Аккаунт занят - ждем завершения его текущей задачи
+                self.waiting.setdefault(task.account_id, deque()).append(task)
+                logger.info(f"⏳ Аккаунт {task.account_id} уже обрабатывается, задача #{task.id} ожидает")
+            else:
+                self._scheduled_accounts.add(task.account_id)
+                self.ready.append(task)
                 logger.info(f"➕ Задача #{task.id} добавлена в очередь")
+        self._dispatch()
+    
+    def _dispatch(self):
+        """Запустить готовые задачи, пока есть свободные потоки"""
+        while True:
+            with self.lock:
+                if not self.running or self._running_count >= self.max_workers or not self.ready:
+                    return
+                task = self.ready.popleft()
+                self._running_count += 1
+                self.active_accounts.add(task.account_id)
+                self._record_wait(task)
             
-    def _process_queue(self):
-        """Основной цикл обработки очереди"""
-        futures = {}
-        
-        while self.running:
             try:
-                # Проверяем завершенные задачи
-                completed_futures = []
-                for future in list(futures.keys()):
-                    if future.done():
-                        completed_futures.append(future)
-                        
-                # Обрабатываем завершенные задачи
-                for future in completed_futures:
-                    task = futures.pop(future)
-                    try:
-                        result = future.result()
-                        logger.info(f"✅ Задача #{task.id} завершена")
-                        with self.lock:
-                            self.active_accounts.discard(task.account_id)
-                            self.queued_tasks.discard(task.id)  # Удаляем из отслеживания
-                    except Exception as e:
-                        logger.error(f"❌ Ошибка в задаче #{task.id}: {e}")
-                        with self.lock:
-                            self.active_accounts.discard(task.account_id)
-                            self.queued_tasks.discard(task.id)  # Удаляем из отслеживания
-                
-                # Добавляем новые задачи если есть свободные слоты
-                while len(futures) < self.max_workers and not self.task_queue.empty():
-                    try:
-                        task = self.task_queue.get_nowait()
-                        
-                        # Проверяем, не обрабатывается ли уже этот аккаунт
-                        with self.lock:
-                            if task.account_id in self.active_accounts:
-                                logger.info(f"⏳ Аккаунт {task.account_id} уже обрабатывается, откладываем")
-                                self.task_queue.put(task)  # Возвращаем в очередь
-                                continue
-                                
-                            self.active_accounts.add(task.account_id)
-                        
-                        # Запускаем задачу в отдельном потоке
-                        future = self.executor.submit(self._process_task, task)
-                        futures[future] = task
-                        logger.info(f"🔄 Запущена обработка задачи #{task.id} для аккаунта {task.account_id}")
-                        
-                    except queue.Empty:
-                        break
-                
-                # Небольшая пауза
-                time.sleep(1)
-                
-            except Exception as e:
-                logger.error(f"❌ Ошибка в цикле обработки очереди: {e}")
-                time.sleep(5)
+                future = self.executor.submit(self._process_task, task)
+            except RuntimeError:
+                # Пул уже остановлен
+                with self.lock:
+                    self._running_count -= 1
+                    self.active_accounts.discard(task.account_id)
+                    self.ready.appendleft(task)
+                return
+            logger.info(f"🔄 Запущена обработка задачи #{task.id} для аккаунта {task.account_id}")
+            future.add_done_callback(partial(self._on_task_done, task))
+    
+    def _record_wait(self, task):
+        waited = time.monotonic() - self._enqueued_at.pop(task.id, time.monotonic())
+        stats = self.wait_stats.setdefault(task.account_id, {'tasks': 0, 'total_wait': 0.0, 'max_wait': 0.0})
+        stats['tasks'] += 1
+        stats['total_wait'] += waited
+        stats['max_wait'] = max(stats['max_wait'], waited)
+    
+    def _on_task_done(self, task, future):
+        """Завершение задачи: освободить аккаунт и запустить его следующую задачу"""
+        try:
+            future.result()
+            logger.info(f"✅ Задача #{task.id} завершена")
+        except Exception as e:
+            logger.error(f"❌ Ошибка в задаче #{task.id}: {e}")
+        
+        with self.lock:
+            self._running_count -= 1
+            self.active_accounts.discard(task.account_id)
+            self.queued_tasks.discard(task.id)
+            
+            waiting = self.waiting.get(task.account_id)
+            if waiting:
+                self.ready.append(waiting.popleft())
+                if not waiting:
+                    del self.waiting[task.account_id]
+            else:
+                self._scheduled_accounts.discard(task.account_id)
+        self._dispatch()
+    
+    def get_stats(self) -> Dict:
+        """Состояние очереди и время ожидания по аккаунтам"""
+        with self.lock:
+            return {
+                'running': self._running_count,
+                'ready': len(self.ready),
+                'waiting': sum(len(tasks) for tasks in self.waiting.values()),
+                'accounts': {
+                    account_id: {
+                        'tasks': stats['tasks'],
+                        'avg_wait': round(stats['total_wait'] / stats['tasks'], 3),
+                        'max_wait': round(stats['max_wait'], 3)
+                    }
+                    for account_id, stats in self.wait_stats.items()
+                }
+            }
                 
     def _process_task(self, task):
         """Обработать одну задачу прогрева"""
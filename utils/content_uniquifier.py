@@ -1,7 +1,8 @@
 import os
+import time
 import random
 import logging
-from PIL import Image, ImageEnhance, ImageFilter, ImageOps
+from PIL import Image
 import cv2
 import numpy as np
 from typing import List, Tuple, Optional, Union
@@ -10,6 +11,13 @@ import json
 import re
 from datetime import datetime, timedelta
 import piexif
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.image_uniquifier import ImageUniquifyParams, image_stage_timings, uniquify_array
+from utils.video_uniquifier import (
+    DEFAULT_OUTPUTS_PER_PASS, VideoUniquifyParams, get_ffmpeg_exe, transcode_ffmpeg, transcode_ffmpeg_many,
+    transcode_opencv, transcode_opencv_many
+)
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +27,18 @@ class ContentUniquifier:
     def __init__(self):
         self.image_extensions = ['.jpg', '.jpeg', '.png', '.webp']
         self.video_extensions = ['.mp4', '.mov', '.avi', '.mkv']
+
+        try:
+            from config import VIDEO_UNIQUIFY_BACKEND, VIDEO_UNIQUIFY_WORKERS
+        except ImportError:
+            VIDEO_UNIQUIFY_BACKEND, VIDEO_UNIQUIFY_WORKERS = 'auto', 0
+        try:
+            from config import VIDEO_VARIANTS_PER_PASS
+        except ImportError:
+            VIDEO_VARIANTS_PER_PASS = DEFAULT_OUTPUTS_PER_PASS
+        self.video_backend = VIDEO_UNIQUIFY_BACKEND  # 'auto' | 'ffmpeg' | 'opencv'
+        self.video_workers = VIDEO_UNIQUIFY_WORKERS  # 0 - по числу ядер
+        self.video_variants_per_pass = VIDEO_VARIANTS_PER_PASS  # Вариантов видео за одно декодирование
         
     def uniquify_content(self, file_path: Union[str, List[str]], content_type: str, caption: str = "") -> Tuple[Union[str, List[str]], str]:
         """
@@ -73,92 +93,58 @@ class ContentUniquifier:
     def uniquify_image(self, image_path: str, content_type: str) -> str:
         """Уникализация изображения"""
         try:
-            # Открываем изображение
-            img = Image.open(image_path)
-            
-            # Конвертируем в RGB если нужно
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
+            started = time.perf_counter()
+            source = self._load_image(image_path)
+            decode_seconds = time.perf_counter() - started
+            return self._uniquify_loaded_image(source, image_path, content_type, decode_seconds)
+        except Exception as e:
+            logger.error(f"Ошибка при уникализации изображения: {e}")
+            return image_path
+
+    def _load_image(self, image_path: str) -> np.ndarray:
+        """Открывает изображение и декодирует его в RGB-массив"""
+        img = Image.open(image_path)
+
+        # Конвертируем в RGB если нужно
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        return np.asarray(img)
+
+    def _uniquify_loaded_image(self, source: np.ndarray, image_path: str, content_type: str,
+                               decode_seconds: float = 0.0) -> str:
+        """
+        Случайные трансформации уже декодированного изображения за один проход
+        (см. utils/image_uniquifier.py); исходный массив не изменяется
+        """
+        try:
             # Применяем случайные трансформации
-            transformations = []
-            
-            # 1. Небольшое изменение размера (98-102%)
-            if random.random() > 0.3:
-                scale = random.uniform(0.98, 1.02)
-                new_size = (int(img.width * scale), int(img.height * scale))
-                img = img.resize(new_size, Image.Resampling.LANCZOS)
-                transformations.append(f"resize_{scale:.2f}")
-            
-            # 2. Поворот на небольшой угол (-2 до +2 градусов)
-            if random.random() > 0.4:
-                angle = random.uniform(-2, 2)
-                img = img.rotate(angle, expand=True, fillcolor='white')
-                transformations.append(f"rotate_{angle:.1f}")
-            
-            # 3. Изменение яркости (90-110%)
-            if random.random() > 0.3:
-                brightness = random.uniform(0.9, 1.1)
-                enhancer = ImageEnhance.Brightness(img)
-                img = enhancer.enhance(brightness)
-                transformations.append(f"brightness_{brightness:.2f}")
-            
-            # 4. Изменение контраста (90-110%)
-            if random.random() > 0.3:
-                contrast = random.uniform(0.9, 1.1)
-                enhancer = ImageEnhance.Contrast(img)
-                img = enhancer.enhance(contrast)
-                transformations.append(f"contrast_{contrast:.2f}")
-            
-            # 5. Изменение насыщенности (90-110%)
-            if random.random() > 0.3:
-                saturation = random.uniform(0.9, 1.1)
-                enhancer = ImageEnhance.Color(img)
-                img = enhancer.enhance(saturation)
-                transformations.append(f"saturation_{saturation:.2f}")
-            
-            # 6. Небольшое размытие или резкость
-            if random.random() > 0.5:
-                if random.random() > 0.5:
-                    # Легкое размытие
-                    img = img.filter(ImageFilter.GaussianBlur(radius=random.uniform(0.1, 0.5)))
-                    transformations.append("blur")
-                else:
-                    # Легкая резкость
-                    enhancer = ImageEnhance.Sharpness(img)
-                    img = enhancer.enhance(random.uniform(1.1, 1.3))
-                    transformations.append("sharpen")
-            
-            # 7. Обрезка краев (1-3 пикселя)
-            if random.random() > 0.3:
-                pixels = random.randint(1, 3)
-                img = img.crop((pixels, pixels, img.width - pixels, img.height - pixels))
-                transformations.append(f"crop_{pixels}px")
-            
-            # 8. Зеркальное отражение (только для не-текстовых изображений)
-            if random.random() > 0.7 and content_type in ['story', 'carousel']:
-                img = ImageOps.mirror(img)
-                transformations.append("mirror")
-            
+            params = ImageUniquifyParams.random(content_type)
+            result, timings = uniquify_array(source, params)
+            if decode_seconds:
+                timings['decode'] = decode_seconds
+
             # Сохраняем уникализированное изображение
             output_path = self._get_unique_output_path(image_path)
             
-            # Сохраняем с случайным качеством (92-98)
-            quality = random.randint(92, 98)
-            
             # Подготавливаем EXIF данные
             exif_bytes = self._generate_unique_exif()
             
-            # Сохраняем с уникальными метаданными
+            # Сохраняем с уникальными метаданными (качество 92-98, без второго прохода optimize)
+            started = time.perf_counter()
+            img = Image.fromarray(result)
+            del result
             if exif_bytes:
-                img.save(output_path, quality=quality, optimize=True, exif=exif_bytes)
+                img.save(output_path, quality=params.quality, exif=exif_bytes)
             else:
-                img.save(output_path, quality=quality, optimize=True)
+                img.save(output_path, quality=params.quality)
+            timings['encode'] = time.perf_counter() - started
+            image_stage_timings.record(timings)
             
             # Дополнительно изменяем метаданные файла
             self._modify_file_metadata(output_path)
             
-            logger.info(f"✅ Изображение уникализировано: {' + '.join(transformations)}")
+            stages = ', '.join(f"{stage} {seconds * 1000:.0f}мс" for stage, seconds in timings.items())
+            logger.info(f"✅ Изображение уникализировано: {' + '.join(params.describe())} ({stages})")
             return output_path
             
         except Exception as e:
@@ -166,83 +152,135 @@ class ContentUniquifier:
             return image_path
     
     def uniquify_video(self, video_path: str, content_type: str) -> str:
-        """Уникализация видео"""
+        """Уникализация видео (ffmpeg-фильтр или конвейер OpenCV, см. utils/video_uniquifier.py)"""
         try:
-            # Открываем видео
-            cap = cv2.VideoCapture(video_path)
-            
-            # Получаем параметры видео
-            fps = int(cap.get(cv2.CAP_PROP_FPS))
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            
-            # Создаем выходной файл
+            params = VideoUniquifyParams.random()
             output_path = self._get_unique_output_path(video_path)
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            
-            # Применяем трансформации
-            transformations = []
-            
-            # 1. Небольшое изменение размера
-            scale = random.uniform(0.98, 1.02)
-            new_width = int(width * scale)
-            new_height = int(height * scale)
-            transformations.append(f"scale_{scale:.2f}")
-            
-            # 2. Изменение скорости (95-105%)
-            speed_factor = random.uniform(0.95, 1.05)
-            new_fps = int(fps * speed_factor)
-            transformations.append(f"speed_{speed_factor:.2f}")
-            
-            out = cv2.VideoWriter(output_path, fourcc, new_fps, (new_width, new_height))
-            
-            # Параметры цветокоррекции
-            brightness = random.uniform(-10, 10)
-            contrast = random.uniform(0.9, 1.1)
-            saturation = random.uniform(0.9, 1.1)
-            
-            frame_count = 0
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
-                # Изменяем размер
-                frame = cv2.resize(frame, (new_width, new_height))
-                
-                # Применяем цветокоррекцию
-                frame = cv2.convertScaleAbs(frame, alpha=contrast, beta=brightness)
-                
-                # Изменяем насыщенность
-                hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV).astype(np.float32)
-                hsv[:, :, 1] = hsv[:, :, 1] * saturation
-                hsv[:, :, 1][hsv[:, :, 1] > 255] = 255
-                frame = cv2.cvtColor(hsv.astype(np.uint8), cv2.COLOR_HSV2BGR)
-                
-                # Записываем кадр
-                out.write(frame)
-                frame_count += 1
-                
-                # Для длинных видео - обрабатываем каждый N-й кадр для ускорения
-                if frame_count % 100 == 0:
-                    logger.debug(f"Обработано кадров: {frame_count}")
-            
-            # Освобождаем ресурсы
-            cap.release()
-            out.release()
-            cv2.destroyAllWindows()
-            
-            # Изменяем метаданные видео файла
-            self._modify_video_metadata(output_path)
+            stats = None
+
+            if self.video_backend in ('auto', 'ffmpeg') and get_ffmpeg_exe():
+                try:
+                    # ffmpeg сразу пишет метаданные, отдельное перекодирование не нужно
+                    stats = transcode_ffmpeg(video_path, output_path, params,
+                                             metadata=self._generate_video_metadata())
+                except Exception as e:
+                    logger.warning(f"ffmpeg не смог обработать видео, используем OpenCV: {e}")
+
+            if stats is None:
+                stats = transcode_opencv(video_path, output_path, params, workers=self.video_workers or None)
+                # Изменяем метаданные видео файла
+                self._modify_video_metadata(output_path)
+
             self._modify_file_metadata(output_path)
-            
-            logger.info(f"✅ Видео уникализировано: {' + '.join(transformations)}")
+
+            logger.info(f"✅ Видео уникализировано ({stats.backend}, {stats.frames} кадров, "
+                        f"{stats.fps:.0f} кадров/с): {' + '.join(params.describe())}")
             return output_path
             
         except Exception as e:
             logger.error(f"Ошибка при уникализации видео: {e}")
             return video_path
     
+    def uniquify_batch(self, file_path: Union[str, List[str]], content_type: str, count: int,
+                       caption: str = "") -> List[Tuple[Union[str, List[str]], str]]:
+        """
+        Несколько уникальных вариантов одного контента (например, для публикации в N аккаунтов)
+
+        Исходник декодируется один раз, варианты строятся параллельно.
+
+        Args:
+            file_path: Путь к файлу или список путей (для карусели)
+            content_type: Тип контента ('photo', 'video', 'carousel', 'story', 'reel')
+            count: Количество вариантов
+            caption: Текст описания
+
+        Returns:
+            List[Tuple[путь к варианту/вариантам, уникализированный caption]]
+        """
+        if count <= 0:
+            return []
+
+        try:
+            if isinstance(file_path, list):
+                # Карусель - варианты каждого файла, затем собираем по номеру варианта
+                per_file = [self._uniquify_single_file_batch(path, content_type, count) for path in file_path]
+                media_variants = [list(paths) for paths in zip(*per_file)]
+            else:
+                media_variants = self._uniquify_single_file_batch(file_path, content_type, count)
+        except Exception as e:
+            logger.error(f"Ошибка при пакетной уникализации контента: {e}")
+            media_variants = [file_path] * count
+
+        return [(media, self.uniquify_text(caption) if caption else "") for media in media_variants]
+
+    def _uniquify_single_file_batch(self, file_path: str, content_type: str, count: int) -> List[str]:
+        """Варианты одного файла"""
+        if not os.path.exists(file_path):
+            logger.error(f"Файл не найден: {file_path}")
+            return [file_path] * count
+
+        file_ext = os.path.splitext(file_path)[1].lower()
+
+        if file_ext in self.image_extensions:
+            return self.uniquify_image_batch(file_path, content_type, count)
+        elif file_ext in self.video_extensions:
+            return self.uniquify_video_batch(file_path, content_type, count)
+        else:
+            logger.warning(f"Неподдерживаемый тип файла: {file_ext}")
+            return [file_path] * count
+
+    def uniquify_image_batch(self, image_path: str, content_type: str, count: int) -> List[str]:
+        """Варианты изображения: одно декодирование, трансформации в пуле потоков"""
+        try:
+            img = self._load_image(image_path)
+        except Exception as e:
+            logger.error(f"Ошибка при открытии изображения {image_path}: {e}")
+            return [image_path] * count
+
+        workers = min(count, os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ImageVariant") as pool:
+            variants = list(pool.map(lambda _: self._uniquify_loaded_image(img, image_path, content_type), range(count)))
+
+        logger.info(f"✅ Создано {count} вариантов изображения за одно декодирование")
+        return variants
+
+    def uniquify_video_batch(self, video_path: str, content_type: str, count: int) -> List[str]:
+        """Варианты видео за одно декодирование (ffmpeg split или общий декодер OpenCV)"""
+        if count == 1:
+            return [self.uniquify_video(video_path, content_type)]
+
+        try:
+            params_list = [VideoUniquifyParams.random() for _ in range(count)]
+            output_paths = [self._get_unique_output_path(video_path) for _ in range(count)]
+            stats = None
+
+            if self.video_backend in ('auto', 'ffmpeg') and get_ffmpeg_exe():
+                try:
+                    metadata_list = [self._generate_video_metadata() for _ in range(count)]
+                    stats = transcode_ffmpeg_many(video_path, output_paths, params_list, metadata_list,
+                                                  outputs_per_pass=self.video_variants_per_pass)
+                except Exception as e:
+                    logger.warning(f"ffmpeg не смог обработать видео, используем OpenCV: {e}")
+
+            if stats is None:
+                stats = transcode_opencv_many(video_path, output_paths, params_list,
+                                              workers=self.video_workers or None,
+                                              outputs_per_pass=self.video_variants_per_pass)
+                for output_path in output_paths:
+                    self._modify_video_metadata(output_path)
+
+            for output_path in output_paths:
+                self._modify_file_metadata(output_path)
+
+            passes = -(-count // max(1, self.video_variants_per_pass or DEFAULT_OUTPUTS_PER_PASS))
+            logger.info(f"✅ Создано {count} вариантов видео за {passes} декодирований "
+                        f"({stats.backend}, {stats.frames} кадров, {stats.seconds:.1f}с)")
+            return output_paths
+
+        except Exception as e:
+            logger.error(f"Ошибка при пакетной уникализации видео: {e}")
+            return [video_path] * count
+
     def uniquify_text(self, text: str) -> str:
         """Уникализация текста"""
         if not text:
@@ -461,6 +499,32 @@ class ContentUniquifier:
         except Exception as e:
             logger.warning(f"Не удалось изменить метаданные файла: {e}")
     
+    def _generate_video_metadata(self) -> dict:
+        """Генерирует случайные метаданные видео"""
+        creation_time = datetime.now() - timedelta(
+            days=random.randint(0, 30),
+            hours=random.randint(0, 23),
+            minutes=random.randint(0, 59)
+        )
+
+        # Список устройств для метаданных
+        devices = [
+            "iPhone 13 Pro",
+            "iPhone 14 Pro Max",
+            "iPhone 15 Pro",
+            "Samsung Galaxy S23 Ultra",
+            "Google Pixel 8 Pro",
+        ]
+
+        return {
+            'creation_time': creation_time.isoformat(),
+            'encoder': f'{random.choice(devices)} Camera',
+            'comment': f'Recorded with {random.choice(devices)}',
+            'title': '',
+            'artist': '',
+            'album': ''
+        }
+
     def _modify_video_metadata(self, video_path: str):
         """Изменяет метаданные видео файла"""
         try:
@@ -471,22 +535,6 @@ class ContentUniquifier:
             # Загружаем видео
             video = VideoFileClip(video_path)
             
-            # Генерируем случайные метаданные
-            creation_time = datetime.now() - timedelta(
-                days=random.randint(0, 30),
-                hours=random.randint(0, 23),
-                minutes=random.randint(0, 59)
-            )
-            
-            # Список устройств для метаданных
-            devices = [
-                "iPhone 13 Pro",
-                "iPhone 14 Pro Max", 
-                "iPhone 15 Pro",
-                "Samsung Galaxy S23 Ultra",
-                "Google Pixel 8 Pro",
-            ]
-            
             # Создаем временный файл для вывода
             temp_output = tempfile.NamedTemporaryFile(suffix='.mp4', delete=False)
             temp_output.close()
@@ -499,14 +547,7 @@ class ContentUniquifier:
                 temp_audiofile=tempfile.mktemp('.m4a'),
                 remove_temp=True,
                 logger=None,  # Отключаем вывод moviepy
-                metadata={
-                    'creation_time': creation_time.isoformat(),
-                    'encoder': f'{random.choice(devices)} Camera',
-                    'comment': f'Recorded with {random.choice(devices)}',
-                    'title': '',
-                    'artist': '',
-                    'album': ''
-                }
+                metadata=self._generate_video_metadata()
             )
             
             # Закрываем видео
@@ -539,4 +580,8 @@ def uniquify_for_publication(file_path: Union[str, List[str]], content_type: str
     Returns:
         Tuple[уникализированные файлы, уникализированный текст]
     """
-    return uniquifier.uniquify_content(file_path, content_type, caption) 
\ No newline at end of file
+    return uniquifier.uniquify_content(file_path, content_type, caption) 
+
+def get_image_stage_stats():
+    """Статистика времени этапов уникализации изображений (decode/geometry/color/filter/encode)"""
+    return image_stage_timings.snapshot()
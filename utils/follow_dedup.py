@@ -0,0 +1,246 @@
+"""
+Проверка "уже подписывались" через фильтр Блума по аккаунту
+
+Вместо загрузки всей истории подписок аккаунта в set при каждом запуске задачи:
+- для аккаунта хранится фильтр Блума целей (таблица follow_bloom_filters) и номер
+  последней учтенной записи follow_history
+- при обращении фильтр догружает только новые записи истории (id > учтенного),
+  после каждой подписки цель сразу добавляется в фильтр в памяти
+- отрицательный ответ фильтра точный; положительные ответы подтверждаются
+  запросом target_user_id IN (...) по индексу (account_id, target_user_id)
+- при заполнении сверх расчетной емкости фильтр пересобирается с удвоенной емкостью
+"""
+
+import math
+import logging
+import hashlib
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from database.models import FollowHistory, FollowBloomFilter
+
+logger = logging.getLogger(__name__)
+
+# Доля ложных срабатываний фильтра
+FALSE_POSITIVE_RATE = 0.01
+# Минимальная емкость фильтра (записей)
+MIN_CAPACITY = 10000
+# Размер пачки для точной проверки IN (...)
+CONFIRM_CHUNK_SIZE = 500
+
+
+class BloomFilter:
+    """Фильтр Блума над строковыми ключами (двойное хеширование blake2b)"""
+
+    def __init__(self, capacity: int, error_rate: float = FALSE_POSITIVE_RATE,
+                 hash_count: Optional[int] = None, bits: Optional[bytes] = None):
+        self.capacity = max(1, capacity)
+        if bits is not None:
+            self.bits = bytearray(bits)
+            self.hash_count = hash_count
+        else:
+            size = math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2))
+            self.bits = bytearray((size + 7) // 8)
+            self.hash_count = max(1, round(len(self.bits) * 8 / self.capacity * math.log(2)))
+        self.size = len(self.bits) * 8
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+@dataclass
+class DedupStats:
+    """Статистика проверок"""
+    checked: int = 0
+    bloom_negative: int = 0
+    confirmed: int = 0
+    false_positive: int = 0
+    rebuilds: int = 0
+    caught_up: int = 0
+
+
+class _AccountFilter:
+    """Фильтр одного аккаунта в памяти"""
+
+    def __init__(self, bloom: BloomFilter, item_count: int, last_history_id: int):
+        self.bloom = bloom
+        self.item_count = item_count
+        self.last_history_id = last_history_id
+        self.lock = threading.Lock()
+
+
+class FollowDedupIndex:
+    """Фильтры Блума истории подписок по аккаунтам"""
+
+    def __init__(self, session_factory: Optional[Callable] = None,
+                 error_rate: float = FALSE_POSITIVE_RATE,
+                 min_capacity: int = MIN_CAPACITY):
+        """
+        Args:
+            session_factory: Фабрика сессий (по умолчанию get_session из db_manager)
+            error_rate: Доля ложных срабатываний фильтра
+            min_capacity: Минимальная емкость нового фильтра
+        """
+        if session_factory is None:
+            from database.db_manager import get_session
+            session_factory = get_session
+        self._session_factory = session_factory
+        self.error_rate = error_rate
+        self.min_capacity = min_capacity
+        self._filters: Dict[int, _AccountFilter] = {}
+        self._lock = threading.Lock()
+        self._stats = DedupStats()
+
+    def _get_filter(self, session, account_id: int) -> _AccountFilter:
+        with self._lock:
+            account_filter = self._filters.get(account_id)
+            if account_filter is None:
+                account_filter = self._filters[account_id] = self._load(session, account_id)
+        return account_filter
+
+    def _load(self, session, account_id: int) -> _AccountFilter:
+        """Фильтр из БД или, если его еще нет, построенный по всей истории"""
+        row = session.get(FollowBloomFilter, account_id)
+        if row is not None:
+            bloom = BloomFilter(row.capacity, hash_count=row.hash_count, bits=row.bits)
+            return _AccountFilter(bloom, row.item_count or 0, row.last_history_id or 0)
+
+        count = session.query(FollowHistory.id).filter(FollowHistory.account_id == account_id).count()
+        return self._build(session, account_id, max(self.min_capacity, count * 2))
+
+    def _build(self, session, account_id: int, capacity: int) -> _AccountFilter:
+        """Полная сборка фильтра потоковым чтением истории аккаунта"""
+        account_filter = _AccountFilter(BloomFilter(capacity, self.error_rate), 0, 0)
+        self._add_rows(account_filter, session.query(FollowHistory.id, FollowHistory.target_user_id).filter(
+            FollowHistory.account_id == account_id
+        ).yield_per(5000))
+        self._stats.rebuilds += 1
+        logger.info(f"🧮 Фильтр истории подписок аккаунта {account_id}: "
+                    f"{account_filter.item_count} записей, емкость {capacity}")
+        self._save(session, account_id, account_filter)
+        return account_filter
+
+    @staticmethod
+    def _add_rows(account_filter: _AccountFilter, rows: Iterable) -> int:
+        added = 0
+        for history_id, target_user_id in rows:
+            account_filter.bloom.add(str(target_user_id))
+            account_filter.last_history_id = max(account_filter.last_history_id, history_id)
+            added += 1
+        account_filter.item_count += added
+        return added
+
+    def _save(self, session, account_id: int, account_filter: _AccountFilter):
+        try:
+            session.merge(FollowBloomFilter(
+                account_id=account_id,
+                capacity=account_filter.bloom.capacity,
+                hash_count=account_filter.bloom.hash_count,
+                item_count=account_filter.item_count,
+                bits=bytes(account_filter.bloom.bits),
+                last_history_id=account_filter.last_history_id,
+                updated_at=datetime.now()
+            ))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Ошибка сохранения фильтра подписок аккаунта {account_id}: {e}")
+
+    def _catch_up(self, session, account_id: int, account_filter: _AccountFilter) -> _AccountFilter:
+        """Добавляет записи истории, появившиеся после последней учтенной (в т.ч. из других процессов)"""
+        added = self._add_rows(account_filter, session.query(FollowHistory.id, FollowHistory.target_user_id).filter(
+            FollowHistory.account_id == account_id,
+            FollowHistory.id > account_filter.last_history_id
+        ).order_by(FollowHistory.id))
+        if not added:
+            return account_filter
+
+        self._stats.caught_up += added
+        if account_filter.item_count > account_filter.bloom.capacity:
+            # Переполнен - доля ложных срабатываний растет, пересобираем
+            account_filter = self._build(session, account_id, account_filter.item_count * 2)
+            with self._lock:
+                self._filters[account_id] = account_filter
+        else:
+            self._save(session, account_id, account_filter)
+        return account_filter
+
+    def find_followed(self, account_id: int, target_ids: Iterable[str]) -> Set[str]:
+        """
+        Возвращает цели, на которые аккаунт уже подписывался.
+
+        Args:
+            account_id: ID аккаунта
+            target_ids: ID пользователей Instagram (строки)
+        """
+        target_ids = [str(target_id) for target_id in target_ids]
+        if not target_ids:
+            return set()
+
+        session = self._session_factory()
+        try:
+            account_filter = self._get_filter(session, account_id)
+            with account_filter.lock:
+                account_filter = self._catch_up(session, account_id, account_filter)
+                candidates = [target_id for target_id in target_ids if target_id in account_filter.bloom]
+
+            followed = set()
+            for start in range(0, len(candidates), CONFIRM_CHUNK_SIZE):
+                chunk = candidates[start:start + CONFIRM_CHUNK_SIZE]
+                followed.update(row[0] for row in session.query(FollowHistory.target_user_id).filter(
+                    FollowHistory.account_id == account_id,
+                    FollowHistory.target_user_id.in_(chunk)
+                ))
+
+            self._stats.checked += len(target_ids)
+            self._stats.bloom_negative += len(target_ids) - len(candidates)
+            self._stats.confirmed += len(followed)
+            self._stats.false_positive += len(set(candidates) - followed)
+            return followed
+        finally:
+            session.close()
+
+    def is_followed(self, account_id: int, target_id: str) -> bool:
+        """Подписывался ли аккаунт на пользователя"""
+        return str(target_id) in self.find_followed(account_id, [target_id])
+
+    def record_follow(self, account_id: int, target_id: str):
+        """Добавляет цель в фильтр сразу после записи в историю (в БД фильтр попадет при догрузке)"""
+        with self._lock:
+            account_filter = self._filters.get(account_id)
+        if account_filter is not None:
+            with account_filter.lock:
+                account_filter.bloom.add(str(target_id))
+
+    def get_stats(self) -> Dict[str, int]:
+        stats = dict(self._stats.__dict__)
+        stats['accounts'] = len(self._filters)
+        return stats
+
+
+# Глобальный индекс
+_index: Optional[FollowDedupIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_follow_dedup_index() -> FollowDedupIndex:
+    """Получает глобальный индекс истории подписок"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = FollowDedupIndex()
+    return _index
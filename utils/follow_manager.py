@@ -2,9 +2,10 @@ import logging
 import random
 import time
 import asyncio
+import itertools
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Set
+from typing import List, Dict, Iterator, Optional, Set
 from sqlalchemy.orm import Session
 from instagrapi import Client
 from instagrapi.types import User, UserShort
@@ -12,9 +13,18 @@ from instagrapi.types import User, UserShort
 from database.models import FollowTask, FollowHistory, FollowTaskStatus, FollowSourceType
 from database.db_manager import get_session
 from instagram.client import get_instagram_client
+from utils.follow_dedup import get_follow_dedup_index
+from utils.profile_cache import get_profile_cache
 
 logger = logging.getLogger(__name__)
 
+# Поля профиля, которые проверяют флаговые фильтры задачи
+FILTER_FIELDS = {
+    'skip_private': 'is_private',
+    'skip_no_avatar': 'profile_pic_url',
+    'only_business': 'is_business',
+}
+
 
 class FollowManager:
     """Менеджер для управления автоподписками"""
@@ -67,22 +77,17 @@ class FollowManager:
     def get_unique_targets(self, all_targets: List[UserShort]) -> List[UserShort]:
         """Получить уникальные цели для подписки (которые еще не обработаны этим аккаунтом)"""
         try:
-            # Получаем историю подписок для этого аккаунта
-            followed_user_ids = self.session.query(FollowHistory.target_user_id).filter_by(
-                account_id=self.task.account_id
-            ).all()
-            
-            followed_set = {str(user_id[0]) for user_id in followed_user_ids}
-            
-            # Также добавляем уже обработанных в этой задаче
+            # Уже обработанные в этой задаче
             processed_set = set(self.task.processed_users or [])
+            candidates = [target for target in all_targets if str(target.pk) not in processed_set]
+            
+            # История подписок аккаунта: фильтр Блума + точная проверка только совпадений
+            followed_set = get_follow_dedup_index().find_followed(
+                self.task.account_id, [str(target.pk) for target in candidates]
+            )
             
             # Фильтруем только уникальные цели
-            unique_targets = []
-            for target in all_targets:
-                target_id = str(target.pk)
-                if target_id not in followed_set and target_id not in processed_set:
-                    unique_targets.append(target)
+            unique_targets = [target for target in candidates if str(target.pk) not in followed_set]
             
             logger.info(f"📊 Найдено {len(unique_targets)} уникальных целей из {len(all_targets)} общих")
             return unique_targets
@@ -91,53 +96,81 @@ class FollowManager:
             logger.error(f"Ошибка при получении уникальных целей: {e}")
             return all_targets
     
-    def apply_filters(self, users: List[UserShort]) -> List[UserShort]:
-        """Применить фильтры к списку пользователей"""
+    def _required_profile_fields(self) -> Set[str]:
+        """Поля профиля, которые нужны включенным фильтрам"""
+        filters = self.task.filters or {}
+        fields = {field for key, field in FILTER_FIELDS.items() if filters.get(key, False)}
+        if 'min_followers' in filters or 'max_followers' in filters:
+            fields.add('follower_count')
+        return fields
+    
+    def _passes_filters(self, user_info) -> bool:
+        """Проверить профиль по фильтрам задачи"""
+        filters = self.task.filters
+        
+        if filters.get('skip_private', False) and user_info.is_private:
+            return False
+        
+        if filters.get('skip_no_avatar', False) and not user_info.profile_pic_url:
+            return False
+        
+        if filters.get('only_business', False) and not getattr(user_info, 'is_business', False):
+            return False
+        
+        # Фильтры по количеству подписчиков
+        if 'min_followers' in filters or 'max_followers' in filters:
+            min_followers = filters.get('min_followers', 0)
+            max_followers = filters.get('max_followers', float('inf'))
+            if user_info.follower_count < min_followers or user_info.follower_count > max_followers:
+                return False
+        
+        return True
+    
+    def iter_filtered_users(self, users: List[UserShort]) -> Iterator[UserShort]:
+        """
+        Лениво отфильтровать пользователей.
+        Профиль запрашивается (через общий кэш) только если фильтрам не хватает
+        данных из списка источника, и только для тех, до кого дошла очередь.
+        """
         if not self.task.filters:
-            return users
+            yield from users
+            return
         
-        filtered_users = []
-        filters = self.task.filters
+        fields = self._required_profile_fields()
+        profile_cache = get_profile_cache()
+        accepted = 0
         
         for user in users:
             try:
-                # Получаем полную информацию о пользователе для фильтрации
-                if hasattr(user, 'is_private') and hasattr(user, 'follower_count'):
-                    # У нас уже есть информация
+                if all(getattr(user, field, None) is not None for field in fields):
+                    # Данных из источника достаточно
                     user_info = user
                 else:
-                    # Нужно получить полную информацию
-                    user_info = self.instagram_client.user_info(user.pk)
-                
-                # Применяем фильтры
-                if filters.get('skip_private', False) and user_info.is_private:
-                    self.task.skipped_count += 1
-                    continue
+                    user_info = profile_cache.fetch(self.instagram_client, pk=user.pk)
                 
-                if filters.get('skip_no_avatar', False) and not user_info.profile_pic_url:
+                if not self._passes_filters(user_info):
                     self.task.skipped_count += 1
                     continue
                 
-                if filters.get('only_business', False) and not getattr(user_info, 'is_business', False):
-                    self.task.skipped_count += 1
-                    continue
-                
-                # Фильтры по количеству подписчиков
-                min_followers = filters.get('min_followers', 0)
-                max_followers = filters.get('max_followers', float('inf'))
-                
-                if user_info.follower_count < min_followers or user_info.follower_count > max_followers:
-                    self.task.skipped_count += 1
-                    continue
-                
-                filtered_users.append(user)
-                
             except Exception as e:
                 logger.warning(f"Не удалось проверить пользователя {user.username}: {e}")
                 continue
+            
+            accepted += 1
+            yield user
         
-        logger.info(f"🔍 После фильтрации осталось {len(filtered_users)} из {len(users)} пользователей")
-        return filtered_users
+        logger.info(f"🔍 После фильтрации осталось {accepted} из {len(users)} пользователей "
+                    f"(кэш профилей: {profile_cache.get_stats()['hit_rate']:.0%} попаданий)")
+    
+    def remaining_quota(self) -> int:
+        """Сколько подписок осталось до лимита задачи"""
+        return max(0, (self.task.follow_limit or 0) - (self.task.followed_count or 0))
+    
+    def apply_filters(self, users: List[UserShort], limit: Optional[int] = None) -> List[UserShort]:
+        """Применить фильтры к списку пользователей (по умолчанию - не больше оставшегося лимита задачи)"""
+        if limit is None:
+            limit = self.remaining_quota()
+        return list(itertools.islice(self.iter_filtered_users(users), limit))
     
     def get_source_users(self) -> List[UserShort]:
         """Получить список пользователей из источника"""
@@ -205,11 +238,10 @@ class FollowManager:
     def follow_user(self, user: UserShort) -> bool:
         """Подписаться на пользователя"""
         try:
-            # Получаем полную информацию о пользователе через username
-            user_info = self.instagram_client.user_info_by_username(user.username)
-            
-            # Проверяем, не подписаны ли уже
-            if user_info.friendship_status.following:
+            # Профиль уже проверен при фильтрации - повторный запрос не нужен.
+            # Статус подписки зависит от аккаунта, поэтому берется только из переданного объекта
+            friendship_status = getattr(user, 'friendship_status', None)
+            if friendship_status is not None and friendship_status.following:
                 logger.info(f"ℹ️ Уже подписаны на @{user.username}")
                 return False
             
@@ -238,6 +270,7 @@ class FollowManager:
                 self.task.processed_users.append(str(user.pk))
                 
                 self.session.commit()
+                get_follow_dedup_index().record_follow(self.task.account_id, str(user.pk))
                 return True
             else:
                 logger.warning(f"⚠️ Не удалось подписаться на @{user.username}")
@@ -314,21 +347,23 @@ class FollowManager:
             # Получаем уникальные цели
             unique_users = self.get_unique_targets(all_users)
             
+            # Перемешиваем список для случайности (до фильтрации: профили
+            # запрашиваются по мере подписок и только пока не достигнут лимит)
+            random.shuffle(unique_users)
+            
             # Применяем фильтры
-            filtered_users = self.apply_filters(unique_users)
+            filtered_users = self.iter_filtered_users(unique_users)
+            first_user = next(filtered_users, None)
             
-            if not filtered_users:
+            if first_user is None:
                 self.task.status = FollowTaskStatus.COMPLETED
                 self.task.completed_at = datetime.now()
                 self.task.error = "Нет подходящих пользователей после применения фильтров"
                 self.session.commit()
                 return
             
-            # Перемешиваем список для случайности
-            random.shuffle(filtered_users)
-            
             # Выполняем подписки
-            for user in filtered_users:
+            for user in itertools.chain([first_user], filtered_users):
                 if not self.should_continue():
                     break
                 
@@ -377,7 +412,7 @@ class FollowManager:
                     username = target_username.strip().replace('@', '')
                     
                     # Получаем информацию о пользователе
-                    user_info = self.instagram_client.user_info_by_username(username)
+                    user_info = get_profile_cache().fetch(self.instagram_client, username=username)
                     if not user_info:
                         logger.warning(f"❌ Пользователь @{username} не найден")
                         self.task.failed_count += 1
@@ -386,10 +421,9 @@ class FollowManager:
                     
                     # Проверяем уникальность если нужно
                     if unique_follows:
-                        existing = self.session.query(FollowHistory).filter_by(
-                            account_id=self.task.account_id,
-                            target_user_id=str(user_info.pk)
-                        ).first()
+                        existing = get_follow_dedup_index().is_followed(
+                            self.task.account_id, str(user_info.pk)
+                        )
                         
                         if existing:
                             logger.info(f"ℹ️ Уже подписаны на @{username} ранее")
@@ -476,21 +510,23 @@ class FollowManager:
             # Получаем уникальные цели
             unique_users = await self.async_get_unique_targets(all_users)
             
-            # Применяем фильтры
-            filtered_users = await self.async_apply_filters(unique_users)
+            # Перемешиваем список для случайности (до фильтрации: профили
+            # запрашиваются по мере подписок и только пока не достигнут лимит)
+            random.shuffle(unique_users)
+            
+            # Применяем фильтры (запросы профилей - в пуле потоков)
+            filtered_users = self.iter_filtered_users(unique_users)
+            user = await self._run_in_executor(next, filtered_users, None)
             
-            if not filtered_users:
+            if user is None:
                 self.task.status = FollowTaskStatus.COMPLETED
                 self.task.completed_at = datetime.now()
                 self.task.error = "Нет подходящих пользователей после применения фильтров"
                 self.session.commit()
                 return
             
-            # Перемешиваем список для случайности
-            random.shuffle(filtered_users)
-            
             # Выполняем подписки
-            for user in filtered_users:
+            while user is not None:
                 if not await self.async_should_continue():
                     break
                 
@@ -505,6 +541,8 @@ class FollowManager:
                 else:
                     # Короткая задержка при ошибке
                     await asyncio.sleep(random.randint(5, 15))
+                
+                user = await self._run_in_executor(next, filtered_users, None)
             
             # Завершаем задачу
             if self.task.status == FollowTaskStatus.RUNNING:
@@ -533,12 +571,7 @@ class FollowManager:
         """Проверить, подписан ли уже на пользователя"""
         try:
             # Проверяем в истории подписок
-            existing = self.session.query(FollowHistory).filter_by(
-                account_id=account_id,
-                target_user_id=str(user_id)
-            ).first()
-            
-            return existing is not None
+            return get_follow_dedup_index().is_followed(account_id, str(user_id))
         except Exception as e:
             logger.error(f"Ошибка при проверке подписки: {e}")
             return False
@@ -555,6 +588,7 @@ class FollowManager:
             )
             self.session.add(history)
             self.session.commit()
+            get_follow_dedup_index().record_follow(account_id, str(user_id))
         except Exception as e:
             logger.error(f"Ошибка при сохранении истории: {e}")
     
@@ -645,9 +679,9 @@ class FollowManager:
         """Асинхронно получить уникальные цели для подписки"""
         return await self._run_in_executor(self.get_unique_targets, all_targets)
     
-    async def async_apply_filters(self, users: List[UserShort]) -> List[UserShort]:
+    async def async_apply_filters(self, users: List[UserShort], limit: Optional[int] = None) -> List[UserShort]:
         """Асинхронно применить фильтры к списку пользователей"""
-        return await self._run_in_executor(self.apply_filters, users)
+        return await self._run_in_executor(self.apply_filters, users, limit)
     
     async def async_should_continue(self) -> bool:
         """Асинхронно проверить, нужно ли продолжать выполнение задачи"""
@@ -656,13 +690,10 @@ class FollowManager:
     async def async_follow_user(self, user: UserShort) -> bool:
         """Асинхронно подписаться на пользователя"""
         try:
-            # Получаем полную информацию о пользователе через username
-            user_info = await self._run_in_executor(
-                self.instagram_client.user_info_by_username, user.username
-            )
-            
-            # Проверяем, не подписаны ли уже
-            if user_info.friendship_status.following:
+            # Профиль уже проверен при фильтрации - повторный запрос не нужен.
+            # Статус подписки зависит от аккаунта, поэтому берется только из переданного объекта
+            friendship_status = getattr(user, 'friendship_status', None)
+            if friendship_status is not None and friendship_status.following:
                 logger.info(f"ℹ️ Уже подписаны на @{user.username}")
                 return False
             
@@ -693,6 +724,7 @@ class FollowManager:
                 self.task.processed_users.append(str(user.pk))
                 
                 self.session.commit()
+                get_follow_dedup_index().record_follow(self.task.account_id, str(user.pk))
                 return True
             else:
                 logger.warning(f"⚠️ Не удалось подписаться на @{user.username}")
@@ -721,7 +753,7 @@ class FollowManager:
                     
                     # Получаем информацию о пользователе
                     user_info = await self._run_in_executor(
-                        self.instagram_client.user_info_by_username, username
+                        lambda: get_profile_cache().fetch(self.instagram_client, username=username)
                     )
                     if not user_info:
                         logger.warning(f"❌ Пользователь @{username} не найден")
@@ -732,10 +764,8 @@ class FollowManager:
                     # Проверяем уникальность если нужно
                     if unique_follows:
                         existing = await self._run_in_executor(
-                            lambda: self.session.query(FollowHistory).filter_by(
-                                account_id=self.task.account_id,
-                                target_user_id=str(user_info.pk)
-                            ).first()
+                            get_follow_dedup_index().is_followed,
+                            self.task.account_id, str(user_info.pk)
                         )
                         
                         if existing:
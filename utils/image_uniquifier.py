@@ -0,0 +1,258 @@
+"""
+Уникализация изображения за один проход
+Вместо цепочки из 8 операций PIL, каждая из которых создает новое изображение:
+- масштаб, поворот с расширением холста, обрезка краев и отражение
+  складываются в одну аффинную матрицу и выполняются одним cv2.warpAffine
+- яркость и контраст сводятся в одну таблицу (LUT), насыщенность - смешивание
+  с яркостью; всё применяется на месте полосами строк за один проход по памяти
+- размытие/резкость - одна свертка на месте
+В памяти одновременно исходник и результат (~2 буфера), время этапов учитывается.
+"""
+
+import math
+import time
+import random
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Высота полосы строк для цветового прохода
+COLOR_BLOCK_ROWS = 256
+
+# Ядро ImageFilter.SMOOTH, относительно которого PIL считает резкость
+SMOOTH_KERNEL = np.array([[1, 1, 1], [1, 5, 1], [1, 1, 1]], dtype=np.float32) / 13
+
+WHITE = (255, 255, 255)
+
+
+@dataclass
+class ImageUniquifyParams:
+    """Случайные параметры уникализации изображения (те же распределения, что и в прежней цепочке PIL)"""
+    scale: Optional[float] = None
+    angle: Optional[float] = None
+    brightness: Optional[float] = None
+    contrast: Optional[float] = None
+    saturation: Optional[float] = None
+    blur_radius: Optional[float] = None
+    sharpness: Optional[float] = None
+    crop: int = 0
+    mirror: bool = False
+    quality: int = 95
+
+    @classmethod
+    def random(cls, content_type: str) -> 'ImageUniquifyParams':
+        params = cls()
+        # 1. Небольшое изменение размера (98-102%)
+        if random.random() > 0.3:
+            params.scale = random.uniform(0.98, 1.02)
+        # 2. Поворот на небольшой угол (-2 до +2 градусов)
+        if random.random() > 0.4:
+            params.angle = random.uniform(-2, 2)
+        # 3-5. Яркость, контраст, насыщенность (90-110%)
+        if random.random() > 0.3:
+            params.brightness = random.uniform(0.9, 1.1)
+        if random.random() > 0.3:
+            params.contrast = random.uniform(0.9, 1.1)
+        if random.random() > 0.3:
+            params.saturation = random.uniform(0.9, 1.1)
+        # 6. Небольшое размытие или резкость
+        if random.random() > 0.5:
+            if random.random() > 0.5:
+                params.blur_radius = random.uniform(0.1, 0.5)
+            else:
+                params.sharpness = random.uniform(1.1, 1.3)
+        # 7. Обрезка краев (1-3 пикселя)
+        if random.random() > 0.3:
+            params.crop = random.randint(1, 3)
+        # 8. Зеркальное отражение (только для не-текстовых изображений)
+        if random.random() > 0.7 and content_type in ['story', 'carousel']:
+            params.mirror = True
+        # Качество сохранения (92-98)
+        params.quality = random.randint(92, 98)
+        return params
+
+    def describe(self) -> List[str]:
+        """Описание трансформаций для лога (как в прежней цепочке)"""
+        transformations = []
+        if self.scale is not None:
+            transformations.append(f"resize_{self.scale:.2f}")
+        if self.angle is not None:
+            transformations.append(f"rotate_{self.angle:.1f}")
+        if self.brightness is not None:
+            transformations.append(f"brightness_{self.brightness:.2f}")
+        if self.contrast is not None:
+            transformations.append(f"contrast_{self.contrast:.2f}")
+        if self.saturation is not None:
+            transformations.append(f"saturation_{self.saturation:.2f}")
+        if self.blur_radius is not None:
+            transformations.append("blur")
+        if self.sharpness is not None:
+            transformations.append("sharpen")
+        if self.crop:
+            transformations.append(f"crop_{self.crop}px")
+        if self.mirror:
+            transformations.append("mirror")
+        return transformations
+
+
+class StageTimings:
+    """Потокобезопасная статистика времени этапов"""
+
+    def __init__(self):
+        self._totals: Dict[str, float] = {}
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stages: Dict[str, float]):
+        with self._lock:
+            for stage, seconds in stages.items():
+                self._totals[stage] = self._totals.get(stage, 0.0) + seconds
+                self._counts[stage] = self._counts.get(stage, 0) + 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                stage: {
+                    'count': self._counts[stage],
+                    'total_seconds': round(total, 4),
+                    'avg_ms': round(total / self._counts[stage] * 1000, 2)
+                }
+                for stage, total in self._totals.items()
+            }
+
+
+image_stage_timings = StageTimings()
+
+
+def _rotation_matrix(width: int, height: int, angle: float) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """
+    Обратная матрица поворота с расширением холста (холст → исходник) и размер холста,
+    посчитанные так же, как в Image.rotate(expand=True)
+    """
+    radians = -math.radians(angle)
+    a, b = round(math.cos(radians), 15), round(math.sin(radians), 15)
+    d, e = -b, a
+    cx, cy = width / 2, height / 2
+    c = a * -cx + b * -cy + cx
+    f = d * -cx + e * -cy + cy
+
+    xs, ys = [], []
+    for x, y in ((0, 0), (width, 0), (width, height), (0, height)):
+        xs.append(a * x + b * y + c)
+        ys.append(d * x + e * y + f)
+    new_width = math.ceil(max(xs)) - math.floor(min(xs))
+    new_height = math.ceil(max(ys)) - math.floor(min(ys))
+
+    tx, ty = -(new_width - width) / 2, -(new_height - height) / 2
+    c, f = a * tx + b * ty + c, d * tx + e * ty + f
+    return np.array([[a, b, c], [d, e, f], [0, 0, 1]], dtype=np.float64), (new_width, new_height)
+
+
+def build_geometry(width: int, height: int, params: ImageUniquifyParams) -> Tuple[Optional[np.ndarray], Tuple[int, int]]:
+    """
+    Прямая аффинная матрица (исходник → результат) в координатах OpenCV и размер результата.
+    Возвращает None вместо матрицы, если геометрия не меняется.
+    """
+    forward = np.eye(3)
+    size = (width, height)
+
+    if params.scale is not None:
+        size = (int(width * params.scale), int(height * params.scale))
+        forward = np.diag([size[0] / width, size[1] / height, 1.0]) @ forward
+
+    if params.angle is not None:
+        inverse, size = _rotation_matrix(size[0], size[1], params.angle)
+        forward = np.linalg.inv(inverse) @ forward
+
+    if params.crop:
+        size = (size[0] - 2 * params.crop, size[1] - 2 * params.crop)
+        forward = np.array([[1, 0, -params.crop], [0, 1, -params.crop], [0, 0, 1]], dtype=np.float64) @ forward
+
+    if params.mirror:
+        forward = np.array([[-1, 0, size[0]], [0, 1, 0], [0, 0, 1]], dtype=np.float64) @ forward
+
+    if np.allclose(forward, np.eye(3)):
+        return None, size
+
+    # Непрерывные координаты PIL (центр пикселя +0.5) → координаты OpenCV (центр пикселя в целых)
+    shift = np.array([[1, 0, 0.5], [0, 1, 0.5], [0, 0, 1]])
+    unshift = np.array([[1, 0, -0.5], [0, 1, -0.5], [0, 0, 1]])
+    return (unshift @ forward @ shift)[:2], size
+
+
+def build_color_lut(image: np.ndarray, brightness: Optional[float], contrast: Optional[float]) -> Optional[np.ndarray]:
+    """
+    Одна таблица для яркости и контраста в семантике ImageEnhance:
+    яркость - смешивание с черным, контраст - со средней яркостью (L) изображения после яркости
+    """
+    if brightness is None and contrast is None:
+        return None
+
+    values = np.arange(256, dtype=np.float32)
+    if brightness is not None:
+        values = np.clip(values * brightness, 0, 255)
+    if contrast is not None:
+        r, g, b = cv2.mean(image)[:3]
+        mean = int((0.299 * r + 0.587 * g + 0.114 * b) * (brightness or 1.0) + 0.5)
+        values = np.clip(mean + contrast * (values - mean), 0, 255)
+    return values.astype(np.uint8)
+
+
+def apply_color(image: np.ndarray, lut: Optional[np.ndarray], saturation: Optional[float],
+                block_rows: int = COLOR_BLOCK_ROWS):
+    """Таблица яркости/контраста и насыщенность на месте, полосами строк за один проход"""
+    if lut is None and saturation is None:
+        return
+    for top in range(0, image.shape[0], block_rows):
+        block = image[top:top + block_rows]
+        if lut is not None:
+            cv2.LUT(block, lut, dst=block)
+        if saturation is not None:
+            # ImageEnhance.Color: смешивание с оттенками серого (L)
+            gray = cv2.cvtColor(cv2.cvtColor(block, cv2.COLOR_RGB2GRAY), cv2.COLOR_GRAY2RGB)
+            cv2.addWeighted(block, saturation, gray, 1.0 - saturation, 0, dst=block)
+
+
+def apply_filter(image: np.ndarray, blur_radius: Optional[float], sharpness: Optional[float]):
+    """Размытие по Гауссу или резкость как ImageEnhance.Sharpness - одна свертка на месте"""
+    if blur_radius is not None:
+        cv2.GaussianBlur(image, (0, 0), blur_radius, dst=image)
+    elif sharpness is not None:
+        # f * img + (1 - f) * SMOOTH(img) = свертка с одним ядром
+        kernel = (1.0 - sharpness) * SMOOTH_KERNEL
+        kernel[1, 1] += sharpness
+        cv2.filter2D(image, -1, kernel, dst=image, borderType=cv2.BORDER_REPLICATE)
+
+
+def uniquify_array(source: np.ndarray, params: ImageUniquifyParams) -> Tuple[np.ndarray, Dict[str, float]]:
+    """
+    Применяет параметры к RGB-массиву. Исходник не изменяется
+    (его можно разделять между вариантами), результат - новый массив.
+
+    Returns:
+        (результат, время этапов в секундах)
+    """
+    timings = {}
+    height, width = source.shape[:2]
+
+    started = time.perf_counter()
+    matrix, size = build_geometry(width, height, params)
+    if matrix is None:
+        result = source.copy()
+    else:
+        result = cv2.warpAffine(source, matrix, size, flags=cv2.INTER_CUBIC,
+                                borderMode=cv2.BORDER_CONSTANT, borderValue=WHITE)
+    timings['geometry'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    apply_color(result, build_color_lut(result, params.brightness, params.contrast), params.saturation)
+    timings['color'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    apply_filter(result, params.blur_radius, params.sharpness)
+    timings['filter'] = time.perf_counter() - started
+
+    return result, timings
@@ -0,0 +1,147 @@
+"""
+Общий кэш профилей Instagram для фильтрации целей автоподписки
+
+Вместо запроса user_info для каждой цели в apply_filters и повторного запроса
+user_info_by_username перед подпиской:
+- профили хранятся по pk (и по username) с TTL, размер ограничен (LRU)
+- кэш общий для всех задач и аккаунтов процесса: одна и та же аудитория
+  (подписчики популярного аккаунта, хештег) проверяется один раз
+- хранятся только данные самого профиля, не зависящие от аккаунта, который их запросил
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Значения по умолчанию, если в config.py их нет
+DEFAULT_PROFILE_CACHE_TTL = 6 * 3600
+DEFAULT_PROFILE_CACHE_SIZE = 50000
+
+
+class ProfileCache:
+    """LRU-кэш профилей с TTL"""
+
+    def __init__(self, max_size: int = DEFAULT_PROFILE_CACHE_SIZE, ttl: float = DEFAULT_PROFILE_CACHE_TTL):
+        """
+        Args:
+            max_size: Максимальное количество профилей
+            ttl: Время жизни профиля (сек)
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._profiles: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self._usernames: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'fetches': 0, 'errors': 0, 'evictions': 0, 'expired': 0}
+
+    def _lookup(self, pk: str) -> Optional[Any]:
+        entry = self._profiles.get(pk)
+        if entry is None:
+            return None
+        expires_at, profile = entry
+        if time.monotonic() >= expires_at:
+            self._remove(pk, profile)
+            self._stats['expired'] += 1
+            return None
+        self._profiles.move_to_end(pk)
+        return profile
+
+    def _remove(self, pk: str, profile: Any):
+        del self._profiles[pk]
+        username = getattr(profile, 'username', None)
+        if username and self._usernames.get(username.lower()) == pk:
+            del self._usernames[username.lower()]
+
+    def get(self, pk) -> Optional[Any]:
+        """Профиль по pk (None - нет в кэше или устарел)"""
+        with self._lock:
+            profile = self._lookup(str(pk))
+            self._stats['hits' if profile is not None else 'misses'] += 1
+            return profile
+
+    def get_by_username(self, username: str) -> Optional[Any]:
+        """Профиль по username"""
+        with self._lock:
+            pk = self._usernames.get(username.lower())
+            profile = self._lookup(pk) if pk is not None else None
+            self._stats['hits' if profile is not None else 'misses'] += 1
+            return profile
+
+    def put(self, profile: Any):
+        """Сохраняет профиль (объект с pk и username)"""
+        pk = str(profile.pk)
+        with self._lock:
+            old = self._profiles.get(pk)
+            if old is not None:
+                self._remove(pk, old[1])
+            self._profiles[pk] = (time.monotonic() + self.ttl, profile)
+            username = getattr(profile, 'username', None)
+            if username:
+                self._usernames[username.lower()] = pk
+            while len(self._profiles) > self.max_size:
+                old_pk, (_, old_profile) = next(iter(self._profiles.items()))
+                self._remove(old_pk, old_profile)
+                self._stats['evictions'] += 1
+
+    def fetch(self, client, pk=None, username: Optional[str] = None) -> Any:
+        """
+        Профиль из кэша или из Instagram (user_info / user_info_by_username).
+        Ошибки запроса пробрасываются вызывающему.
+        """
+        profile = self.get(pk) if pk is not None else self.get_by_username(username)
+        if profile is not None:
+            return profile
+
+        with self._lock:
+            self._stats['fetches'] += 1
+        try:
+            profile = client.user_info(pk) if pk is not None else client.user_info_by_username(username)
+        except Exception:
+            with self._lock:
+                self._stats['errors'] += 1
+            raise
+        if profile is not None:
+            self.put(profile)
+        return profile
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+            self._usernames.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика кэша"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._profiles)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+def _get_cache_settings() -> Tuple[int, float]:
+    try:
+        from config import PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL
+        return int(PROFILE_CACHE_SIZE), float(PROFILE_CACHE_TTL)
+    except ImportError:
+        return DEFAULT_PROFILE_CACHE_SIZE, DEFAULT_PROFILE_CACHE_TTL
+
+
+# Глобальный кэш
+_profile_cache: Optional[ProfileCache] = None
+_profile_cache_lock = threading.Lock()
+
+
+def get_profile_cache() -> ProfileCache:
+    """Получает общий кэш профилей"""
+    global _profile_cache
+    if _profile_cache is None:
+        with _profile_cache_lock:
+            if _profile_cache is None:
+                max_size, ttl = _get_cache_settings()
+                _profile_cache = ProfileCache(max_size, ttl)
+    return _profile_cache
@@ -0,0 +1,134 @@
+"""
+Балансировка аккаунтов по прокси с учетом нагрузки и качества
+- качество прокси считается по последней задержке и доле неудачных проверок
+  (см. utils/proxy_checker.py)
+- оценка нагрузки = (аккаунтов + 1) * качество, прокси хранятся в min-куче по оценке,
+  поэтому быстрый и стабильный прокси получает больше аккаунтов, чем медленный
+- назначение и освобождение - O(log n), устаревшие записи кучи пропускаются лениво
+"""
+
+import heapq
+import math
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+# Задержка, которая удваивает оценку прокси (мс)
+LATENCY_SCALE_MS = 500.0
+# Вес доли неудачных проверок
+FAILURE_WEIGHT = 4.0
+# Допустимое превышение справедливой доли, прежде чем аккаунты начнут переноситься
+OVERLOAD_TOLERANCE = 1
+
+
+@dataclass
+class ProxyLoad:
+    """Текущая нагрузка и качество прокси"""
+    proxy_id: int
+    accounts: int = 0
+    latency_ms: Optional[float] = None
+    check_count: int = 0
+    fail_count: int = 0
+    quality: float = 1.0
+
+    @property
+    def failure_rate(self) -> float:
+        return (self.fail_count or 0) / self.check_count if self.check_count else 0.0
+
+    @property
+    def score(self) -> float:
+        """Оценка после назначения еще одного аккаунта (меньше - лучше)"""
+        return (self.accounts + 1) * self.quality
+
+
+class ProxyLoadBalancer:
+    """Min-куча прокси по оценке нагрузки"""
+
+    def __init__(self, loads: Iterable[ProxyLoad]):
+        self._loads: Dict[int, ProxyLoad] = {load.proxy_id: load for load in loads}
+        self._heap: List[tuple] = []
+        self._versions: Dict[int, int] = {}
+        self._total_accounts = sum(load.accounts for load in self._loads.values())
+        self._total_weight = 0.0
+        self._compute_quality()
+        for proxy_id in self._loads:
+            self._push(proxy_id)
+
+    def _compute_quality(self):
+        """Качество: 1 + задержка / LATENCY_SCALE_MS + FAILURE_WEIGHT * доля неудач"""
+        known = [load.latency_ms for load in self._loads.values() if load.latency_ms is not None]
+        # Непроверенным прокси приписываем среднюю задержку, чтобы они не получали всё подряд
+        default_latency = sum(known) / len(known) if known else 0.0
+        for load in self._loads.values():
+            latency = load.latency_ms if load.latency_ms is not None else default_latency
+            load.quality = 1.0 + latency / LATENCY_SCALE_MS + FAILURE_WEIGHT * load.failure_rate
+            self._total_weight += 1.0 / load.quality
+
+    def _push(self, proxy_id: int):
+        version = self._versions.get(proxy_id, 0) + 1
+        self._versions[proxy_id] = version
+        heapq.heappush(self._heap, (self._loads[proxy_id].score, proxy_id, version))
+
+    def __contains__(self, proxy_id) -> bool:
+        return proxy_id in self._loads
+
+    def __len__(self) -> int:
+        return len(self._loads)
+
+    def accounts(self, proxy_id: int) -> int:
+        return self._loads[proxy_id].accounts
+
+    def acquire(self, exclude: Optional[int] = None) -> Optional[int]:
+        """Выбирает прокси с минимальной оценкой и засчитывает ему аккаунт"""
+        skipped = None
+        proxy_id = None
+        while self._heap:
+            _, candidate, version = heapq.heappop(self._heap)
+            if self._versions.get(candidate) != version or candidate not in self._loads:
+                continue  # Устаревшая запись
+            if candidate == exclude:
+                skipped = candidate
+                continue
+            proxy_id = candidate
+            break
+
+        if skipped is not None:
+            self._push(skipped)
+        if proxy_id is None:
+            return None
+
+        self._loads[proxy_id].accounts += 1
+        self._total_accounts += 1
+        self._push(proxy_id)
+        return proxy_id
+
+    def release(self, proxy_id: int):
+        """Снимает аккаунт с прокси"""
+        load = self._loads.get(proxy_id)
+        if load and load.accounts > 0:
+            load.accounts -= 1
+            self._total_accounts -= 1
+            self._push(proxy_id)
+
+    def remove(self, proxy_id: int):
+        """Исключает прокси (например, после неудачной проверки)"""
+        load = self._loads.pop(proxy_id, None)
+        self._versions.pop(proxy_id, None)
+        if load:
+            self._total_accounts -= load.accounts
+            self._total_weight -= 1.0 / load.quality
+
+    def fair_share(self, proxy_id: int) -> float:
+        """Справедливая доля аккаунтов прокси пропорционально 1 / качество"""
+        if not self._loads or self._total_weight <= 0:
+            return 0.0
+        return self._total_accounts * (1.0 / self._loads[proxy_id].quality) / self._total_weight
+
+    def is_overloaded(self, proxy_id: int) -> bool:
+        """Прокси держит заметно больше своей справедливой доли"""
+        if proxy_id not in self._loads:
+            return False
+        return self._loads[proxy_id].accounts > math.ceil(self.fair_share(proxy_id)) + OVERLOAD_TOLERANCE
+
+    def snapshot(self) -> Dict[int, int]:
+        """Количество аккаунтов по прокси"""
+        return {proxy_id: load.accounts for proxy_id, load in self._loads.items()}
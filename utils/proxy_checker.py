@@ -0,0 +1,295 @@
+"""
+Асинхронная проверка прокси
+Заменяет поток на каждый прокси с отдельным requests.get и коммитом на каждый результат:
+- все проверки идут в одном event loop через одну сессию aiohttp,
+  число одновременных проверок ограничено семафором
+- ответ не дочитывается: достаточно статуса, соединение сразу закрывается
+- проверку можно прервать (cancel() или общий дедлайн) - непроверенные прокси не трогаются;
+  вызывающий код передает свой AsyncProxyChecker (или событие отмены) в check_all_proxies
+- для каждого прокси замеряется задержка
+- результаты пишутся в БД одним executemany UPDATE в конце
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+import aiohttp
+from sqlalchemy import update, bindparam, func
+
+from database.models import Proxy
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECK_URL = 'http://httpbin.org/ip'
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_CONCURRENCY = 500
+
+# Протоколы, которые aiohttp умеет проксировать сам
+HTTP_PROTOCOLS = ('http', 'https')
+
+
+@dataclass
+class ProxyTarget:
+    """Снимок данных прокси, не привязанный к сессии БД"""
+    id: int
+    host: str
+    port: int
+    username: Optional[str] = None
+    password: Optional[str] = None
+    protocol: str = 'http'
+
+    @classmethod
+    def from_proxy(cls, proxy) -> 'ProxyTarget':
+        return cls(
+            id=proxy.id,
+            host=proxy.host,
+            port=proxy.port,
+            username=proxy.username,
+            password=proxy.password,
+            protocol=(proxy.protocol or 'http').lower()
+        )
+
+    @property
+    def url(self) -> str:
+        """URL прокси без учетных данных (они передаются отдельно)"""
+        protocol = 'http' if self.protocol in HTTP_PROTOCOLS else self.protocol
+        return f"{protocol}://{self.host}:{self.port}"
+
+
+@dataclass
+class ProxyCheckResult:
+    """Результат проверки одного прокси"""
+    proxy_id: int
+    working: bool
+    error: Optional[str] = None
+    latency_ms: Optional[float] = None
+    checked_at: datetime = field(default_factory=datetime.now)
+
+    def as_dict(self) -> Dict:
+        """Формат результата check_all_proxies"""
+        return {'working': self.working, 'error': self.error, 'latency': self.latency_ms}
+
+
+class AsyncProxyChecker:
+    """Проверка большого количества прокси в одном event loop"""
+
+    def __init__(self, check_url: str = DEFAULT_CHECK_URL,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 fallback_check: Optional[Callable] = None,
+                 cancel_event: Optional[threading.Event] = None):
+        """
+        Args:
+            check_url: Адрес, запрашиваемый через прокси (в тестах - локальная заглушка)
+            timeout: Таймаут проверки одного прокси (сек)
+            concurrency: Максимум одновременных проверок
+            fallback_check: Синхронная проверка для протоколов, которые не поддерживает aiohttp
+                (socks); по умолчанию - check_proxy из proxy_manager
+            cancel_event: Событие отмены, общее с вызывающим кодом (по умолчанию - свое)
+        """
+        self.check_url = check_url
+        self.timeout = timeout
+        self.concurrency = max(1, concurrency)
+        self._fallback_check = fallback_check
+        self._cancelled = cancel_event or threading.Event()
+
+    def cancel(self):
+        """
+        Прерывает текущую проверку (можно вызывать из другого потока).
+        Отмена до запуска не теряется: следующая проверка сразу завершится.
+        """
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    async def check_many(self, proxies: Iterable, deadline: Optional[float] = None) -> Dict[int, ProxyCheckResult]:
+        """
+        Проверяет прокси с ограниченным параллелизмом.
+
+        Args:
+            proxies: Объекты Proxy или ProxyTarget
+            deadline: Общий лимит времени проверки (сек); незавершенные проверки отменяются
+
+        Returns:
+            dict: {proxy_id: ProxyCheckResult} только для проверенных прокси
+        """
+        targets = [p if isinstance(p, ProxyTarget) else ProxyTarget.from_proxy(p) for p in proxies]
+        if not targets:
+            return {}
+        if self.cancelled:
+            # Отмена пришла до запуска - она относится к этой проверке
+            self._cancelled.clear()
+            logger.warning(f"⏹ Проверка {len(targets)} прокси отменена до запуска")
+            return {}
+
+        results: Dict[int, ProxyCheckResult] = {}
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            async def run(target: ProxyTarget):
+                async with semaphore:
+                    if self.cancelled:
+                        return
+                    results[target.id] = await self._check_one(session, target)
+
+            tasks = [asyncio.create_task(run(target)) for target in targets]
+            watcher = asyncio.create_task(self._watch_cancel(tasks))
+            try:
+                done, pending = await asyncio.wait(tasks, timeout=deadline)
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    await asyncio.gather(*pending, return_exceptions=True)
+                    logger.warning(f"⏹ Проверка прокси прервана по дедлайну: не проверено {len(pending)}")
+            finally:
+                watcher.cancel()
+
+        if self.cancelled:
+            # Отмена израсходована - тот же объект можно использовать снова
+            self._cancelled.clear()
+            logger.warning(f"⏹ Проверка прокси отменена: проверено {len(results)} из {len(targets)}")
+        return results
+
+    async def _watch_cancel(self, tasks: List[asyncio.Task]):
+        """Отменяет незавершенные проверки, как только вызван cancel()"""
+        while not self.cancelled:
+            await asyncio.sleep(0.05)
+        for task in tasks:
+            task.cancel()
+
+    async def _check_one(self, session: aiohttp.ClientSession, target: ProxyTarget) -> ProxyCheckResult:
+        """Проверяет один прокси и замеряет задержку до получения статуса"""
+        if target.protocol not in HTTP_PROTOCOLS:
+            return await self._check_fallback(target)
+
+        proxy_auth = aiohttp.BasicAuth(target.username, target.password or '') if target.username else None
+        started = time.perf_counter()
+        try:
+            async with session.get(self.check_url, proxy=target.url, proxy_auth=proxy_auth,
+                                   allow_redirects=False) as response:
+                latency_ms = (time.perf_counter() - started) * 1000
+                # Тело не читаем: статуса достаточно, соединение закрывается сразу
+                if response.status == 200:
+                    logger.debug(f"✅ Прокси {target.host}:{target.port} работает ({latency_ms:.0f} мс)")
+                    return ProxyCheckResult(target.id, True, latency_ms=latency_ms)
+                logger.warning(f"❌ Прокси {target.host}:{target.port} вернул статус {response.status}")
+                return ProxyCheckResult(target.id, False, f"Статус {response.status}", latency_ms)
+        except asyncio.TimeoutError:
+            error = "Таймаут подключения"
+        except aiohttp.ClientProxyConnectionError as e:
+            error = f"Ошибка прокси: {e}"
+        except aiohttp.ClientError as e:
+            error = f"Общая ошибка: {e}"
+        logger.warning(f"❌ Прокси {target.host}:{target.port}: {error}")
+        return ProxyCheckResult(target.id, False, error)
+
+    async def _check_fallback(self, target: ProxyTarget) -> ProxyCheckResult:
+        """Проверка socks-прокси синхронной функцией в пуле потоков"""
+        check = self._fallback_check
+        if check is None:
+            from utils.proxy_manager import check_proxy
+            check = check_proxy
+
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            proxy_id, working, error = await asyncio.wait_for(
+                loop.run_in_executor(None, check, target), timeout=self.timeout * 2
+            )
+        except asyncio.TimeoutError:
+            return ProxyCheckResult(target.id, False, "Таймаут подключения")
+        latency_ms = (time.perf_counter() - started) * 1000 if working else None
+        return ProxyCheckResult(proxy_id, working, error, latency_ms)
+
+    def check(self, proxies: Iterable, deadline: Optional[float] = None) -> Dict[int, ProxyCheckResult]:
+        """Синхронная обертка над check_many (работает и при запущенном event loop)"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.check_many(proxies, deadline))
+
+        # Вызов из асинхронного кода - проверяем в отдельном потоке со своим loop
+        holder = {}
+
+        def runner():
+            holder['results'] = asyncio.run(self.check_many(proxies, deadline))
+
+        thread = threading.Thread(target=runner, daemon=True, name="ProxyChecker")
+        thread.start()
+        thread.join()
+        return holder.get('results', {})
+
+
+def save_check_results(results: Dict[int, ProxyCheckResult], session_factory: Optional[Callable] = None) -> bool:
+    """
+    Записывает результаты проверки одной транзакцией.
+
+    Задержка обновляется только у рабочих прокси, чтобы последнее удачное измерение
+    не затиралось пустым значением.
+    """
+    if not results:
+        return True
+
+    if session_factory is None:
+        from database.db_manager import get_session
+        session_factory = get_session
+
+    table = Proxy.__table__
+    working_rows, failed_rows = [], []
+    for result in results.values():
+        row = {'b_id': result.proxy_id, 'b_checked_at': result.checked_at}
+        if result.working:
+            row['b_latency_ms'] = result.latency_ms
+            working_rows.append(row)
+        else:
+            failed_rows.append(row)
+
+    where = table.c.id == bindparam('b_id')
+    common = dict(
+        last_checked=bindparam('b_checked_at'),
+        check_count=func.coalesce(table.c.check_count, 0) + 1
+    )
+
+    session = session_factory()
+    try:
+        if working_rows:
+            session.execute(
+                update(table).where(where).values(is_active=True, latency_ms=bindparam('b_latency_ms'), **common),
+                working_rows
+            )
+        if failed_rows:
+            session.execute(
+                update(table).where(where).values(
+                    is_active=False, fail_count=func.coalesce(table.c.fail_count, 0) + 1, **common
+                ),
+                failed_rows
+            )
+        session.commit()
+        logger.info(f"💾 Сохранены результаты проверки {len(results)} прокси "
+                    f"(рабочих: {len(working_rows)}, нерабочих: {len(failed_rows)})")
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении результатов проверки прокси: {e}")
+        session.rollback()
+        return False
+    finally:
+        session.close()
+
+
+def get_proxy_checker(cancel_event: Optional[threading.Event] = None) -> AsyncProxyChecker:
+    """Создает проверку с настройками из config"""
+    try:
+        from config import PROXY_CHECK_URL, PROXY_CHECK_TIMEOUT, PROXY_CHECK_CONCURRENCY
+    except ImportError:
+        PROXY_CHECK_URL, PROXY_CHECK_TIMEOUT, PROXY_CHECK_CONCURRENCY = DEFAULT_CHECK_URL, DEFAULT_TIMEOUT, DEFAULT_CONCURRENCY
+    return AsyncProxyChecker(PROXY_CHECK_URL, PROXY_CHECK_TIMEOUT, PROXY_CHECK_CONCURRENCY,
+                             cancel_event=cancel_event)
@@ -11,13 +11,15 @@ from database.safe_user_wrapper import get_user_instagram_accounts as get_instag
 from database.user_management import get_active_users, get_user_info
 from utils.user_cache import get_user_cache, process_users_with_limits
 from utils.processing_state import ProcessingState
+from utils.proxy_checker import get_proxy_checker, save_check_results
+from utils.proxy_balancer import ProxyLoad, ProxyLoadBalancer
 from config import MAX_WORKERS
 import random
 import json
 import os
 import time
 import datetime
-from sqlalchemy import func
+from sqlalchemy import func, update, bindparam
 
 logger = logging.getLogger(__name__)
 
@@ -67,69 +69,111 @@ def check_proxy(proxy_object):
         logger.warning(f"❌ Прокси {proxy_object.host}:{proxy_object.port}: {error_msg}")
         return proxy_object.id, False, error_msg
 
-def check_all_proxies():
+def check_all_proxies(deadline=None, checker=None):
     """
     Проверка всех прокси в базе данных
 
+    Все прокси проверяются асинхронно (utils.proxy_checker), результаты
+    записываются в базу одной транзакцией после завершения проверки.
+
+    Args:
+        deadline: Общий лимит времени проверки (сек); непроверенные прокси не обновляются
+        checker: AsyncProxyChecker вызывающего кода - через его cancel() проверку можно
+            прервать из другого потока (по умолчанию создается по настройкам config)
+
     Returns:
-        dict: Словарь с результатами проверки {proxy_id: {'working': bool, 'error': str}}
+        dict: Словарь с результатами проверки {proxy_id: {'working': bool, 'error': str, 'latency': float}}
     """
-    from database.db_manager import Session
-    from database.models import Proxy
-
-    session = Session()
     try:
-        # Получаем все прокси
         proxies = get_proxies()
-        results = {}
-
-        # Проверяем прокси параллельно
-        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            futures = []
-            for proxy in proxies:
-                # Передаем сам объект прокси, а не URL
-                futures.append(executor.submit(check_proxy, proxy))
-
-            for future in concurrent.futures.as_completed(futures):
-                try:
-                    proxy_id, is_working, error = future.result()
-
-                    # Обновляем статус прокси в базе данных
-                    proxy = session.query(Proxy).filter_by(id=proxy_id).first()
-                    if proxy:
-                        proxy.is_active = is_working
-                        proxy.last_checked = datetime.datetime.utcnow()
-                        session.commit()
-
-                    results[proxy_id] = {'working': is_working, 'error': error}
-                except Exception as e:
-                    logger.error(f"Ошибка при обработке результата проверки прокси: {e}")
-
-        return results
+        if not proxies:
+            return {}
+
+        started = time.time()
+        checker = checker or get_proxy_checker()
+        results = checker.check(proxies, deadline=deadline)
+        save_check_results(results)
+
+        # Аккаунты только что отвалившихся прокси переносятся сразу, остальные остаются на месте
+        newly_dead = [proxy.id for proxy in proxies
+                      if proxy.is_active and proxy.id in results and not results[proxy.id].working]
+        if newly_dead:
+            reassign_accounts_from_proxies(newly_dead)
+
+        working = sum(1 for result in results.values() if result.working)
+        logger.info(f"🔍 Проверено {len(results)} из {len(proxies)} прокси за {time.time() - started:.1f}с, "
+                    f"рабочих: {working}")
+        return {proxy_id: result.as_dict() for proxy_id, result in results.items()}
     except Exception as e:
         logger.error(f"Ошибка при проверке прокси: {e}")
-        session.rollback()
         return {}
-    finally:
-        session.close()
+
+def load_proxy_balancer(session):
+    """
+    Загружает активные прокси с их качеством и текущим числом аккаунтов
+
+    Returns:
+        ProxyLoadBalancer: Балансировщик по всем активным прокси
+    """
+    account_counts = dict(
+        session.query(InstagramAccount.proxy_id, func.count(InstagramAccount.id))
+        .filter(InstagramAccount.proxy_id.isnot(None))
+        .group_by(InstagramAccount.proxy_id)
+        .all()
+    )
+    rows = session.query(
+        Proxy.id, Proxy.latency_ms, Proxy.check_count, Proxy.fail_count
+    ).filter(Proxy.is_active == True).all()
+
+    return ProxyLoadBalancer(
+        ProxyLoad(
+            proxy_id=row.id,
+            accounts=account_counts.get(row.id, 0),
+            latency_ms=row.latency_ms,
+            check_count=row.check_count or 0,
+            fail_count=row.fail_count or 0
+        )
+        for row in rows
+    )
+
+def save_proxy_assignments(session, assignments):
+    """
+    Записывает назначения прокси одной транзакцией
+
+    Args:
+        session: Сессия БД
+        assignments: Словарь {account_id: proxy_id}
+    """
+    if not assignments:
+        return
+    table = InstagramAccount.__table__
+    session.execute(
+        update(table).where(table.c.id == bindparam('b_id')).values(
+            proxy_id=bindparam('b_proxy_id'),
+            updated_at=bindparam('b_updated_at')
+        ),
+        [{'b_id': account_id, 'b_proxy_id': proxy_id, 'b_updated_at': datetime.datetime.now()}
+         for account_id, proxy_id in assignments.items()]
+    )
+    session.commit()
 
 def distribute_proxies():
     """
     Распределение прокси по аккаунтам Instagram
 
+    Аккаунты без прокси или с неактивным прокси получают наименее нагруженный
+    прокси с учетом его задержки и доли неудачных проверок. Аккаунты на рабочих
+    прокси остаются на месте, пока прокси не перегружен сверх своей доли.
+    Все назначения записываются одной транзакцией.
+
     Returns:
         tuple: (success, message)
     """
+    session = get_session()
     try:
-        # Получаем все активные прокси
-        from database.db_manager import Session
-        from database.models import Proxy
+        balancer = load_proxy_balancer(session)
 
-        session = Session()
-        active_proxies = session.query(Proxy).filter_by(is_active=True).all()
-        session.close()
-
-        if not active_proxies:
+        if not len(balancer):
             logger.warning("Нет активных прокси для распределения")
             return False, "Нет активных прокси"
 
@@ -147,50 +191,120 @@ def distribute_proxies():
 
         total_accounts = 0
         processed_users = 0
-        proxy_index = 0  # Глобальный индекс для циклического распределения
+        orphaned = []  # Аккаунты без прокси или с неактивным прокси
+        placed = []  # Аккаунты на рабочих прокси
 
         logger.info(f"📋 Начинаем распределение прокси для {len(users)} пользователей")
 
-        # Обрабатываем каждого пользователя отдельно
+        # Собираем аккаунты каждого пользователя отдельно
         for user_id in users:
             try:
                 processing_state.start_user_processing(user_id)
-                
+
                 # Получаем аккаунты конкретного пользователя
                 user_accounts = get_instagram_accounts(user_id=user_id)
-                
+
                 if not user_accounts:
                     processing_state.complete_user_processing(user_id, True)
                     continue
-                
+
                 total_accounts += len(user_accounts)
-                logger.info(f"👤 Пользователь {user_id}: распределяем прокси для {len(user_accounts)} аккаунтов")
-                
-                # Распределяем прокси циклически для аккаунтов пользователя
                 for account in user_accounts:
-                    proxy = active_proxies[proxy_index % len(active_proxies)]
-                    update_instagram_account(account.id, proxy_id=proxy.id)
-                    logger.info(f"Аккаунту {account.username} (пользователь {user_id}) назначен прокси {proxy.host}:{proxy.port}")
-                    proxy_index += 1
+                    if account.proxy_id in balancer:
+                        placed.append((account.id, account.proxy_id))
+                    else:
+                        orphaned.append(account.id)
 
                 # Завершаем обработку пользователя
                 processing_state.complete_user_processing(user_id, True)
                 processed_users += 1
-                
+
             except Exception as e:
                 # Ошибка обработки конкретного пользователя
                 processing_state.complete_user_processing(user_id, False, str(e))
                 logger.error(f"❌ Ошибка распределения прокси для пользователя {user_id}: {e}")
                 continue
 
+        assignments = {}
+
+        # Сначала размещаем аккаунты без рабочего прокси
+        for account_id in orphaned:
+            proxy_id = balancer.acquire()
+            if proxy_id is None:
+                break
+            assignments[account_id] = proxy_id
+
+        # Затем разгружаем прокси, которые держат заметно больше своей доли
+        for account_id, current_proxy_id in placed:
+            if not balancer.is_overloaded(current_proxy_id):
+                continue
+            balancer.release(current_proxy_id)
+            proxy_id = balancer.acquire()
+            if proxy_id is not None and proxy_id != current_proxy_id:
+                assignments[account_id] = proxy_id
+
+        save_proxy_assignments(session, assignments)
+
         # Завершаем цикл обработки
         processing_state.complete_cycle()
-        logger.info(f"🏁 Распределение прокси завершено: {processed_users}/{len(users)} пользователей, {total_accounts} аккаунтов")
+        logger.info(f"🏁 Распределение прокси завершено: {processed_users}/{len(users)} пользователей, "
+                    f"{total_accounts} аккаунтов, переназначено {len(assignments)}")
 
-        return True, f"Прокси распределены между {total_accounts} аккаунтами"
+        return True, f"Прокси распределены между {total_accounts} аккаунтами (переназначено: {len(assignments)})"
     except Exception as e:
+        session.rollback()
         logger.error(f"Ошибка при распределении прокси: {e}")
         return False, str(e)
+    finally:
+        session.close()
+
+def reassign_accounts_from_proxies(proxy_ids):
+    """
+    Переносит аккаунты с отключенных прокси, не трогая остальные назначения
+
+    Args:
+        proxy_ids: ID прокси, признанных нерабочими
+
+    Returns:
+        int: Количество перенесенных аккаунтов
+    """
+    proxy_ids = list(proxy_ids)
+    if not proxy_ids:
+        return 0
+
+    session = get_session()
+    try:
+        account_ids = [
+            row.id for row in session.query(InstagramAccount.id)
+            .filter(InstagramAccount.proxy_id.in_(proxy_ids))
+            .order_by(InstagramAccount.id)
+            .all()
+        ]
+        if not account_ids:
+            return 0
+
+        balancer = load_proxy_balancer(session)
+        for proxy_id in proxy_ids:
+            balancer.remove(proxy_id)
+
+        assignments = {}
+        for account_id in account_ids:
+            proxy_id = balancer.acquire()
+            if proxy_id is None:
+                break
+            assignments[account_id] = proxy_id
+
+        save_proxy_assignments(session, assignments)
+        if len(assignments) < len(account_ids):
+            logger.warning(f"⚠️ Нет рабочих прокси для {len(account_ids) - len(assignments)} аккаунтов")
+        logger.info(f"🔄 Перенесено {len(assignments)} аккаунтов с {len(proxy_ids)} нерабочих прокси")
+        return len(assignments)
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Ошибка при переносе аккаунтов с нерабочих прокси: {e}")
+        return 0
+    finally:
+        session.close()
 
 def parse_proxy_url(proxy_url):
     """
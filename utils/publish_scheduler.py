@@ -0,0 +1,327 @@
+"""
+Планировщик задач публикации с приоритетами
+Заменяет queue.Queue и поток-таймер на каждую отложенную задачу:
+- отложенные задачи ждут в куче по времени запуска, их переносит один поток-таймер
+- готовые задачи раскладываются по полосам (lane) аккаунтов - куча по приоритету на аккаунт
+- в общей очереди готовых стоит не больше одной задачи (голова полосы) на свободный аккаунт,
+  поэтому у аккаунта одновременно выполняется не больше одной задачи,
+  а задачи других аккаунтов никогда не ждут за ней
+"""
+
+import heapq
+import time
+import logging
+import threading
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Dict, Hashable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class TaskPriority(IntEnum):
+    """Приоритеты задач публикации (меньше - важнее)"""
+    CRITICAL = 1
+    HIGH = 2
+    NORMAL = 3
+    LOW = 4
+
+
+@dataclass
+class ScheduledPublishTask:
+    """Задача в планировщике"""
+    task_id: int
+    account_id: Optional[int] = None
+    chat_id: Any = None
+    bot: Any = None
+    priority: int = TaskPriority.NORMAL
+    run_at: float = 0.0
+    enqueued_at: float = field(default_factory=time.time)
+    seq: int = 0
+
+    @property
+    def lane_key(self) -> Hashable:
+        """Ключ полосы: аккаунт, а для задач без аккаунта - сама задача"""
+        return self.account_id if self.account_id is not None else ('task', self.task_id)
+
+
+class PublishScheduler:
+    """
+    Потокобезопасный планировщик с приоритетами, отложенным запуском
+    и полосами аккаунтов (не больше одной выполняемой задачи на аккаунт)
+    """
+
+    def __init__(self):
+        self._lanes: Dict[Hashable, List[tuple]] = {}  # lane_key -> куча (priority, seq, task)
+        self._ready: List[tuple] = []  # (priority, seq, lane_key) - головы полос свободных аккаунтов
+        self._ready_heads: Dict[Hashable, int] = {}  # lane_key -> seq актуальной записи в _ready
+        self._delayed: List[tuple] = []  # (run_at, seq, task)
+        self._busy_lanes: Set[Hashable] = set()
+        self._queued_ids: Set[int] = set()
+        self._seq = 0
+        self._closed = False
+
+        self._lock = threading.Lock()
+        self._ready_cond = threading.Condition(self._lock)
+        self._timer_cond = threading.Condition(self._lock)
+        self._timer_thread = None
+
+    def _next_seq(self) -> int:
+        self._seq += 1
+        return self._seq
+
+    def start(self):
+        """Запускает поток-таймер для отложенных задач"""
+        with self._lock:
+            self._closed = False
+            if self._timer_thread and self._timer_thread.is_alive():
+                return
+            self._timer_thread = threading.Thread(target=self._timer_loop, daemon=True, name="PublishSchedulerTimer")
+            self._timer_thread.start()
+
+    def close(self):
+        """Останавливает планировщик и будит все ожидающие потоки"""
+        with self._lock:
+            self._closed = True
+            self._ready_cond.notify_all()
+            self._timer_cond.notify_all()
+        if self._timer_thread:
+            self._timer_thread.join(timeout=5.0)
+            self._timer_thread = None
+
+    def put(self, task_id: int, account_id: Optional[int] = None, chat_id=None, bot=None,
+            priority: int = TaskPriority.NORMAL, delay_seconds: float = 0, run_at: Optional[float] = None) -> bool:
+        """
+        Добавляет задачу в планировщик.
+
+        Args:
+            task_id: ID задачи в базе данных
+            account_id: ID аккаунта (полоса для последовательного выполнения)
+            chat_id: ID чата для уведомлений
+            bot: Объект бота для уведомлений
+            priority: Приоритет задачи
+            delay_seconds: Задержка перед выполнением
+            run_at: Абсолютное время запуска (timestamp), имеет приоритет над delay_seconds
+
+        Returns:
+            bool: False, если задача уже в очереди
+        """
+        now = time.time()
+        if run_at is None:
+            run_at = now + delay_seconds if delay_seconds > 0 else now
+
+        with self._lock:
+            if task_id in self._queued_ids:
+                logger.debug(f"Задача #{task_id} уже в очереди")
+                return False
+
+            task = ScheduledPublishTask(
+                task_id=task_id,
+                account_id=account_id,
+                chat_id=chat_id,
+                bot=bot,
+                priority=int(priority),
+                run_at=run_at,
+                seq=self._next_seq()
+            )
+            self._queued_ids.add(task_id)
+            self._schedule(task, now)
+        return True
+
+    def _schedule(self, task: ScheduledPublishTask, now: float):
+        """Кладет задачу в отложенные или в полосу (вызывается под блокировкой)"""
+        if task.run_at > now:
+            heapq.heappush(self._delayed, (task.run_at, task.seq, task))
+            # Будим таймер, только если новая задача стала ближайшей
+            if self._delayed[0][2] is task:
+                self._timer_cond.notify()
+        else:
+            self._push_lane(task)
+
+    def _push_lane(self, task: ScheduledPublishTask):
+        """Кладет готовую задачу в полосу ее аккаунта (вызывается под блокировкой)"""
+        lane = self._lanes.setdefault(task.lane_key, [])
+        heapq.heappush(lane, (task.priority, task.seq, task))
+        self._publish_head(task.lane_key)
+
+    def _publish_head(self, lane_key: Hashable):
+        """Выставляет голову полосы свободного аккаунта в общую очередь (вызывается под блокировкой)"""
+        if lane_key in self._busy_lanes:
+            return
+        lane = self._lanes.get(lane_key)
+        if not lane:
+            return
+        priority, seq, _ = lane[0]
+        if self._ready_heads.get(lane_key) == seq:
+            return
+        # Прежняя запись этой полосы (если была) станет неактуальной и будет пропущена в get()
+        self._ready_heads[lane_key] = seq
+        heapq.heappush(self._ready, (priority, seq, lane_key))
+        self._ready_cond.notify()
+
+    def _timer_loop(self):
+        """Единственный поток, переносящий отложенные задачи в полосы"""
+        with self._lock:
+            while not self._closed:
+                now = time.time()
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, _, task = heapq.heappop(self._delayed)
+                    if task.task_id not in self._queued_ids:
+                        continue
+                    self._push_lane(task)
+                    logger.info(f"Задача #{task.task_id} добавлена в очередь после задержки")
+
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                self._timer_cond.wait(timeout)
+
+    def get(self, timeout: Optional[float] = None) -> Optional[ScheduledPublishTask]:
+        """
+        Забирает самую приоритетную задачу среди свободных аккаунтов и помечает аккаунт занятым.
+
+        Returns:
+            ScheduledPublishTask или None, если истек таймаут или планировщик закрыт
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._lock:
+            while True:
+                while self._ready:
+                    _, seq, lane_key = heapq.heappop(self._ready)
+                    if self._ready_heads.get(lane_key) != seq:
+                        continue  # Неактуальная запись
+                    del self._ready_heads[lane_key]
+
+                    lane = self._lanes[lane_key]
+                    _, _, task = heapq.heappop(lane)
+                    if not lane:
+                        del self._lanes[lane_key]
+                    self._busy_lanes.add(lane_key)
+                    self._queued_ids.discard(task.task_id)
+                    return task
+
+                if self._closed:
+                    return None
+                remaining = deadline - time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._ready_cond.wait(remaining)
+
+    def task_done(self, task: ScheduledPublishTask):
+        """Освобождает аккаунт и выставляет следующую задачу его полосы"""
+        with self._lock:
+            self._busy_lanes.discard(task.lane_key)
+            self._publish_head(task.lane_key)
+
+    def defer(self, task: ScheduledPublishTask, delay_seconds: float):
+        """
+        Возвращает выданную задачу в планировщик с задержкой и освобождает аккаунт.
+        Используется, когда аккаунт занят вне очереди (например, прогревом),
+        чтобы не держать поток пула на блокировке аккаунта.
+        """
+        with self._lock:
+            self._busy_lanes.discard(task.lane_key)
+            now = time.time()
+            task.run_at = now + delay_seconds
+            task.seq = self._next_seq()
+            self._queued_ids.add(task.task_id)
+            self._schedule(task, now)
+            self._publish_head(task.lane_key)
+
+    def remove(self, task_id: int) -> bool:
+        """Удаляет задачу из очереди (если она еще не запущена)"""
+        with self._lock:
+            if task_id not in self._queued_ids:
+                return False
+            self._queued_ids.discard(task_id)
+            self._delayed = [item for item in self._delayed if item[2].task_id != task_id]
+            heapq.heapify(self._delayed)
+            for lane_key, lane in list(self._lanes.items()):
+                if any(item[2].task_id == task_id for item in lane):
+                    lane[:] = [item for item in lane if item[2].task_id != task_id]
+                    heapq.heapify(lane)
+                    self._ready_heads.pop(lane_key, None)
+                    if lane:
+                        self._publish_head(lane_key)
+                    else:
+                        del self._lanes[lane_key]
+                    break
+            self._timer_cond.notify()
+            return True
+
+    def next_run_at(self) -> Optional[float]:
+        """Время запуска ближайшей отложенной задачи"""
+        with self._lock:
+            return self._delayed[0][0] if self._delayed else None
+
+    def qsize(self) -> int:
+        """Общее количество задач в планировщике"""
+        with self._lock:
+            return len(self._queued_ids)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Статистика планировщика"""
+        with self._lock:
+            return {
+                'ready_accounts': len(self._ready_heads),
+                'lanes': len(self._lanes),
+                'queued_in_lanes': sum(len(lane) for lane in self._lanes.values()),
+                'delayed': len(self._delayed),
+                'busy_accounts': len(self._busy_lanes),
+                'total': len(self._queued_ids)
+            }
+
+
+class LatencyHistogram:
+    """Потокобезопасная гистограмма задержек с фиксированными границами корзин (секунды)"""
+
+    DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 600)
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # Последняя корзина - всё, что больше
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """Добавляет наблюдение"""
+        value = max(0.0, value)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += value
+            if value > self._max:
+                self._max = value
+
+    def percentile(self, p: float) -> float:
+        """Оценка перцентиля по верхней границе корзины"""
+        with self._lock:
+            if not self._count:
+                return 0.0
+            target = self._count * p / 100
+            cumulative = 0
+            for i, count in enumerate(self._counts):
+                cumulative += count
+                if cumulative >= target:
+                    return self.buckets[i] if i < len(self.buckets) else self._max
+            return self._max
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Возвращает состояние гистограммы для статистики"""
+        p50, p95, p99 = self.percentile(50), self.percentile(95), self.percentile(99)
+        with self._lock:
+            labels = [f"<={bound}s" for bound in self.buckets] + [f">{self.buckets[-1]}s"]
+            return {
+                'count': self._count,
+                'avg': self._sum / self._count if self._count else 0.0,
+                'max': self._max,
+                'p50': p50,
+                'p95': p95,
+                'p99': p99,
+                'buckets': dict(zip(labels, self._counts))
+            }
@@ -10,12 +10,20 @@ from database.db_manager import get_pending_tasks, update_publish_task_status, g
 from instagram.profile_manager import ProfileManager
 from instagram.post_manager import PostManager
 from instagram.reels_manager import ReelsManager
-from database.db_manager import get_scheduled_tasks
+from database.db_manager import claim_due_scheduled_tasks, get_next_scheduled_time, scheduled_tasks_changed
 from utils.task_queue import add_task_to_queue
 from instagram.client import Client
 
 logger = logging.getLogger(__name__)
 
+# Максимальный сон между проверками отложенных задач (сек): задачи,
+# созданные другим процессом, будут замечены не позже этого срока
+MAX_SCHEDULER_SLEEP = 60
+
+# Минимальный сон, если наступившие задачи остались, но ни одну забрать не удалось
+# (например, "database is locked"): без него цикл крутится без пауз
+MIN_SCHEDULER_SLEEP = 1
+
 def execute_task(task):
     """Выполнение запланированной задачи"""
     try:
@@ -45,43 +53,61 @@ def execute_task(task):
         update_publish_task_status(task.id, 'failed', error_message=str(e))
 
 def check_scheduled_tasks(bot=None):
-    """Проверка и выполнение запланированных задач"""
+    """
+    Запуск наступивших запланированных задач
+    
+    Returns:
+        float: Через сколько секунд проверить снова (до ближайшего срока, не больше MAX_SCHEDULER_SLEEP;
+            не меньше MIN_SCHEDULER_SLEEP, если наступившие задачи забрать не удалось)
+    """
     try:
         # Получаем текущее время в локальной временной зоне
         now = datetime.datetime.now()
         
         logger.debug(f"🕐 Проверка запланированных задач. Текущее время: {now}")
 
-        # Получаем все запланированные задачи
-        tasks = get_scheduled_tasks()
+        # Забираем только наступившие задачи (атомарно переводятся в PROCESSING)
+        tasks = claim_due_scheduled_tasks(now)
         
-        logger.debug(f"📋 Найдено {len(tasks)} запланированных задач")
+        logger.debug(f"📋 Найдено {len(tasks)} наступивших задач")
 
         for task in tasks:
-            # Если время выполнения задачи наступило или прошло
-            if task.scheduled_time and task.scheduled_time <= now:
-                logger.info(f"⏰ Время выполнения задачи #{task.id} наступило! Запланировано: {task.scheduled_time}, Сейчас: {now}")
-                
-                # Используем новую систему очереди задач для всех типов задач
-                if bot:
-                    logger.info(f"📤 Добавление задачи #{task.id} (тип: {task.task_type}) в очередь задач")
-                    # Получаем user_id из задачи для отправки уведомлений
-                    user_id = task.user_id if hasattr(task, 'user_id') else None
-                    logger.info(f"📧 User ID для уведомлений: {user_id}")
-                    add_task_to_queue(task.id, user_id, bot)
-                else:
-                    # Fallback для старого механизма если нет бота
-                    logger.info(f"🔄 Запуск задачи #{task.id} в отдельном потоке (fallback)")
-                    threading.Thread(target=execute_task, args=(task,)).start()
+            logger.info(f"⏰ Время выполнения задачи #{task.id} наступило! Запланировано: {task.scheduled_time}, Сейчас: {now}")
+            
+            # Используем новую систему очереди задач для всех типов задач
+            if bot:
+                logger.info(f"📤 Добавление задачи #{task.id} (тип: {task.task_type}) в очередь задач")
+                # Получаем user_id из задачи для отправки уведомлений
+                user_id = task.user_id if hasattr(task, 'user_id') else None
+                logger.info(f"📧 User ID для уведомлений: {user_id}")
+                add_task_to_queue(task.id, user_id, bot)
             else:
-                if task.scheduled_time:
-                    time_diff = task.scheduled_time - now
-                    logger.debug(f"⏳ Задача #{task.id} запланирована на {task.scheduled_time} (через {time_diff})")
+                # Fallback для старого механизма если нет бота
+                logger.info(f"🔄 Запуск задачи #{task.id} в отдельном потоке (fallback)")
+                threading.Thread(target=execute_task, args=(task,)).start()
+        
+        # Спим до ближайшего срока
+        next_time = get_next_scheduled_time()
+        if next_time is None:
+            return MAX_SCHEDULER_SLEEP
+        time_diff = (next_time - datetime.datetime.now()).total_seconds()
+        logger.debug(f"⏳ Ближайшая задача запланирована на {next_time} (через {max(0.0, time_diff):.0f} сек)")
+        # Сразу повторяем, только если этот проход что-то забрал (задач больше лимита)
+        min_delay = 0.0 if tasks else MIN_SCHEDULER_SLEEP
+        return min(max(min_delay, time_diff), MAX_SCHEDULER_SLEEP)
                     
     except Exception as e:
         logger.error(f"❌ Ошибка при проверке запланированных задач: {e}")
         import traceback
         logger.error(traceback.format_exc())
+        return MAX_SCHEDULER_SLEEP
+
+def run_scheduled_tasks_loop(bot=None):
+    """Цикл запуска отложенных задач: сон до ближайшего срока или до создания новой задачи"""
+    while True:
+        scheduled_tasks_changed.clear()
+        delay = check_scheduled_tasks(bot=bot)
+        scheduled_tasks_changed.wait(delay)
 
 def refresh_account_sessions():
     """Периодическое обновление сессий аккаунтов"""
@@ -130,8 +156,8 @@ def start_scheduler():
         updater = Updater(TELEGRAM_TOKEN, use_context=True)
         bot = updater.bot
 
-        # Проверяем запланированные задачи каждую минуту
-        schedule.every(1).minutes.do(check_scheduled_tasks, bot=bot)
+        # Запланированные задачи запускаются отдельным потоком точно к сроку
+        threading.Thread(target=run_scheduled_tasks_loop, kwargs={'bot': bot}, daemon=True).start()
 
         # Обновляем сессии аккаунтов каждые 12 часов
         schedule.every(12).hours.do(refresh_account_sessions)
@@ -1,6 +1,17 @@
 #!/usr/bin/env python3
 """
 Умный сервис валидации аккаунтов с управлением нагрузкой
+
+Ожидание результата проверки - через Future на аккаунт, без опроса статуса:
+- запрос проверки возвращает Future, который завершается итоговым статусом
+  (VALID после проверки, либо результатом восстановления невалидного аккаунта)
+- одновременные запросы по одному аккаунту получают один и тот же Future
+- для асинхронного кода Future оборачивается в asyncio (await_validation)
+
+Состояние проверок (результат, время, cooldown) переживает перезапуск:
+- итоговые статусы пишутся пачками в account_validation_states фоновым потоком
+- при запуске состояние загружается, и аккаунты не проверяются заново все разом
+- периодические проверки распределяются равномерно по интервалу проверки
 """
 
 import asyncio
@@ -10,13 +21,14 @@ import threading
 import queue
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple, Set
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from sqlalchemy import bindparam, insert, update
 from dataclasses import dataclass
 from enum import Enum
 import random
 
 from database.db_manager import get_session, update_instagram_account
-from database.models import InstagramAccount
+from database.models import InstagramAccount, AccountValidationState
 from database.safe_user_wrapper import get_user_instagram_accounts as get_instagram_accounts
 from database.user_management import get_active_users, get_user_info
 from utils.user_cache import get_user_cache, process_users_with_limits
@@ -25,6 +37,9 @@ from instagram.client import get_instagram_client
 
 logger = logging.getLogger(__name__)
 
+# Как часто сбрасывать изменившиеся состояния проверок в БД (сек)
+STATE_FLUSH_INTERVAL = 10.0
+
 class ValidationPriority(Enum):
     """Приоритеты валидации"""
     CRITICAL = 1  # Аккаунт нужен для активной задачи
@@ -98,6 +113,15 @@ class SmartValidatorService:
         self.active_checks: Set[int] = set()
         self.active_recoveries: Set[int] = set()
         
+        # Незавершенные проверки: общий Future на аккаунт и аккаунты, ожидающие проверки в очереди
+        self._pending_checks: Dict[int, Future] = {}
+        self._queued_checks: Set[int] = set()
+        
+        # Аккаунты, чье итоговое состояние еще не записано в БД
+        self._dirty_states: Set[int] = set()
+        self._state_stats = {'loaded': 0, 'flushes': 0, 'rows_written': 0, 'errors': 0}
+        self._stop_event = threading.Event()
+        
         # Потоки и исполнители
         self.is_running = False
         self._check_thread = None
@@ -128,6 +152,10 @@ class SmartValidatorService:
             return
         
         self.is_running = True
+        self._stop_event.clear()
+        
+        # Восстанавливаем результаты проверок до перезапуска
+        self.load_state()
         
         # Запускаем потоки
         self._check_thread = threading.Thread(target=self._check_worker, daemon=True)
@@ -138,50 +166,97 @@ class SmartValidatorService:
         self._recovery_thread.start()
         self._monitor_thread.start()
         
-        # Запускаем периодическую проверку
+        # Запускаем периодическую проверку и запись состояния
         threading.Thread(target=self._periodic_check, daemon=True).start()
+        threading.Thread(target=self._state_writer, daemon=True).start()
         
         logger.info("✅ Умный валидатор запущен")
     
     def stop(self):
         """Остановка сервиса"""
         self.is_running = False
+        self._stop_event.set()
         self._check_executor.shutdown(wait=True)
         self._recovery_executor.shutdown(wait=True)
+        self.flush_state()
+        
+        # Будим ожидающих: проверок больше не будет
+        with self._status_lock:
+            pending = [(account_id, self._status_of(account_id)) for account_id in self._pending_checks]
+        for account_id, status in pending:
+            self._settle(account_id, status)
         logger.info("🛑 Умный валидатор остановлен")
     
-    def request_validation(self, account_id: int, priority: ValidationPriority = ValidationPriority.NORMAL):
+    def request_validation(self, account_id: int, priority: ValidationPriority = ValidationPriority.NORMAL) -> Future:
         """
         Запросить валидацию аккаунта
         
         Args:
             account_id: ID аккаунта
             priority: Приоритет проверки
+            
+        Returns:
+            Future: Завершится итоговым статусом аккаунта (AccountStatus).
+            Повторный запрос по аккаунту, проверка которого еще не закончена, получает тот же Future.
         """
         with self._status_lock:
             task = self.account_statuses.get(account_id)
+            pending = self._pending_checks.get(account_id)
             
-            # Если аккаунт уже проверяется или восстанавливается
-            if task and task.status in [AccountStatus.CHECKING, AccountStatus.RECOVERING]:
+            # Если аккаунт уже ждет проверки, проверяется или восстанавливается - присоединяемся
+            if pending is not None:
+                if account_id in self._queued_checks and priority.value < task.priority.value:
+                    # Проверка еще в очереди - поднимаем приоритет (первая извлеченная запись выполнится)
+                    task.priority = priority
+                    self.check_queue.put((priority.value, account_id))
                 logger.debug(f"Аккаунт {account_id} уже обрабатывается")
-                return
+                return pending
             
             # Если аккаунт в cooldown после неудачного восстановления
             if task and task.status == AccountStatus.COOLDOWN:
                 if task.next_check and datetime.now() < task.next_check:
                     logger.debug(f"Аккаунт {account_id} в cooldown до {task.next_check}")
-                    return
+                    return self._completed(task.status)
             
             # Создаем или обновляем задачу
             if not task:
                 task = ValidationTask(account_id=account_id, priority=priority)
                 self.account_statuses[account_id] = task
             else:
-                task.priority = min(task.priority, priority)  # Повышаем приоритет
+                task.priority = priority
             
             # Добавляем в очередь проверки
+            future = self._pending_checks[account_id] = Future()
+            self._queued_checks.add(account_id)
             self.check_queue.put((priority.value, account_id))
             logger.debug(f"Добавлена проверка аккаунта {account_id} с приоритетом {priority.name}")
+            return future
+    
+    def get_pending_check(self, account_id: int) -> Optional[Future]:
+        """Future незавершенной проверки аккаунта (None, если проверка не идет)"""
+        with self._status_lock:
+            return self._pending_checks.get(account_id)
+    
+    @staticmethod
+    def _completed(status: Optional[AccountStatus]) -> Future:
+        future = Future()
+        future.set_result(status)
+        return future
+    
+    def _status_of(self, account_id: int) -> Optional[AccountStatus]:
+        """Статус аккаунта (вызывается под _status_lock)"""
+        task = self.account_statuses.get(account_id)
+        return task.status if task else None
+    
+    def _settle(self, account_id: int, status: Optional[AccountStatus]):
+        """Завершить Future проверки аккаунта и разбудить всех ожидающих"""
+        with self._status_lock:
+            future = self._pending_checks.pop(account_id, None)
+            self._queued_checks.discard(account_id)
+            if account_id in self.account_statuses:
+                self._dirty_states.add(account_id)
+        if future is not None and not future.done():
+            future.set_result(status)
     
     def get_account_status(self, account_id: int) -> Optional[AccountStatus]:
         """Получить статус аккаунта"""
@@ -218,10 +293,11 @@ class SmartValidatorService:
                     time.sleep(5)
                     continue
                 
-                # Проверяем, не проверяется ли уже
+                # Проверяем, не проверяется ли уже (повторные записи после повышения приоритета)
                 with self._status_lock:
-                    if account_id in self.active_checks:
+                    if account_id in self.active_checks or account_id not in self._queued_checks:
                         continue
+                    self._queued_checks.discard(account_id)
                     self.active_checks.add(account_id)
                 
                 # Запускаем проверку
@@ -266,6 +342,7 @@ class SmartValidatorService:
     
     def _check_account(self, account_id: int):
         """Проверка одного аккаунта"""
+        needs_recovery = False
         try:
             # Обновляем статус
             with self._status_lock:
@@ -309,7 +386,8 @@ class SmartValidatorService:
                     logger.info(f"✅ @{account.username} валиден")
                 else:
                     task.status = AccountStatus.INVALID
-                    # Добавляем в очередь восстановления с приоритетом
+                    # Добавляем в очередь восстановления с приоритетом (ожидающие дождутся его результата)
+                    needs_recovery = True
                     self.recovery_queue.put((task.priority.value, account_id))
                     logger.warning(f"❌ @{account.username} невалиден, добавлен в очередь восстановления")
             
@@ -329,6 +407,9 @@ class SmartValidatorService:
         finally:
             with self._status_lock:
                 self.active_checks.discard(account_id)
+                status = self._status_of(account_id)
+            if not needs_recovery:
+                self._settle(account_id, status)
     
     def _recover_account(self, account_id: int):
         """Восстановление одного аккаунта"""
@@ -388,6 +469,8 @@ class SmartValidatorService:
         finally:
             with self._status_lock:
                 self.active_recoveries.discard(account_id)
+                status = self._status_of(account_id)
+            self._settle(account_id, status)
     
     def _quick_check(self, account: InstagramAccount) -> bool:
         """
@@ -558,9 +641,12 @@ class SmartValidatorService:
     
     def _periodic_check(self):
         """Периодическая проверка всех аккаунтов"""
+        next_cycle = time.monotonic() + self.check_interval
         while self.is_running:
             try:
-                time.sleep(self.check_interval)
+                if self._stop_event.wait(max(0.0, next_cycle - time.monotonic())):
+                    return
+                next_cycle = time.monotonic() + self.check_interval
                 
                 if self.system_load.is_high_load:
                     logger.info("⏸️ Пропускаем периодическую проверку из-за высокой нагрузки")
@@ -581,6 +667,7 @@ class SmartValidatorService:
                 processing_state.start_cycle(users)
                 
                 processed_users = 0
+                due_accounts = []
                 for user_id in users:
                     try:
                         # Проверяем системную нагрузку перед каждым пользователем
@@ -621,15 +708,15 @@ class SmartValidatorService:
                                         if time_since_check < 10800:  # 3 часа для неактивных
                                             continue
                             
-                            # Добавляем в очередь с низким приоритетом
-                            self.request_validation(account.id, ValidationPriority.LOW)
+                            # Проверим с низким приоритетом, распределив по интервалу
+                            due_accounts.append(account.id)
                             user_processed_accounts += 1
                         
                         # Завершаем обработку пользователя
                         processing_state.complete_user_processing(user_id, True)
                         processed_users += 1
                         
-                        logger.debug(f"✅ Пользователь {user_id}: {user_processed_accounts} аккаунтов добавлено в очередь")
+                        logger.debug(f"✅ Пользователь {user_id}: {user_processed_accounts} аккаунтов запланировано к проверке")
                         
                         # Пауза между пользователями
                         time.sleep(0.1)
@@ -644,9 +731,128 @@ class SmartValidatorService:
                 processing_state.complete_cycle()
                 logger.info(f"🏁 Периодическая проверка завершена: {processed_users}/{len(users)} пользователей")
                 
+                # Не все сразу: проверки растягиваются до следующего цикла
+                self._stagger_requests(due_accounts, next_cycle)
+                
             except Exception as e:
                 logger.error(f"Ошибка периодической проверки: {e}")
     
+    def load_state(self) -> int:
+        """
+        Загрузить сохраненные результаты проверок (аккаунты, уже известные в памяти, не затираются)
+        
+        Returns:
+            int: Количество загруженных аккаунтов
+        """
+        session = get_session()
+        try:
+            rows = session.query(AccountValidationState).all()
+        except Exception as e:
+            logger.error(f"Ошибка загрузки состояния проверок: {e}")
+            return 0
+        finally:
+            session.close()
+        
+        loaded = 0
+        with self._status_lock:
+            for row in rows:
+                if row.account_id in self.account_statuses:
+                    continue
+                try:
+                    status = AccountStatus(row.status)
+                except ValueError:
+                    continue
+                self.account_statuses[row.account_id] = ValidationTask(
+                    account_id=row.account_id,
+                    priority=ValidationPriority.LOW,
+                    retry_count=row.retry_count or 0,
+                    last_check=row.last_check,
+                    next_check=row.next_check,
+                    status=status
+                )
+                loaded += 1
+            self._state_stats['loaded'] += loaded
+        
+        if loaded:
+            logger.info(f"📂 Загружено состояние проверок {loaded} аккаунтов")
+        return loaded
+    
+    def flush_state(self) -> bool:
+        """Записать изменившиеся итоговые состояния одной транзакцией"""
+        with self._status_lock:
+            rows = []
+            for account_id in self._dirty_states:
+                task = self.account_statuses.get(account_id)
+                # Промежуточные статусы не сохраняем: после перезапуска проверка не продолжится
+                if task and task.status not in (AccountStatus.CHECKING, AccountStatus.RECOVERING):
+                    rows.append({
+                        'b_account_id': account_id,
+                        'b_status': task.status.value,
+                        'b_retry_count': task.retry_count,
+                        'b_last_check': task.last_check,
+                        'b_next_check': task.next_check,
+                        'b_updated_at': datetime.now()
+                    })
+            dirty, self._dirty_states = self._dirty_states, set()
+        if not rows:
+            return True
+        
+        table = AccountValidationState.__table__
+        session = get_session()
+        try:
+            ids = [row['b_account_id'] for row in rows]
+            existing = {row[0] for row in session.query(AccountValidationState.account_id).filter(
+                AccountValidationState.account_id.in_(ids)
+            )}
+            values = dict(
+                status=bindparam('b_status'),
+                retry_count=bindparam('b_retry_count'),
+                last_check=bindparam('b_last_check'),
+                next_check=bindparam('b_next_check'),
+                updated_at=bindparam('b_updated_at')
+            )
+            updates = [row for row in rows if row['b_account_id'] in existing]
+            inserts = [row for row in rows if row['b_account_id'] not in existing]
+            if updates:
+                session.execute(
+                    update(table).where(table.c.account_id == bindparam('b_account_id')).values(**values), updates
+                )
+            if inserts:
+                session.execute(insert(table).values(account_id=bindparam('b_account_id'), **values), inserts)
+            session.commit()
+            
+            with self._status_lock:
+                self._state_stats['flushes'] += 1
+                self._state_stats['rows_written'] += len(rows)
+            return True
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Ошибка записи состояния проверок: {e}")
+            with self._status_lock:
+                self._state_stats['errors'] += 1
+                self._dirty_states |= dirty
+            return False
+        finally:
+            session.close()
+    
+    def _state_writer(self):
+        """Фоновая запись состояния проверок пачками"""
+        while not self._stop_event.wait(STATE_FLUSH_INTERVAL):
+            self.flush_state()
+    
+    def _stagger_requests(self, account_ids: List[int], deadline: float):
+        """Равномерно распределить плановые проверки до deadline (time.monotonic)"""
+        if not account_ids:
+            return
+        spacing = max(0.0, deadline - time.monotonic()) / len(account_ids)
+        logger.info(f"📅 {len(account_ids)} плановых проверок, интервал между ними {spacing:.1f} сек")
+        for account_id in account_ids:
+            if not self.is_running:
+                return
+            self.request_validation(account_id, ValidationPriority.LOW)
+            if self._stop_event.wait(spacing):
+                return
+    
     def get_stats(self) -> Dict:
         """Получить статистику работы"""
         with self._status_lock:
@@ -662,6 +868,8 @@ class SmartValidatorService:
                 'status_counts': status_counts,
                 'active_checks': len(self.active_checks),
                 'active_recoveries': len(self.active_recoveries),
+                'pending_checks': len(self._pending_checks),
+                'state_persistence': dict(self._state_stats, dirty=len(self._dirty_states)),
                 'check_queue_size': self.check_queue.qsize(),
                 'recovery_queue_size': self.recovery_queue.qsize(),
                 'system_load': {
@@ -684,6 +892,32 @@ def get_smart_validator() -> SmartValidatorService:
                 _smart_validator_instance = SmartValidatorService()
     return _smart_validator_instance
 
+# Сколько ждать проверки, которая уже идет, и результата проверки для критических задач (сек)
+IN_PROGRESS_WAIT = 10
+CRITICAL_WAIT = 30
+
+
+def wait_for_validation(future: Optional[Future], timeout: float) -> Optional[AccountStatus]:
+    """Дождаться итогового статуса (None - не дождались)"""
+    if future is None:
+        return None
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        return None
+
+
+async def await_validation(future: Optional[Future], timeout: float) -> Optional[AccountStatus]:
+    """Асинхронно дождаться итогового статуса, не занимая поток (None - не дождались)"""
+    if future is None:
+        return None
+    try:
+        # shield: таймаут ожидающего не отменяет общую проверку
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+    except asyncio.TimeoutError:
+        return None
+
+
 def validate_before_use(account_id: int, priority: ValidationPriority = ValidationPriority.HIGH) -> bool:
     """
     Проверить аккаунт перед использованием
@@ -700,24 +934,40 @@ def validate_before_use(account_id: int, priority: ValidationPriority = Validati
     if status == AccountStatus.VALID:
         return True
     
-    # Если проверяется или восстанавливается - ждем немного
+    # Если проверяется или восстанавливается - ждем результата
     if status in [AccountStatus.CHECKING, AccountStatus.RECOVERING]:
-        for _ in range(10):  # Ждем до 10 секунд
-            time.sleep(1)
-            status = validator.get_account_status(account_id)
-            if status == AccountStatus.VALID:
-                return True
-            elif status not in [AccountStatus.CHECKING, AccountStatus.RECOVERING]:
-                break
+        result = wait_for_validation(validator.get_pending_check(account_id), IN_PROGRESS_WAIT)
+        if result == AccountStatus.VALID:
+            return True
+        status = validator.get_account_status(account_id)
     
     # Если невалиден или неизвестен - запрашиваем проверку
     if status in [None, AccountStatus.INVALID]:
-        validator.request_validation(account_id, priority)
+        future = validator.request_validation(account_id, priority)
         # Для критических задач ждем результат
         if priority == ValidationPriority.CRITICAL:
-            for _ in range(30):  # Ждем до 30 секунд
-                time.sleep(1)
-                if validator.is_account_valid(account_id):
-                    return True
+            return wait_for_validation(future, CRITICAL_WAIT) == AccountStatus.VALID
+    
+    return False
+
+
+async def validate_before_use_async(account_id: int, priority: ValidationPriority = ValidationPriority.HIGH) -> bool:
+    """Асинхронный вариант validate_before_use"""
+    validator = get_smart_validator()
+    
+    status = validator.get_account_status(account_id)
+    if status == AccountStatus.VALID:
+        return True
+    
+    if status in [AccountStatus.CHECKING, AccountStatus.RECOVERING]:
+        result = await await_validation(validator.get_pending_check(account_id), IN_PROGRESS_WAIT)
+        if result == AccountStatus.VALID:
+            return True
+        status = validator.get_account_status(account_id)
+    
+    if status in [None, AccountStatus.INVALID]:
+        future = validator.request_validation(account_id, priority)
+        if priority == ValidationPriority.CRITICAL:
+            return await await_validation(future, CRITICAL_WAIT) == AccountStatus.VALID
     
-    return False 
\ No newline at end of file
+    return False
@@ -5,9 +5,11 @@
 
 import os
 import sys
+import time
 import logging
+import threading
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable, Callable, List, Tuple
 
 # Добавляем путь к admin_bot для импорта
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'admin_bot'))
@@ -17,16 +19,163 @@ from admin_bot.models.user import User, UserStatus, SubscriptionPlan, PLAN_INFO
 
 logger = logging.getLogger(__name__)
 
+# Время жизни решения о доступе по умолчанию (сек)
+DEFAULT_ACCESS_CACHE_TTL = 30.0
+
+
+class AccessDecisionCache:
+    """
+    Кэш решений о доступе по telegram_id с TTL.
+
+    Запись живет не дольше TTL и не дольше окончания подписки. Изменения пользователя
+    в этом процессе сбрасывают его запись сразу (через подписку на хранилище),
+    изменения из другого процесса (админ-бота) - не позже чем через TTL: раз в TTL
+    читается журнал изменений пользователей (отметки активности в него не пишутся).
+    """
+
+    def __init__(self, ttl: float = DEFAULT_ACCESS_CACHE_TTL, change_seq: int = 0):
+        self.ttl = ttl
+        self._entries: Dict[int, tuple] = {}
+        self._lock = threading.Lock()
+        self._change_seq = change_seq
+        self._next_sync = time.monotonic() + ttl
+        self._generation = 0
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'resets': 0}
+
+    def sync(self, changes_since: Callable[[int], Tuple[int, Optional[List[int]]]]):
+        """
+        Не чаще раза в TTL сбрасывает записи пользователей, измененных после
+        последней синхронизации (в т.ч. другим процессом).
+
+        Args:
+            changes_since: UserStore.changes_since - (номер записи журнала, telegram_id
+                измененных или None, если журнал отрезан и сбросить нужно все)
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_sync:
+                return
+            self._next_sync = now + self.ttl
+            seq = self._change_seq
+
+        try:
+            last_seq, telegram_ids = changes_since(seq)
+        except Exception as e:
+            logger.error(f"Ошибка чтения журнала изменений пользователей: {e}")
+            return
+
+        with self._lock:
+            if last_seq == self._change_seq:
+                return
+            self._change_seq = last_seq
+            self._generation += 1
+            if telegram_ids is None:
+                if self._entries:
+                    self._stats['resets'] += 1
+                self._entries.clear()
+                return
+            for telegram_id in telegram_ids:
+                if self._entries.pop(telegram_id, None) is not None:
+                    self._stats['invalidations'] += 1
+
+    def get(self, telegram_id: int) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(telegram_id)
+            if entry is None or entry[0] <= now:
+                self._stats['misses'] += 1
+                return None
+            self._stats['hits'] += 1
+            return entry[1]
+
+    @property
+    def generation(self) -> int:
+        """Номер последнего сброса: решение, вычисленное до сброса, не кэшируется"""
+        return self._generation
+
+    def put(self, telegram_id: int, access_info: Dict[str, Any], generation: Optional[int] = None):
+        ttl = self.ttl
+        user = access_info.get('user')
+        if user is not None and user.subscription_end:
+            # Решение "доступ есть" не должно пережить окончание подписки
+            ttl = min(ttl, max(0.0, (user.subscription_end - datetime.now()).total_seconds()))
+        if ttl <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[telegram_id] = (time.monotonic() + ttl, access_info)
+
+    def invalidate(self, telegram_ids: Iterable[int]):
+        with self._lock:
+            self._generation += 1
+            for telegram_id in telegram_ids:
+                if self._entries.pop(telegram_id, None) is not None:
+                    self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def _get_cache_ttl() -> float:
+    try:
+        from config import SUBSCRIPTION_CACHE_TTL
+        return float(SUBSCRIPTION_CACHE_TTL)
+    except ImportError:
+        return DEFAULT_ACCESS_CACHE_TTL
+
+
 class SubscriptionService:
     """Сервис для проверки подписок пользователей в основной системе"""
     
-    def __init__(self):
-        self.user_service = UserService()
+    def __init__(self, cache_ttl: Optional[float] = None, user_service: Optional[UserService] = None):
+        self.user_service = user_service or UserService()
+        self.access_cache = AccessDecisionCache(_get_cache_ttl() if cache_ttl is None else cache_ttl,
+                                                self.user_service.store.change_seq())
+        # Любое сохранение/удаление пользователя в этом процессе сбрасывает его решение
+        self.user_service.store.add_listener(self.access_cache.invalidate)
         logger.info("🔐 SubscriptionService инициализирован")
     
+    def invalidate_user(self, telegram_id: int):
+        """Сбрасывает кэшированное решение о доступе пользователя"""
+        self.access_cache.invalidate([telegram_id])
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Статистика кэша решений о доступе (попадания, промахи, доля попаданий)"""
+        return self.access_cache.get_stats()
+    
     def check_user_access(self, telegram_id: int) -> Dict[str, Any]:
         """
-        Проверяет доступ пользователя к системе
+        Проверяет доступ пользователя к системе (с кэшированием решения)
+        
+        Returns:
+            dict: см. _evaluate_user_access
+        """
+        self.access_cache.sync(self.user_service.store.changes_since)
+        
+        cached = self.access_cache.get(telegram_id)
+        if cached is not None:
+            return dict(cached)
+        
+        generation = self.access_cache.generation
+        access_info = self._evaluate_user_access(telegram_id)
+        if access_info['status'] != 'error':
+            self.access_cache.put(telegram_id, access_info, generation)
+        return dict(access_info)
+    
+    def _evaluate_user_access(self, telegram_id: int) -> Dict[str, Any]:
+        """
+        Вычисляет доступ пользователя к системе по его данным
         
         Returns:
             dict: {
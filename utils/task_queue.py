@@ -1,6 +1,5 @@
 import threading
 import logging
-import queue
 import time
 from datetime import datetime
 import concurrent.futures
@@ -10,22 +9,25 @@ import json
 import os
 from typing import List
 
-from database.db_manager import update_publish_task_status, get_publish_task, update_task_status
+from database.db_manager import (
+    get_publish_task, mark_publish_task_queued, claim_interrupted_publish_tasks, renew_publish_task_leases
+)
+from database.status_buffer import get_status_buffer
 from database.models import TaskStatus, TaskType
 from instagram.post_manager import PostManager
 from instagram.reels_manager import ReelsManager
 from instagram.story_manager import StoryManager
 from instagram.client_patch import add_account_to_cache
-from utils.content_uniquifier import uniquify_for_publication
+from instagram.client import get_account_lock
+from utils.content_uniquifier import get_image_stage_stats, uniquify_for_publication, uniquifier
 from utils.system_monitor import get_adaptive_limits  # Добавляем импорт крутой системы мониторинга
+from utils.publish_scheduler import PublishScheduler, TaskPriority, LatencyHistogram
 
 logger = logging.getLogger(__name__)
 
-# Создаем очередь задач
-task_queue = queue.Queue()
-
-# Словарь для хранения результатов выполнения задач
-task_results = {}
+# Планировщик задач: приоритеты, отложенный запуск одним таймером,
+# последовательное выполнение задач одного аккаунта
+task_scheduler = PublishScheduler()
 
 # Пул потоков для параллельного выполнения задач
 # Теперь количество потоков будет динамически адаптироваться под нагрузку
@@ -35,6 +37,20 @@ executor = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS)
 # Глобальная переменная для хранения активных пакетов задач
 active_task_batches = {}
 
+# Варианты медиа, подготовленные для пакета задач с общим исходником:
+# task_id -> (Future со списком вариантов, номер варианта задачи, исходник)
+media_prepare_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="MediaPrepare")
+prepared_media = {}
+prepared_media_lock = threading.Lock()
+
+def update_publish_task_status(task_id, status, error_message=None, media_id=None):
+    """
+    Обновляет статус задачи через буфер отложенной записи.
+    Промежуточные статусы пишутся пакетами, финальные (COMPLETED/FAILED) -
+    до возврата, чтобы уведомления и итоговый отчет видели актуальный статус.
+    """
+    return get_status_buffer().update(task_id, status, error_message=error_message, media_id=media_id)
+
 def get_task_adaptive_limits():
     """Получает адаптивные лимиты на основе крутой системной нагрузки"""
     try:
@@ -189,17 +205,16 @@ def process_task(task_id, chat_id, bot):
         is_video = file_extension in ['.mp4', '.mov', '.avi', '.mkv', '.webm']
         
         # Определяем тип контента для уникализации
-        if task_type == TaskType.CAROUSEL:
-            content_type = 'carousel'
-        elif task_type == TaskType.REEL or is_video:
-            content_type = 'reel'
-        elif task_type == TaskType.STORY:
-            content_type = 'story'
-        else:
-            content_type = 'photo'
+        content_type = get_uniquify_content_type(task_type, media_path)
         
         # Применяем уникализацию если включена
-        if uniquify_content:
+        prepared_media = take_prepared_media(task_id) if uniquify_content else None
+        if prepared_media is not None:
+            # Вариант уже создан вместе с остальными задачами пакета (одно декодирование исходника)
+            logger.info(f"🎨 Используется заранее уникализированный вариант для типа: {content_type}")
+            media_path = json.dumps(prepared_media) if isinstance(prepared_media, list) else prepared_media
+            full_caption = uniquifier.uniquify_text(full_caption) if full_caption else full_caption
+        elif uniquify_content:
             logger.info(f"🎨 Применяется уникализация контента для типа: {content_type}")
             
             # Для карусели нужно сначала распарсить пути
@@ -510,6 +525,178 @@ def process_task(task_id, chat_id, bot):
         
         return False
 
+def get_uniquify_content_type(task_type, media_path):
+    """Тип контента для уникализации по типу задачи и расширению файла"""
+    file_extension = os.path.splitext(media_path or '')[1].lower()
+    is_video = file_extension in ['.mp4', '.mov', '.avi', '.mkv', '.webm']
+
+    if task_type == TaskType.CAROUSEL:
+        return 'carousel'
+    elif task_type == TaskType.REEL or is_video:
+        return 'reel'
+    elif task_type == TaskType.STORY:
+        return 'story'
+    return 'photo'
+
+def _parse_media_paths(task_type, media_path):
+    """Пути медиа задачи: для карусели - список из JSON"""
+    if task_type != TaskType.CAROUSEL:
+        return media_path
+    try:
+        media_paths = json.loads(media_path)
+        return media_paths if isinstance(media_paths, list) else [media_path]
+    except Exception:
+        return [media_path]
+
+def prepare_batch_media(task_ids: List[int]):
+    """
+    Заранее создает уникальные варианты медиа для задач пакета с общим исходником.
+
+    Задачи с одинаковым файлом и включенной уникализацией группируются,
+    для каждой группы исходник декодируется один раз и все варианты строятся
+    в фоне; process_task забирает свой вариант через take_prepared_media.
+
+    Returns:
+        int: Количество задач, для которых готовятся варианты
+    """
+    groups = {}
+    for task_id in task_ids:
+        task_data = get_publish_task(task_id)
+        if not task_data:
+            continue
+        options = task_data.get('options') or {}
+        if isinstance(options, str):
+            try:
+                options = json.loads(options) if options else {}
+            except Exception:
+                options = {}
+        if not options.get('uniquify_content', False) or not task_data.get('media_path'):
+            continue
+
+        task_type = task_data['task_type']
+        content_type = get_uniquify_content_type(task_type, task_data['media_path'])
+        groups.setdefault((task_data['media_path'], content_type), []).append((task_id, task_type))
+
+    prepared = 0
+    for (media_path, content_type), tasks in groups.items():
+        if len(tasks) < 2:
+            continue
+        source = _parse_media_paths(tasks[0][1], media_path)
+        future = media_prepare_executor.submit(uniquifier.uniquify_batch, source, content_type, len(tasks))
+        with prepared_media_lock:
+            for index, (task_id, _) in enumerate(tasks):
+                prepared_media[task_id] = (future, index, source)
+        prepared += len(tasks)
+        logger.info(f"🎨 Готовим {len(tasks)} вариантов медиа {content_type} за одно декодирование")
+    return prepared
+
+def take_prepared_media(task_id: int):
+    """
+    Забирает заранее созданный вариант медиа задачи.
+
+    Не блокирует: диспетчер запускает задачу только после готовности вариантов
+    (_wait_for_prepared_media), поэтому здесь Future уже завершен.
+
+    Returns:
+        Путь (или список путей для карусели) или None, если вариант не готовился,
+        еще не готов либо его создание не удалось - тогда задача уникализирует медиа сама.
+    """
+    with prepared_media_lock:
+        entry = prepared_media.get(task_id)
+        if entry is not None and entry[0].done():
+            del prepared_media[task_id]
+    if entry is None:
+        return None
+
+    future, index, _ = entry
+    if not future.done():
+        logger.warning(f"Варианты медиа для задачи #{task_id} еще не готовы, уникализируем отдельно")
+        discard_prepared_media(task_id)
+        return None
+    try:
+        media, _ = future.result()[index]
+        return media
+    except Exception as e:
+        logger.warning(f"Не удалось получить подготовленный вариант медиа для задачи #{task_id}: {e}")
+        return None
+
+def _remove_variant_files(media, source):
+    """Удаляет файлы варианта (исходник, подставленный при ошибке уникализации, не трогаем)"""
+    sources = set(source if isinstance(source, list) else [source])
+    for path in (media if isinstance(media, list) else [media]):
+        if path and path not in sources and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Не удалось удалить неиспользованный вариант {path}: {e}")
+
+def _wait_for_prepared_media(task) -> bool:
+    """
+    Если варианты медиа задачи еще готовятся, задача возвращается в планировщик
+    колбэком готовности, а не ждет в потоке пула. Полоса аккаунта остается занятой
+    до возврата, поэтому порядок задач аккаунта не меняется.
+
+    Returns:
+        bool: Запуск задачи отложен до готовности вариантов
+    """
+    with prepared_media_lock:
+        entry = prepared_media.get(task.task_id)
+    if entry is None or entry[0].done():
+        return False
+    entry[0].add_done_callback(lambda _: task_scheduler.defer(task, 0))
+    return True
+
+def discard_prepared_media(task_id: int) -> bool:
+    """
+    Отказ от варианта, который задача так и не забрала (ошибка до публикации,
+    задача без уникализации): запись удаляется, файлы варианта - когда будут готовы.
+
+    Returns:
+        bool: Был ли вариант для задачи
+    """
+    with prepared_media_lock:
+        entry = prepared_media.pop(task_id, None)
+    if entry is None:
+        return False
+
+    future, index, source = entry
+
+    def remove_files(done_future):
+        try:
+            media, _ = done_future.result()[index]
+        except Exception:
+            return
+        _remove_variant_files(media, source)
+
+    future.add_done_callback(remove_files)
+    return True
+
+def enqueue_task_batch(task_ids: List[int], chat_id: int = None, bot=None) -> List[int]:
+    """
+    Ставит пакет задач в очередь: сначала запускается общая подготовка вариантов
+    медиа, затем задачи добавляются в очередь и пакет регистрируется для отчета.
+    Подготовка должна начаться до постановки в очередь - иначе задачи разных
+    аккаунтов стартуют сразу и уникализируют исходник каждая сама.
+
+    Returns:
+        List[int]: Задачи, которые удалось поставить в очередь
+    """
+    try:
+        prepare_batch_media(task_ids)
+    except Exception as e:
+        logger.warning(f"Не удалось подготовить варианты медиа для пакета: {e}")
+
+    queued = []
+    for task_id in task_ids:
+        if add_task_to_queue(task_id, chat_id, bot):
+            queued.append(task_id)
+        else:
+            discard_prepared_media(task_id)
+
+    if queued and chat_id and bot:
+        register_task_batch(queued, chat_id, bot)
+    return queued
+
 def register_task_batch(task_ids: List[int], chat_id: int, bot):
     """Регистрирует пакет задач для отправки итогового отчета"""
     if not task_ids:
@@ -606,104 +793,223 @@ def check_and_send_batch_report(task_id: int, chat_id: int, bot):
         # Удаляем завершенный пакет
         del active_task_batches[batch_to_update]
 
+class DispatchSlots:
+    """
+    Семафор с изменяемым лимитом: слот освобождается из колбэка завершения задачи,
+    и диспетчер просыпается сразу, без опроса futures
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout=None):
+        """Ждет свободный слот. Возвращает False по таймауту или после close()"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._closed or self.in_flight < self.limit, timeout)
+            if self._closed or self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def set_limit(self, limit):
+        with self._cond:
+            self.limit = limit
+            self._cond.notify_all()
+
+    def close(self):
+        """Будит ожидающий диспетчер при остановке"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def reopen(self):
+        with self._cond:
+            self._closed = False
+
+
+# Слоты пула и гистограммы задержек диспетчера
+dispatch_slots = DispatchSlots(MAX_WORKERS)
+queue_wait_histogram = LatencyHistogram()  # Ожидание: постановка в очередь (или наступление срока) → старт
+execution_histogram = LatencyHistogram()  # Выполнение: старт → завершение
+
+# Интервал проверки нагрузки системы (секунды)
+LOAD_CHECK_INTERVAL = 30
+
+# Через сколько секунд повторить задачу, если аккаунт занят вне очереди (вход, прогрев)
+ACCOUNT_BUSY_RETRY_DELAY = 5
+
+# Сколько раз задача откладывалась из-за занятого аккаунта
+account_busy_deferrals = 0
+
+def _run_dispatched_task(task):
+    """Выполняет задачу в пуле потоков с замером задержек"""
+    started_at = time.time()
+    queue_wait_histogram.observe(started_at - max(task.enqueued_at, task.run_at))
+    try:
+        return process_task(task.task_id, task.chat_id, task.bot)
+    finally:
+        # Вариант, подготовленный для задачи, но не использованный ею
+        discard_prepared_media(task.task_id)
+        execution_histogram.observe(time.time() - started_at)
+
+def _on_task_done(future, task):
+    """Колбэк завершения: освобождает аккаунт и слот пула"""
+    try:
+        # Получаем результат, чтобы обработать возможные исключения
+        future.result()
+    except Exception as e:
+        logger.error(f"❌ Ошибка в задаче {(task.task_id, task.chat_id)}: {e}")
+        logger.error(traceback.format_exc())
+    finally:
+        task_scheduler.task_done(task)
+        dispatch_slots.release()
+
+def _refresh_adaptive_limits():
+    """Обновляет лимит слотов по данным системы мониторинга"""
+    try:
+        # Получаем адаптивные лимиты от крутой системы мониторинга
+        adaptive_workers, system_delay, system_limits = get_task_adaptive_limits()
+
+        # Обновляем максимальное количество потоков если изменилось
+        if adaptive_workers != dispatch_slots.limit:
+            logger.info(f"🔧 Адаптация нагрузки: потоков {dispatch_slots.limit} → {adaptive_workers} | Уровень: {system_limits.description}")
+
+            # Если нужно уменьшить количество потоков, новые задачи ждут завершения лишних
+            if dispatch_slots.in_flight > adaptive_workers:
+                logger.info(f"⏳ Ожидание завершения {dispatch_slots.in_flight - adaptive_workers} задач для снижения нагрузки")
+
+            dispatch_slots.set_limit(adaptive_workers)
+    except Exception as e:
+        logger.warning(f"⚠️ Ошибка проверки нагрузки: {e}")
+
 def task_worker():
-    """Функция-обработчик очереди задач с адаптивным управлением нагрузкой"""
+    """
+    Диспетчер очереди задач с адаптивным управлением нагрузкой.
+    Следующая задача запускается сразу после освобождения слота (колбэк завершения),
+    а новая задача забирается из планировщика сразу после постановки в очередь.
+    """
+    global account_busy_deferrals
+
     logger.info("🚀 Запущен адаптивный обработчик очереди задач")
 
-    # Словарь для отслеживания выполняющихся задач
-    futures = {}
     last_load_check = 0
-    current_max_workers = MAX_WORKERS
 
-    while True:
+    while not stop_event.is_set():
         try:
-            # Проверяем нагрузку системы каждые 30 секунд
+            # Проверяем нагрузку системы каждые LOAD_CHECK_INTERVAL секунд
             current_time = time.time()
-            if current_time - last_load_check > 30:
-                try:
-                    # Получаем адаптивные лимиты от крутой системы мониторинга
-                    adaptive_workers, system_delay, system_limits = get_task_adaptive_limits()
-                    
-                    # Обновляем максимальное количество потоков если изменилось
-                    if adaptive_workers != current_max_workers:
-                        logger.info(f"🔧 Адаптация нагрузки: потоков {current_max_workers} → {adaptive_workers} | Уровень: {system_limits.description}")
-                        current_max_workers = adaptive_workers
-                        
-                        # Если нужно уменьшить количество потоков, ждем завершения лишних
-                        if len(futures) > current_max_workers:
-                            logger.info(f"⏳ Ожидание завершения {len(futures) - current_max_workers} задач для снижения нагрузки")
-                    
-                    last_load_check = current_time
-                    
-                except Exception as e:
-                    logger.warning(f"⚠️ Ошибка проверки нагрузки: {e}")
-                    last_load_check = current_time
-
-            # Проверяем завершенные задачи
-            done_futures = []
-            for future, task_info in list(futures.items()):
-                if future.done():
-                    try:
-                        # Получаем результат, чтобы обработать возможные исключения
-                        future.result()
-                    except Exception as e:
-                        logger.error(f"❌ Ошибка в задаче {task_info}: {e}")
-                        logger.error(traceback.format_exc())
-                    done_futures.append(future)
-
-            # Удаляем завершенные задачи из словаря
-            for future in done_futures:
-                del futures[future]
+            if current_time - last_load_check > LOAD_CHECK_INTERVAL:
+                _refresh_adaptive_limits()
+                last_load_check = current_time
+            next_check_in = max(0.0, last_load_check + LOAD_CHECK_INTERVAL - time.time())
+
+            # Ждем свободный слот в пуле
+            if not dispatch_slots.acquire(timeout=next_check_in):
+                continue
 
             # Проверяем, не перегружена ли система критически
             if check_system_overload():
+                dispatch_slots.release()
                 logger.warning("🚨 Система критически перегружена! Приостанавливаем обработку новых задач")
-                time.sleep(30)  # Ждем 30 секунд при критической перегрузке (было 60)
+                stop_event.wait(30)  # Ждем 30 секунд при критической перегрузке
                 continue
 
-            # Получаем новую задачу из очереди, если есть место в пуле
-            if len(futures) < current_max_workers:
-                try:
-                    # Неблокирующее получение задачи с таймаутом
-                    task = task_queue.get(block=True, timeout=1.0)
-
-                    if task is None:
-                        # Сигнал для завершения
-                        break
+            # Ждем готовую задачу (планировщик будит сразу при постановке)
+            task = task_scheduler.get(timeout=next_check_in)
+            if task is None:
+                dispatch_slots.release()
+                continue
 
-                    task_id, chat_id, bot = task
+            # Аккаунт занят другой операцией - откладываем задачу, а не паркуем поток пула на блокировке
+            if task.account_id is not None and get_account_lock(task.account_id).locked():
+                account_busy_deferrals += 1
+                task_scheduler.defer(task, ACCOUNT_BUSY_RETRY_DELAY)
+                dispatch_slots.release()
+                logger.debug(f"⏸️ Аккаунт задачи #{task.task_id} занят, повтор через {ACCOUNT_BUSY_RETRY_DELAY}с")
+                continue
 
-                    # Запускаем задачу в пуле потоков
-                    future = executor.submit(process_task, task_id, chat_id, bot)
-                    futures[future] = (task_id, chat_id)
+            # Варианты медиа пакета еще готовятся - слот не занимаем, задача вернется по их готовности
+            if _wait_for_prepared_media(task):
+                dispatch_slots.release()
+                logger.debug(f"🎨 Задача #{task.task_id} ждет подготовки вариантов медиа")
+                continue
 
-                    # Отмечаем задачу как взятую из очереди
-                    task_queue.task_done()
-                    
-                    logger.debug(f"📋 Запущена задача #{task_id} ({len(futures)}/{current_max_workers} потоков)")
+            # Запускаем задачу в пуле потоков
+            future = executor.submit(_run_dispatched_task, task)
+            future.add_done_callback(lambda f, task=task: _on_task_done(f, task))
 
-                except queue.Empty:
-                    # Если очередь пуста, просто продолжаем цикл
-                    pass
-            else:
-                # Если все рабочие потоки заняты, ждем немного
-                time.sleep(0.5)
+            logger.debug(f"📋 Запущена задача #{task.task_id} ({dispatch_slots.in_flight}/{dispatch_slots.limit} потоков)")
 
         except Exception as e:
             logger.error(f"❌ Критическая ошибка в обработчике очереди: {e}")
             logger.error(traceback.format_exc())
-            time.sleep(1)  # Пауза перед следующей итерацией
+            stop_event.wait(1)  # Пауза перед следующей итерацией
 
 # Запускаем обработчик в отдельном потоке
 worker_thread = None
+lease_thread = None
+stop_event = threading.Event()
+
+# Аренда задач в статусе PROCESSING: очередь запускают и бот, и веб-API с общей базой,
+# поэтому чужие задачи забираются, только если их процесс перестал продлевать аренду
+PUBLISH_LEASE_HEARTBEAT = 30  # Интервал продления аренды своих задач (секунды)
+PUBLISH_LEASE_TIMEOUT = 300  # Через сколько секунд без продления задачу можно забрать
 
-def start_task_queue():
-    """Запускает обработчик очереди задач"""
-    global worker_thread
+def recover_interrupted_tasks(bot=None):
+    """Возвращает в очередь задачи остановившихся процессов (PROCESSING с истекшей арендой)"""
+    tasks = claim_interrupted_publish_tasks(PUBLISH_LEASE_TIMEOUT)
+    if not tasks:
+        return 0
+
+    now = time.time()
+    recovered = 0
+    for task in tasks:
+        run_at = None
+        if task['scheduled_time']:
+            # Отложенная задача сохраняет свое время запуска
+            run_at = max(task['scheduled_time'].timestamp(), now)
+
+        priority = task['priority'] if task['priority'] is not None else TaskPriority.NORMAL
+        if task_scheduler.put(task['id'], task['account_id'], chat_id=task['user_id'], bot=bot,
+                              priority=priority, run_at=run_at):
+            recovered += 1
+
+    logger.info(f"♻️ Восстановлено {recovered} задач публикации с истекшей арендой")
+    return recovered
+
+def _lease_loop(bot=None):
+    """Продлевает аренду своих задач и забирает задачи остановившихся процессов"""
+    while not stop_event.wait(PUBLISH_LEASE_HEARTBEAT):
+        try:
+            renew_publish_task_leases()
+            recover_interrupted_tasks(bot)
+        except Exception as e:
+            logger.error(f"Ошибка при продлении аренды задач: {e}")
+
+def start_task_queue(bot=None):
+    """Запускает обработчик очереди задач и восстанавливает прерванные задачи"""
+    global worker_thread, lease_thread
 
     if worker_thread is None or not worker_thread.is_alive():
+        stop_event.clear()
+        dispatch_slots.reopen()
+        task_scheduler.start()
+        try:
+            recover_interrupted_tasks(bot)
+        except Exception as e:
+            logger.error(f"Ошибка при восстановлении задач: {e}")
         worker_thread = threading.Thread(target=task_worker, daemon=True)
         worker_thread.start()
+        lease_thread = threading.Thread(target=_lease_loop, args=(bot,), daemon=True, name="PublishLease")
+        lease_thread.start()
         logger.info("Запущен поток обработки очереди задач")
     else:
         logger.info("Поток обработки очереди задач уже запущен")
@@ -713,8 +1019,15 @@ def stop_task_queue():
     global worker_thread, executor
 
     if worker_thread and worker_thread.is_alive():
-        task_queue.put(None)  # Сигнал для завершения
+        stop_event.set()  # Сигнал для завершения
+        dispatch_slots.close()
+        task_scheduler.close()
         worker_thread.join(timeout=5.0)
+        if lease_thread:
+            lease_thread.join(timeout=5.0)
+
+        # Сохраняем накопленные статусы задач
+        get_status_buffer().flush()
 
         # Завершаем пул потоков
         executor.shutdown(wait=False)
@@ -724,7 +1037,7 @@ def stop_task_queue():
 
         logger.info("Поток обработки очереди задач остановлен")
 
-def add_task_to_queue(task_id, chat_id=None, bot=None, delay_seconds=0):
+def add_task_to_queue(task_id, chat_id=None, bot=None, delay_seconds=0, priority=TaskPriority.NORMAL):
     """Добавляет задачу в очередь на выполнение
     
     Args:
@@ -732,6 +1045,7 @@ def add_task_to_queue(task_id, chat_id=None, bot=None, delay_seconds=0):
         chat_id: ID чата для отправки уведомлений (опционально)
         bot: Объект бота для отправки уведомлений (опционально)
         delay_seconds: Задержка перед выполнением в секундах
+        priority: Приоритет задачи (TaskPriority)
     """
     try:
         # Проверяем, что задача существует
@@ -740,23 +1054,18 @@ def add_task_to_queue(task_id, chat_id=None, bot=None, delay_seconds=0):
             logger.error(f"Задача #{task_id} не найдена")
             return False
 
-        # Обновляем статус задачи
-        update_publish_task_status(task_id, TaskStatus.PROCESSING)
+        # Сохраняем состояние очереди в БД, чтобы восстановить задачу после перезапуска
+        scheduled_time = None
+        if delay_seconds > 0:
+            scheduled_time = datetime.fromtimestamp(time.time() + delay_seconds)
+        mark_publish_task_queued(task_id, scheduled_time=scheduled_time, priority=priority)
+
+        task_scheduler.put(task_id, task['account_id'], chat_id=chat_id, bot=bot,
+                           priority=priority, delay_seconds=delay_seconds)
 
         if delay_seconds > 0:
-            # Если нужна задержка, добавляем задачу с таймером
-            def delayed_add():
-                time.sleep(delay_seconds)
-                task_queue.put((task_id, chat_id, bot))
-                logger.info(f"Задача #{task_id} добавлена в очередь после задержки {delay_seconds}с")
-            
-            # Запускаем в отдельном потоке
-            delay_thread = threading.Thread(target=delayed_add, daemon=True)
-            delay_thread.start()
             logger.info(f"Задача #{task_id} запланирована с задержкой {delay_seconds} секунд")
         else:
-            # Добавляем задачу в очередь немедленно
-            task_queue.put((task_id, chat_id, bot))
             logger.info(f"Задача #{task_id} добавлена в очередь")
 
         return True
@@ -768,16 +1077,12 @@ def add_task_to_queue(task_id, chat_id=None, bot=None, delay_seconds=0):
 def get_task_status(task_id):
     """Возвращает статус выполнения задачи"""
     try:
-        if task_id in task_results:
-            return task_results[task_id]
-
-        # Если задача не найдена в результатах, проверяем БД
         task = get_publish_task(task_id)
         if task:
             return {
-                'success': task.status == TaskStatus.COMPLETED,
-                'result': task.error_message or "В процессе выполнения",
-                'completed_at': task.updated_at
+                'success': task['status'] == TaskStatus.COMPLETED,
+                'result': task.get('error_message') or "В процессе выполнения",
+                'completed_at': task.get('updated_at')
             }
 
         return None
@@ -792,19 +1097,28 @@ def get_queue_stats():
         adaptive_workers, system_delay, system_limits = get_task_adaptive_limits()
         
         return {
-            'queue_size': task_queue.qsize(),
+            'queue_size': task_scheduler.qsize(),
             'max_workers': MAX_WORKERS,
             'current_max_workers': adaptive_workers,
             'system_delay': system_delay,
             'load_level': system_limits.description,
             'is_overloaded': check_system_overload(),
             'timeout_multiplier': system_limits.timeout_multiplier if hasattr(system_limits, 'timeout_multiplier') else 1.0,
-            'batch_size': system_limits.batch_size if hasattr(system_limits, 'batch_size') else 1
+            'batch_size': system_limits.batch_size if hasattr(system_limits, 'batch_size') else 1,
+            'scheduler': task_scheduler.get_stats(),
+            'in_flight': dispatch_slots.in_flight,
+            'account_busy_deferrals': account_busy_deferrals,
+            'status_buffer': get_status_buffer().get_stats(),
+            'latency': {
+                'enqueue_to_start': queue_wait_histogram.snapshot(),
+                'start_to_finish': execution_histogram.snapshot()
+            },
+            'image_stages': get_image_stage_stats()
         }
     except Exception as e:
         logger.error(f"Ошибка при получении статистики очереди: {e}")
         return {
-            'queue_size': task_queue.qsize(),
+            'queue_size': task_scheduler.qsize(),
             'max_workers': MAX_WORKERS,
             'current_max_workers': MAX_WORKERS,
             'system_delay': 5.0,
@@ -0,0 +1,306 @@
+"""
+Потоковая уникализация видео
+- цветокоррекция через заранее посчитанную таблицу (LUT) и смешивание с яркостью
+  вместо BGR→HSV→float32→BGR на каждом кадре
+- конвейер: декодирование → пул потоков обработки → поток кодирования
+  (OpenCV отпускает GIL, поэтому кадры обрабатываются параллельно)
+- ffmpeg-бэкенд (imageio-ffmpeg): весь фильтр-граф выполняется внутри ffmpeg,
+  кадры не проходят через Python, звук и метаданные сохраняются за один проход
+- варианты для нескольких аккаунтов (*_many) делаются за одно декодирование
+  на группу из outputs_per_pass вариантов (число кодировщиков за проход ограничено)
+"""
+
+import os
+import re
+import time
+import queue
+import random
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Порог, ниже которого изменение насыщенности не применяется
+SATURATION_EPSILON = 0.005
+
+# Вариантов за один проход декодера по умолчанию: каждый вариант - свой кодировщик
+DEFAULT_OUTPUTS_PER_PASS = 4
+
+
+@dataclass
+class VideoUniquifyParams:
+    """Случайные параметры уникализации одного видео"""
+    scale: float = 1.0
+    speed_factor: float = 1.0
+    brightness: float = 0.0
+    contrast: float = 1.0
+    saturation: float = 1.0
+
+    @classmethod
+    def random(cls) -> 'VideoUniquifyParams':
+        return cls(
+            scale=random.uniform(0.98, 1.02),
+            speed_factor=random.uniform(0.95, 1.05),
+            brightness=random.uniform(-10, 10),
+            contrast=random.uniform(0.9, 1.1),
+            saturation=random.uniform(0.9, 1.1)
+        )
+
+    def describe(self) -> List[str]:
+        """Описание трансформаций для лога"""
+        return [f"scale_{self.scale:.2f}", f"speed_{self.speed_factor:.2f}"]
+
+    def output_size(self, width: int, height: int) -> Tuple[int, int]:
+        """Размер кадра после масштабирования (четный - требование yuv420p)"""
+        return max(2, int(width * self.scale) // 2 * 2), max(2, int(height * self.scale) // 2 * 2)
+
+
+@dataclass
+class TranscodeStats:
+    """Результат перекодирования"""
+    backend: str
+    frames: int
+    seconds: float
+
+    @property
+    def fps(self) -> float:
+        return self.frames / self.seconds if self.seconds else 0.0
+
+
+def build_color_lut(contrast: float, brightness: float) -> np.ndarray:
+    """Таблица яркости/контраста: то же, что cv2.convertScaleAbs(x, alpha=contrast, beta=brightness)"""
+    values = np.abs(np.arange(256, dtype=np.float32) * contrast + brightness)
+    return np.clip(np.rint(values), 0, 255).astype(np.uint8)
+
+
+class FrameTransformer:
+    """Преобразование одного кадра; таблицы считаются один раз на видео"""
+
+    def __init__(self, params: VideoUniquifyParams, size: Tuple[int, int]):
+        self.size = size
+        self.lut = build_color_lut(params.contrast, params.brightness)
+        self.saturation = params.saturation
+
+    def __call__(self, frame: np.ndarray) -> np.ndarray:
+        if (frame.shape[1], frame.shape[0]) != self.size:
+            frame = cv2.resize(frame, self.size)
+        frame = cv2.LUT(frame, self.lut)
+
+        # Насыщенность: смешивание с яркостью кадра (как ImageEnhance.Color), без перехода в HSV
+        if abs(self.saturation - 1.0) > SATURATION_EPSILON:
+            gray = cv2.cvtColor(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), cv2.COLOR_GRAY2BGR)
+            cv2.addWeighted(frame, self.saturation, gray, 1.0 - self.saturation, 0, dst=frame)
+        return frame
+
+
+def transcode_opencv(input_path: str, output_path: str, params: VideoUniquifyParams,
+                     workers: Optional[int] = None, max_in_flight: int = 32) -> TranscodeStats:
+    """
+    Уникализация видео через OpenCV с конвейером по потокам.
+
+    Декодирование идет в вызывающем потоке, обработка кадров - в пуле,
+    запись - в отдельном потоке строго в исходном порядке кадров.
+    Очередь ограничена max_in_flight кадрами, поэтому память не растет с длиной видео.
+    """
+    return transcode_opencv_many(input_path, [output_path], [params], workers, max_in_flight)
+
+
+def _in_passes(transcode, outputs_per_pass: int, input_path: str, output_paths: List[str],
+               params_list: List[VideoUniquifyParams], per_output: Optional[List] = None, **kwargs) -> TranscodeStats:
+    """Варианты группами по outputs_per_pass: одно декодирование на группу (frames - сумма по проходам)"""
+    started = time.perf_counter()
+    backend, frames = None, 0
+    for start in range(0, len(output_paths), outputs_per_pass):
+        end = start + outputs_per_pass
+        args = (input_path, output_paths[start:end], params_list[start:end])
+        if per_output is not None:
+            args += (per_output[start:end],)
+        stats = transcode(*args, outputs_per_pass=outputs_per_pass, **kwargs)
+        backend, frames = stats.backend, frames + stats.frames
+    return TranscodeStats(backend, frames, time.perf_counter() - started)
+
+
+def transcode_opencv_many(input_path: str, output_paths: List[str], params_list: List[VideoUniquifyParams],
+                          workers: Optional[int] = None, max_in_flight: int = 32,
+                          outputs_per_pass: Optional[int] = None) -> TranscodeStats:
+    """
+    Несколько вариантов одного видео за одно декодирование.
+
+    Каждый декодированный кадр преобразуется параметрами всех вариантов,
+    поток кодирования пишет результаты в свои файлы. Больше outputs_per_pass
+    вариантов делаются несколькими проходами, чтобы не держать N кодировщиков разом.
+    """
+    outputs_per_pass = max(1, outputs_per_pass or DEFAULT_OUTPUTS_PER_PASS)
+    if len(output_paths) > outputs_per_pass:
+        return _in_passes(transcode_opencv_many, outputs_per_pass, input_path, output_paths, params_list,
+                          workers=workers, max_in_flight=max_in_flight)
+
+    started = time.perf_counter()
+    cap = cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        raise ValueError(f"Не удалось открыть видео: {input_path}")
+
+    writers = []
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        transformers = []
+        for output_path, params in zip(output_paths, params_list):
+            size = params.output_size(width, height)
+            out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps * params.speed_factor, size)
+            writers.append(out)
+            if not out.isOpened():
+                raise ValueError(f"Не удалось создать видео: {output_path}")
+            transformers.append(FrameTransformer(params, size))
+
+        pending = queue.Queue(maxsize=max_in_flight)
+        state = {'frames': 0, 'error': None}
+
+        def encoder():
+            # Пишет кадры по порядку; после ошибки только вычитывает очередь, чтобы не блокировать декодер
+            while True:
+                futures = pending.get()
+                if futures is None:
+                    return
+                if state['error'] is not None:
+                    continue
+                try:
+                    for out, future in zip(writers, futures):
+                        out.write(future.result())
+                    state['frames'] += 1
+                except Exception as e:
+                    state['error'] = e
+
+        encoder_thread = threading.Thread(target=encoder, daemon=True, name="VideoEncoder")
+        encoder_thread.start()
+
+        workers = workers or min(4, os.cpu_count() or 1)
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="VideoFrame") as pool:
+                while state['error'] is None:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    # Каждый вариант получает свою копию: LUT и смешивание пишут в кадр на месте
+                    pending.put([pool.submit(transformer, frame if i == len(transformers) - 1 else frame.copy())
+                                 for i, transformer in enumerate(transformers)])
+        finally:
+            pending.put(None)
+            encoder_thread.join()
+
+        if state['error'] is not None:
+            raise state['error']
+        return TranscodeStats('opencv', state['frames'], time.perf_counter() - started)
+    finally:
+        cap.release()
+        for out in writers:
+            out.release()
+
+
+def get_ffmpeg_exe() -> Optional[str]:
+    """Путь к ffmpeg из imageio-ffmpeg (None, если пакет недоступен)"""
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return None
+
+
+def build_ffmpeg_video_filter(params: VideoUniquifyParams) -> str:
+    """
+    Фильтр-граф, эквивалентный FrameTransformer: масштаб → eq → скорость.
+
+    eq работает прямо в YUV (тоже через таблицу), без перевода кадров в RGB.
+    x * contrast + brightness переписывается как (x - 128) * contrast + 128 + сдвиг,
+    потому что eq растягивает контраст относительно середины диапазона.
+    """
+    shift = (128 * (params.contrast - 1) + params.brightness) / 255
+    filters = [
+        f"scale=trunc(iw*{params.scale:.4f}/2)*2:trunc(ih*{params.scale:.4f}/2)*2",
+        f"eq=contrast={params.contrast:.4f}:brightness={shift:.4f}:saturation={params.saturation:.4f}",
+        f"setpts=PTS/{params.speed_factor:.4f}",
+    ]
+    return ','.join(filters)
+
+
+def transcode_ffmpeg(input_path: str, output_path: str, params: VideoUniquifyParams,
+                     metadata: Optional[Dict[str, str]] = None,
+                     preset: str = 'veryfast', crf: int = 20,
+                     timeout: Optional[float] = None) -> TranscodeStats:
+    """
+    Уникализация видео одним вызовом ffmpeg.
+
+    Звук (если есть) ускоряется вместе с видео, метаданные записываются сразу,
+    поэтому дополнительное перекодирование для метаданных не нужно.
+    """
+    return transcode_ffmpeg_many(input_path, [output_path], [params], [metadata], preset, crf, timeout)
+
+
+def transcode_ffmpeg_many(input_path: str, output_paths: List[str], params_list: List[VideoUniquifyParams],
+                          metadata_list: Optional[List[Optional[Dict[str, str]]]] = None,
+                          preset: str = 'veryfast', crf: int = 20,
+                          timeout: Optional[float] = None,
+                          outputs_per_pass: Optional[int] = None) -> TranscodeStats:
+    """
+    Несколько вариантов одного видео одним процессом ffmpeg.
+
+    Видео декодируется один раз и раздается фильтром split по цепочкам вариантов,
+    каждый вариант кодируется в свой файл со своим звуком и метаданными.
+    Больше outputs_per_pass вариантов делаются несколькими процессами по очереди.
+    """
+    ffmpeg = get_ffmpeg_exe()
+    if not ffmpeg:
+        raise RuntimeError("ffmpeg недоступен (нужен пакет imageio-ffmpeg)")
+
+    count = len(output_paths)
+    metadata_list = metadata_list or [None] * count
+    outputs_per_pass = max(1, outputs_per_pass or DEFAULT_OUTPUTS_PER_PASS)
+    if count > outputs_per_pass:
+        return _in_passes(transcode_ffmpeg_many, outputs_per_pass, input_path, output_paths, params_list,
+                          metadata_list, preset=preset, crf=crf, timeout=timeout)
+
+    if count == 1:
+        graph = f"[0:v:0]{build_ffmpeg_video_filter(params_list[0])}[v0]"
+    else:
+        labels = ''.join(f"[s{i}]" for i in range(count))
+        chains = [f"[s{i}]{build_ffmpeg_video_filter(params)}[v{i}]" for i, params in enumerate(params_list)]
+        graph = ';'.join([f"[0:v:0]split={count}{labels}"] + chains)
+
+    started = time.perf_counter()
+    command = [
+        ffmpeg, '-hide_banner', '-nostdin', '-y', '-loglevel', 'error', '-nostats', '-progress', 'pipe:1',
+        '-i', input_path,
+        '-filter_complex', graph,
+    ]
+    for i, (output_path, params, metadata) in enumerate(zip(output_paths, params_list, metadata_list)):
+        command += [
+            '-map', f"[v{i}]", '-map', '0:a:0?',
+            '-filter:a', f"atempo={params.speed_factor:.4f}",
+            # Кадры не дублируются и не выбрасываются: меняется только их время.
+            # Без edit list: иначе длительность последнего кадра после setpts
+            # угадывается, и при части коэффициентов скорости он обрезается
+            '-fps_mode', 'passthrough', '-use_editlist', '0',
+            '-c:v', 'libx264', '-preset', preset, '-crf', str(crf), '-pix_fmt', 'yuv420p',
+            '-c:a', 'aac', '-movflags', '+faststart',
+            '-map_metadata', '-1',
+        ]
+        for key, value in (metadata or {}).items():
+            command += ['-metadata', f"{key}={value}"]
+        command.append(output_path)
+
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+    if result.returncode != 0:
+        error = result.stderr.decode('utf-8', 'replace').strip().splitlines()
+        raise RuntimeError(f"ffmpeg завершился с кодом {result.returncode}: {error[-1] if error else ''}")
+
+    frames = re.findall(rb'^frame=(\d+)', result.stdout, re.MULTILINE)
+    return TranscodeStats('ffmpeg', int(frames[-1]) if frames else 0, time.perf_counter() - started)
@@ -3078,13 +3078,16 @@ def create_follow_task():
                             'source': data['source_value']
                         })
             
+            new_tasks = [obj for obj in session.new if isinstance(obj, FollowTask)]
             session.commit()
             
             # Запускаем асинхронную очередь если она не запущена
-            from utils.async_follow_queue import start_async_follow_queue
+            from utils.async_follow_queue import start_async_follow_queue, enqueue_follow_tasks
             # Используем максимальное количество потоков из настроек
             max_threads = data.get('threads', 5)
             start_async_follow_queue(max_workers=max_threads)
+            # Передаем новые задачи в очередь напрямую, без ожидания сверки с БД
+            enqueue_follow_tasks(task.id for task in new_tasks)
             
             logger.info(f"✅ Создано {len(created_tasks)} задач автоподписки")
             
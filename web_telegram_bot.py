@@ -27,7 +27,7 @@ from database.db_manager import (
     delete_instagram_account, get_instagram_account_by_username
 )
 from utils.smart_validator_service import (
-    get_smart_validator, ValidationPriority, AccountStatus
+    get_smart_validator, ValidationPriority, AccountStatus, await_validation
 )
 from instagram.client import get_instagram_client
 from config import WEB_TELEGRAM_BOT_TOKEN
@@ -402,12 +402,12 @@ async def handle_check_account(callback: CallbackQuery):
     account_id = int(callback.data.split('_')[1])
     
     validator = get_smart_validator()
-    validator.request_validation(account_id, ValidationPriority.HIGH)
+    future = validator.request_validation(account_id, ValidationPriority.HIGH)
     
     await callback.answer("🔍 Проверка запущена!", show_alert=True)
     
-    # Ждем результат
-    await asyncio.sleep(3)
+    # Ждем результат (обновляем карточку сразу по завершении проверки)
+    await await_validation(future, timeout=30)
     
     account = get_instagram_account(account_id)
     if account: